@@ -2,8 +2,10 @@ import streamlit as st
 from openai import OpenAI
 # from database_tools import DatabaseTools # No longer needed directly here
 from sql_agent import SQLAgent
+from instrumentation import obter_tracer, span
 import pandas as pd
 import os
+import importlib
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -28,11 +30,22 @@ st.set_page_config(
 #     # This function might be removed or adapted if schema display is needed differently
 #     pass 
 
+# Agentes disponíveis (variável SQL_AGENT): módulo e classe
+AGENTES = {
+    'agent': ('sql_agent', 'SQLAgent'),
+    'simple': ('simple_sql_query', 'SimpleSQLQuery'),
+    'openai': ('openai_sql_query', 'OpenAISQLQuery'),
+}
+
 # Inicializar o agente SQL (now finds DB path itself)
 @st.cache_resource
 def get_sql_agent():
     # db_tools = get_db_tools() # No longer pass db_tools
-    return SQLAgent() # Initialize without arguments
+    tipo = os.getenv("SQL_AGENT", "agent").lower()
+    if tipo == 'agent':
+        return SQLAgent() # Initialize without arguments
+    modulo, classe = AGENTES[tipo]
+    return getattr(importlib.import_module(modulo), classe)()
 
 # Função para exibir o esquema do banco de dados (Commented out as DatabaseTools is removed)
 # def show_database_schema():
@@ -47,22 +60,97 @@ def process_query(query):
     result = agent.process_query(query)
     return result
 
+# Função para processar consultas exibindo o SQL e os resultados à medida que chegam
+def stream_query(query):
+    agent = get_sql_agent() # Agent is already cached
+    st.subheader("Consulta SQL (Gerada pelo Agente):")
+    sql_area = st.empty()
+    st.subheader("Resultados:")
+    result_area = st.empty()
+    result_area.info("Aguardando a consulta SQL...")
+    
+    for event in agent.stream_query(query):
+        if event["event"] == "token":
+            sql_area.code(event["text"], language="sql")
+        elif event["event"] == "sql":
+            sql_area.code(event["sql"], language="sql")
+            result_area.info("Executando a consulta...")
+        elif event["event"] == "result":
+            result_area.write(event["result"])
+        elif event["event"] == "done":
+            result = event["response"]
+    
+    # Resposta final (inclui o caso de erro)
+    with span("render"):
+        sql_area.code(result["sql"], language="sql")
+        result_area.write(result["result"])
+    timings = result.get("timings", {})
+    if "first_result" in timings:
+        st.caption(f"Primeiro resultado em {timings['first_result']:.1f} s; total {timings.get('total', 0):.1f} s")
+    return result
+
+# Etapas exibidas no painel de desempenho, na ordem de execução
+STAGES = ["query", "context", "llm", "agent", "sql", "post", "render"]
+
+# Função para exibir os percentis de latência por etapa na barra lateral
+def show_metrics(area):
+    estatisticas = obter_tracer().estatisticas()
+    with area.expander("Desempenho"):
+        if not estatisticas:
+            st.caption("Nenhuma consulta medida ainda.")
+            return
+        etapas = [e for e in STAGES if e in estatisticas] + sorted(set(estatisticas) - set(STAGES))
+        tabela = pd.DataFrame(
+            [[estatisticas[e]['n'], estatisticas[e]['p50_ms'], estatisticas[e]['p95_ms'],
+              estatisticas[e]['p99_ms'], estatisticas[e]['erros']] for e in etapas],
+            index=etapas, columns=["n", "p50 ms", "p95 ms", "p99 ms", "erros"])
+        st.dataframe(tabela.round(0))
+        tokens = [estatisticas[e] for e in ("llm", "agent") if e in estatisticas]
+        prompt = sum(t.get('prompt_tokens', 0) for t in tokens)
+        completion = sum(t.get('completion_tokens', 0) for t in tokens)
+        if prompt or completion:
+            st.caption(f"Tokens: {prompt:,} no prompt, {completion:,} na resposta")
+        st.caption(f"Últimas execuções de cada etapa; spans em {obter_tracer().caminho}")
+
+# Consultas por página no histórico
+HISTORY_PAGE_SIZE = 20
+
+# Funções de navegação do histórico: a página atual é identificada pelo id da
+# última consulta da página anterior (ver HistoryStore.page)
+def next_history_page(before):
+    estado = st.session_state['historico']
+    estado['anteriores'].append(estado['antes'])
+    estado['antes'] = before
+
+def previous_history_page():
+    estado = st.session_state['historico']
+    estado['antes'] = estado['anteriores'].pop()
+
 # Função para exibir o histórico de consultas
 def show_history():
     agent = get_sql_agent() # Agent is already cached
-    memory = agent.get_memory()
+    estado = st.session_state.setdefault('historico', {'anteriores': [], 'antes': None})
+    # Apenas uma página é lida do arquivo do histórico
+    pagina = agent.get_history(estado['antes'], HISTORY_PAGE_SIZE)
     
-    if not memory:
+    if not pagina and not estado['anteriores']:
         st.info("Nenhuma consulta realizada ainda.")
         return
     
-    for i, item in enumerate(memory):
-        with st.expander(f"Consulta {i+1}: {item['query']}"):
+    for item in pagina:
+        with st.expander(f"Consulta {item['id']}: {item['query']}"):
             # Display SQL placeholder and result (now likely a string)
             st.markdown(f"**SQL Gerado (interno ao agente):** `{item['sql']}`")
             st.markdown("**Resultado:**")
             # Display result as text/markdown, as it's not guaranteed to be a DataFrame
-            st.write(item['result']) 
+            st.write(item['result'])
+            if item['result_size'] > len(item['result']):
+                st.caption(f"Prévia de {item['result_size']:,} caracteres")
+    
+    col_anterior, col_proxima = st.columns(2)
+    col_anterior.button("◀ Mais recentes", disabled=not estado['anteriores'], on_click=previous_history_page)
+    col_proxima.button("Mais antigas ▶", disabled=len(pagina) < HISTORY_PAGE_SIZE,
+                       on_click=next_history_page, args=(pagina[-1]['id'] if pagina else None,))
 
 # Interface principal
 def main():
@@ -81,6 +169,8 @@ def main():
     st.sidebar.title("Navegação")
     # Temporarily remove "Esquema do Banco" option
     page = st.sidebar.radio("Ir para:", ["Consulta", "Histórico"]) 
+    # Preenchido ao final, já com os tempos da consulta desta execução
+    metricas = st.sidebar.container()
     
     # Página de consulta
     if page == "Consulta":
@@ -93,19 +183,22 @@ def main():
         
         # Botão para processar a consulta
         if st.button("Processar Consulta"):
-            if query:
+            if query and hasattr(get_sql_agent(), "stream_query"):
+                stream_query(query)
+            elif query:
                 with st.spinner("Processando sua consulta..."):
                     result = process_query(query)
                 
-                # Exibir a consulta SQL gerada
-                st.subheader("Consulta SQL (Gerada pelo Agente):")
-                # Display the placeholder SQL info
-                st.markdown(f"`{result['sql']}`") 
-                
-                # Exibir os resultados (now likely a string)
-                st.subheader("Resultados:")
-                # Display the agent's text output
-                st.write(result['result']) 
+                with span("render"):
+                    # Exibir a consulta SQL gerada
+                    st.subheader("Consulta SQL (Gerada pelo Agente):")
+                    # Display the placeholder SQL info
+                    st.markdown(f"`{result['sql']}`") 
+                    
+                    # Exibir os resultados (now likely a string)
+                    st.subheader("Resultados:")
+                    # Display the agent's text output
+                    st.write(result['result']) 
             else:
                 st.warning("Por favor, digite uma pergunta.")
     
@@ -118,6 +211,8 @@ def main():
     elif page == "Histórico":
         st.header("Histórico de Consultas")
         show_history()
+    
+    show_metrics(metricas)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,9 @@
 import streamlit as st
 from database_tools import DatabaseTools
 from sql_agent import SQLAgent
+from sql_guard import ConsultaBloqueada, verificar_somente_leitura
+from exports import FORMATOS
+from utils import get_query_download_link
 import pandas as pd
 import os
 
@@ -15,6 +18,13 @@ st.set_page_config(
 # Caminho para o banco de dados
 DB_PATH = './cargas.db'
 
+# Linhas por página no visualizador de resultados
+PAGE_SIZE = 50
+SEM_ORDEM = "(ordem da consulta)"
+
+# Consultas por página no histórico
+HISTORY_PAGE_SIZE = 20
+
 # Inicializar as ferramentas de banco de dados
 @st.cache_resource
 def get_db_tools():
@@ -23,8 +33,7 @@ def get_db_tools():
 # Inicializar o agente SQL
 @st.cache_resource
 def get_sql_agent():
-    db_tools = get_db_tools()
-    return SQLAgent(db_tools)
+    return SQLAgent(DB_PATH)
 
 # Função para exibir o esquema do banco de dados
 def show_database_schema():
@@ -52,19 +61,118 @@ def process_query(query):
     result = agent.process_query(query)
     return result
 
+# Funções do visualizador paginado: a posição de cada visualizador fica em
+# st.session_state e apenas a página visível é lida do banco a cada interação
+def reset_pages(key):
+    st.session_state[f"paginas_{key}"] = {'anteriores': [], 'atual': None}
+    st.session_state.pop(f"download_{key}", None)
+
+def next_page(key, proxima):
+    state = st.session_state[f"paginas_{key}"]
+    state['anteriores'].append(state['atual'])
+    state['atual'] = proxima
+
+def previous_page(key):
+    state = st.session_state[f"paginas_{key}"]
+    state['atual'] = state['anteriores'].pop()
+
+def show_result_pages(sql, key):
+    """
+    Exibe o resultado de uma consulta página a página (ver DatabaseTools.fetch_page).
+    
+    Args:
+        sql (str): Consulta SQL executada.
+        key (str): Identificador do visualizador na sessão.
+    """
+    db_tools = get_db_tools()
+    if f"paginas_{key}" not in st.session_state:
+        reset_pages(key)
+    state = st.session_state[f"paginas_{key}"]
+    ordem = st.session_state.get(f"ordem_{key}", SEM_ORDEM)
+    decrescente = st.session_state.get(f"desc_{key}", False)
+    
+    try:
+        page = db_tools.fetch_page(sql, PAGE_SIZE, None if ordem == SEM_ORDEM else ordem,
+                                   decrescente, state['atual'])
+    except Exception as e:
+        st.error(f"Erro ao executar consulta: {e}")
+        return
+    
+    col_ordem, col_desc = st.columns([3, 1])
+    col_ordem.selectbox("Ordenar por", [SEM_ORDEM] + page['columns'], key=f"ordem_{key}",
+                        on_change=reset_pages, args=(key,))
+    col_desc.checkbox("Decrescente", key=f"desc_{key}", on_change=reset_pages, args=(key,))
+    st.dataframe(page['rows'], use_container_width=True)
+    
+    col_anterior, col_pagina, col_proxima = st.columns([1, 2, 1])
+    col_anterior.button("◀ Anterior", key=f"anterior_{key}", disabled=not state['anteriores'],
+                        on_click=previous_page, args=(key,))
+    col_pagina.caption(f"Página {len(state['anteriores']) + 1}")
+    col_proxima.button("Próxima ▶", key=f"proxima_{key}", disabled=page['next'] is None,
+                       on_click=next_page, args=(key, page['next']))
+    
+    # Exportação do resultado completo, gravada em lotes e baixada como arquivo estático
+    for coluna, formato in zip(st.columns(len(FORMATOS)), FORMATOS):
+        if coluna.button(f"Exportar {formato.upper()}", key=f"exportar_{formato}_{key}"):
+            try:
+                with st.spinner("Exportando..."):
+                    st.session_state[f"download_{key}"] = get_query_download_link(db_tools, sql, formato)
+            except Exception as e:
+                st.error(f"Erro ao exportar: {e}")
+    if st.session_state.get(f"download_{key}"):
+        st.markdown(st.session_state[f"download_{key}"], unsafe_allow_html=True)
+
+def show_result(result, key):
+    """
+    Exibe o resultado de uma consulta: paginado quando o SQL está disponível.
+    """
+    if isinstance(result['result'], pd.DataFrame):
+        if 'error' in result['result'].columns:
+            st.error(result['result']['error'][0])
+            return
+    try:
+        verificar_somente_leitura(result['sql'])
+    except ConsultaBloqueada:
+        # Sem SQL executável (ex: erro do agente): exibe a resposta como veio
+        st.write(result['result'])
+        return
+    show_result_pages(result['sql'], key)
+
+# Funções de navegação do histórico: a página atual é identificada pelo id da
+# última consulta da página anterior (ver HistoryStore.page)
+def next_history_page(before):
+    estado = st.session_state['historico']
+    estado['anteriores'].append(estado['antes'])
+    estado['antes'] = before
+
+def previous_history_page():
+    estado = st.session_state['historico']
+    estado['antes'] = estado['anteriores'].pop()
+
 # Função para exibir o histórico de consultas
 def show_history():
     agent = get_sql_agent()
-    memory = agent.get_memory()
+    estado = st.session_state.setdefault('historico', {'anteriores': [], 'antes': None})
+    # Apenas uma página é lida do arquivo do histórico
+    pagina = agent.get_history(estado['antes'], HISTORY_PAGE_SIZE)
     
-    if not memory:
+    if not pagina and not estado['anteriores']:
         st.info("Nenhuma consulta realizada ainda.")
         return
     
-    for i, item in enumerate(memory):
-        with st.expander(f"Consulta {i+1}: {item['query']}"):
-            st.code(item['sql'], language="sql")
-            st.dataframe(item['result'])
+    col_anterior, col_proxima = st.columns(2)
+    col_anterior.button("◀ Mais recentes", disabled=not estado['anteriores'], on_click=previous_history_page)
+    col_proxima.button("Mais antigas ▶", disabled=len(pagina) < HISTORY_PAGE_SIZE,
+                       on_click=next_history_page, args=(pagina[-1]['id'] if pagina else None,))
+    if not pagina:
+        return
+    
+    # Apenas a consulta escolhida é executada, não todo o histórico
+    i = st.selectbox("Consulta", range(len(pagina)),
+                     format_func=lambda i: f"Consulta {pagina[i]['id']}: {pagina[i]['query']}")
+    item = pagina[i]
+    st.code(item['sql'], language="sql")
+    show_result(item, f"historico_{item['id']}")
 
 # Interface principal
 def main():
@@ -91,20 +199,21 @@ def main():
         if st.button("Processar Consulta"):
             if query:
                 with st.spinner("Processando sua consulta..."):
-                    result = process_query(query)
-                
-                # Exibir a consulta SQL gerada
-                st.subheader("Consulta SQL gerada:")
-                st.code(result['sql'], language="sql")
-                
-                # Exibir os resultados
-                st.subheader("Resultados:")
-                if 'error' in result['result'].columns:
-                    st.error(result['result']['error'][0])
-                else:
-                    st.dataframe(result['result'])
+                    # O resultado fica na sessão para a navegação entre páginas
+                    st.session_state['resultado'] = process_query(query)
+                reset_pages("consulta")
             else:
                 st.warning("Por favor, digite uma pergunta.")
+        
+        result = st.session_state.get('resultado')
+        if result:
+            # Exibir a consulta SQL gerada
+            st.subheader("Consulta SQL gerada:")
+            st.code(result['sql'], language="sql")
+            
+            # Exibir os resultados
+            st.subheader("Resultados:")
+            show_result(result, "consulta")
     
     # Página de esquema do banco
     elif page == "Esquema do Banco":
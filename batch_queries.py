@@ -0,0 +1,214 @@
+"""
+Processamento em lote de perguntas (ex: relatórios noturnos com centenas de
+perguntas padrão por porto e por mercadoria).
+
+O lote é processado em três etapas:
+    1. Perguntas equivalentes (mesma forma normalizada, ver query_cache.py) são
+       agrupadas e cada grupo é tratado uma única vez.
+    2. O SQL de cada grupo vem dos templates (ver template_engine.py), do cache
+       de consultas ou do modelo; as chamadas ao modelo são concorrentes,
+       limitadas pelo semáforo do agente e por um limite de requisições por minuto.
+    3. Consultas SQL iguais após a normalização (ver result_cache.canonizar_sql)
+       são executadas uma única vez, em threads.
+
+As respostas voltam na ordem da entrada, com os tempos de cada pergunta.
+
+O agente é uma instância de SimpleSQLQuery ou OpenAISQLQuery; são usados os
+atributos cache, memory, max_concurrency e timeout e os métodos _template_sql,
+_agenerate_sql, _run_sql e _error_response.
+"""
+
+import os
+import time
+import asyncio
+from db_connection import DEFAULT_POOL_SIZE
+from query_cache import normalizar_pergunta
+from result_cache import canonizar_sql
+
+# Limite padrão de chamadas ao modelo por minuto (variável SQL_LLM_RPM)
+RPM_PADRAO = 60
+
+
+class LimitadorTaxa:
+    """
+    Espaça as chamadas ao modelo para respeitar um limite de requisições por minuto.
+    """
+
+    def __init__(self, por_minuto=None):
+        """
+        Args:
+            por_minuto (float, optional): Requisições por minuto (padrão: SQL_LLM_RPM ou 60).
+                                          Zero ou negativo desativa o limite.
+        """
+        por_minuto = por_minuto if por_minuto is not None else float(os.getenv("SQL_LLM_RPM") or RPM_PADRAO)
+        self.intervalo = 60.0 / por_minuto if por_minuto > 0 else 0.0
+        self._proxima = 0.0
+        self._lock = asyncio.Lock()
+
+    async def aguardar(self):
+        """Aguarda até que a próxima chamada seja permitida."""
+        if not self.intervalo:
+            return
+        async with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(agora, self._proxima) + self.intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+
+def agrupar_perguntas(perguntas):
+    """
+    Agrupa perguntas equivalentes.
+
+    Args:
+        perguntas (list): Perguntas em linguagem natural.
+
+    Returns:
+        list: Listas de índices das perguntas de cada grupo, na ordem da primeira ocorrência.
+    """
+    grupos = {}
+    for indice, pergunta in enumerate(perguntas):
+        grupos.setdefault(normalizar_pergunta(pergunta), []).append(indice)
+    return list(grupos.values())
+
+
+async def _gerar(agente, pergunta, semaforo, limitador, timeout, usar_cache=True):
+    """
+    Obtém o SQL de uma pergunta, dos templates, do cache de consultas ou do modelo.
+
+    Returns:
+        tuple: (SQL, veio do cache, segundos, veio de um template)
+    """
+    inicio = time.perf_counter()
+    if usar_cache:
+        sql_query = agente._template_sql(pergunta)
+        if sql_query is not None:
+            return sql_query, False, time.perf_counter() - inicio, True
+    if usar_cache and agente.cache:
+        sql_query = await asyncio.to_thread(agente.cache.get, pergunta)
+        if sql_query is not None:
+            return sql_query, True, time.perf_counter() - inicio, False
+    async with semaforo:
+        await limitador.aguardar()
+        sql_query = await asyncio.wait_for(agente._agenerate_sql(pergunta), timeout)
+    return sql_query, False, time.perf_counter() - inicio, False
+
+
+async def _executar(agente, sql_query, semaforo, timeout):
+    """
+    Executa uma consulta SQL em uma thread.
+
+    Returns:
+        tuple: (resultado, segundos)
+    """
+    async with semaforo:
+        inicio = time.perf_counter()
+        result = await asyncio.wait_for(asyncio.to_thread(agente._run_sql, sql_query), timeout)
+        return result, time.perf_counter() - inicio
+
+
+async def aprocessar_lote(agente, perguntas, rpm=None, timeout=None):
+    """
+    Processa um lote de perguntas.
+
+    Args:
+        agente: Instância de SimpleSQLQuery ou OpenAISQLQuery.
+        perguntas (list): Perguntas em linguagem natural.
+        rpm (float, optional): Limite de chamadas ao modelo por minuto (padrão: SQL_LLM_RPM ou 60).
+        timeout (float, optional): Tempo limite, em segundos, da geração e da execução
+                                   de cada pergunta. Padrão: agente.timeout.
+
+    Returns:
+        list: Uma resposta por pergunta, na ordem da entrada, no formato de
+            process_query com as chaves adicionais "timings" (segundos em "llm",
+            "sql" e "total") e "duplicate_of" (índice da pergunta equivalente
+            já processada no lote, ou None).
+    """
+    perguntas = list(perguntas)
+    timeout = timeout or agente.timeout
+    semaforo_llm = asyncio.Semaphore(agente.max_concurrency)
+    semaforo_sql = asyncio.Semaphore(int(os.getenv("SQL_POOL_SIZE") or DEFAULT_POOL_SIZE))
+    limitador = LimitadorTaxa(rpm)
+
+    # 1. Perguntas equivalentes são geradas uma única vez
+    grupos = agrupar_perguntas(perguntas)
+    representantes = [perguntas[indices[0]] for indices in grupos]
+    geracoes = await asyncio.gather(
+        *(_gerar(agente, pergunta, semaforo_llm, limitador, timeout) for pergunta in representantes),
+        return_exceptions=True
+    )
+
+    # 2. SQL igual após a normalização é executado uma única vez
+    consultas = {}
+    for posicao, geracao in enumerate(geracoes):
+        if not isinstance(geracao, BaseException):
+            consultas.setdefault(canonizar_sql(geracao[0]), []).append(posicao)
+    execucoes = await asyncio.gather(
+        *(_executar(agente, geracoes[posicoes[0]][0], semaforo_sql, timeout) for posicoes in consultas.values()),
+        return_exceptions=True
+    )
+    por_grupo = {}
+    for posicoes, execucao in zip(consultas.values(), execucoes):
+        for posicao in posicoes:
+            por_grupo[posicao] = execucao
+
+    # SQL do cache que falhou é descartado e gerado novamente pelo modelo
+    for posicao, execucao in list(por_grupo.items()):
+        from_cache = geracoes[posicao][1]
+        if from_cache and isinstance(execucao, Exception):
+            print(f"SQL em cache descartado: {execucao}")
+            await asyncio.to_thread(agente.cache.invalidate, representantes[posicao])
+            try:
+                geracoes[posicao] = await _gerar(agente, representantes[posicao], semaforo_llm,
+                                                 limitador, timeout, usar_cache=False)
+                por_grupo[posicao] = await _executar(agente, geracoes[posicao][0], semaforo_sql, timeout)
+            except Exception as e:
+                por_grupo[posicao] = e
+
+    # 3. Respostas na ordem da entrada
+    respostas = [None] * len(perguntas)
+    for posicao, indices in enumerate(grupos):
+        geracao = geracoes[posicao]
+        execucao = por_grupo.get(posicao)
+        erro = geracao if isinstance(geracao, BaseException) else execucao
+        if isinstance(erro, asyncio.CancelledError):
+            raise erro
+        if isinstance(erro, BaseException):
+            if isinstance(erro, asyncio.TimeoutError):
+                mensagem = f"Erro: tempo limite de {timeout:g} s excedido"
+            else:
+                mensagem = f"Erro: {str(erro)}"
+            print(f"Erro ao processar consulta: {representantes[posicao]}: {mensagem}")
+            tempos = {"llm": 0.0, "sql": 0.0, "total": 0.0}
+            if not isinstance(geracao, BaseException):
+                tempos = {"llm": geracao[2], "sql": 0.0, "total": geracao[2]}
+        else:
+            sql_query, from_cache, tempo_llm, from_template = geracao
+            result, tempo_sql = execucao
+            if agente.cache and not from_cache and not from_template:
+                await asyncio.to_thread(agente.cache.put, representantes[posicao], sql_query)
+            tempos = {"llm": tempo_llm, "sql": tempo_sql, "total": tempo_llm + tempo_sql}
+
+        for ordem, indice in enumerate(indices):
+            query = perguntas[indice]
+            if isinstance(erro, BaseException):
+                resposta = agente._error_response(query, mensagem)
+            else:
+                agente.memory.append({"query": query, "sql": sql_query, "result": result})
+                resposta = {"query": query, "sql": sql_query, "result": result, "from_cache": from_cache,
+                            "from_template": from_template}
+            resposta["timings"] = dict(tempos)
+            resposta["duplicate_of"] = indices[0] if ordem else None
+            respostas[indice] = resposta
+    return respostas
+
+
+def processar_lote(agente, perguntas, rpm=None, timeout=None):
+    """
+    Versão síncrona de aprocessar_lote, para scripts e tarefas agendadas.
+
+    Não pode ser chamada de dentro de um loop de eventos em execução; nesse
+    caso, use aprocessar_lote.
+    """
+    return asyncio.run(aprocessar_lote(agente, perguntas, rpm, timeout))
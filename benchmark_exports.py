@@ -0,0 +1,141 @@
+"""
+Benchmark das exportações de resultados (ver exports.py).
+
+Compara, para cada formato, o tempo, o tamanho do arquivo e o pico de memória
+Python (tracemalloc) da exportação em lotes com o link antigo em data URI
+(DataFrame inteiro -> CSV em memória -> base64).
+
+Sem --db, cria um banco temporário com uma tabela Cargas sintética.
+
+Uso:
+    python benchmark_exports.py                          # 1 milhão de linhas sintéticas
+    python benchmark_exports.py --linhas 200000 --formatos csv parquet
+    python benchmark_exports.py --db cargas.db --sql "SELECT * FROM Cargas WHERE Ano = '2023'"
+"""
+
+import os
+import sys
+import time
+import base64
+import random
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+import pandas as pd
+from exports import FORMATOS, exportar_cursor
+
+PORTOS = ['BRSSZ', 'BRPNG', 'BRRIG', 'BRITJ', 'BRVIX', 'BRIQI', 'BRSUA', 'BRRIO']
+MERCADORIAS = ['2601', '1201', '1005', '2709', '1701', '0901', '8703', '4703']
+
+
+def criar_banco_sintetico(db_path, linhas, lote=100000):
+    """
+    Cria uma tabela Cargas com linhas sintéticas.
+
+    Args:
+        db_path (str): Caminho do banco de dados.
+        linhas (int): Número de linhas.
+        lote (int): Linhas inseridas por transação.
+    """
+    aleatorio = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Origem TEXT, Destino TEXT, '
+                 'CDMercadoria TEXT, Sentido TEXT, Ano TEXT, VLPesoCargaBruta REAL, TEU REAL)')
+    for inicio in range(0, linhas, lote):
+        conn.executemany(
+            'INSERT INTO Cargas (Origem, Destino, CDMercadoria, Sentido, Ano, VLPesoCargaBruta, TEU) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(aleatorio.choice(PORTOS), aleatorio.choice(PORTOS), aleatorio.choice(MERCADORIAS),
+              aleatorio.choice(['Embarcados', 'Desembarcados']), str(aleatorio.randint(2018, 2024)),
+              round(aleatorio.uniform(1, 50000), 3), float(aleatorio.randint(0, 4)))
+             for _ in range(min(lote, linhas - inicio))]
+        )
+        conn.commit()
+    conn.close()
+
+
+def exportar_data_uri(conn, sql, destino):
+    """Exportação antiga: resultado inteiro em um DataFrame, CSV em memória e base64."""
+    df = pd.read_sql_query(sql, conn)
+    b64 = base64.b64encode(df.to_csv(index=False).encode()).decode()
+    href = f'<a href="data:file/csv;base64,{b64}" download="data.csv">Download</a>'
+    with open(destino, 'w') as arquivo:
+        arquivo.write(href)
+    return {'linhas': len(df), 'bytes': len(href)}
+
+
+def medir(executar, memoria=True):
+    """
+    Executa uma exportação e mede tempo e pico de memória.
+
+    Returns:
+        dict: Resultado da exportação com segundos e pico_mb.
+    """
+    inicio = time.perf_counter()
+    resultado = executar()
+    resultado['segundos'] = time.perf_counter() - inicio
+    resultado['pico_mb'] = None
+    if memoria:
+        # Segunda execução, com tracemalloc, apenas para o pico de memória
+        tracemalloc.start()
+        executar()
+        resultado['pico_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return resultado
+
+
+def imprimir_resultados(resultados):
+    print(f"\n{'formato':<10} {'linhas':>10} {'segundos':>9} {'linhas/s':>11} {'arquivo MB':>11} {'pico MB':>8}")
+    for formato, r in resultados:
+        pico = f"{r['pico_mb']:8.1f}" if r['pico_mb'] is not None else f"{'-':>8}"
+        print(f"{formato:<10} {r['linhas']:>10,} {r['segundos']:9.2f} {r['linhas'] / r['segundos']:11,.0f} "
+              f"{r['bytes'] / 2**20:11.1f} {pico}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede as exportações em lotes e o link em data URI.")
+    parser.add_argument('--db', default=None,
+                        help='Caminho do banco de dados SQLite (padrão: banco sintético temporário).')
+    parser.add_argument('--linhas', type=int, default=1_000_000,
+                        help='Linhas do banco sintético.')
+    parser.add_argument('--sql', default='SELECT * FROM Cargas',
+                        help='Consulta exportada.')
+    parser.add_argument('--formatos', nargs='+', choices=list(FORMATOS) + ['data-uri'],
+                        default=list(FORMATOS) + ['data-uri'],
+                        help='Formatos a medir (data-uri é o link antigo em base64).')
+    parser.add_argument('--sem-memoria', action='store_true',
+                        help='Não mede o pico de memória (evita a segunda execução de cada formato).')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(pasta, 'cargas.db')
+            print(f"Criando banco sintético com {args.linhas:,} linhas...")
+            criar_banco_sintetico(db_path, args.linhas)
+        elif not os.path.exists(db_path):
+            print(f"Banco de dados não encontrado: {db_path}")
+            sys.exit(1)
+
+        conn = sqlite3.connect(db_path)
+        resultados = []
+        for formato in args.formatos:
+            if formato == 'parquet':
+                try:
+                    import duckdb  # noqa: F401
+                except ImportError:
+                    print("duckdb não instalado; Parquet ignorado")
+                    continue
+            destino = os.path.join(pasta, f'exportacao_{formato}')
+            if formato == 'data-uri':
+                executar = lambda: exportar_data_uri(conn, args.sql, destino)
+            else:
+                executar = lambda: exportar_cursor(conn.execute(args.sql), formato, destino)
+            resultados.append((formato, medir(executar, not args.sem_memoria)))
+        conn.close()
+    imprimir_resultados(resultados)
+
+
+if __name__ == '__main__':
+    main()
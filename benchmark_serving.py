@@ -0,0 +1,167 @@
+"""
+Benchmark de latência das consultas com sessões concorrentes.
+
+Simula várias sessões do Streamlit executando as consultas ao mesmo tempo e
+compara os modos de abertura do banco (ver db_connection.py), com uma conexão
+nova por consulta e com o pool de conexões usado por DatabaseTools.
+
+Uso:
+    python benchmark_serving.py                          # consultas de exemplo, 1/4/8 sessões
+    python benchmark_serving.py --sessoes 1 16 --log consultas.sql --repeticoes 20
+    python benchmark_serving.py --log consultas.sql --pool-size 8
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+from db_connection import SERVING_MODES, connect_database, ConnectionPool
+from index_advisor import CONSULTAS_EXEMPLO, carregar_consultas
+
+
+def percentil(valores, p):
+    """
+    Calcula o percentil p (0-100) de uma lista de valores.
+
+    Args:
+        valores (list): Valores medidos.
+        p (float): Percentil desejado.
+
+    Returns:
+        float: Valor do percentil (interpolação linear).
+    """
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def executar_consulta(db_path, modo, sql):
+    """Executa uma consulta com uma conexão nova a cada chamada."""
+    conn = connect_database(db_path, modo)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def executar_no_pool(pool, sql):
+    """Executa uma consulta com uma conexão retirada do pool."""
+    with pool.connection() as conn:
+        return conn.execute(sql).fetchall()
+
+
+def medir_latencias(executar, consultas, sessoes, repeticoes):
+    """
+    Executa as consultas em várias threads simultâneas e mede a latência de cada execução.
+
+    Args:
+        executar (callable): Função que recebe o SQL e executa a consulta.
+        consultas (list): Consultas a executar.
+        sessoes (int): Número de sessões (threads) simultâneas.
+        repeticoes (int): Vezes que cada sessão executa o conjunto de consultas.
+
+    Returns:
+        dict: Latências em ms (p50, p95, p99, média), total de consultas e vazão (consultas/s).
+    """
+    latencias = []
+    erros = []
+    trava = threading.Lock()
+    barreira = threading.Barrier(sessoes)
+
+    def sessao():
+        locais = []
+        barreira.wait()
+        try:
+            for _ in range(repeticoes):
+                for sql in consultas:
+                    inicio = time.perf_counter()
+                    executar(sql)
+                    locais.append((time.perf_counter() - inicio) * 1000)
+        except Exception as e:
+            erros.append(e)
+        with trava:
+            latencias.extend(locais)
+
+    threads = [threading.Thread(target=sessao) for _ in range(sessoes)]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.perf_counter() - inicio
+    if erros:
+        raise erros[0]
+
+    return {
+        'p50': percentil(latencias, 50),
+        'p95': percentil(latencias, 95),
+        'p99': percentil(latencias, 99),
+        'media': sum(latencias) / len(latencias) if latencias else 0.0,
+        'consultas': len(latencias),
+        'vazao': len(latencias) / decorrido if decorrido > 0 else 0.0,
+    }
+
+
+def imprimir_resultados(resultados):
+    """
+    Exibe a tabela de latências.
+
+    Args:
+        resultados (list): Tuplas (configuração, sessões, métricas).
+    """
+    print(f"\n{'configuração':14s} {'sessões':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'consultas/s':>12s}")
+    for configuracao, sessoes, metricas in resultados:
+        print(f"{configuracao:14s} {sessoes:7d} {metricas['p50']:9.2f} {metricas['p95']:9.2f} "
+              f"{metricas['p99']:9.2f} {metricas['vazao']:12.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara a latência das consultas com sessões concorrentes.")
+    parser.add_argument('--db', default=os.path.join(os.getcwd(), 'cargas.db'),
+                        help='Caminho do banco de dados SQLite.')
+    parser.add_argument('--log', default=None,
+                        help='Arquivo .sql ou .jsonl com as consultas (padrão: exemplos do prompt).')
+    parser.add_argument('--sessoes', type=int, nargs='+', default=[1, 4, 8],
+                        help='Números de sessões simultâneas a testar.')
+    parser.add_argument('--modos', nargs='+', choices=SERVING_MODES, default=list(SERVING_MODES),
+                        help='Modos de abertura do banco a comparar.')
+    parser.add_argument('--repeticoes', type=int, default=10,
+                        help='Vezes que cada sessão executa o conjunto de consultas.')
+    parser.add_argument('--pool-size', type=int, default=None,
+                        help='Tamanho do pool de conexões (padrão: SQL_POOL_SIZE ou 4).')
+    parser.add_argument('--sem-pool', action='store_true',
+                        help='Mede apenas uma conexão nova por consulta.')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Banco de dados não encontrado: {args.db}")
+        sys.exit(1)
+
+    consultas = carregar_consultas(args.log) if args.log else CONSULTAS_EXEMPLO
+    print(f"{len(consultas)} consultas, {args.repeticoes} repetições por sessão")
+
+    resultados = []
+    for modo in args.modos:
+        # Aquecimento: carrega as páginas no cache do sistema operacional
+        for sql in consultas:
+            executar_consulta(args.db, modo, sql)
+        for sessoes in args.sessoes:
+            metricas = medir_latencias(lambda sql: executar_consulta(args.db, modo, sql),
+                                       consultas, sessoes, args.repeticoes)
+            resultados.append((modo, sessoes, metricas))
+            if not args.sem_pool:
+                pool = ConnectionPool(args.db, size=args.pool_size, mode=modo)
+                metricas = medir_latencias(lambda sql: executar_no_pool(pool, sql),
+                                           consultas, sessoes, args.repeticoes)
+                pool.close()
+                resultados.append((f'{modo}+pool', sessoes, metricas))
+    imprimir_resultados(resultados)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,138 +2,57 @@ import pandas as pd
 import sqlite3
 import json
 import os
+import io
+import time
+import uuid
+import argparse
+import tempfile
+import queue
+import multiprocessing as mp
+from rollups import criar_rollups, atualizar_rollups
 
-# Este script cria o banco de dados cargas.db com uma restrição de 10.000 registros
-# para fins de desenvolvimento e teste. A restrição é implementada durante a importação
-# dos dados do CSV.
+# Este script cria o banco de dados cargas.db.
+#
+# Por padrão, a importação é limitada a 10.000 registros para fins de desenvolvimento
+# e teste. Com a opção --completo, o CSV inteiro é carregado em modo de ingestão em
+# massa: leitura em streaming, uma única transação (ou poucas transações grandes),
+# PRAGMAs de carga em massa e valores passados diretamente das colunas para o
+# executemany, sem dicionários por linha.
+#
+# Com --workers, a carga completa usa um pipeline paralelo: processos trabalhadores
+# interpretam e convertem os blocos do CSV e um único processo escritor grava no
+# SQLite. --benchmark compara a taxa de ingestão de 1 a N trabalhadores.
+#
+# Com --layout tipado, os dados são gravados na tabela Cargas_Fato com as colunas de
+# baixa cardinalidade codificadas como chaves inteiras (tabelas Dominio_<grupo>),
+# Ano e datas como inteiros, e a view Cargas mantém os nomes de colunas usados nas
+# consultas geradas pelo modelo.
+#
+# Ao final da carga, são criadas tabelas de rollup pré-agregadas (ver rollups.py),
+# usadas automaticamente pelas consultas de agregação simples sobre Cargas.
+#
+# Toda carga (inclusive a incremental) grava uma nova versão dos dados na tabela
+# MetadadosCarga; os caches das classes de consulta são invalidados quando ela muda.
+# O catálogo de anos (MetadadosAnos) é gravado junto, para que os metadados das
+# consultas não precisem percorrer Cargas (ver metadata_snapshot.py).
+#
+# Com --incremental, o CSV (ex: o extrato de um novo mês) é aplicado a um banco já
+# existente: apenas os registros com IDCarga novo ou conteúdo alterado são gravados,
+# e os rollups são recalculados só para os anos afetados.
+#
+# Uso:
+#   python create_database.py                         # modo desenvolvimento (10.000 registros)
+#   python create_database.py --completo              # carga completa do CSV
+#   python create_database.py --completo --workers 4  # carga completa com 4 trabalhadores
+#   python create_database.py --benchmark --workers 8 # compara 1 a 8 trabalhadores
+#   python create_database.py --completo --layout tipado  # layout tipado com chaves inteiras
+#   python create_database.py --incremental --csv novo_mes.csv  # aplica apenas registros novos/alterados
 
 # Definir caminhos dos arquivos
 csv_path = os.path.join(os.getcwd(),'carga_encoded.csv')
 json_path = os.path.join(os.getcwd(),'mapeamentos.json')
 db_path = os.path.join(os.getcwd(),'cargas.db')
 
-# Criar conexão com o banco de dados SQLite
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-print("Criando banco de dados SQLite...")
-
-# Carregar os mapeamentos do arquivo JSON
-with open(json_path, 'r') as f:
-    mapeamentos = json.load(f)
-
-# Criar tabelas para os mapeamentos
-print("Criando tabelas de mapeamento...")
-
-# Tabela para CDMercadoria
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS CDMercadoria (
-    codigo TEXT PRIMARY KEY,
-    descricao TEXT
-)
-''')
-
-# Tabela para Portos
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS Portos (
-    codigo TEXT PRIMARY KEY,
-    nome TEXT
-)
-''')
-
-# Tabela para Países Origem
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS PaisesOrigem (
-    codigo TEXT PRIMARY KEY,
-    nome TEXT
-)
-''')
-
-# Tabela para Países Destino
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS PaisesDestino (
-    codigo TEXT PRIMARY KEY,
-    nome TEXT
-)
-''')
-
-# Tabela para Tipo Navegação
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS TipoNavegacao (
-    codigo TEXT PRIMARY KEY,
-    descricao TEXT
-)
-''')
-
-# Tabela para Sentido
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS Sentido (
-    codigo TEXT PRIMARY KEY,
-    descricao TEXT
-)
-''')
-
-# Tabela para Natureza da Carga
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS NaturezaCarga (
-    codigo TEXT PRIMARY KEY,
-    descricao TEXT
-)
-''')
-
-# Tabela para ConteinerEstado
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS ConteinerEstado (
-    codigo TEXT PRIMARY KEY,
-    descricao TEXT
-)
-''')
-
-# Inserir dados nas tabelas de mapeamento
-print("Inserindo dados nas tabelas de mapeamento...")
-
-# Inserir dados na tabela CDMercadoria
-for codigo, descricao in mapeamentos['CDMercadoria'].items():
-    cursor.execute('INSERT OR REPLACE INTO CDMercadoria VALUES (?, ?)', (codigo, descricao))
-
-# Inserir dados na tabela Portos
-for codigo, nome in mapeamentos['Portos'].items():
-    cursor.execute('INSERT OR REPLACE INTO Portos VALUES (?, ?)', (codigo, nome))
-
-# Inserir dados na tabela PaisesOrigem
-for codigo, nome in mapeamentos['Países Origem'].items():
-    cursor.execute('INSERT OR REPLACE INTO PaisesOrigem VALUES (?, ?)', (codigo, nome))
-
-# Inserir dados na tabela PaisesDestino
-for codigo, nome in mapeamentos['Países Destino'].items():
-    cursor.execute('INSERT OR REPLACE INTO PaisesDestino VALUES (?, ?)', (codigo, nome))
-
-# Inserir dados na tabela TipoNavegacao
-for codigo, descricao in mapeamentos['Tipo Navegação'].items():
-    cursor.execute('INSERT OR REPLACE INTO TipoNavegacao VALUES (?, ?)', (codigo, descricao))
-
-# Inserir dados na tabela Sentido
-for codigo, descricao in mapeamentos['Sentido'].items():
-    cursor.execute('INSERT OR REPLACE INTO Sentido VALUES (?, ?)', (codigo, descricao))
-
-# Inserir dados na tabela NaturezaCarga
-for codigo, descricao in mapeamentos['Natureza da Carga'].items():
-    cursor.execute('INSERT OR REPLACE INTO NaturezaCarga VALUES (?, ?)', (codigo, descricao))
-
-# Inserir dados na tabela ConteinerEstado
-for codigo, descricao in mapeamentos['ConteinerEstado'].items():
-    cursor.execute('INSERT OR REPLACE INTO ConteinerEstado VALUES (?, ?)', (codigo, descricao))
-
-conn.commit()
-print("Tabelas de mapeamento criadas e populadas com sucesso!")
-
-# Criar tabela principal para os dados do CSV
-print("Criando tabela principal para os dados do CSV...")
-
-# Ler as primeiras linhas do CSV para obter os nomes das colunas
-df_sample = pd.read_csv(csv_path, nrows=5)
-colunas = df_sample.columns.tolist()
-
 # Renomear colunas com nomes problemáticos para evitar ambiguidades e erros de sintaxe
 column_mapping = {
     'Tipo Operação da Carga': 'TipoOperacaoCarga',
@@ -144,108 +63,1171 @@ column_mapping = {
     'Carga Geral Acondicionamento': 'CargaGeralAcondicionamento'
 }
 
-# Criar a tabela principal usando nomes de colunas seguros
-print("Criando tabela Cargas com nomes de colunas seguros...")
+# Colunas com tipos numéricos na tabela Cargas (as demais são TEXT)
+colunas_inteiras = ['IDCarga', 'IDAtracacao']
+colunas_reais = ['VLPesoCargaBruta', 'QTCarga', 'TEU']
+
+# Tabelas de mapeamento: (nome da tabela, chave no JSON, coluna de descrição)
+tabelas_mapeamento = [
+    ('CDMercadoria', 'CDMercadoria', 'descricao'),
+    ('Portos', 'Portos', 'nome'),
+    ('PaisesOrigem', 'Países Origem', 'nome'),
+    ('PaisesDestino', 'Países Destino', 'nome'),
+    ('TipoNavegacao', 'Tipo Navegação', 'descricao'),
+    ('Sentido', 'Sentido', 'descricao'),
+    ('NaturezaCarga', 'Natureza da Carga', 'descricao'),
+    ('ConteinerEstado', 'ConteinerEstado', 'descricao'),
+]
+
+# Layout tipado: colunas de baixa cardinalidade gravadas como chaves inteiras para
+# as tabelas Dominio_<grupo>. Colunas do mesmo grupo compartilham o dicionário.
+grupos_dominio = {
+    'Porto': ['Origem', 'Destino'],
+    'NomePorto': ['Origem_Nome', 'Destino_Nome'],
+    'Pais': ['Pais_Origem', 'Pais_Destino'],
+    'Mercadoria': ['CDMercadoria'],
+    'Sentido': ['Sentido'],
+    'NaturezaCarga': ['Natureza_da_Carga'],
+    'TipoNavegacao': ['TipoNavegacao_Codigo'],
+    'TipoNavegacaoDesc': ['TipoNavegacao_Desc'],
+    'TipoOperacaoCarga': ['TipoOperacaoCarga'],
+    'CargaGeralAcondicionamento': ['CargaGeralAcondicionamento'],
+    'ConteinerEstado': ['ConteinerEstado'],
+}
+
+# Layout tipado: colunas codificadas que aparecem nos filtros das consultas geradas
+colunas_filtro_tipado = ['Origem', 'Destino', 'Sentido', 'Natureza_da_Carga',
+                         'CDMercadoria', 'TipoNavegacao_Codigo']
+
+# Layout tipado: colunas de ano gravadas como INTEGER
+colunas_ano = ['Ano']
+
+# Índices compostos para os formatos de consulta mais comuns:
+#   WHERE Sentido = ? AND Origem = ? AND Ano = ?        -> idx_origem_sentido_ano
+#   WHERE Sentido = ? AND Destino IN (...) AND Ano = ?  -> idx_destino_sentido_ano
+#   WHERE Ano = ? [AND Sentido = ?] GROUP BY ...        -> idx_ano_sentido_natureza
+#   WHERE CDMercadoria = ? ...                          -> idx_cdmercadoria
+# As medidas no final tornam os índices cobrindo para SUM(VLPesoCargaBruta)/SUM(TEU).
+indices_compostos = [
+    ('idx_origem_sentido_ano', ['Origem', 'Sentido', 'Ano', 'VLPesoCargaBruta', 'TEU']),
+    ('idx_destino_sentido_ano', ['Destino', 'Sentido', 'Ano', 'VLPesoCargaBruta', 'TEU']),
+    ('idx_ano_sentido_natureza', ['Ano', 'Sentido', 'Natureza_da_Carga', 'VLPesoCargaBruta', 'TEU']),
+    ('idx_cdmercadoria', ['CDMercadoria', 'Sentido', 'Ano', 'VLPesoCargaBruta']),
+]
+
+# Carga incremental: hash do conteúdo de cada registro, por IDCarga
+tabela_hash = 'Cargas_Hash'
+
+# PRAGMAs usados durante a carga em massa. O banco é reconstruído a partir do CSV,
+# portanto abrimos mão do journal e do fsync enquanto a carga está em andamento.
+pragmas_carga_massa = [
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA locking_mode = EXCLUSIVE',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',  # 256 MB de cache de páginas
+]
+
+# PRAGMAs restaurados ao final da carga
+pragmas_padrao = [
+    'PRAGMA journal_mode = DELETE',
+    'PRAGMA synchronous = FULL',
+    'PRAGMA locking_mode = NORMAL',
+]
+
+# Pipeline paralelo: intervalo, em segundos, entre as verificações dos processos
+# enquanto as filas estão cheias, e espera pelo fim de cada processo antes de terminá-lo
+intervalo_verificacao = 0.5
+tempo_encerramento = 30
+
+
+def criar_tabelas_mapeamento(conn, mapeamentos):
+    """
+    Cria e popula as tabelas de mapeamento a partir do arquivo de mapeamentos.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        mapeamentos (dict): Conteúdo do arquivo mapeamentos.json.
+    """
+    cursor = conn.cursor()
+
+    print("Criando tabelas de mapeamento...")
+    for tabela, _, coluna_descricao in tabelas_mapeamento:
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {tabela} (
+            codigo TEXT PRIMARY KEY,
+            {coluna_descricao} TEXT
+        )
+        ''')
+
+    print("Inserindo dados nas tabelas de mapeamento...")
+    for tabela, chave, _ in tabelas_mapeamento:
+        cursor.executemany(f'INSERT OR REPLACE INTO {tabela} VALUES (?, ?)',
+                           mapeamentos[chave].items())
+
+    conn.commit()
+    print("Tabelas de mapeamento criadas e populadas com sucesso!")
+
+
+def obter_colunas(csv_path):
+    """
+    Lê o cabeçalho do CSV e calcula os nomes de colunas SQL seguros.
+
+    Args:
+        csv_path (str): Caminho do arquivo CSV.
+
+    Returns:
+        tuple: (colunas originais do CSV, colunas SQL correspondentes)
+    """
+    # Ler as primeiras linhas do CSV para obter os nomes das colunas
+    df_sample = pd.read_csv(csv_path, nrows=5)
+    colunas = df_sample.columns.tolist()
+
+    # Criar uma lista de nomes de colunas SQL seguros
+    colunas_sql = []
+    for coluna in colunas:
+        coluna_sql = column_mapping.get(coluna, coluna)
+        # Substituir espaços e caracteres especiais
+        coluna_sql = coluna_sql.replace(' ', '_').replace('-', '_')
+        colunas_sql.append(coluna_sql)
+
+    return colunas, colunas_sql
+
+
+def tipos_colunas(colunas):
+    """
+    Define os tipos usados na leitura do CSV para cada coluna.
+
+    Declarar as colunas de texto evita a inferência do pandas a cada chunk e
+    preserva códigos com zeros à esquerda (ex: CDMercadoria '0101'). As colunas
+    numéricas são convertidas em transformar_chunk.
+
+    Args:
+        colunas (list): Colunas originais do CSV.
 
-# Primeiro, criar uma lista de nomes de colunas SQL seguros
-colunas_sql = []
-for coluna in colunas:
-    coluna_sql = column_mapping.get(coluna, coluna)
-    # Substituir espaços e caracteres especiais
-    coluna_sql = coluna_sql.replace(' ', '_').replace('-', '_')
-    colunas_sql.append(coluna_sql)
+    Returns:
+        dict: Mapeamento coluna -> tipo para o pd.read_csv.
+    """
+    dtypes = {}
+    for coluna in colunas:
+        if coluna not in colunas_inteiras and coluna not in colunas_reais:
+            dtypes[coluna] = 'str'
+    return dtypes
 
-# Criar a tabela principal
-create_table_sql = '''
+
+def transformar_chunk(chunk, column_mapping_complete):
+    """
+    Renomeia as colunas de um chunk e converte as medidas numéricas.
+
+    Valores não numéricos em VLPesoCargaBruta, QTCarga e TEU viram NULL em vez
+    de interromper a importação.
+
+    Args:
+        chunk (pd.DataFrame): Chunk lido do CSV.
+        column_mapping_complete (dict): Mapeamento coluna do CSV -> coluna SQL.
+
+    Returns:
+        pd.DataFrame: Chunk pronto para inserção.
+    """
+    chunk = chunk.rename(columns=column_mapping_complete)
+    for coluna in colunas_reais:
+        if coluna in chunk.columns:
+            chunk[coluna] = pd.to_numeric(chunk[coluna], errors='coerce')
+    return chunk
+
+
+def criar_tabela_cargas(conn, colunas, colunas_sql):
+    """
+    Cria a tabela principal Cargas usando nomes de colunas seguros.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        colunas (list): Colunas originais do CSV.
+        colunas_sql (list): Colunas SQL correspondentes.
+    """
+    print("Criando tabela Cargas com nomes de colunas seguros...")
+
+    create_table_sql = '''
 CREATE TABLE IF NOT EXISTS Cargas (
 '''
 
-# Adicionar colunas à tabela com nomes ajustados
-for i, coluna in enumerate(colunas):
-    coluna_sql = colunas_sql[i]
-    
-    if coluna in ['IDCarga', 'IDAtracacao']:
-        create_table_sql += f'    "{coluna_sql}" INTEGER,'
-    elif coluna in ['VLPesoCargaBruta', 'QTCarga', 'TEU']:
-        create_table_sql += f'    "{coluna_sql}" REAL,'
-    else:
-        create_table_sql += f'    "{coluna_sql}" TEXT,'
-
-# Adicionar chave primária e finalizar a criação da tabela
-create_table_sql = create_table_sql.rstrip(',') + ',\n    PRIMARY KEY ("IDCarga")\n)'
-cursor.execute(create_table_sql)
-
-# Definir o limite de registros
-max_rows = 10000  # Limite de 10.000 registros
-
-print("Tabela principal criada com sucesso!")
-print(f"Iniciando importação dos dados do CSV (limitado a {max_rows} registros)...")
-
-# Atualizar o mapeamento de colunas para incluir todas as colunas
-column_mapping_complete = {}
-for i, coluna in enumerate(colunas):
-    column_mapping_complete[coluna] = colunas_sql[i]
-
-# Importar dados do CSV em chunks para economizar memória
-chunksize = 5000
-total_rows = 0
-
-try:
-    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
-        # Verificar se já atingimos o limite de registros
-        if total_rows >= max_rows:
-            break
-            
-        # Se este chunk fizer ultrapassar o limite, cortar o chunk
-        if total_rows + len(chunk) > max_rows:
-            chunk = chunk.iloc[:(max_rows - total_rows)]
-            
-        # Renomear colunas no DataFrame
-        chunk = chunk.rename(columns=column_mapping_complete)
-        
-        # Preparar os dados para inserção
-        records = chunk.to_dict('records')
-        
-        # Criar a query de inserção com nomes de colunas entre aspas
-        placeholders = ', '.join(['?'] * len(colunas_sql))
-        columns = ', '.join([f'"{col}"' for col in colunas_sql])
-        insert_query = f'INSERT OR REPLACE INTO Cargas ({columns}) VALUES ({placeholders})'
-        
-        # Preparar os valores para inserção
-        values = []
-        for record in records:
-            row_values = []
-            for col in colunas_sql:
-                row_values.append(record.get(col))
-            values.append(tuple(row_values))
-        
-        # Inserir os dados
-        cursor.executemany(insert_query, values)
+    # Adicionar colunas à tabela com nomes ajustados
+    for coluna, coluna_sql in zip(colunas, colunas_sql):
+        if coluna in colunas_inteiras:
+            create_table_sql += f'    "{coluna_sql}" INTEGER,'
+        elif coluna in colunas_reais:
+            create_table_sql += f'    "{coluna_sql}" REAL,'
+        else:
+            create_table_sql += f'    "{coluna_sql}" TEXT,'
+
+    # Adicionar chave primária e finalizar a criação da tabela
+    create_table_sql = create_table_sql.rstrip(',') + ',\n    PRIMARY KEY ("IDCarga")\n)'
+    conn.execute(create_table_sql)
+    conn.commit()
+    print("Tabela principal criada com sucesso!")
+
+
+def montar_insert(colunas_sql, tabela='Cargas'):
+    """
+    Monta a instrução de inserção com nomes de colunas entre aspas.
+
+    Args:
+        colunas_sql (list): Colunas SQL da tabela.
+        tabela (str): Nome da tabela de destino.
+
+    Returns:
+        str: Instrução INSERT OR REPLACE parametrizada.
+    """
+    placeholders = ', '.join(['?'] * len(colunas_sql))
+    columns = ', '.join([f'"{col}"' for col in colunas_sql])
+    return f'INSERT OR REPLACE INTO {tabela} ({columns}) VALUES ({placeholders})'
+
+
+def linhas_do_chunk(chunk, colunas_sql):
+    """
+    Gera as tuplas de valores de um chunk direto dos arrays de coluna.
+
+    Cada coluna é convertida uma única vez para lista de objetos Python e as
+    linhas são montadas com zip, sem criar um dicionário por registro. Valores
+    NaN são gravados como NULL pelo SQLite.
+
+    Args:
+        chunk (pd.DataFrame): Chunk já com as colunas renomeadas.
+        colunas_sql (list): Ordem das colunas na instrução de inserção.
+
+    Returns:
+        iterator: Tuplas prontas para o executemany.
+    """
+    return zip(*[chunk[col].tolist() for col in colunas_sql])
+
+
+class LayoutCargas:
+    """
+    Layout original da tabela Cargas: uma única tabela com colunas TEXT.
+
+    O layout concentra tudo o que depende do formato de armazenamento: criação
+    das tabelas, conversão dos chunks lidos do CSV e montagem das linhas
+    inseridas. As instâncias são enviadas aos processos do pipeline paralelo,
+    por isso devem permanecer serializáveis.
+    """
+
+    tabela = 'Cargas'
+    colunas_juncao = ()
+
+    def __init__(self, colunas, colunas_sql):
+        """
+        Args:
+            colunas (list): Colunas originais do CSV.
+            colunas_sql (list): Colunas SQL correspondentes.
+        """
+        self.colunas = colunas
+        self.colunas_sql = colunas_sql
+        self.column_mapping_complete = dict(zip(colunas, colunas_sql))
+        self.dtypes = tipos_colunas(colunas)
+        self.insert_query = montar_insert(colunas_sql, self.tabela)
+
+    def criar(self, conn):
+        """
+        Cria as tabelas do layout.
+
+        Args:
+            conn (sqlite3.Connection): Conexão com o banco de dados.
+        """
+        criar_tabela_cargas(conn, self.colunas, self.colunas_sql)
+
+    def transformar(self, chunk):
+        """
+        Converte um chunk lido do CSV (pode rodar nos processos trabalhadores).
+
+        Args:
+            chunk (pd.DataFrame): Chunk lido do CSV.
+
+        Returns:
+            pd.DataFrame: Chunk pronto para linhas().
+        """
+        return transformar_chunk(chunk, self.column_mapping_complete)
+
+    def linhas(self, conn, chunk):
+        """
+        Gera as tuplas inseridas para um chunk já transformado.
+
+        Args:
+            conn (sqlite3.Connection): Conexão usada pelo escritor.
+            chunk (pd.DataFrame): Chunk retornado por transformar().
+
+        Returns:
+            iterator: Tuplas prontas para o executemany.
+        """
+        return linhas_do_chunk(chunk, self.colunas_sql)
+
+
+class LayoutCargasTipado(LayoutCargas):
+    """
+    Layout tipado e codificado por dicionário.
+
+    Os dados ficam na tabela Cargas_Fato: colunas de baixa cardinalidade
+    (sentido, portos, países, natureza da carga, tipo de navegação, ...) são
+    gravadas como chaves INTEGER para as tabelas Dominio_<grupo>, Ano é gravado
+    como INTEGER e as colunas de data como segundos desde 1970. A view Cargas
+    reconstrói os valores originais com os mesmos nomes de colunas, de modo que
+    o SQL gerado pelo modelo não muda.
+    """
+
+    tabela = 'Cargas_Fato'
+    colunas_juncao = tuple(colunas_filtro_tipado)
+
+    def __init__(self, colunas, colunas_sql):
+        super().__init__(colunas, colunas_sql)
+        self.grupos = {
+            grupo: [col for col in cols if col in colunas_sql]
+            for grupo, cols in grupos_dominio.items()
+        }
+        self.grupos = {grupo: cols for grupo, cols in self.grupos.items() if cols}
+        self.grupo_da_coluna = {col: grupo for grupo, cols in self.grupos.items() for col in cols}
+        self.colunas_ano = [col for col in colunas_ano if col in colunas_sql]
+        self.colunas_data = [col for col in colunas_sql if col.startswith('Data')]
+        self.dominios = None
+
+    def criar(self, conn):
+        cursor = conn.cursor()
+        existente = cursor.execute(
+            "SELECT type FROM sqlite_master WHERE name = 'Cargas'").fetchone()
+        if existente and existente[0] == 'table':
+            raise ValueError("O banco já possui a tabela Cargas no layout texto; "
+                             "use um arquivo novo para o layout tipado.")
+
+        print("Criando tabela Cargas_Fato e dicionários do layout tipado...")
+        for grupo in self.grupos:
+            cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS Dominio_{grupo} (
+                id INTEGER PRIMARY KEY,
+                valor TEXT UNIQUE
+            )
+            ''')
+
+        definicoes = []
+        for coluna, coluna_sql in zip(self.colunas, self.colunas_sql):
+            if (coluna in colunas_inteiras or coluna_sql in self.grupo_da_coluna
+                    or coluna_sql in self.colunas_ano or coluna_sql in self.colunas_data):
+                definicoes.append(f'    "{coluna_sql}" INTEGER')
+            elif coluna in colunas_reais:
+                definicoes.append(f'    "{coluna_sql}" REAL')
+            else:
+                definicoes.append(f'    "{coluna_sql}" TEXT')
+        cursor.execute('CREATE TABLE IF NOT EXISTS Cargas_Fato (\n'
+                       + ',\n'.join(definicoes)
+                       + ',\n    PRIMARY KEY ("IDCarga")\n)')
+
+        # Colunas usadas em filtros entram na view por LEFT JOIN: a condição
+        # "Sentido = 'Embarcados'" vira uma busca no dicionário seguida de uma busca
+        # pelo índice da chave inteira. As demais usam subconsultas escalares, que o
+        # SQLite só avalia quando a coluna é referenciada na consulta.
+        selecao = []
+        juncoes = []
+        for coluna_sql in self.colunas_sql:
+            grupo = self.grupo_da_coluna.get(coluna_sql)
+            if grupo and coluna_sql in colunas_filtro_tipado:
+                alias = f'd_{coluna_sql}'
+                selecao.append(f'    {alias}.valor AS "{coluna_sql}"')
+                juncoes.append(f'LEFT JOIN Dominio_{grupo} {alias} ON {alias}.id = f."{coluna_sql}"')
+            elif grupo:
+                selecao.append(f'    (SELECT valor FROM Dominio_{grupo} WHERE id = f."{coluna_sql}") AS "{coluna_sql}"')
+            elif coluna_sql in self.colunas_data:
+                selecao.append(f'''    CASE WHEN f."{coluna_sql}" % 86400 = 0 '''
+                               f'''THEN date(f."{coluna_sql}", 'unixepoch') '''
+                               f'''ELSE datetime(f."{coluna_sql}", 'unixepoch') END AS "{coluna_sql}"''')
+            else:
+                selecao.append(f'    f."{coluna_sql}" AS "{coluna_sql}"')
+        cursor.execute('CREATE VIEW IF NOT EXISTS Cargas AS\nSELECT\n'
+                       + ',\n'.join(selecao)
+                       + '\nFROM Cargas_Fato f\n'
+                       + '\n'.join(juncoes))
+        conn.commit()
+        self.dominios = None
+        print("Layout tipado criado com sucesso!")
+
+    def transformar(self, chunk):
+        chunk = super().transformar(chunk)
+        for coluna in self.colunas_ano:
+            chunk[coluna] = pd.to_numeric(chunk[coluna], errors='coerce')
+        for coluna in self.colunas_data:
+            datas = pd.to_datetime(chunk[coluna], errors='coerce', dayfirst=True, format='mixed')
+            invalidas = datas.isna() & chunk[coluna].notna()
+            if invalidas.any():
+                raise ValueError(f"Valor de data inválido na coluna {coluna}: "
+                                 f"{chunk[coluna][invalidas].iloc[0]!r}")
+            chunk[coluna] = (datas - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1)
+        return chunk
+
+    def carregar_dominios(self, conn):
+        """
+        Carrega os dicionários já gravados no banco.
+
+        Args:
+            conn (sqlite3.Connection): Conexão com o banco de dados.
+        """
+        self.dominios = {}
+        for grupo in self.grupos:
+            rows = conn.execute(f'SELECT valor, id FROM Dominio_{grupo}').fetchall()
+            self.dominios[grupo] = dict(rows)
+
+    def linhas(self, conn, chunk):
+        if self.dominios is None:
+            self.carregar_dominios(conn)
+
+        for coluna, grupo in self.grupo_da_coluna.items():
+            dicionario = self.dominios[grupo]
+            valores = chunk[coluna]
+            novos = [valor for valor in valores.dropna().unique() if valor not in dicionario]
+            if novos:
+                primeiro_id = len(dicionario) + 1
+                novos_ids = list(zip(range(primeiro_id, primeiro_id + len(novos)), novos))
+                conn.executemany(f'INSERT INTO Dominio_{grupo} (id, valor) VALUES (?, ?)', novos_ids)
+                dicionario.update((valor, id_) for id_, valor in novos_ids)
+            chunk[coluna] = valores.map(dicionario)
+
+        return linhas_do_chunk(chunk, self.colunas_sql)
+
+
+layouts = {
+    'texto': LayoutCargas,
+    'tipado': LayoutCargasTipado,
+}
+
+
+def importar_limitado(conn, csv_path, layout, max_rows=10000, chunksize=5000):
+    """
+    Importa os dados do CSV com limite de registros (modo desenvolvimento).
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        csv_path (str): Caminho do arquivo CSV.
+        layout (LayoutCargas): Layout de armazenamento da tabela Cargas.
+        max_rows (int): Número máximo de registros importados.
+        chunksize (int): Número de linhas lidas por chunk.
+
+    Returns:
+        int: Total de registros importados.
+    """
+    print(f"Iniciando importação dos dados do CSV (limitado a {max_rows} registros)...")
+
+    cursor = conn.cursor()
+    total_rows = 0
+    inicio = time.perf_counter()
+
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=layout.dtypes):
+            # Se este chunk fizer ultrapassar o limite, cortar o chunk
+            if total_rows + len(chunk) > max_rows:
+                chunk = chunk.iloc[:(max_rows - total_rows)]
+
+            # Renomear colunas no DataFrame e inserir os dados
+            chunk = layout.transformar(chunk)
+            cursor.executemany(layout.insert_query, layout.linhas(conn, chunk))
+            conn.commit()
+
+            total_rows += len(chunk)
+            print(f"Importados {total_rows} registros...")
+
+            if total_rows >= max_rows:
+                print(f"Limite de {max_rows} registros atingido. Importação concluída.")
+                break
+    except Exception as e:
+        print(f"Erro durante a importação: {e}")
+        conn.rollback()
+        raise
+
+    reportar_taxa(total_rows, time.perf_counter() - inicio)
+    return total_rows
+
+
+def importar_completo(conn, csv_path, layout, chunksize=100000, linhas_por_transacao=None):
+    """
+    Importa o CSV inteiro em modo de ingestão em massa.
+
+    O arquivo é lido em streaming, sem limite de registros. Todas as linhas são
+    gravadas em uma única transação, a menos que linhas_por_transacao seja
+    informado, caso em que a transação é confirmada a cada bloco desse tamanho.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        csv_path (str): Caminho do arquivo CSV.
+        layout (LayoutCargas): Layout de armazenamento da tabela Cargas.
+        chunksize (int): Número de linhas lidas por chunk.
+        linhas_por_transacao (int, optional): Tamanho de cada transação.
+
+    Returns:
+        int: Total de registros importados.
+    """
+    print("Iniciando importação completa dos dados do CSV (modo carga em massa)...")
+
+    total_rows = 0
+    linhas_na_transacao = 0
+    inicio = time.perf_counter()
+
+    # O controle de transações é explícito para permitir a carga em uma única transação
+    isolation_level = conn.isolation_level
+    conn.commit()
+    conn.isolation_level = None
+    aplicar_pragmas(conn, pragmas_carga_massa)
+    try:
+        conn.execute('BEGIN')
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=layout.dtypes):
+            chunk = layout.transformar(chunk)
+            conn.executemany(layout.insert_query, layout.linhas(conn, chunk))
+
+            total_rows += len(chunk)
+            linhas_na_transacao += len(chunk)
+            if linhas_por_transacao and linhas_na_transacao >= linhas_por_transacao:
+                conn.execute('COMMIT')
+                conn.execute('BEGIN')
+                linhas_na_transacao = 0
+
+            decorrido = time.perf_counter() - inicio
+            print(f"Importados {total_rows} registros ({total_rows / decorrido:,.0f} linhas/s)...")
+        conn.execute('COMMIT')
+    except Exception as e:
+        print(f"Erro durante a importação: {e}")
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        aplicar_pragmas(conn, pragmas_padrao)
+        conn.isolation_level = isolation_level
+
+    reportar_taxa(total_rows, time.perf_counter() - inicio)
+    return total_rows
+
+
+def detectar_layout(conn):
+    """
+    Identifica o layout de um banco já existente.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+
+    Returns:
+        str: 'tipado', 'texto' ou None se o banco ainda não tem a tabela Cargas.
+    """
+    tabelas = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    if 'Cargas_Fato' in tabelas:
+        return 'tipado'
+    if 'Cargas' in tabelas:
+        return 'texto'
+    return None
+
+
+def hash_registros(chunk):
+    """
+    Calcula um hash de 64 bits do conteúdo de cada linha de um chunk lido do CSV.
+
+    Args:
+        chunk (pd.DataFrame): Chunk lido do CSV, antes da transformação.
+
+    Returns:
+        list: Hashes como inteiros com sinal (cabem em um INTEGER do SQLite).
+    """
+    return pd.util.hash_pandas_object(chunk, index=False).astype('int64').tolist()
+
+
+def importar_incremental(conn, csv_path, layout, chunksize=100000):
+    """
+    Aplica um CSV a um banco existente, gravando apenas registros novos ou alterados.
+
+    Os IDCarga e hashes de cada chunk vão para uma tabela de staging temporária,
+    comparada com a tabela Cargas_Hash; somente as linhas sem hash gravado ou com
+    hash diferente são convertidas e gravadas (INSERT OR REPLACE pela chave
+    IDCarga), e os índices são atualizados linha a linha pelo próprio SQLite. O
+    custo é proporcional ao tamanho do CSV aplicado, não ao histórico do banco.
+
+    Registros carregados antes da existência de Cargas_Hash não têm hash e são
+    regravados uma única vez, na primeira carga incremental que os contiver.
+    Registros ausentes do CSV não são removidos.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados (tabelas do layout já criadas).
+        csv_path (str): Caminho do arquivo CSV com os registros novos ou alterados.
+        layout (LayoutCargas): Layout de armazenamento da tabela Cargas.
+        chunksize (int): Número de linhas lidas por chunk.
+
+    Returns:
+        dict: Totais de registros lidos, novos e alterados, e os anos afetados.
+    """
+    print("Iniciando importação incremental dos dados do CSV...")
+
+    cursor = conn.cursor()
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {tabela_hash} (
+        IDCarga INTEGER PRIMARY KEY,
+        hash INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('DROP TABLE IF EXISTS temp.Staging_Carga')
+    cursor.execute('CREATE TEMP TABLE Staging_Carga (IDCarga INTEGER PRIMARY KEY, hash INTEGER NOT NULL)')
+
+    totais = {'lidos': 0, 'novos': 0, 'alterados': 0}
+    anos = set()
+    inicio = time.perf_counter()
+
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=layout.dtypes):
+            cursor.execute('DELETE FROM temp.Staging_Carga')
+            cursor.executemany('INSERT OR REPLACE INTO temp.Staging_Carga VALUES (?, ?)',
+                               zip(chunk['IDCarga'].tolist(), hash_registros(chunk)))
+
+            # Mantém no staging apenas registros novos (sem hash) ou com conteúdo diferente do gravado
+            cursor.execute(f'''
+            DELETE FROM temp.Staging_Carga WHERE IDCarga IN (
+                SELECT s.IDCarga FROM temp.Staging_Carga s
+                JOIN {tabela_hash} h ON h.IDCarga = s.IDCarga AND h.hash = s.hash)
+            ''')
+            alterados = cursor.execute(f'''
+            SELECT s.IDCarga, EXISTS (SELECT 1 FROM {layout.tabela} c WHERE c.IDCarga = s.IDCarga)
+            FROM temp.Staging_Carga s
+            ''').fetchall()
+            totais['lidos'] += len(chunk)
+            if not alterados:
+                continue
+
+            ids = [id_carga for id_carga, _ in alterados]
+            existentes = sum(1 for _, existente in alterados if existente)
+            totais['alterados'] += existentes
+            totais['novos'] += len(ids) - existentes
+
+            # Anos dos registros antes e depois da gravação (o ano pode ter mudado)
+            consulta_anos = 'SELECT DISTINCT Ano FROM Cargas WHERE IDCarga IN (SELECT IDCarga FROM temp.Staging_Carga)'
+            anos.update(row[0] for row in cursor.execute(consulta_anos))
+
+            delta = layout.transformar(chunk[chunk['IDCarga'].isin(ids)].copy())
+            cursor.executemany(layout.insert_query, layout.linhas(conn, delta))
+            cursor.execute(f'INSERT OR REPLACE INTO {tabela_hash} SELECT IDCarga, hash FROM temp.Staging_Carga')
+            anos.update(row[0] for row in cursor.execute(consulta_anos))
+
+            print(f"Lidos {totais['lidos']} registros: {totais['novos']} novos, "
+                  f"{totais['alterados']} alterados...")
         conn.commit()
-        
-        total_rows += len(records)
-        print(f"Importados {total_rows} registros...")
-        
-        # Verificar novamente se atingimos o limite após a importação
-        if total_rows >= max_rows:
-            print(f"Limite de {max_rows} registros atingido. Importação concluída.")
-            break
-            
-except Exception as e:
-    print(f"Erro durante a importação: {e}")
-    conn.rollback()
-    raise
-
-# Criar índices para melhorar o desempenho das consultas
-print("Criando índices para otimizar consultas...")
-cursor.execute('CREATE INDEX IF NOT EXISTS idx_cdmercadoria ON Cargas ("CDMercadoria")')
-cursor.execute('CREATE INDEX IF NOT EXISTS idx_origem ON Cargas ("Origem")')
-cursor.execute('CREATE INDEX IF NOT EXISTS idx_destino ON Cargas ("Destino")')
-cursor.execute('CREATE INDEX IF NOT EXISTS idx_ano ON Cargas ("Ano")')
-
-# Fechar a conexão
-conn.commit()
-conn.close()
-
-print("Banco de dados criado e populado com sucesso!")
-print(f"Caminho do banco de dados: {db_path}")
+    except Exception as e:
+        print(f"Erro durante a importação incremental: {e}")
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute('DROP TABLE IF EXISTS temp.Staging_Carga')
+
+    reportar_taxa(totais['lidos'], time.perf_counter() - inicio)
+    print(f"Registros gravados: {totais['novos']} novos, {totais['alterados']} alterados")
+    totais['anos'] = sorted(anos, key=lambda ano: (ano is None, str(ano)))
+    return totais
+
+
+def ler_blocos_csv(csv_path, linhas_por_bloco):
+    """
+    Lê o CSV em blocos de texto bruto, sem interpretar os campos.
+
+    A interpretação fica a cargo dos processos trabalhadores. Cada registro do
+    extrato da ANTAQ ocupa exatamente uma linha, portanto os blocos podem ser
+    cortados em qualquer quebra de linha.
+
+    Args:
+        csv_path (str): Caminho do arquivo CSV.
+        linhas_por_bloco (int): Número de linhas por bloco.
+
+    Yields:
+        tuple: (cabeçalho, texto do bloco)
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        cabecalho = f.readline()
+        bloco = []
+        for linha in f:
+            bloco.append(linha)
+            if len(bloco) >= linhas_por_bloco:
+                yield cabecalho, ''.join(bloco)
+                bloco = []
+        if bloco:
+            yield cabecalho, ''.join(bloco)
+
+
+def trabalhador_transformacao(fila_entrada, fila_saida, layout, falha):
+    """
+    Processo trabalhador: interpreta e converte blocos do CSV.
+
+    Após um erro (deste ou de outro processo, sinalizado por falha), os blocos
+    seguintes são descartados e o processo encerra assim que a fila de entrada
+    esvazia, com ou sem o sinal de fim. O aviso de fim é sempre enviado ao escritor.
+
+    Args:
+        fila_entrada (multiprocessing.Queue): Blocos de texto a processar (None encerra).
+        fila_saida (multiprocessing.Queue): Chunks prontos para o escritor.
+        layout (LayoutCargas): Layout de armazenamento da tabela Cargas.
+        falha (multiprocessing.Event): Sinaliza um erro em qualquer etapa do pipeline.
+    """
+    try:
+        while True:
+            try:
+                tarefa = fila_entrada.get(timeout=intervalo_verificacao)
+            except queue.Empty:
+                # Após um erro, o processo principal para de ler e pode não enviar o sinal de fim
+                if falha.is_set():
+                    break
+                continue
+            if tarefa is None:
+                break
+            if falha.is_set():
+                continue
+            try:
+                cabecalho, texto = tarefa
+                chunk = pd.read_csv(io.StringIO(cabecalho + texto), dtype=layout.dtypes)
+                colocar_na_fila(fila_saida, ('dados', layout.transformar(chunk)), falha.is_set)
+            except Exception as e:
+                falha.set()
+                fila_saida.put(('erro', f"{type(e).__name__}: {e}"))
+    finally:
+        fila_saida.put(('fim', None))
+
+
+def escritor_sqlite(fila_saida, db_path, layout, num_trabalhadores, resultado, falha):
+    """
+    Processo escritor único: drena a fila de resultados para o SQLite.
+
+    Todas as linhas são gravadas em uma única transação com os PRAGMAs de carga
+    em massa. Após um erro a transação é descartada, mas a fila continua sendo
+    drenada até o fim de todos os trabalhadores, que do contrário ficariam
+    bloqueados na fila cheia. O total gravado (ou a mensagem de erro) é enviado
+    pelo pipe de resultado.
+
+    Args:
+        fila_saida (multiprocessing.Queue): Chunks produzidos pelos trabalhadores.
+        db_path (str): Caminho do banco de dados SQLite.
+        layout (LayoutCargas): Layout de armazenamento da tabela Cargas.
+        num_trabalhadores (int): Número de trabalhadores a aguardar.
+        resultado (multiprocessing.connection.Connection): Pipe para o processo principal.
+        falha (multiprocessing.Event): Sinaliza um erro em qualquer etapa do pipeline.
+    """
+    conn = None
+    total_rows = 0
+    finalizados = 0
+    erro = None
+
+    try:
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        aplicar_pragmas(conn, pragmas_carga_massa)
+        conn.execute('BEGIN')
+    except Exception as e:
+        erro = f"{type(e).__name__}: {e}"
+        falha.set()
+
+    while finalizados < num_trabalhadores:
+        tipo, conteudo = fila_saida.get()
+        if tipo == 'fim':
+            finalizados += 1
+        elif tipo == 'erro':
+            erro = erro or conteudo
+        elif erro is None and not falha.is_set():
+            try:
+                conn.executemany(layout.insert_query, layout.linhas(conn, conteudo))
+                total_rows += len(conteudo)
+            except Exception as e:
+                erro = f"{type(e).__name__}: {e}"
+                falha.set()
+
+    if erro is None and falha.is_set():
+        erro = "importação interrompida pelo processo principal"
+    if conn is not None:
+        try:
+            if conn.in_transaction:
+                conn.execute('COMMIT' if erro is None else 'ROLLBACK')
+            aplicar_pragmas(conn, pragmas_padrao)
+        except Exception as e:
+            erro = erro or f"{type(e).__name__}: {e}"
+        finally:
+            conn.close()
+
+    resultado.send((total_rows if erro is None else 0, erro))
+
+
+def colocar_na_fila(fila, item, parado):
+    """
+    Coloca um item em uma fila limitada sem bloquear indefinidamente.
+
+    Args:
+        fila (multiprocessing.Queue): Fila de destino.
+        item: Item a colocar.
+        parado (callable): Retorna True quando o pipeline parou e o item deve ser descartado.
+
+    Returns:
+        bool: True se o item foi colocado na fila.
+    """
+    while not parado():
+        try:
+            fila.put(item, timeout=intervalo_verificacao)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def aguardar_resultado(resultado_recv, escritor, trabalhadores):
+    """
+    Aguarda o resultado do escritor, detectando processos encerrados sem resposta.
+
+    Returns:
+        tuple: (total gravado, mensagem de erro ou None)
+    """
+    while not resultado_recv.poll(intervalo_verificacao):
+        # O escritor pode ter enviado o resultado logo antes de encerrar
+        if not escritor.is_alive() and not resultado_recv.poll():
+            return 0, f"escritor encerrado inesperadamente (código {escritor.exitcode})"
+        encerrados = [t.exitcode for t in trabalhadores if t.exitcode not in (None, 0)]
+        if encerrados:
+            return 0, f"trabalhador encerrado inesperadamente (código {encerrados[0]})"
+    return resultado_recv.recv()
+
+
+def encerrar_processos(processos, tempo_limite=tempo_encerramento):
+    """
+    Aguarda o fim dos processos e termina os que não encerrarem no prazo.
+
+    Args:
+        processos (list): Processos do pipeline.
+        tempo_limite (float): Segundos de espera por processo.
+    """
+    for processo in processos:
+        processo.join(tempo_limite)
+        if processo.is_alive():
+            processo.terminate()
+            processo.join()
+
+
+def importar_paralelo(db_path, csv_path, layout, num_trabalhadores=None, chunksize=50000, verbose=True):
+    """
+    Importa o CSV inteiro com um pipeline paralelo de interpretação e um único escritor.
+
+    O processo principal lê blocos de texto bruto do CSV; um conjunto de
+    processos trabalhadores interpreta cada bloco, renomeia as colunas e converte
+    as medidas numéricas; um único processo escritor grava no SQLite. As filas
+    entre as etapas são limitadas, o que mantém o uso de memória constante
+    independentemente do tamanho do arquivo.
+
+    Um erro em qualquer etapa interrompe a leitura e descarta a transação; um
+    processo que morra sem responder é detectado pelo processo principal, que
+    termina os demais em vez de ficar bloqueado nas filas.
+
+    Args:
+        db_path (str): Caminho do banco de dados SQLite (tabelas do layout já criadas).
+        csv_path (str): Caminho do arquivo CSV.
+        layout (LayoutCargas): Layout de armazenamento da tabela Cargas.
+        num_trabalhadores (int, optional): Número de trabalhadores (padrão: núcleos - 1).
+        chunksize (int): Linhas por bloco enviado aos trabalhadores.
+        verbose (bool): Se True, exibe o progresso da importação.
+
+    Returns:
+        int: Total de registros importados.
+
+    Raises:
+        RuntimeError: Se a importação falhou (nada é gravado).
+    """
+    if not num_trabalhadores:
+        num_trabalhadores = max(1, (os.cpu_count() or 2) - 1)
+
+    if verbose:
+        print(f"Iniciando importação paralela dos dados do CSV ({num_trabalhadores} trabalhadores)...")
+
+    fila_entrada = mp.Queue(maxsize=num_trabalhadores * 2)
+    fila_saida = mp.Queue(maxsize=num_trabalhadores * 2)
+    resultado_recv, resultado_send = mp.Pipe(duplex=False)
+    falha = mp.Event()
+    inicio = time.perf_counter()
+
+    escritor = mp.Process(target=escritor_sqlite,
+                          args=(fila_saida, db_path, layout, num_trabalhadores, resultado_send, falha))
+    trabalhadores = [
+        mp.Process(target=trabalhador_transformacao,
+                   args=(fila_entrada, fila_saida, layout, falha))
+        for _ in range(num_trabalhadores)
+    ]
+    escritor.start()
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+
+    def pipeline_parado():
+        # Durante a leitura, nenhum processo deveria ter terminado
+        return falha.is_set() or not escritor.is_alive() or not all(t.is_alive() for t in trabalhadores)
+
+    def sem_consumidores():
+        # Os trabalhadores terminam um a um ao receber o sinal de fim
+        return not escritor.is_alive() or not any(t.is_alive() for t in trabalhadores)
+
+    try:
+        try:
+            linhas_lidas = 0
+            for bloco in ler_blocos_csv(csv_path, chunksize):
+                # Após um erro, o restante do arquivo não é lido
+                if not colocar_na_fila(fila_entrada, bloco, pipeline_parado):
+                    break
+                linhas_lidas += chunksize
+                if verbose:
+                    decorrido = time.perf_counter() - inicio
+                    print(f"Lidas ~{linhas_lidas} linhas ({linhas_lidas / decorrido:,.0f} linhas/s)...")
+        except BaseException:
+            # A leitura falhou: o escritor descarta a transação
+            falha.set()
+            raise
+        finally:
+            for _ in trabalhadores:
+                if not colocar_na_fila(fila_entrada, None, sem_consumidores):
+                    break
+
+        total_rows, erro = aguardar_resultado(resultado_recv, escritor, trabalhadores)
+        if erro:
+            falha.set()
+    finally:
+        if falha.is_set():
+            # Blocos que nenhum trabalhador vai ler não devem prender o processo principal na saída
+            fila_entrada.cancel_join_thread()
+        encerrar_processos([escritor] + trabalhadores)
+
+    if erro:
+        print(f"Erro durante a importação: {erro}")
+        raise RuntimeError(erro)
+
+    if verbose:
+        reportar_taxa(total_rows, time.perf_counter() - inicio)
+    return total_rows
+
+
+def benchmark_paralelo(csv_path, layout, max_trabalhadores=None, chunksize=50000):
+    """
+    Compara a taxa de ingestão do pipeline paralelo de 1 a N trabalhadores.
+
+    Cada execução grava em um banco temporário, descartado ao final.
+
+    Args:
+        csv_path (str): Caminho do arquivo CSV.
+        layout (LayoutCargas): Layout de armazenamento da tabela Cargas.
+        max_trabalhadores (int, optional): Maior número de trabalhadores testado.
+        chunksize (int): Linhas por bloco enviado aos trabalhadores.
+
+    Returns:
+        list: Tuplas (trabalhadores, registros, segundos, linhas/s).
+    """
+    if not max_trabalhadores:
+        max_trabalhadores = os.cpu_count() or 1
+
+    resultados = []
+    for num_trabalhadores in range(1, max_trabalhadores + 1):
+        with tempfile.TemporaryDirectory() as diretorio:
+            db_temporario = os.path.join(diretorio, 'benchmark.db')
+            conn = sqlite3.connect(db_temporario)
+            layout.criar(conn)
+            conn.close()
+
+            inicio = time.perf_counter()
+            total_rows = importar_paralelo(db_temporario, csv_path, layout,
+                                           num_trabalhadores=num_trabalhadores,
+                                           chunksize=chunksize, verbose=False)
+            segundos = time.perf_counter() - inicio
+        resultados.append((num_trabalhadores, total_rows, segundos, total_rows / segundos))
+
+    print("\nTrabalhadores | Registros | Tempo (s) | Linhas/s | Speedup")
+    base = resultados[0][3]
+    for num_trabalhadores, total_rows, segundos, taxa in resultados:
+        print(f"{num_trabalhadores:>13} | {total_rows:>9} | {segundos:>9.2f} | {taxa:>8,.0f} | {taxa / base:>6.2f}x")
+    return resultados
+
+
+def aplicar_pragmas(conn, pragmas):
+    """
+    Executa uma lista de PRAGMAs na conexão.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        pragmas (list): Instruções PRAGMA a executar.
+    """
+    for pragma in pragmas:
+        conn.execute(pragma)
+
+
+def reportar_taxa(total_rows, segundos):
+    """
+    Exibe o total importado e a taxa de ingestão em linhas por segundo.
+
+    Args:
+        total_rows (int): Total de registros importados.
+        segundos (float): Tempo decorrido da importação.
+    """
+    taxa = total_rows / segundos if segundos > 0 else 0
+    print(f"Importação: {total_rows} registros em {segundos:.2f}s ({taxa:,.0f} linhas/s)")
+
+
+def criar_indices(conn, tabela='Cargas', colunas_juncao=()):
+    """
+    Cria índices para melhorar o desempenho das consultas.
+
+    Os índices compostos seguem o formato das consultas geradas a partir dos
+    exemplos do prompt (Sentido + Origem/Destino + Ano) e incluem as medidas
+    agregadas, de modo que SUM/COUNT são respondidos só pelo índice, sem
+    acessar a tabela. O prefixo de cada índice cobre os antigos índices de
+    coluna única.
+
+    No layout tipado, a view Cargas sempre lê as chaves das colunas unidas aos
+    dicionários; elas entram nos índices (antes das medidas) para que os
+    índices continuem cobrindo as consultas feitas pela view.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        tabela (str): Tabela que armazena os dados (Cargas ou Cargas_Fato).
+        colunas_juncao (iterable): Colunas lidas pela view em toda consulta.
+    """
+    print("Criando índices para otimizar consultas...")
+    cursor = conn.cursor()
+    colunas_tabela = {row[1] for row in cursor.execute(f'PRAGMA table_info({tabela})')}
+
+    # Índices de coluna única substituídos pelos compostos
+    for nome in ['idx_origem', 'idx_destino', 'idx_ano']:
+        cursor.execute(f'DROP INDEX IF EXISTS {nome}')
+
+    for nome, colunas in indices_compostos:
+        chaves = [col for col in colunas if col not in colunas_reais]
+        chaves += [col for col in colunas_juncao if col not in chaves]
+        medidas = [col for col in colunas if col in colunas_reais]
+        colunas = [col for col in chaves + medidas if col in colunas_tabela]
+        lista = ', '.join(f'"{col}"' for col in colunas)
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({lista})')
+
+    # Estatísticas para o planejador escolher entre os índices compostos
+    cursor.execute('ANALYZE')
+    conn.commit()
+
+
+def atualizar_catalogo_anos(conn, tabela='Cargas'):
+    """
+    Grava na tabela MetadadosAnos os anos presentes nos dados e o número de registros de cada um.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        tabela (str): Tabela que armazena os dados (Cargas ou Cargas_Fato).
+    """
+    conn.execute('CREATE TABLE IF NOT EXISTS MetadadosAnos (Ano PRIMARY KEY, registros INTEGER)')
+    conn.execute('DELETE FROM MetadadosAnos')
+    conn.execute(f'INSERT INTO MetadadosAnos SELECT Ano, COUNT(*) FROM {tabela} '
+                 'WHERE Ano IS NOT NULL GROUP BY Ano')
+    conn.commit()
+
+
+def registrar_versao(conn, registros=None):
+    """
+    Grava uma nova versão dos dados na tabela MetadadosCarga.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        registros (int, optional): Total de registros após a carga.
+    """
+    conn.execute('CREATE TABLE IF NOT EXISTS MetadadosCarga (chave TEXT PRIMARY KEY, valor TEXT)')
+    valores = {
+        'versao': f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}",
+        'atualizado_em': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    if registros is not None:
+        valores['registros'] = str(registros)
+    conn.executemany('INSERT OR REPLACE INTO MetadadosCarga VALUES (?, ?)', valores.items())
+    conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cria o banco de dados cargas.db a partir do CSV.")
+    parser.add_argument('--completo', action='store_true',
+                        help='Carrega o CSV inteiro em modo de ingestão em massa (sem limite de registros).')
+    parser.add_argument('--max-registros', type=int, default=10000,
+                        help='Limite de registros no modo desenvolvimento (padrão: 10000).')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Linhas lidas por chunk (padrão: 5000 no modo desenvolvimento, 100000 no modo completo).')
+    parser.add_argument('--linhas-por-transacao', type=int, default=None,
+                        help='No modo completo, confirma a transação a cada N linhas (padrão: transação única).')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='No modo completo, usa o pipeline paralelo com N processos trabalhadores.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Aplica o CSV a um banco existente, gravando apenas registros novos ou alterados.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compara a taxa de ingestão do pipeline paralelo de 1 a --workers trabalhadores.')
+    parser.add_argument('--layout', choices=sorted(layouts), default='texto',
+                        help='Layout de armazenamento: texto (original) ou tipado (chaves inteiras e view Cargas).')
+    parser.add_argument('--sem-rollups', action='store_true',
+                        help='Não cria as tabelas de rollup pré-agregadas.')
+    parser.add_argument('--csv', default=csv_path, help='Caminho do arquivo CSV.')
+    parser.add_argument('--db', default=db_path, help='Caminho do banco de dados SQLite.')
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        layout = layouts[args.layout](*obter_colunas(args.csv))
+        benchmark_paralelo(args.csv, layout,
+                           max_trabalhadores=args.workers,
+                           chunksize=args.chunksize or 50000)
+        return
+
+    # Criar conexão com o banco de dados SQLite
+    conn = sqlite3.connect(args.db)
+
+    print("Criando banco de dados SQLite...")
+
+    # Carregar os mapeamentos do arquivo JSON
+    with open(json_path, 'r') as f:
+        mapeamentos = json.load(f)
+
+    criar_tabelas_mapeamento(conn, mapeamentos)
+
+    # Criar tabela principal para os dados do CSV
+    print("Criando tabela principal para os dados do CSV...")
+    if args.incremental:
+        # O layout de um banco existente prevalece sobre --layout
+        args.layout = detectar_layout(conn) or args.layout
+    layout = layouts[args.layout](*obter_colunas(args.csv))
+    layout.criar(conn)
+
+    if args.incremental:
+        totais = importar_incremental(conn, args.csv, layout,
+                                      chunksize=args.chunksize or 100000)
+        # Os índices já foram atualizados pelas gravações; os rollups são
+        # recalculados apenas para os anos afetados
+        if totais['anos'] and not args.sem_rollups:
+            atualizar_rollups(conn, totais['anos'])
+        if totais['novos'] or totais['alterados']:
+            atualizar_catalogo_anos(conn, layout.tabela)
+            registrar_versao(conn, conn.execute(f'SELECT COUNT(*) FROM {layout.tabela}').fetchone()[0])
+        conn.execute('PRAGMA optimize')
+        conn.close()
+        print("Banco de dados atualizado com sucesso!")
+        print(f"Caminho do banco de dados: {args.db}")
+        return
+
+    if args.completo and args.workers:
+        conn.close()
+        importar_paralelo(args.db, args.csv, layout,
+                          num_trabalhadores=args.workers,
+                          chunksize=args.chunksize or 50000)
+        conn = sqlite3.connect(args.db)
+    elif args.completo:
+        importar_completo(conn, args.csv, layout,
+                          chunksize=args.chunksize or 100000,
+                          linhas_por_transacao=args.linhas_por_transacao)
+    else:
+        importar_limitado(conn, args.csv, layout,
+                          max_rows=args.max_registros,
+                          chunksize=args.chunksize or 5000)
+
+    criar_indices(conn, layout.tabela, layout.colunas_juncao)
+
+    if not args.sem_rollups:
+        criar_rollups(conn)
+
+    atualizar_catalogo_anos(conn, layout.tabela)
+    registrar_versao(conn, conn.execute(f'SELECT COUNT(*) FROM {layout.tabela}').fetchone()[0])
+
+    # Fechar a conexão
+    conn.close()
+
+    print("Banco de dados criado e populado com sucesso!")
+    print(f"Caminho do banco de dados: {args.db}")
+    print(f"Tamanho do arquivo: {os.path.getsize(args.db) / 1024 / 1024:.1f} MB (layout {args.layout})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,129 @@
+import os
 import sqlite3
+import threading
 import pandas as pd
+from db_connection import INTERNAL_TABLE_PREFIXES, ConnectionPool, BatchReader
+from rollups import RollupRewriter
+from result_cache import obter_cache_resultados
+from exports import exportar_cursor, novo_arquivo_exportacao
+from sql_guard import SQLGuard, ConsultaBloqueada, OrcamentoExcedido, inserir_limite, verificar_somente_leitura
+
+# Tempo máximo, em segundos, da contagem exata de um resultado truncado
+COUNT_SECONDS = 2.0
+
+# Tempo máximo, em segundos, de uma exportação (variável SQL_EXPORT_SECONDS)
+EXPORT_SECONDS = 600.0
+
+# Linhas por página no visualizador de resultados
+DEFAULT_PAGE_SIZE = 50
+
+def _keyset_filter(column, value, position, descending):
+    """
+    Condição das linhas posteriores à chave (valor da coluna, posição) na ordenação.
+    
+    O SQLite ordena NULL antes dos demais valores em ordem crescente e depois
+    deles em ordem decrescente; empates são desfeitos pela posição.
+    
+    Returns:
+        tuple: (condição SQL, parâmetros)
+    """
+    if column is None:
+        return "_pos > ?", [position]
+    empate = f"({column} IS ? AND _pos > ?)"
+    if value is None:
+        if descending:
+            return empate, [value, position]
+        return f"({column} IS NOT NULL OR {empate})", [value, position]
+    if descending:
+        return f"({column} < ? OR {column} IS NULL OR {empate})", [value, value, position]
+    return f"({column} > ? OR {empate})", [value, value, position]
+
+class QueryStream:
+    """
+    Resultado de uma consulta lido em lotes (DataFrames de até batch_size linhas).
+    
+    A conexão fica retirada do pool apenas durante a iteração. Ao final, rows e
+    bytes trazem o que foi lido, truncated indica se o orçamento de linhas ou
+    de bytes interrompeu a leitura e total_rows traz o total de linhas do
+    resultado: exato quando a leitura foi completa ou a contagem terminou em
+    COUNT_SECONDS segundos, senão a estimativa do plano (total_exact=False).
+    """
+    
+    def __init__(self, tools, query, batch_size=None, max_rows=None, max_bytes=None, cancelar=None):
+        self.tools = tools
+        self.query = query
+        self.batch_size = batch_size
+        self.max_rows = max_rows or tools.guard.max_linhas
+        self.max_bytes = max_bytes
+        self.cancelar = cancelar
+        self.columns = []
+        self.rows = 0
+        self.bytes = 0
+        self.truncated = False
+        self.total_rows = None
+        self.total_exact = False
+    
+    def __iter__(self):
+        tools = self.tools
+        conn = tools.pool.acquire()
+        try:
+            # Uma linha além do orçamento indica que o resultado foi truncado
+            sql = tools.guard.preparar(conn, tools.rollups.rewrite(self.query), self.max_rows + 1)
+            with tools.guard.limitar(conn, self.cancelar):
+                reader = BatchReader(conn.execute(sql), self.batch_size, self.max_rows, self.max_bytes)
+                self.columns = reader.columns
+                for batch in reader:
+                    self.rows, self.bytes = reader.rows, reader.bytes
+                    yield pd.DataFrame.from_records(batch, columns=self.columns)
+                self.rows, self.bytes, self.truncated = reader.rows, reader.bytes, reader.truncated
+            if self.truncated:
+                self.total_rows, self.total_exact = tools.estimate_count(self.query, conn)
+            else:
+                self.total_rows, self.total_exact = self.rows, True
+        finally:
+            tools.pool.release(conn)
 
 class DatabaseTools:
-    def __init__(self, db_path):
+    def __init__(self, db_path, mode=None, pool_size=None):
         """
         Inicializa as ferramentas de interação com o banco de dados.
         
         Args:
             db_path (str): Caminho para o arquivo do banco de dados SQLite.
+            mode (str, optional): Modo de abertura do banco ('readonly', 'immutable' ou
+                                 'readwrite'). Padrão: variável SQL_SERVING_MODE ou 'readonly'.
+            pool_size (int, optional): Número máximo de conexões abertas.
+                                      Padrão: variável SQL_POOL_SIZE ou 4.
         """
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        self.mode = mode
+        self.pool = ConnectionPool(db_path, size=pool_size, mode=mode)
+        # A instância é compartilhada entre as sessões do Streamlit (st.cache_resource):
+        # cada thread guarda a conexão que retirou do pool
+        self._local = threading.local()
+        self.rollups = RollupRewriter(db_path)
+        self.results = obter_cache_resultados(db_path)
+        self.guard = SQLGuard()
+    
+    @property
+    def conn(self):
+        return getattr(self._local, 'conn', None)
+    
+    @property
+    def cursor(self):
+        return getattr(self._local, 'cursor', None)
     
     def connect(self):
         """
-        Estabelece conexão com o banco de dados.
+        Retira uma conexão do pool para a thread atual.
         
         Returns:
             bool: True se a conexão foi estabelecida com sucesso, False caso contrário.
         """
         try:
-            self.conn = sqlite3.connect(self.db_path)
-            self.cursor = self.conn.cursor()
+            conn = self.pool.acquire()
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
             return True
         except Exception as e:
             print(f"Erro ao conectar ao banco de dados: {e}")
@@ -30,17 +131,26 @@ class DatabaseTools:
     
     def disconnect(self):
         """
-        Fecha a conexão com o banco de dados.
+        Devolve a conexão da thread atual ao pool.
         """
         if self.conn:
-            self.conn.close()
-            self.conn = None
-            self.cursor = None
+            self._local.cursor.close()
+            self.pool.release(self._local.conn)
+            self._local.conn = None
+            self._local.cursor = None
+    
+    def close(self):
+        """
+        Fecha as conexões mantidas no pool.
+        """
+        self.pool.close()
     
     def list_tables(self):
         """
         Lista todas as tabelas disponíveis no banco de dados.
         
+        No layout tipado, a view Cargas é listada no lugar das tabelas internas.
+        
         Returns:
             list: Lista de nomes das tabelas.
         """
@@ -48,8 +158,9 @@ class DatabaseTools:
             return []
         
         try:
-            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = [table[0] for table in self.cursor.fetchall()]
+            self.cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view');")
+            tables = [table[0] for table in self.cursor.fetchall()
+                      if not table[0].startswith(INTERNAL_TABLE_PREFIXES)]
             return tables
         except Exception as e:
             print(f"Erro ao listar tabelas: {e}")
@@ -102,42 +213,193 @@ class DatabaseTools:
         Returns:
             pd.DataFrame: DataFrame com as linhas amostradas.
         """
-        if not self.connect():
-            return pd.DataFrame()
-        
         try:
             query = f"SELECT * FROM {table_name} LIMIT {limit};"
-            df = pd.read_sql_query(query, self.conn)
-            return df
+            chunks = list(self.iter_query(query, max_rows=limit))
+            return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
         except Exception as e:
             print(f"Erro ao amostrar tabela {table_name}: {e}")
             return pd.DataFrame()
-        finally:
-            self.disconnect()
     
-    def execute_query(self, query):
+    def iter_query(self, query, batch_size=None, max_rows=None, max_bytes=None, cancelar=None):
+        """
+        Executa uma consulta SQL e entrega o resultado em lotes, sem carregá-lo inteiro.
+        
+        A consulta passa pela reescrita para rollups e pelo guarda (ver sql_guard.py),
+        que insere LIMIT max_rows + 1. Os erros do guarda e do SQLite são levantados
+        durante a iteração.
+        
+        Args:
+            query (str): Consulta SQL a ser executada.
+            batch_size (int, optional): Linhas por lote (padrão: SQL_BATCH_SIZE ou 1000).
+            max_rows (int, optional): Máximo de linhas lidas (padrão: SQL_MAX_ROWS ou 1000).
+            max_bytes (int, optional): Máximo de bytes lidos (padrão: SQL_MAX_RESULT_MB ou 32 MB).
+            cancelar (threading.Event, optional): Interrompe a consulta quando sinalizado.
+            
+        Returns:
+            QueryStream: Iterável de DataFrames com o andamento da leitura.
+        """
+        return QueryStream(self, query, batch_size, max_rows, max_bytes, cancelar)
+    
+    def estimate_count(self, query, conn=None):
+        """
+        Conta as linhas do resultado de uma consulta, sem o LIMIT do guarda.
+        
+        A contagem exata tem até COUNT_SECONDS segundos; depois disso, o total é
+        estimado pelo plano da consulta (linhas visitadas, um limite superior).
+        
+        Args:
+            query (str): Consulta SQL.
+            conn (sqlite3.Connection, optional): Conexão a usar (padrão: uma do pool).
+            
+        Returns:
+            tuple: (total de linhas, True se a contagem é exata)
+        """
+        if conn is None:
+            with self.pool.connection() as conn:
+                return self.estimate_count(query, conn)
+        sql = self.rollups.rewrite(query).rstrip().rstrip(';')
+        try:
+            with SQLGuard(max_segundos=COUNT_SECONDS).limitar(conn):
+                # Em uma nova linha, para não ficar dentro de um comentário no fim da consulta
+                return conn.execute(f"SELECT COUNT(*) FROM (\n{sql}\n)").fetchone()[0], True
+        except OrcamentoExcedido:
+            return int(self.guard.analisar(conn, sql)['custo']), False
+    
+    def fetch_page(self, query, page_size=None, order_by=None, descending=False, after=None, cancelar=None):
+        """
+        Lê uma página do resultado de uma consulta, com paginação por chave (keyset).
+        
+        A consulta é envolvida como subconsulta, numerada na ordem original
+        (row_number) e ordenada pela coluna escolhida com a posição como
+        desempate. Cada página filtra as linhas posteriores à última chave da
+        página anterior, sem OFFSET nem materializar o resultado: sem ordenação,
+        a leitura para ao completar a página; com ordenação, o SQLite mantém
+        apenas as page_size + 1 primeiras linhas durante a ordenação.
+        
+        Args:
+            query (str): Consulta SQL.
+            page_size (int, optional): Linhas por página (padrão: 50).
+            order_by (str, optional): Coluna de ordenação (padrão: ordem da consulta).
+            descending (bool): Ordem decrescente da coluna de ordenação.
+            after (tuple, optional): Chave retornada em "next" pela página anterior.
+            cancelar (threading.Event, optional): Interrompe a consulta quando sinalizado.
+            
+        Returns:
+            dict: rows (DataFrame da página), columns e next (chave da próxima
+                página, ou None na última página).
+        """
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        sql = self.rollups.rewrite(query).rstrip().rstrip(';')
+        with self.pool.connection() as conn:
+            self.guard.verificar(conn, sql)
+            # Nomes originais das colunas (como subconsulta, o SQLite renomeia as repetidas)
+            columns = [col[0] for col in conn.execute(inserir_limite(sql, 0)[0]).description]
+            aliases = [f"c{i}" for i in range(len(columns))]
+            column = aliases[columns.index(order_by)] if order_by is not None else None
+            
+            params = []
+            where = ""
+            if after is not None:
+                condition, params = _keyset_filter(column, after[0], after[1], descending)
+                where = f"WHERE {condition}"
+            # Sem ordenação, as linhas já saem na ordem de _pos e a leitura para no LIMIT
+            order = f"ORDER BY {column} {'DESC' if descending else 'ASC'}, _pos" if column else ""
+            # Em uma nova linha, para não ficar dentro de um comentário no fim da consulta
+            paged = (f"WITH _resultado({', '.join(aliases)}) AS (\n{sql}\n), "
+                     f"_numerado AS (SELECT row_number() OVER () AS _pos, * FROM _resultado) "
+                     f"SELECT * FROM _numerado {where} {order} LIMIT ?")
+            with self.guard.limitar(conn, cancelar):
+                rows = conn.execute(paged, params + [page_size + 1]).fetchall()
+        
+        next_key = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_key = (last[1 + aliases.index(column)] if column else None, last[0])
+        df = pd.DataFrame.from_records([row[1:] for row in rows], columns=columns)
+        return {'rows': df, 'columns': columns, 'next': next_key}
+    
+    def export_query(self, query, formato='csv', destino=None, cancelar=None):
+        """
+        Exporta o resultado completo de uma consulta para um arquivo, em lotes.
+        
+        A consulta passa pela reescrita para rollups e pelas verificações do
+        guarda, sem o LIMIT das consultas interativas; o tempo limite é
+        SQL_EXPORT_SECONDS (padrão 600 s). Ver exports.py.
+        
+        Args:
+            query (str): Consulta SQL.
+            formato (str): 'csv', 'csv.gz' ou 'parquet'.
+            destino (str, optional): Caminho do arquivo (padrão: um novo arquivo em
+                                     static/exports, servido pelo Streamlit).
+            cancelar (threading.Event, optional): Interrompe a exportação quando sinalizado.
+            
+        Returns:
+            dict: arquivo, url (quando destino não foi informado), linhas, bytes e segundos.
+        """
+        url = None
+        if destino is None:
+            destino, url = novo_arquivo_exportacao(formato)
+        sql = self.rollups.rewrite(query)
+        max_segundos = float(os.getenv("SQL_EXPORT_SECONDS") or EXPORT_SECONDS)
+        with self.pool.connection() as conn:
+            self.guard.verificar(conn, sql)
+            try:
+                with self.guard.limitar(conn, cancelar, max_segundos):
+                    exportacao = exportar_cursor(conn.execute(sql), formato, destino)
+            except BaseException:
+                # Não deixa um arquivo incompleto para download
+                if os.path.exists(destino):
+                    os.remove(destino)
+                raise
+        exportacao['url'] = url
+        return exportacao
+    
+    def execute_query(self, query, cancelar=None, max_rows=None, max_bytes=None):
         """
         Executa uma consulta SQL diretamente.
         
+        Agregações simples sobre Cargas são executadas nas tabelas de rollup
+        quando possível (ver rollups.py), e consultas repetidas são respondidas
+        pelo cache de resultados enquanto os dados não mudam (ver result_cache.py).
+        
+        Consultas de modificação e consultas com plano caro demais são recusadas,
+        e a execução é interrompida ao passar do orçamento de tempo (ver sql_guard.py).
+        O resultado é lido em lotes (ver iter_query) até max_rows linhas ou max_bytes
+        bytes; df.attrs traz truncated, total_rows e total_exact.
+        
         Args:
             query (str): Consulta SQL a ser executada.
+            cancelar (threading.Event, optional): Interrompe a consulta quando sinalizado.
+            max_rows (int, optional): Máximo de linhas (padrão: SQL_MAX_ROWS ou 1000).
+            max_bytes (int, optional): Máximo de bytes (padrão: SQL_MAX_RESULT_MB ou 32 MB).
             
         Returns:
             pd.DataFrame: DataFrame com os resultados da consulta.
         """
-        if not self.connect():
-            return pd.DataFrame()
+        # Verificar se a consulta é segura (não permite modificações no banco)
+        try:
+            verificar_somente_leitura(query)
+        except ConsultaBloqueada as e:
+            return pd.DataFrame({'error': [str(e)]})
+        
+        # O resultado depende dos limites: um resultado truncado não serve a um limite maior
+        tipo = f"dataframe:{max_rows or self.guard.max_linhas}:{max_bytes}"
+        df = self.results.get(query, tipo=tipo)
+        if df is not None:
+            return df
         
         try:
-            # Verificar se a consulta é segura (não permite modificações no banco)
-            query_lower = query.lower().strip()
-            if query_lower.startswith(('insert', 'update', 'delete', 'drop', 'alter', 'create')):
-                return pd.DataFrame({'error': ['Consultas de modificação não são permitidas por segurança.']})
-            
-            df = pd.read_sql_query(query, self.conn)
+            stream = self.iter_query(query, max_rows=max_rows, max_bytes=max_bytes, cancelar=cancelar)
+            chunks = list(stream)
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=stream.columns)
+            df.attrs.update(truncated=stream.truncated, total_rows=stream.total_rows,
+                            total_exact=stream.total_exact)
+            self.results.put(query, df, tipo=tipo)
             return df
+        except (ConsultaBloqueada, OrcamentoExcedido) as e:
+            return pd.DataFrame({'error': [str(e)]})
         except Exception as e:
             print(f"Erro ao executar consulta: {e}")
             return pd.DataFrame({'error': [str(e)]})
-        finally:
-            self.disconnect()
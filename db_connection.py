@@ -0,0 +1,449 @@
+"""
+Funções auxiliares para abrir o banco de dados cargas.db nas classes de consulta.
+
+As consultas só leem o banco, por isso as conexões usam um modo de serviço
+(variável de ambiente SQL_SERVING_MODE):
+    readonly   - padrão: somente leitura com travas normais, mmap e query_only;
+                 seguro enquanto uma carga incremental grava no arquivo.
+    immutable  - opcional: como readonly, mas o arquivo é tratado como imutável
+                 (sem travas nem verificação de alterações). Use apenas se o
+                 banco não for atualizado com o aplicativo em execução: uma carga
+                 (inclusive --incremental) leria páginas antigas ou incompletas
+                 sem erro. Reinicie o aplicativo após recriar ou atualizar o banco.
+    readwrite  - conexão comum, como antes.
+
+ConnectionPool mantém conexões abertas entre as chamadas de DatabaseTools.
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+# Tabelas internas do layout tipado e da carga incremental (ver create_database.py)
+# e rollups (ver rollups.py). O modelo consulta apenas Cargas; os rollups são usados pela
+# reescrita das consultas, não diretamente.
+INTERNAL_TABLE_PREFIXES = ('Cargas_Fato', 'Cargas_Hash', 'Dominio_', 'Rollup', 'Metadados')
+
+# Tabela chave/valor gravada a cada carga com a versão dos dados (ver create_database.py)
+METADATA_TABLE = 'MetadadosCarga'
+
+# Motores de execução das consultas geradas (variável de ambiente SQL_BACKEND)
+QUERY_BACKENDS = ('sqlite', 'duckdb', 'duckdb-parquet')
+
+# Modos de abertura do banco nas classes de consulta (variável SQL_SERVING_MODE)
+SERVING_MODES = ('readonly', 'immutable', 'readwrite')
+
+# PRAGMAs das conexões de leitura: leituras pelo mmap (o SQLite limita ao máximo
+# da compilação), 64 MB de cache de páginas e bloqueio de escritas
+SERVING_PRAGMAS = [
+    'PRAGMA mmap_size = 2147483648',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA query_only = ON',
+]
+
+# Tamanho padrão do pool de conexões (variável SQL_POOL_SIZE)
+DEFAULT_POOL_SIZE = 4
+
+# Instruções preparadas mantidas em cache por conexão
+CACHED_STATEMENTS = 256
+
+# Mesmo limite de SQLDatabase.run do LangChain para valores de texto no resultado
+MAX_RESULT_TEXT = 300
+
+# Linhas por lote na leitura dos resultados (variável SQL_BATCH_SIZE)
+DEFAULT_BATCH_SIZE = 1000
+
+# Memória máxima, em MB, de um resultado lido (variável SQL_MAX_RESULT_MB)
+DEFAULT_MAX_RESULT_MB = 32
+
+
+def get_serving_mode(mode=None):
+    """
+    Retorna o modo de abertura do banco.
+
+    Args:
+        mode (str, optional): Modo explícito; se omitido, usa SQL_SERVING_MODE.
+
+    Returns:
+        str: 'readonly', 'immutable' ou 'readwrite'.
+    """
+    mode = (mode or os.getenv("SQL_SERVING_MODE") or 'readonly').lower()
+    if mode not in SERVING_MODES:
+        raise ValueError(f"Modo de serviço desconhecido: {mode} (opções: {', '.join(SERVING_MODES)})")
+    return mode
+
+
+def connect_database(db_path, mode=None, check_same_thread=True, cached_statements=128):
+    """
+    Abre uma conexão sqlite3 com o banco de cargas no modo de serviço.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+        mode (str, optional): Modo de serviço (padrão: SQL_SERVING_MODE ou 'readonly').
+        check_same_thread (bool): Repassado a sqlite3.connect.
+        cached_statements (int): Tamanho do cache de instruções preparadas da conexão.
+
+    Returns:
+        sqlite3.Connection: Conexão com o banco de dados.
+    """
+    mode = get_serving_mode(mode)
+    if mode == 'readwrite':
+        return sqlite3.connect(db_path, check_same_thread=check_same_thread,
+                               cached_statements=cached_statements)
+
+    if not os.path.exists(db_path):
+        # Em modo somente leitura o SQLite não cria o arquivo; o erro fica explícito
+        raise FileNotFoundError(f"Banco de dados não encontrado: {db_path}")
+    uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+    if mode == 'immutable':
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread,
+                           cached_statements=cached_statements)
+    for pragma in SERVING_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool de conexões sqlite3 reutilizadas entre chamadas e threads.
+
+    As conexões são criadas sob demanda até o tamanho do pool e cada uma é usada
+    por uma única thread de cada vez. Ao ser retirada do pool, a conexão passa
+    por uma verificação de saúde: é descartada se o arquivo do banco foi
+    substituído ou alterado desde que foi aberta, e conexões ociosas há mais de
+    health_check_interval segundos executam SELECT 1 antes de serem reutilizadas.
+    """
+
+    def __init__(self, db_path, size=None, mode=None, timeout=30.0,
+                 health_check_interval=30.0, cached_statements=CACHED_STATEMENTS):
+        """
+        Args:
+            db_path (str): Caminho para o arquivo do banco de dados SQLite.
+            size (int, optional): Número máximo de conexões (padrão: SQL_POOL_SIZE ou 4).
+            mode (str, optional): Modo de serviço das conexões.
+            timeout (float): Segundos de espera por uma conexão livre.
+            health_check_interval (float): Ociosidade, em segundos, que exige SELECT 1.
+            cached_statements (int): Tamanho do cache de instruções preparadas por conexão.
+        """
+        self.db_path = db_path
+        self.size = size or int(os.getenv("SQL_POOL_SIZE") or DEFAULT_POOL_SIZE)
+        self.mode = mode
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()
+        self._signatures = {}
+        self._created = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        """Identifica a versão do arquivo do banco (inode, tamanho e data de modificação)."""
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _open(self):
+        signature = self._file_signature()
+        conn = connect_database(self.db_path, self.mode, check_same_thread=False,
+                                cached_statements=self.cached_statements)
+        return conn, signature
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _healthy(self, conn, signature, last_used):
+        if signature != self._file_signature():
+            return False
+        if time.monotonic() - last_used > self.health_check_interval:
+            try:
+                conn.execute('SELECT 1').fetchone()
+            except sqlite3.Error:
+                return False
+        return True
+
+    def acquire(self):
+        """
+        Retira uma conexão do pool, abrindo uma nova se houver espaço.
+
+        Returns:
+            sqlite3.Connection: Conexão pronta para uso.
+
+        Raises:
+            TimeoutError: Se nenhuma conexão ficar livre dentro do timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn, signature, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    create = self._created < self.size
+                    if create:
+                        self._created += 1
+                if create:
+                    try:
+                        conn, signature = self._open()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    self._signatures[id(conn)] = signature
+                    return conn
+                remaining = deadline - time.monotonic()
+                try:
+                    conn, signature, last_used = self._idle.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    raise TimeoutError(f"Nenhuma conexão livre no pool após {self.timeout:.0f}s "
+                                       f"(tamanho: {self.size})")
+
+            if self._healthy(conn, signature, last_used):
+                self._signatures[id(conn)] = signature
+                return conn
+            self._discard(conn)
+
+    def release(self, conn):
+        """
+        Devolve uma conexão ao pool.
+
+        Args:
+            conn (sqlite3.Connection): Conexão obtida por acquire().
+        """
+        signature = self._signatures.pop(id(conn), None)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, signature, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager que retira e devolve uma conexão do pool.
+
+        Yields:
+            sqlite3.Connection: Conexão pronta para uso.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """
+        Fecha as conexões livres; as que estão em uso são fechadas ao serem devolvidas.
+        """
+        self._closed = True
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+def list_internal_tables(db_path):
+    """
+    Lista as tabelas internas (layout tipado, carga incremental e rollups) presentes no banco.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+
+    Returns:
+        list: Nomes das tabelas internas.
+    """
+    conn = connect_database(db_path)
+    try:
+        names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    finally:
+        conn.close()
+    return [name for name in names if name.startswith(INTERNAL_TABLE_PREFIXES)]
+
+
+def get_dataset_version(db_path):
+    """
+    Retorna a versão dos dados do banco, usada para invalidar caches.
+
+    A versão é gravada pela ingestão na tabela MetadadosCarga a cada carga
+    completa ou incremental. Em bancos antigos, sem essa tabela, usa o
+    tamanho e a data de modificação do arquivo.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+
+    Returns:
+        str: Identificador da versão dos dados.
+    """
+    try:
+        conn = connect_database(db_path)
+        try:
+            row = conn.execute(f"SELECT valor FROM {METADATA_TABLE} WHERE chave = 'versao'").fetchone()
+        finally:
+            conn.close()
+        if row:
+            return str(row[0])
+    except sqlite3.Error:
+        pass
+    except FileNotFoundError:
+        return 'ausente'
+    stat = os.stat(db_path)
+    return f"arquivo-{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def format_result(rows):
+    """
+    Formata as linhas de uma consulta como SQLDatabase.run do LangChain.
+
+    Args:
+        rows (list): Linhas do resultado.
+
+    Returns:
+        str: Lista de tuplas como texto, ou "" se não houver linhas.
+    """
+    if not rows:
+        return ""
+    rows = [tuple(value[:MAX_RESULT_TEXT] + '...'
+                  if isinstance(value, str) and len(value) > MAX_RESULT_TEXT else value
+                  for value in row)
+            for row in rows]
+    return str(rows)
+
+
+def row_size(row):
+    """Estima a memória ocupada por uma linha do resultado, em bytes."""
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row) + 8 * len(row)
+
+
+class BatchReader:
+    """
+    Lê o resultado de um cursor em lotes de tamanho fixo, dentro de um orçamento
+    de linhas e de bytes.
+
+    A leitura para ao atingir max_rows linhas ou max_bytes bytes estimados
+    (ver row_size); nesse caso, truncated indica que havia mais linhas. Para
+    detectar o excesso de linhas, a consulta deve retornar até max_rows + 1 linhas.
+    """
+
+    def __init__(self, cursor, batch_size=None, max_rows=None, max_bytes=None):
+        """
+        Args:
+            cursor (sqlite3.Cursor): Cursor com a consulta já executada.
+            batch_size (int, optional): Linhas por lote (padrão: SQL_BATCH_SIZE ou 1000).
+            max_rows (int, optional): Máximo de linhas lidas (padrão: sem limite).
+            max_bytes (int, optional): Máximo de bytes lidos
+                                       (padrão: SQL_MAX_RESULT_MB ou 32 MB).
+        """
+        self.cursor = cursor
+        self.batch_size = batch_size or int(os.getenv("SQL_BATCH_SIZE") or DEFAULT_BATCH_SIZE)
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes or int(float(os.getenv("SQL_MAX_RESULT_MB") or DEFAULT_MAX_RESULT_MB) * 2**20)
+        self.columns = [col[0] for col in cursor.description or []]
+        self.rows = 0
+        self.bytes = 0
+        self.truncated = False
+
+    def __iter__(self):
+        while True:
+            size = self.batch_size
+            if self.max_rows is not None:
+                size = min(size, self.max_rows - self.rows)
+                if size <= 0:
+                    # Uma linha além do orçamento indica que o resultado foi truncado
+                    self.truncated = self.cursor.fetchone() is not None
+                    return
+            batch = self.cursor.fetchmany(size)
+            if not batch:
+                return
+            for position, row in enumerate(batch):
+                self.bytes += row_size(row)
+                if self.bytes > self.max_bytes:
+                    self.truncated = True
+                    batch = batch[:position]
+                    break
+            self.rows += len(batch)
+            if batch:
+                yield batch
+            if self.truncated:
+                return
+
+    def fetch(self):
+        """
+        Lê todos os lotes dentro do orçamento.
+
+        Returns:
+            list: Linhas lidas.
+        """
+        return [row for batch in self for row in batch]
+
+
+def create_sql_database(db_path):
+    """
+    Cria o SQLDatabase do LangChain para o banco de cargas.
+
+    O suporte a views é habilitado para que a view Cargas do layout tipado
+    apareça no esquema enviado ao modelo, e as tabelas internas desse layout
+    são omitidas. As conexões do SQLAlchemy são criadas por connect_database,
+    no modo de serviço configurado. As tabelas só são refletidas quando o
+    esquema é pedido (get_table_info), o que não acontece quando o contexto
+    vem do cache em disco (ver prompt_cache.py).
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+
+    Returns:
+        SQLDatabase: Conexão do LangChain com o banco de dados.
+    """
+    from langchain_community.utilities.sql_database import SQLDatabase
+
+    return SQLDatabase.from_uri(
+        f"sqlite:///{db_path}",
+        engine_args={"creator": lambda: connect_database(db_path, check_same_thread=False)},
+        view_support=True,
+        ignore_tables=list_internal_tables(db_path) or None,
+        lazy_table_reflection=True
+    )
+
+
+def create_query_engine(db_path, backend=None):
+    """
+    Cria o motor que executa as consultas geradas, conforme o backend escolhido.
+
+    O backend vem do argumento ou da variável de ambiente SQL_BACKEND:
+    'sqlite' (padrão), 'duckdb' (DuckDB sobre o arquivo SQLite) ou
+    'duckdb-parquet' (DuckDB sobre a exportação Parquet, ver duckdb_backend.py).
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+        backend (str, optional): Nome do backend.
+
+    Returns:
+        DuckDBEngine: Motor DuckDB, ou None para executar no próprio SQLite.
+    """
+    backend = (backend or os.getenv("SQL_BACKEND") or 'sqlite').lower()
+    if backend not in QUERY_BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend} (opções: {', '.join(QUERY_BACKENDS)})")
+    if backend == 'sqlite':
+        return None
+
+    from duckdb_backend import DuckDBEngine
+
+    return DuckDBEngine(db_path, fonte='parquet' if backend == 'duckdb-parquet' else 'sqlite')
@@ -0,0 +1,480 @@
+"""
+Backend analítico DuckDB para executar o SQL gerado pelo modelo.
+
+O prompt ensina o dialeto do SQLite; traduzir_sql converte as construções que
+têm comportamento diferente no DuckDB (strftime com argumentos invertidos, LIKE
+sem distinção de maiúsculas, strings entre aspas duplas, TOTAL, IIF, MAX/MIN
+escalares, CAST para REAL/INTEGER) e rejeita as que não têm equivalente, como
+julianday ou modificadores de data. Nesses casos, e em qualquer erro do DuckDB,
+as classes de consulta executam a consulta no SQLite.
+
+Fontes de dados:
+    sqlite   - o arquivo cargas.db é anexado pela extensão sqlite do DuckDB.
+    parquet  - Cargas (já decodificada no layout tipado), as tabelas de
+               mapeamento e os rollups são exportados para arquivos Parquet.
+
+Uso:
+    python duckdb_backend.py --exportar                     # exporta cargas.db para Parquet
+    python duckdb_backend.py --benchmark                    # compara SQLite e DuckDB nas consultas de exemplo
+    python duckdb_backend.py --benchmark --log consultas.sql --fonte parquet
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+import pandas as pd
+from db_connection import INTERNAL_TABLE_PREFIXES, format_result
+from sql_guard import OrcamentoExcedido
+from rollups import tokenizar_sql, nome_identificador
+
+# Tabelas internas do layout tipado e da carga incremental, não exportadas para
+# Parquet (os rollups são exportados para que a reescrita continue funcionando)
+TABELAS_NAO_EXPORTADAS = tuple(p for p in INTERNAL_TABLE_PREFIXES if not p.startswith('Rollup'))
+
+# Funções do SQLite sem equivalente direto no DuckDB
+FUNCOES_NAO_SUPORTADAS = {'JULIANDAY', 'UNIXEPOCH', 'TIME', 'ZEROBLOB', 'RANDOMBLOB',
+                          'LIKELIHOOD', 'LIKELY', 'UNLIKELY', 'SQLITE_VERSION'}
+
+# Tipos do CAST com tamanhos diferentes no DuckDB (REAL é float32, INTEGER é int32)
+TIPOS_CAST = {'REAL': 'DOUBLE', 'FLOAT': 'DOUBLE', 'INTEGER': 'BIGINT', 'INT': 'BIGINT'}
+
+# Tipos declarados no SQLite -> tipos das colunas exportadas
+TIPOS_PARQUET = {'INTEGER': 'BIGINT', 'INT': 'BIGINT', 'REAL': 'DOUBLE', 'TEXT': 'VARCHAR'}
+
+
+class DialetoNaoSuportado(ValueError):
+    """Consulta com construção do SQLite que não pode ser executada no DuckDB."""
+
+
+def _fechamento(tokens, i_abre):
+    """Retorna o índice do ')' que fecha o '(' em tokens[i_abre]."""
+    profundidade = 0
+    for j in range(i_abre, len(tokens)):
+        if tokens[j][1] == '(':
+            profundidade += 1
+        elif tokens[j][1] == ')':
+            profundidade -= 1
+            if profundidade == 0:
+                return j
+    raise DialetoNaoSuportado("Parênteses não balanceados")
+
+
+def _argumentos(tokens, i_abre, i_fecha):
+    """Divide os tokens entre parênteses em intervalos (início, fim) por argumento."""
+    argumentos = []
+    inicio = i_abre + 1
+    profundidade = 0
+    for j in range(i_abre + 1, i_fecha):
+        if tokens[j][1] == '(':
+            profundidade += 1
+        elif tokens[j][1] == ')':
+            profundidade -= 1
+        elif tokens[j][1] == ',' and profundidade == 0:
+            argumentos.append((inicio, j))
+            inicio = j + 1
+    if inicio < i_fecha:
+        argumentos.append((inicio, i_fecha))
+    return argumentos
+
+
+def _traduzir(sql, tokens, inicio, fim, colunas, avisos):
+    """Traduz tokens[inicio:fim] para o dialeto do DuckDB, preservando os espaços."""
+    partes = []
+    posicao = tokens[inicio][2] if inicio < fim else 0
+    i = inicio
+    while i < fim:
+        tipo, texto, ini, fim_token = tokens[i]
+        partes.append(sql[posicao:ini])
+        maiusculo = texto.upper()
+        anterior = tokens[i - 1][1].upper() if i > inicio else ''
+        chamada = tipo == 'ident' and i + 1 < fim and tokens[i + 1][1] == '('
+
+        if chamada:
+            i_fecha = _fechamento(tokens, i + 1)
+            args = [_traduzir(sql, tokens, a, b, colunas, avisos)
+                    for a, b in _argumentos(tokens, i + 1, i_fecha)]
+            literais = [sql[tokens[a][2]:tokens[b - 1][3]] for a, b in _argumentos(tokens, i + 1, i_fecha)]
+            traducao = None
+
+            if maiusculo in FUNCOES_NAO_SUPORTADAS:
+                raise DialetoNaoSuportado(f"Função {texto}() não tem equivalente no DuckDB")
+            elif maiusculo == 'STRFTIME':
+                if len(args) != 2:
+                    raise DialetoNaoSuportado("strftime() com modificadores de data não é suportado")
+                valor = 'current_timestamp' if literais[1].lower() == "'now'" else f'TRY_CAST({args[1]} AS TIMESTAMP)'
+                traducao = f'strftime({valor}, {args[0]})'
+            elif maiusculo in ('DATE', 'DATETIME') and anterior != 'AS':
+                if literais != ["'now'"]:
+                    raise DialetoNaoSuportado(f"{texto}() só é suportado com o argumento 'now'")
+                traducao = ("strftime(current_date, '%Y-%m-%d')" if maiusculo == 'DATE'
+                            else "strftime(current_timestamp, '%Y-%m-%d %H:%M:%S')")
+            elif maiusculo == 'TOTAL' and len(args) == 1:
+                traducao = f'COALESCE(CAST(SUM({args[0]}) AS DOUBLE), 0.0)'
+            elif maiusculo == 'IIF' and len(args) == 3:
+                traducao = f'CASE WHEN {args[0]} THEN {args[1]} ELSE {args[2]} END'
+            elif maiusculo in ('MAX', 'MIN') and len(args) > 1:
+                traducao = f'{"GREATEST" if maiusculo == "MAX" else "LEAST"}({", ".join(args)})'
+            elif maiusculo == 'CHAR' and len(args) == 1:
+                traducao = f'chr({args[0]})'
+            elif maiusculo == 'TYPEOF':
+                avisos.append("typeof() retorna nomes de tipo diferentes no DuckDB")
+
+            if traducao is None:
+                traducao = f'{texto}({", ".join(args)})'
+            partes.append(traducao)
+            posicao = tokens[i_fecha][3]
+            i = i_fecha + 1
+            continue
+
+        if tipo == 'ident' and maiusculo == 'LIKE':
+            # LIKE do SQLite não diferencia maiúsculas e minúsculas (ASCII)
+            partes.append('ILIKE')
+        elif tipo == 'ident' and maiusculo in TIPOS_CAST and anterior == 'AS':
+            partes.append(TIPOS_CAST[maiusculo])
+        elif (tipo == 'quoted' and colunas is not None and anterior != 'AS'
+              and nome_identificador(tokens[i]).lower() not in colunas):
+            # O SQLite aceita strings entre aspas duplas quando não há coluna com o nome
+            partes.append("'" + nome_identificador(tokens[i]).replace("'", "''") + "'")
+        else:
+            if texto == '/':
+                avisos.append("Divisão: o SQLite trunca a divisão entre inteiros, o DuckDB não")
+            partes.append(texto)
+        posicao = fim_token
+        i += 1
+    return ''.join(partes)
+
+
+def traduzir_sql(sql, colunas=None):
+    """
+    Traduz uma consulta do dialeto do SQLite para o DuckDB.
+
+    Args:
+        sql (str): Consulta no dialeto do SQLite.
+        colunas (iterable, optional): Colunas conhecidas; strings entre aspas duplas
+            que não são colunas viram literais entre aspas simples.
+
+    Returns:
+        tuple: (consulta traduzida, lista de avisos sobre diferenças de comportamento)
+
+    Raises:
+        DialetoNaoSuportado: Se a consulta usa construções sem equivalente no DuckDB.
+    """
+    sql = sql.strip().rstrip(';')
+    tokens = tokenizar_sql(sql)
+    if colunas is not None:
+        # Aliases definidos na consulta também são identificadores válidos
+        aliases = [nome_identificador(tokens[i + 1]) for i in range(len(tokens) - 1)
+                   if tokens[i][1].upper() == 'AS' and tokens[i + 1][0] in ('ident', 'quoted')]
+        colunas = {c.lower() for c in list(colunas) + aliases}
+    avisos = []
+    traduzido = _traduzir(sql, tokens, 0, len(tokens), colunas, avisos)
+    return traduzido, list(dict.fromkeys(avisos))
+
+
+def tabelas_exportaveis(conn):
+    """
+    Lista as tabelas e views exportadas para Parquet.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+
+    Returns:
+        list: Nomes das tabelas e views.
+    """
+    return [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'")
+        if not name.startswith(TABELAS_NAO_EXPORTADAS)]
+
+
+def pasta_parquet_padrao(db_path):
+    """Pasta padrão da exportação Parquet: <banco>_parquet ao lado do arquivo."""
+    return os.path.splitext(db_path)[0] + '_parquet'
+
+
+def exportar_parquet(db_path, pasta=None, chunksize=200000):
+    """
+    Exporta Cargas, as tabelas de mapeamento e os rollups para arquivos Parquet.
+
+    As tabelas são lidas em chunks e os tipos das colunas seguem os tipos
+    declarados no SQLite, de modo que as comparações do SQL gerado (ex: Ano = '2023'
+    no layout texto) se comportam como no banco original.
+
+    Args:
+        db_path (str): Caminho do banco de dados SQLite.
+        pasta (str, optional): Pasta de destino (padrão: <banco>_parquet).
+        chunksize (int): Linhas lidas por chunk.
+
+    Returns:
+        dict: Nome da tabela -> número de linhas exportadas.
+    """
+    import duckdb
+
+    pasta = pasta or pasta_parquet_padrao(db_path)
+    os.makedirs(pasta, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    duck = duckdb.connect()
+    exportadas = {}
+    try:
+        for tabela in tabelas_exportaveis(conn):
+            colunas = [(row[1], TIPOS_PARQUET.get(row[2].upper(), 'VARCHAR'))
+                       for row in conn.execute(f'PRAGMA table_info("{tabela}")')]
+            duck.execute('DROP TABLE IF EXISTS exportacao')
+            duck.execute('CREATE TABLE exportacao (' +
+                         ', '.join(f'"{nome}" {tipo}' for nome, tipo in colunas) + ')')
+            total = 0
+            for chunk in pd.read_sql_query(f'SELECT * FROM "{tabela}"', conn, chunksize=chunksize):
+                duck.register('chunk', chunk)
+                duck.execute('INSERT INTO exportacao SELECT * FROM chunk')
+                duck.unregister('chunk')
+                total += len(chunk)
+            destino = os.path.join(pasta, f'{tabela}.parquet')
+            duck.execute(f"COPY exportacao TO '{destino}' (FORMAT parquet, COMPRESSION zstd)")
+            exportadas[tabela] = total
+            print(f"Exportada {tabela}: {total} linhas -> {destino}")
+    finally:
+        duck.close()
+        conn.close()
+    return exportadas
+
+
+class DuckDBEngine:
+    """
+    Executa as consultas geradas no DuckDB, sobre o arquivo SQLite ou sobre Parquet.
+    """
+
+    def __init__(self, db_path, fonte='sqlite', pasta_parquet=None):
+        """
+        Args:
+            db_path (str): Caminho para o arquivo do banco de dados SQLite.
+            fonte (str): 'sqlite' (anexa o arquivo) ou 'parquet' (usa a exportação Parquet).
+            pasta_parquet (str, optional): Pasta da exportação Parquet (padrão: <banco>_parquet).
+        """
+        import duckdb
+
+        self.db_path = db_path
+        self.fonte = fonte
+        self.conn = duckdb.connect()
+        # O SQLite ordena NULL como o menor valor
+        self.conn.execute("SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+
+        if fonte == 'sqlite':
+            self.conn.execute('INSTALL sqlite')
+            self.conn.execute('LOAD sqlite')
+            self.conn.execute(f"ATTACH '{db_path}' AS cargas (TYPE sqlite, READ_ONLY)")
+            self.conn.execute('USE cargas')
+        elif fonte == 'parquet':
+            pasta = pasta_parquet or pasta_parquet_padrao(db_path)
+            arquivo_cargas = os.path.join(pasta, 'Cargas.parquet')
+            if (not os.path.exists(arquivo_cargas)
+                    or os.path.getmtime(arquivo_cargas) < os.path.getmtime(db_path)):
+                print("Exportação Parquet ausente ou desatualizada; exportando...")
+                exportar_parquet(db_path, pasta)
+            for arquivo in sorted(os.listdir(pasta)):
+                if arquivo.endswith('.parquet'):
+                    tabela = arquivo[:-len('.parquet')]
+                    caminho = os.path.join(pasta, arquivo)
+                    self.conn.execute(f"CREATE VIEW \"{tabela}\" AS SELECT * FROM read_parquet('{caminho}')")
+        else:
+            raise ValueError(f"Fonte de dados desconhecida para o DuckDB: {fonte}")
+
+        self.colunas = {row[0] for row in self.conn.execute(
+            'SELECT DISTINCT column_name FROM duckdb_columns() WHERE database_name = current_database()'
+        ).fetchall()}
+
+    def execute(self, sql, max_segundos=None):
+        """
+        Traduz e executa uma consulta.
+
+        Args:
+            sql (str): Consulta no dialeto do SQLite.
+            max_segundos (float, optional): Tempo limite; a consulta é interrompida ao passar dele.
+
+        Returns:
+            tuple: (nomes das colunas, lista de tuplas)
+
+        Raises:
+            DialetoNaoSuportado: Se a consulta não puder ser traduzida.
+            OrcamentoExcedido: Se a consulta foi interrompida pelo tempo limite.
+        """
+        traduzido, _ = traduzir_sql(sql, self.colunas)
+        # Cada chamada usa seu próprio cursor, o que permite uso por várias threads
+        cursor = self.conn.cursor()
+        # O DuckDB não tem o progress handler do SQLite: um timer interrompe o cursor
+        interrompida = threading.Event()
+
+        def interromper():
+            interrompida.set()
+            cursor.interrupt()
+
+        timer = threading.Timer(max_segundos, interromper) if max_segundos else None
+        try:
+            if timer:
+                timer.start()
+            cursor.execute(traduzido)
+            colunas = [d[0] for d in cursor.description] if cursor.description else []
+            return colunas, cursor.fetchall()
+        except Exception as e:
+            if interrompida.is_set():
+                raise OrcamentoExcedido(f"Consulta interrompida: tempo limite de {max_segundos:g} s excedido.") from e
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+            cursor.close()
+
+    def run(self, sql, max_segundos=None):
+        """
+        Executa a consulta e formata o resultado como SQLDatabase.run do LangChain.
+
+        Args:
+            sql (str): Consulta no dialeto do SQLite.
+            max_segundos (float, optional): Tempo limite da consulta.
+
+        Returns:
+            str: Resultado da consulta.
+        """
+        _, linhas = self.execute(sql, max_segundos)
+        return format_result(linhas)
+
+
+def _equivalentes(a, b, tolerancia=1e-9):
+    """Compara dois resultados, tolerando diferenças de arredondamento em ponto flutuante."""
+    if len(a) != len(b):
+        return False
+    for linha_a, linha_b in zip(a, b):
+        if len(linha_a) != len(linha_b):
+            return False
+        for x, y in zip(linha_a, linha_b):
+            if isinstance(x, (int, float)) and isinstance(y, (int, float)) and not isinstance(x, bool):
+                if abs(float(x) - float(y)) > tolerancia * max(1.0, abs(float(x)), abs(float(y))):
+                    return False
+            elif x != y and str(x) != str(y):
+                return False
+    return True
+
+
+def _medir(executar, repeticoes):
+    """Executa uma função várias vezes e retorna (melhor tempo em ms, último resultado)."""
+    melhor = float('inf')
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = executar()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000, resultado
+
+
+def benchmark(db_path, consultas, fontes=('sqlite',), repeticoes=3):
+    """
+    Compara o tempo de execução das consultas no SQLite e no DuckDB.
+
+    As consultas são executadas sem a reescrita para rollups, para comparar os
+    motores sobre a tabela Cargas. Os resultados são conferidos entre os motores.
+
+    Args:
+        db_path (str): Caminho do banco de dados SQLite.
+        consultas (list): Consultas no dialeto do SQLite.
+        fontes (iterable): Fontes do DuckDB a comparar ('sqlite' e/ou 'parquet').
+        repeticoes (int): Execuções por consulta (vale o melhor tempo).
+
+    Returns:
+        list: Um dicionário por consulta com os tempos em ms por motor e avisos.
+    """
+    conn = sqlite3.connect(db_path)
+    motores = {}
+    for fonte in fontes:
+        try:
+            motores[f'duckdb-{fonte}'] = DuckDBEngine(db_path, fonte=fonte)
+        except Exception as e:
+            print(f"Erro ao iniciar DuckDB ({fonte}): {e}")
+
+    resultados = []
+    for sql in consultas:
+        item = {'sql': ' '.join(sql.split()), 'tempos': {}, 'avisos': []}
+        try:
+            item['tempos']['sqlite'], esperado = _medir(lambda: conn.execute(sql).fetchall(), repeticoes)
+        except sqlite3.Error as e:
+            item['avisos'].append(f"Erro no SQLite: {e}")
+            resultados.append(item)
+            continue
+
+        for nome, motor in motores.items():
+            try:
+                item['avisos'].extend(traduzir_sql(sql, motor.colunas)[1])
+                tempo, (_, obtido) = _medir(lambda: motor.execute(sql), repeticoes)
+                item['tempos'][nome] = tempo
+                # Sem ORDER BY, a ordem das linhas pode diferir entre os motores
+                if 'ORDER' not in sql.upper():
+                    esperado, obtido = sorted(esperado, key=repr), sorted(obtido, key=repr)
+                if not _equivalentes(esperado, obtido):
+                    item['avisos'].append(f"Resultado diferente no {nome}")
+            except Exception as e:
+                item['avisos'].append(f"Erro no {nome}: {e}")
+        item['avisos'] = list(dict.fromkeys(item['avisos']))
+        resultados.append(item)
+
+    conn.close()
+    return resultados
+
+
+def imprimir_benchmark(resultados):
+    """
+    Exibe o relatório do benchmark.
+
+    Args:
+        resultados (list): Resultado de benchmark().
+    """
+    motores = sorted({nome for item in resultados for nome in item['tempos']},
+                     key=lambda nome: (nome != 'sqlite', nome))
+    totais = dict.fromkeys(motores, 0.0)
+    for i, item in enumerate(resultados, 1):
+        print(f"\n{i}. {item['sql'][:120]}")
+        for nome in motores:
+            if nome in item['tempos']:
+                tempo = item['tempos'][nome]
+                totais[nome] += tempo
+                ganho = ''
+                if nome != 'sqlite' and 'sqlite' in item['tempos'] and tempo > 0:
+                    ganho = f" ({item['tempos']['sqlite'] / tempo:.1f}x)"
+                print(f"   {nome:16s} {tempo:10.2f} ms{ganho}")
+        for aviso in item['avisos']:
+            print(f"   ! {aviso}")
+
+    print("\nTotal:")
+    for nome in motores:
+        print(f"   {nome:16s} {totais[nome]:10.2f} ms")
+
+
+def main(argv=None):
+    from index_advisor import CONSULTAS_EXEMPLO, carregar_consultas
+
+    parser = argparse.ArgumentParser(description="Backend DuckDB: exportação Parquet e benchmark contra o SQLite.")
+    parser.add_argument('--db', default=os.path.join(os.getcwd(), 'cargas.db'),
+                        help='Caminho do banco de dados SQLite.')
+    parser.add_argument('--exportar', action='store_true', help='Exporta o banco para Parquet.')
+    parser.add_argument('--pasta', default=None, help='Pasta da exportação Parquet (padrão: <banco>_parquet).')
+    parser.add_argument('--benchmark', action='store_true', help='Compara SQLite e DuckDB.')
+    parser.add_argument('--fonte', choices=['sqlite', 'parquet', 'ambas'], default='ambas',
+                        help='Fonte de dados do DuckDB no benchmark.')
+    parser.add_argument('--log', default=None,
+                        help='Arquivo .sql ou .jsonl com as consultas (padrão: exemplos do prompt).')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Execuções por consulta.')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Banco de dados não encontrado: {args.db}")
+        sys.exit(1)
+
+    if args.exportar:
+        exportar_parquet(args.db, args.pasta)
+    if args.benchmark:
+        consultas = carregar_consultas(args.log) if args.log else CONSULTAS_EXEMPLO
+        fontes = ['sqlite', 'parquet'] if args.fonte == 'ambas' else [args.fonte]
+        imprimir_benchmark(benchmark(args.db, consultas, fontes, args.repeticoes))
+
+
+if __name__ == '__main__':
+    main()
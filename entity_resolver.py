@@ -0,0 +1,359 @@
+"""
+Resolução local de portos, países e mercadorias citados nas perguntas.
+
+Os nomes das tabelas Portos, PaisesOrigem, PaisesDestino e CDMercadoria são
+compilados em um autômato Aho-Corasick sobre o texto normalizado (sem acentos e
+em minúsculas). Cada pergunta é percorrida uma única vez e as menções
+encontradas viram conjuntos exatos de códigos, enviados ao modelo para que o
+SQL use predicados IN (...) sobre colunas indexadas em vez de LIKE '%...%'.
+
+Regras de desambiguação:
+    - menções sobrepostas: vence a mais longa ("salinas rio grande do norte" antes de "rio grande");
+    - nome de país e de porto estrangeiro iguais ("China"): vale o país;
+    - nome de porto brasileiro e estrangeiro iguais ("Vitória"): vale o brasileiro;
+    - um porto brasileiro inclui os terminais da mesma UF (código BR + UF + número)
+      cujo nome termina com a menção ("Santos" -> BRSSZ e BRSP008, DP World Santos),
+      mas não bacias, plataformas ou terminais de outros estados ("Balsa Vitória", PA);
+    - nomes de porto que são palavras comuns ("Porto", "Rio", "Santo") são ignorados.
+
+Uso:
+    python entity_resolver.py "Quanto foi embarcado em Santos para a China em 2023?"
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+import unicodedata
+from collections import deque, defaultdict
+
+# Colunas da tabela Cargas filtradas por cada tipo de entidade
+COLUNAS_ENTIDADE = {
+    'porto': ('Origem', 'Destino'),
+    'pais': ('Pais_Origem', 'Pais_Destino'),
+    'mercadoria': ('CDMercadoria',),
+}
+
+# Rótulos usados no prompt
+ROTULOS_ENTIDADE = {'porto': 'Porto', 'pais': 'País', 'mercadoria': 'Mercadoria'}
+
+# Nomes de porto que coincidem com palavras comuns das perguntas
+NOMES_IGNORADOS = {
+    'porto', 'portos', 'rio', 'sul', 'norte', 'santo', 'santa', 'sao', 'cabo', 'ilha', 'ponta',
+    'barra', 'terminal', 'carga', 'cargas', 'total', 'media', 'mar', 'lago', 'base', 'centro',
+    'granel', 'geral', 'volume', 'ano', 'mes', 'navegacao', 'interior', 'longo', 'curso',
+}
+
+# Tamanho mínimo de um nome para virar padrão
+TAMANHO_MINIMO = 4
+
+# Terminais brasileiros: o código traz a UF ("BRSP008" fica em SP)
+CODIGO_TERMINAL = re.compile(r'BR([A-Z]{2})\d{3}')
+
+# UF dos portos públicos (códigos UN/LOCODE, sem a UF), usada para incluir os terminais
+# do mesmo porto; portos fora da lista não são expandidos
+UF_PORTOS = {
+    'BRANT': 'PR', 'BRARB': 'BA', 'BRARE': 'RN', 'BRBEL': 'PA', 'BRBVM': 'BA', 'BRCAW': 'RJ',
+    'BRCBO': 'SP', 'BRCDO': 'PB', 'BRCIZ': 'AM', 'BRCMG': 'MS', 'BRFEN': 'PE', 'BRFOR': 'CE',
+    'BRGUA': 'RN', 'BRIBB': 'SC', 'BRIGI': 'RJ', 'BRIOS': 'BA', 'BRIQI': 'MA', 'BRITA': 'AM',
+    'BRITB': 'PA', 'BRITC': 'AM', 'BRITJ': 'SC', 'BRJOI': 'SC', 'BRJUR': 'PA', 'BRLDR': 'MS',
+    'BRMAO': 'AM', 'BRMCP': 'AP', 'BRMCU': 'RN', 'BRMCZ': 'AL', 'BRMEA': 'RJ', 'BRNAT': 'RN',
+    'BRNTR': 'RJ', 'BRNVT': 'SC', 'BRPEO': 'SP', 'BRPET': 'RS', 'BRPNG': 'PR', 'BRPNS': 'SP',
+    'BRPOA': 'RS', 'BRPVH': 'RO', 'BRQDO': 'PA', 'BRQNS': 'RS', 'BRRCH': 'ES', 'BRREC': 'PE',
+    'BRRIG': 'RS', 'BRRIO': 'RJ', 'BRSAO': 'SP', 'BRSFS': 'SC', 'BRSOS': 'GO', 'BRSSA': 'BA',
+    'BRSSO': 'SP', 'BRSSZ': 'SP', 'BRSTM': 'PA', 'BRSUA': 'PE', 'BRTBT': 'AM', 'BRTMT': 'PA',
+    'BRVDC': 'PA', 'BRVIX': 'ES',
+}
+
+
+def uf_porto(codigo):
+    """
+    Retorna a UF de um porto ou terminal brasileiro.
+
+    Args:
+        codigo (str): Código do porto.
+
+    Returns:
+        str: Sigla da UF, ou None se não for conhecida.
+    """
+    codigo = str(codigo)
+    terminal = CODIGO_TERMINAL.fullmatch(codigo)
+    return terminal.group(1) if terminal else UF_PORTOS.get(codigo)
+
+
+def normalizar(texto):
+    """
+    Remove acentos, converte para minúsculas e troca pontuação por espaços.
+
+    Args:
+        texto (str): Texto original.
+
+    Returns:
+        str: Texto normalizado, com palavras separadas por um espaço.
+    """
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+    return ' '.join(re.findall(r'[a-z0-9]+', texto))
+
+
+def segmentos_descricao(descricao):
+    """
+    Divide a descrição de uma mercadoria em partes pesquisáveis.
+
+    "Bebidas, Líquidos Alcoólicos e Vinagres" -> descrição completa, "bebidas",
+    "liquidos alcoolicos", "vinagres".
+
+    Args:
+        descricao (str): Descrição da tabela CDMercadoria.
+
+    Returns:
+        set: Partes normalizadas.
+    """
+    partes = {normalizar(descricao)}
+    for parte in re.split(r'[,;()]| e ', str(descricao)):
+        parte = normalizar(parte)
+        if len(parte) >= 5 and parte not in NOMES_IGNORADOS:
+            partes.add(parte)
+    return partes
+
+
+class AhoCorasick:
+    """
+    Autômato de Aho-Corasick para busca simultânea de vários padrões.
+    """
+
+    def __init__(self, padroes):
+        """
+        Args:
+            padroes (iterable): Textos dos padrões (já normalizados).
+        """
+        self.transicoes = [{}]
+        self.falhas = [0]
+        self.saidas = [[]]
+        self.padroes = []
+        for padrao in padroes:
+            no = 0
+            for caractere in padrao:
+                proximo = self.transicoes[no].get(caractere)
+                if proximo is None:
+                    proximo = len(self.transicoes)
+                    self.transicoes[no][caractere] = proximo
+                    self.transicoes.append({})
+                    self.falhas.append(0)
+                    self.saidas.append([])
+                no = proximo
+            self.saidas[no].append(len(self.padroes))
+            self.padroes.append(padrao)
+
+        # Ligações de falha em largura; as saídas herdam as do nó de falha
+        fila = deque(self.transicoes[0].values())
+        while fila:
+            no = fila.popleft()
+            for caractere, filho in self.transicoes[no].items():
+                fila.append(filho)
+                falha = self.falhas[no]
+                while falha and caractere not in self.transicoes[falha]:
+                    falha = self.falhas[falha]
+                self.falhas[filho] = self.transicoes[falha].get(caractere, 0)
+                self.saidas[filho] = self.saidas[filho] + self.saidas[self.falhas[filho]]
+
+    def buscar(self, texto):
+        """
+        Encontra todas as ocorrências dos padrões no texto.
+
+        Args:
+            texto (str): Texto normalizado.
+
+        Returns:
+            list: Tuplas (início, fim, índice do padrão).
+        """
+        ocorrencias = []
+        no = 0
+        transicoes, falhas, saidas, padroes = self.transicoes, self.falhas, self.saidas, self.padroes
+        for posicao, caractere in enumerate(texto):
+            while no and caractere not in transicoes[no]:
+                no = falhas[no]
+            no = transicoes[no].get(caractere, 0)
+            for indice in saidas[no]:
+                ocorrencias.append((posicao + 1 - len(padroes[indice]), posicao + 1, indice))
+        return ocorrencias
+
+
+class EntityResolver:
+    """
+    Resolve menções a portos, países e mercadorias em conjuntos de códigos.
+    """
+
+    def __init__(self, metadata, expandir_terminais=True):
+        """
+        Args:
+            metadata (dict): Metadados com as categorias portos, paises_origem,
+                paises_destino e mercadorias (ver _load_metadata).
+            expandir_terminais (bool): Inclui os terminais da mesma UF cujo nome termina com a menção.
+        """
+        entradas = defaultdict(lambda: defaultdict(set))
+
+        terminais = []
+        for codigo, nome in metadata.get('portos', {}).items():
+            nome_normalizado = normalizar(nome)
+            if len(nome_normalizado) >= TAMANHO_MINIMO and nome_normalizado not in NOMES_IGNORADOS:
+                entradas[nome_normalizado]['porto'].add(codigo)
+            if CODIGO_TERMINAL.fullmatch(str(codigo)):
+                terminais.append((' ' + nome_normalizado, codigo))
+
+        # As colunas Pais_Origem/Pais_Destino guardam o nome do país
+        for categoria in ('paises_origem', 'paises_destino'):
+            for nome in set(metadata.get(categoria, {}).values()):
+                nome_normalizado = normalizar(nome)
+                if len(nome_normalizado) >= TAMANHO_MINIMO:
+                    entradas[nome_normalizado]['pais'].add(nome)
+
+        for codigo, descricao in metadata.get('mercadorias', {}).items():
+            for parte in segmentos_descricao(descricao):
+                entradas[parte]['mercadoria'].add(codigo)
+
+        self.entradas = {}
+        for padrao, por_tipo in entradas.items():
+            por_tipo = dict(por_tipo)
+            if 'porto' in por_tipo:
+                brasileiros = {c for c in por_tipo['porto'] if str(c).startswith('BR')}
+                if brasileiros:
+                    por_tipo['porto'] = brasileiros
+                elif 'pais' in por_tipo:
+                    del por_tipo['porto']
+            if expandir_terminais and 'porto' in por_tipo:
+                chave = ' ' + padrao
+                ufs = {uf_porto(c) for c in por_tipo['porto']} - {None}
+                por_tipo['porto'] |= {codigo for nome, codigo in terminais
+                                      if nome.endswith(chave) and uf_porto(codigo) in ufs}
+            self.entradas[padrao] = {tipo: tuple(sorted(codigos)) for tipo, codigos in por_tipo.items()}
+        self.automato = AhoCorasick(self.entradas)
+
+    def resolver(self, pergunta):
+        """
+        Encontra as entidades citadas na pergunta.
+
+        Args:
+            pergunta (str): Pergunta em linguagem natural.
+
+        Returns:
+            list: Dicionários com tipo, termo, codigos e colunas, na ordem em que aparecem.
+        """
+        texto = normalizar(pergunta)
+        ocorrencias = [(inicio, fim, indice) for inicio, fim, indice in self.automato.buscar(texto)
+                       if (inicio == 0 or texto[inicio - 1] == ' ') and (fim == len(texto) or texto[fim] == ' ')]
+
+        # Menções mais longas primeiro; as sobrepostas a uma já aceita são descartadas
+        ocorrencias.sort(key=lambda o: (o[0] - o[1], o[0]))
+        ocupado = []
+        aceitas = []
+        for inicio, fim, indice in ocorrencias:
+            if any(inicio < f and i < fim for i, f in ocupado):
+                continue
+            ocupado.append((inicio, fim))
+            aceitas.append((inicio, indice))
+
+        entidades = []
+        for _, indice in sorted(aceitas):
+            termo = self.automato.padroes[indice]
+            for tipo, codigos in self.entradas[termo].items():
+                entidades.append({
+                    'tipo': tipo,
+                    'termo': termo,
+                    'codigos': codigos,
+                    'colunas': COLUNAS_ENTIDADE[tipo],
+                })
+        return entidades
+
+    def contexto_prompt(self, entidades):
+        """
+        Formata as entidades encontradas como uma seção do prompt.
+
+        Args:
+            entidades (list): Entidades retornadas por resolver.
+
+        Returns:
+            str: Seção do prompt, ou string vazia se não há entidades.
+        """
+        if not entidades:
+            return ""
+        linhas = ["ENTIDADES IDENTIFICADAS NA PERGUNTA (use exatamente estes valores com IN (...), sem LIKE):"]
+        for entidade in entidades:
+            colunas = ' ou '.join(entidade['colunas'])
+            linhas.append(f"   - {ROTULOS_ENTIDADE[entidade['tipo']]} \"{entidade['termo']}\": "
+                          f"{colunas} IN ({valores_sql(entidade['codigos'])})")
+        return '\n'.join(linhas)
+
+
+def valores_sql(valores):
+    """Formata valores como literais SQL separados por vírgula."""
+    return ', '.join("'" + str(valor).replace("'", "''") + "'" for valor in valores)
+
+
+def predicado_in(entidade, coluna=None):
+    """
+    Monta o predicado IN de uma entidade.
+
+    Args:
+        entidade (dict): Entidade retornada por EntityResolver.resolver.
+        coluna (str, optional): Coluna filtrada (padrão: a primeira da entidade).
+
+    Returns:
+        str: Predicado SQL, ex: "Origem IN ('BRSP008', 'BRSSZ')".
+    """
+    return f"{coluna or entidade['colunas'][0]} IN ({valores_sql(entidade['codigos'])})"
+
+
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+
+def obter_resolver(db_path, metadata, versao=None):
+    """
+    Retorna o resolvedor compilado do banco, compartilhado no processo.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+        metadata (dict): Metadados usados se o resolvedor ainda não foi compilado.
+        versao (str, optional): Versão dos dados; uma versão nova recompila o resolvedor.
+
+    Returns:
+        EntityResolver: Resolvedor compilado.
+    """
+    chave = (os.path.abspath(db_path), versao)
+    with _resolvers_lock:
+        resolver = _resolvers.get(chave)
+        if resolver is None:
+            resolver = _resolvers[chave] = EntityResolver(metadata)
+        return resolver
+
+
+def main(argv=None):
+    import json
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("Uso: python entity_resolver.py \"pergunta\" [mapeamentos.json]")
+        sys.exit(1)
+    json_path = argv[1] if len(argv) > 1 else os.path.join(os.getcwd(), 'mapeamentos.json')
+    with open(json_path, 'r') as f:
+        mapeamentos = json.load(f)
+    metadata = {
+        'portos': mapeamentos['Portos'],
+        'paises_origem': mapeamentos['Países Origem'],
+        'paises_destino': mapeamentos['Países Destino'],
+        'mercadorias': mapeamentos['CDMercadoria'],
+    }
+
+    inicio = time.perf_counter()
+    resolver = EntityResolver(metadata)
+    print(f"Compilação: {len(resolver.entradas)} padrões em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    inicio = time.perf_counter()
+    entidades = resolver.resolver(argv[0])
+    print(f"Resolução: {(time.perf_counter() - inicio) * 1e6:.0f} µs\n")
+    print(resolver.contexto_prompt(entidades) or "Nenhuma entidade encontrada")
+
+
+if __name__ == '__main__':
+    main()
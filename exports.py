@@ -0,0 +1,188 @@
+"""
+Exportação de resultados de consultas em CSV, CSV compactado e Parquet.
+
+Os arquivos são gravados em lotes lidos do cursor do SQLite (ver
+db_connection.BatchReader), sem carregar o resultado inteiro em memória:
+    csv      - cada lote é escrito no arquivo assim que é lido
+    csv.gz   - o mesmo CSV, comprimido em fluxo (gzip)
+    parquet  - os lotes são inseridos em um banco DuckDB temporário em disco,
+               copiado para Parquet (zstd) no final; requer duckdb
+
+No aplicativo, os arquivos ficam em static/exports e são baixados pelo
+servidor de arquivos estáticos do Streamlit (server.enableStaticServing), em
+vez de embutidos na página como data URI em base64. Exportações com mais de
+EXPORT_TTL segundos são apagadas a cada nova exportação.
+"""
+
+import os
+import csv
+import gzip
+import time
+import uuid
+import shutil
+import tempfile
+import pandas as pd
+from db_connection import BatchReader
+
+# Formato -> (extensão do arquivo, tipo MIME)
+FORMATOS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+# Pasta servida pelo Streamlit em app/static/exports
+PASTA_EXPORTACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'exports')
+URL_EXPORTACOES = 'app/static/exports'
+
+# Segundos que um arquivo exportado fica disponível para download
+EXPORT_TTL = 3600
+
+# Nível de compressão do gzip: o padrão (9) comprime pouco mais e é várias vezes mais lento
+NIVEL_GZIP = 6
+
+# Linhas por lote no Parquet: cada lote é uma inserção no DuckDB, que tem custo fixo alto
+LOTE_PARQUET = 10000
+
+# Tipos do DuckDB para os valores do primeiro lote
+TIPOS_DUCKDB = {int: 'BIGINT', float: 'DOUBLE', str: 'VARCHAR', bytes: 'BLOB'}
+
+
+def escrever_csv(reader, destino, compactar=False):
+    """
+    Grava os lotes de um BatchReader em CSV, com cabeçalho.
+
+    Args:
+        reader (BatchReader): Leitor do resultado.
+        destino (str): Caminho do arquivo.
+        compactar (bool): Comprime o arquivo com gzip.
+    """
+    if compactar:
+        arquivo = gzip.open(destino, 'wt', compresslevel=NIVEL_GZIP, newline='', encoding='utf-8')
+    else:
+        arquivo = open(destino, 'w', newline='', encoding='utf-8')
+    with arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(reader.columns)
+        for lote in reader:
+            escritor.writerows(lote)
+
+
+def escrever_parquet(reader, destino):
+    """
+    Grava os lotes de um BatchReader em Parquet.
+
+    Os tipos das colunas são inferidos pelos valores do primeiro lote (texto
+    quando todos são nulos ou os tipos se misturam); os lotes seguintes são
+    convertidos para esses tipos pelo DuckDB.
+
+    Args:
+        reader (BatchReader): Leitor do resultado.
+        destino (str): Caminho do arquivo.
+    """
+    import duckdb
+
+    # Banco em disco: o DuckDB descarrega as páginas em vez de manter o resultado em memória
+    pasta = tempfile.mkdtemp(prefix='exportacao_')
+    duck = duckdb.connect(os.path.join(pasta, 'exportacao.duckdb'))
+    try:
+        criada = False
+        for lote in reader:
+            if not criada:
+                tipos = []
+                for posicao in range(len(reader.columns)):
+                    encontrados = {type(row[posicao]) for row in lote if row[posicao] is not None}
+                    if encontrados == {int, float}:
+                        encontrados = {float}
+                    tipos.append(TIPOS_DUCKDB.get(encontrados.pop(), 'VARCHAR') if len(encontrados) == 1
+                                 else 'VARCHAR')
+                duck.execute('CREATE TABLE exportacao (' + ', '.join(
+                    f'"c{posicao}" {tipo}' for posicao, tipo in enumerate(tipos)) + ')')
+                criada = True
+            chunk = pd.DataFrame.from_records(lote, columns=[f'c{i}' for i in range(len(reader.columns))])
+            duck.register('chunk', chunk)
+            duck.execute('INSERT INTO exportacao SELECT * FROM chunk')
+            duck.unregister('chunk')
+        if not criada:
+            duck.execute('CREATE TABLE exportacao (' + ', '.join(
+                f'"c{posicao}" VARCHAR' for posicao in range(len(reader.columns))) + ')')
+        colunas = ', '.join(f'"c{posicao}" AS "{nome.replace(chr(34), chr(34) * 2)}"'
+                            for posicao, nome in enumerate(reader.columns))
+        caminho = destino.replace("'", "''")
+        duck.execute(f"COPY (SELECT {colunas} FROM exportacao) TO '{caminho}' (FORMAT parquet, COMPRESSION zstd)")
+    finally:
+        duck.close()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def exportar_cursor(cursor, formato, destino, tamanho_lote=None):
+    """
+    Grava o resultado de um cursor em um arquivo, lote a lote.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor com a consulta já executada.
+        formato (str): 'csv', 'csv.gz' ou 'parquet'.
+        destino (str): Caminho do arquivo.
+        tamanho_lote (int, optional): Linhas por lote (padrão: SQL_BATCH_SIZE ou 1000;
+                                      LOTE_PARQUET no Parquet).
+
+    Returns:
+        dict: arquivo, linhas, bytes (tamanho do arquivo) e segundos.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}. Use: {', '.join(FORMATOS)}")
+    inicio = time.perf_counter()
+    # Sem orçamento de linhas ou bytes: o arquivo recebe o resultado inteiro
+    if formato == 'parquet':
+        tamanho_lote = tamanho_lote or LOTE_PARQUET
+    reader = BatchReader(cursor, tamanho_lote, max_bytes=float('inf'))
+    if formato == 'parquet':
+        escrever_parquet(reader, destino)
+    else:
+        escrever_csv(reader, destino, compactar=formato == 'csv.gz')
+    return {
+        'arquivo': destino,
+        'linhas': reader.rows,
+        'bytes': os.path.getsize(destino),
+        'segundos': time.perf_counter() - inicio,
+    }
+
+
+def limpar_exportacoes(pasta=None, ttl=EXPORT_TTL):
+    """
+    Apaga as exportações com mais de ttl segundos.
+
+    Args:
+        pasta (str, optional): Pasta das exportações (padrão: static/exports).
+        ttl (float): Idade máxima dos arquivos, em segundos.
+    """
+    pasta = pasta or PASTA_EXPORTACOES
+    if not os.path.isdir(pasta):
+        return
+    limite = time.time() - ttl
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome)
+        try:
+            if os.path.isfile(caminho) and os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+
+def novo_arquivo_exportacao(formato, prefixo='resultado', pasta=None):
+    """
+    Reserva um nome de arquivo na pasta servida pelo Streamlit.
+
+    Args:
+        formato (str): 'csv', 'csv.gz' ou 'parquet'.
+        prefixo (str): Início do nome do arquivo.
+        pasta (str, optional): Pasta das exportações (padrão: static/exports).
+
+    Returns:
+        tuple: (caminho do arquivo, URL relativa para download)
+    """
+    pasta = pasta or PASTA_EXPORTACOES
+    os.makedirs(pasta, exist_ok=True)
+    limpar_exportacoes(pasta)
+    nome = f"{prefixo}_{uuid.uuid4().hex[:12]}{FORMATOS[formato][0]}"
+    return os.path.join(pasta, nome), f"{URL_EXPORTACOES}/{nome}"
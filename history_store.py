@@ -0,0 +1,216 @@
+"""
+Histórico de consultas limitado e gravado em disco.
+
+O histórico das classes de consulta era uma lista com os resultados completos,
+que crescia sem limite dentro do objeto compartilhado pelas sessões do
+Streamlit (st.cache_resource). HistoryStore mantém:
+    - em memória, apenas as max_recent consultas mais recentes (buffer circular);
+    - em um arquivo SQLite separado (query_history.db, ao lado de cargas.db),
+      até max_entries consultas; as mais antigas são removidas.
+
+De cada resultado são guardados apenas uma prévia (os primeiros preview_chars
+caracteres), o tamanho e um hash do texto completo, que identifica resultados
+iguais sem armazená-los.
+
+Limites (variáveis de ambiente):
+    SQL_HISTORY_RECENT  - consultas mantidas em memória (padrão 50)
+    SQL_HISTORY_MAX     - consultas mantidas no arquivo (padrão 10000)
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import deque
+
+# Consultas mantidas em memória
+MAX_RECENTES_PADRAO = 50
+
+# Consultas mantidas no arquivo
+MAX_ENTRADAS_PADRAO = 10000
+
+# Caracteres do resultado guardados na prévia
+TAMANHO_PREVIA = 500
+
+# Remoção das entradas antigas a cada tantas inserções
+INTERVALO_LIMPEZA = 100
+
+
+def caminho_padrao(db_path):
+    """Arquivo padrão do histórico: query_history.db na mesma pasta do banco."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'query_history.db')
+
+
+def resumir_resultado(result, preview_chars=TAMANHO_PREVIA):
+    """
+    Resume o resultado de uma consulta para o histórico.
+
+    Args:
+        result: Resultado da consulta (texto ou outro objeto, convertido com str).
+        preview_chars (int): Caracteres mantidos na prévia.
+
+    Returns:
+        tuple: (prévia, tamanho do texto completo, hash do texto completo)
+    """
+    texto = result if isinstance(result, str) else str(result)
+    previa = texto if len(texto) <= preview_chars else texto[:preview_chars] + '...'
+    return previa, len(texto), hashlib.sha256(texto.encode('utf-8')).hexdigest()[:16]
+
+
+class HistoryStore:
+    """
+    Histórico de consultas com buffer circular em memória e arquivo SQLite limitado.
+
+    Pode ser usado no lugar da lista memory das classes de consulta: append,
+    len e iteração (sobre as consultas recentes) continuam funcionando.
+    """
+
+    def __init__(self, db_path, history_path=None, max_recent=None, max_entries=None,
+                 preview_chars=TAMANHO_PREVIA):
+        """
+        Args:
+            db_path (str): Caminho do banco de cargas (define a pasta do arquivo padrão).
+            history_path (str, optional): Arquivo do histórico (padrão: query_history.db
+                                          ao lado do banco).
+            max_recent (int, optional): Consultas em memória (padrão: SQL_HISTORY_RECENT ou 50).
+            max_entries (int, optional): Consultas no arquivo (padrão: SQL_HISTORY_MAX ou 10000).
+            preview_chars (int): Caracteres do resultado guardados na prévia.
+        """
+        self.history_path = history_path or caminho_padrao(db_path)
+        self.max_recent = max_recent or int(os.getenv("SQL_HISTORY_RECENT") or MAX_RECENTES_PADRAO)
+        self.max_entries = max_entries or int(os.getenv("SQL_HISTORY_MAX") or MAX_ENTRADAS_PADRAO)
+        self.preview_chars = preview_chars
+        self._recentes = deque(maxlen=self.max_recent)
+        self._insercoes = 0
+        self._proximo_id = 1
+        self._lock = threading.Lock()
+
+        # Sem o arquivo (ex: pasta somente leitura), o histórico fica apenas em memória
+        self.conn = None
+        try:
+            self.conn = sqlite3.connect(self.history_path, check_same_thread=False, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode = WAL')
+            self.conn.execute('PRAGMA synchronous = NORMAL')
+            self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS historico (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                criado REAL NOT NULL,
+                pergunta TEXT,
+                sql TEXT,
+                previa TEXT,
+                tamanho INTEGER,
+                hash_resultado TEXT
+            )
+            ''')
+            linhas = self.conn.execute('SELECT * FROM historico ORDER BY id DESC LIMIT ?',
+                                       (self.max_recent,)).fetchall()
+            self._recentes.extend(self._entrada(row) for row in reversed(linhas))
+            if linhas:
+                self._proximo_id = linhas[0][0] + 1
+        except sqlite3.Error as e:
+            print(f"Histórico de consultas apenas em memória: {e}")
+            self.conn = None
+
+    @staticmethod
+    def _entrada(row):
+        id_, criado, pergunta, sql, previa, tamanho, hash_resultado = row
+        return {"id": id_, "created": criado, "query": pergunta, "sql": sql, "result": previa,
+                "result_size": tamanho, "result_hash": hash_resultado}
+
+    def append(self, item):
+        """
+        Registra uma consulta.
+
+        Args:
+            item (dict): Consulta com as chaves "query", "sql" e "result".
+        """
+        previa, tamanho, hash_resultado = resumir_resultado(item.get("result", ""), self.preview_chars)
+        row = [None, time.time(), item.get("query"), item.get("sql"), previa, tamanho, hash_resultado]
+        with self._lock:
+            if self.conn is not None:
+                try:
+                    row[0] = self.conn.execute(
+                        'INSERT INTO historico (criado, pergunta, sql, previa, tamanho, hash_resultado) '
+                        'VALUES (?, ?, ?, ?, ?, ?)', row[1:]).lastrowid
+                    self._insercoes += 1
+                    if self._insercoes % INTERVALO_LIMPEZA == 0:
+                        self.conn.execute('DELETE FROM historico WHERE id <= ?', (row[0] - self.max_entries,))
+                except sqlite3.Error as e:
+                    print(f"Erro ao gravar histórico de consultas: {e}")
+            if row[0] is None:
+                row[0] = self._proximo_id
+            self._proximo_id = row[0] + 1
+            self._recentes.append(self._entrada(row))
+
+    def recent(self):
+        """
+        Retorna as consultas mantidas em memória.
+
+        Returns:
+            list: Consultas da mais antiga para a mais recente.
+        """
+        with self._lock:
+            return list(self._recentes)
+
+    def page(self, before=None, limit=20):
+        """
+        Lê uma página do histórico, da consulta mais recente para a mais antiga.
+
+        Args:
+            before (int, optional): Retorna consultas com id menor que este
+                                    (o "id" da última consulta da página anterior).
+            limit (int): Consultas por página.
+
+        Returns:
+            list: Consultas da página, da mais recente para a mais antiga.
+        """
+        with self._lock:
+            if self.conn is None:
+                entradas = [e for e in reversed(self._recentes) if before is None or e["id"] < before]
+                return entradas[:limit]
+            if before is None:
+                linhas = self.conn.execute('SELECT * FROM historico ORDER BY id DESC LIMIT ?',
+                                           (limit,)).fetchall()
+            else:
+                linhas = self.conn.execute('SELECT * FROM historico WHERE id < ? ORDER BY id DESC LIMIT ?',
+                                           (before, limit)).fetchall()
+        return [self._entrada(row) for row in linhas]
+
+    def count(self):
+        """
+        Retorna o número de consultas no histórico.
+
+        Returns:
+            int: Consultas no arquivo (ou em memória, sem o arquivo).
+        """
+        with self._lock:
+            if self.conn is None:
+                return len(self._recentes)
+            return self.conn.execute('SELECT COUNT(*) FROM historico').fetchone()[0]
+
+    def clear(self):
+        """
+        Apaga o histórico.
+        """
+        with self._lock:
+            self._recentes.clear()
+            if self.conn is not None:
+                self.conn.execute('DELETE FROM historico')
+
+    def close(self):
+        """
+        Fecha o arquivo do histórico.
+        """
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __len__(self):
+        return len(self._recentes)
+
+    def __iter__(self):
+        return iter(self.recent())
+
+    def __getitem__(self, indice):
+        return self.recent()[indice]
@@ -0,0 +1,319 @@
+"""
+Assistente de índices para o banco de dados cargas.db.
+
+Reexecuta as consultas SQL registradas com EXPLAIN QUERY PLAN, aponta varreduras
+completas da tabela Cargas e B-trees temporárias (GROUP BY/ORDER BY/DISTINCT sem
+índice) e propõe índices compostos para os filtros encontrados. Com --criar, os
+índices propostos são criados e o tempo de cada consulta é medido antes e depois.
+
+Uso:
+    python index_advisor.py                              # consultas de exemplo do prompt
+    python index_advisor.py --log consultas.sql          # consultas separadas por ';'
+    python index_advisor.py --log historico.jsonl        # uma consulta por linha no campo "sql"
+    python index_advisor.py --log consultas.sql --criar  # cria os índices e mede o ganho
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import statistics
+
+# Consultas usadas quando nenhum log é informado: os formatos ensinados nos
+# exemplos do prompt de SimpleSQLQuery._create_context
+CONSULTAS_EXEMPLO = [
+    """SELECT SUM(VLPesoCargaBruta) as total_toneladas, COUNT(*) as total_registros
+       FROM Cargas WHERE Sentido = 'Embarcados' AND Origem = 'BRIQI' AND Ano = '2023'""",
+    """SELECT SUM(VLPesoCargaBruta) as total_toneladas, COUNT(*) as total_registros
+       FROM Cargas WHERE Sentido = 'Desembarcados' AND Destino IN ('BRSSZ', 'BRSP008') AND Ano = '2023'""",
+    """SELECT SUM(TEU) as total_teus, COUNT(*) as total_registros FROM Cargas WHERE Ano = '2023'""",
+    """SELECT SUM(VLPesoCargaBruta) as total_toneladas, COUNT(*) as total_registros
+       FROM Cargas WHERE Natureza_da_Carga = 'Granel Líquido e Gasoso' AND Sentido = 'Embarcados' AND Ano = '2023'""",
+    """SELECT Pais_Destino, SUM(VLPesoCargaBruta) as total_toneladas, COUNT(*) as total_registros
+       FROM Cargas WHERE Sentido = 'Embarcados' AND Ano = '2023'
+       GROUP BY Pais_Destino ORDER BY total_toneladas DESC LIMIT 5""",
+]
+
+# Medidas incluídas no final dos índices propostos para torná-los cobrindo
+MEDIDAS = ['VLPesoCargaBruta', 'TEU', 'QTCarga']
+
+# Número máximo de colunas em um índice proposto
+MAX_COLUNAS_INDICE = 6
+
+
+def carregar_consultas(caminho):
+    """
+    Lê as consultas registradas em um arquivo.
+
+    Arquivos .jsonl devem ter um objeto por linha com o campo "sql"; os demais
+    são lidos como texto SQL com instruções separadas por ';'.
+
+    Args:
+        caminho (str): Caminho do arquivo de log.
+
+    Returns:
+        list: Consultas SELECT encontradas, sem repetições.
+    """
+    consultas = []
+    with open(caminho, 'r', encoding='utf-8') as f:
+        if caminho.endswith('.jsonl'):
+            for linha in f:
+                linha = linha.strip()
+                if linha:
+                    sql = json.loads(linha).get('sql')
+                    if sql:
+                        consultas.append(sql)
+        else:
+            consultas = f.read().split(';')
+
+    vistas = set()
+    resultado = []
+    for sql in consultas:
+        sql = sql.strip()
+        chave = ' '.join(sql.split()).lower()
+        if chave.startswith(('select', 'with')) and chave not in vistas:
+            vistas.add(chave)
+            resultado.append(sql)
+    return resultado
+
+
+def tabela_dados(conn):
+    """
+    Retorna a tabela que armazena os dados: Cargas_Fato no layout tipado, Cargas no layout texto.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+
+    Returns:
+        str: Nome da tabela de dados.
+    """
+    existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='Cargas_Fato'").fetchone()
+    return 'Cargas_Fato' if existe else 'Cargas'
+
+
+def analisar_plano(conn, sql):
+    """
+    Executa EXPLAIN QUERY PLAN e identifica problemas no plano.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        sql (str): Consulta a analisar.
+
+    Returns:
+        dict: Linhas do plano, varreduras completas de Cargas e B-trees temporárias.
+    """
+    plano = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    varreduras = [
+        passo for passo in plano
+        if re.match(r'SCAN (Cargas|Cargas_Fato|f)\b', passo) and 'INDEX' not in passo
+    ]
+    temporarias = [passo for passo in plano if 'USE TEMP B-TREE' in passo]
+    return {"plano": plano, "varreduras": varreduras, "temporarias": temporarias}
+
+
+def colunas_da_consulta(sql, colunas_tabela):
+    """
+    Extrai as colunas de Cargas usadas em filtros, agrupamentos e agregações.
+
+    Args:
+        sql (str): Consulta a analisar.
+        colunas_tabela (set): Colunas existentes na tabela de dados.
+
+    Returns:
+        dict: Colunas de igualdade, de intervalo, de agrupamento e medidas.
+    """
+    def filtrar(nomes):
+        vistos = []
+        for nome in nomes:
+            if nome in colunas_tabela and nome not in vistos:
+                vistos.append(nome)
+        return vistos
+
+    where = re.search(r'\bWHERE\b(.*?)(\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|$)', sql, re.I | re.S)
+    where = where.group(1) if where else ''
+    group = re.search(r'\bGROUP\s+BY\b(.*?)(\bHAVING\b|\bORDER\s+BY\b|\bLIMIT\b|$)', sql, re.I | re.S)
+    group = group.group(1) if group else ''
+
+    igualdade = filtrar(re.findall(r'"?(\w+)"?\s*(?:=|\bIN\s*\()', where, re.I))
+    intervalo = filtrar(re.findall(r'"?(\w+)"?\s*(?:\bBETWEEN\b|>=|<=|>|<)', where, re.I))
+    agrupamento = filtrar(re.findall(r'"?(\w+)"?', group))
+    medidas = filtrar(re.findall(r'\b(?:SUM|AVG|MIN|MAX|TOTAL)\s*\(\s*"?(\w+)"?\s*\)', sql, re.I))
+    return {
+        "igualdade": igualdade,
+        "intervalo": [col for col in intervalo if col not in igualdade],
+        "agrupamento": [col for col in agrupamento if col not in igualdade],
+        "medidas": [col for col in medidas if col in MEDIDAS],
+    }
+
+
+def propor_indice(colunas):
+    """
+    Propõe as colunas de um índice composto para uma consulta.
+
+    Ordem: colunas de igualdade, uma coluna de intervalo, colunas de
+    agrupamento e, se couber, as medidas agregadas (índice cobrindo).
+
+    Args:
+        colunas (dict): Resultado de colunas_da_consulta.
+
+    Returns:
+        list: Colunas do índice proposto (vazia se a consulta não tem filtros).
+    """
+    if not colunas["igualdade"] and not colunas["intervalo"]:
+        return []
+
+    indice = list(colunas["igualdade"]) + colunas["intervalo"][:1]
+    if not colunas["intervalo"]:
+        indice += colunas["agrupamento"]
+    if len(indice) + len(colunas["medidas"]) <= MAX_COLUNAS_INDICE:
+        indice += colunas["medidas"]
+    return indice[:MAX_COLUNAS_INDICE]
+
+
+def indice_existente(conn, tabela, colunas):
+    """
+    Verifica se algum índice da tabela já começa pelas colunas informadas.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        tabela (str): Tabela de dados.
+        colunas (list): Colunas do índice proposto.
+
+    Returns:
+        str: Nome do índice existente, ou None.
+    """
+    for _, nome, *_ in conn.execute(f"PRAGMA index_list({tabela})").fetchall():
+        colunas_indice = [row[2] for row in conn.execute(f"PRAGMA index_info({nome})")]
+        if colunas_indice[:len(colunas)] == colunas:
+            return nome
+    return None
+
+
+def medir(conn, sql, repeticoes=3):
+    """
+    Mede o tempo de execução de uma consulta (mediana das repetições).
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        sql (str): Consulta a medir.
+        repeticoes (int): Número de execuções.
+
+    Returns:
+        float: Tempo em segundos.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        conn.execute(sql).fetchall()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos)
+
+
+def aconselhar(db_path, consultas, criar=False, repeticoes=3):
+    """
+    Analisa as consultas, propõe índices e, opcionalmente, cria-os.
+
+    Args:
+        db_path (str): Caminho do banco de dados SQLite.
+        consultas (list): Consultas SQL a analisar.
+        criar (bool): Se True, cria os índices propostos e mede o tempo depois.
+        repeticoes (int): Execuções por medição de tempo.
+
+    Returns:
+        dict: Análise por consulta e índices propostos (nome -> colunas).
+    """
+    conn = sqlite3.connect(db_path)
+    tabela = tabela_dados(conn)
+    colunas_tabela = {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+
+    analises = []
+    propostos = {}
+    for sql in consultas:
+        try:
+            analise = analisar_plano(conn, sql)
+        except sqlite3.Error as e:
+            analises.append({"sql": sql, "erro": str(e)})
+            continue
+
+        analise["sql"] = sql
+        analise["tempo_antes"] = medir(conn, sql, repeticoes)
+        if analise["varreduras"] or analise["temporarias"]:
+            colunas = propor_indice(colunas_da_consulta(sql, colunas_tabela))
+            if colunas and not indice_existente(conn, tabela, colunas):
+                nome = 'idx_sugerido_' + '_'.join(col.lower() for col in colunas)
+                propostos[nome] = colunas
+                analise["indice"] = nome
+        analises.append(analise)
+
+    if criar and propostos:
+        for nome, colunas in propostos.items():
+            lista = ', '.join(f'"{col}"' for col in colunas)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({lista})')
+        conn.execute('ANALYZE')
+        conn.commit()
+        for analise in analises:
+            if "erro" not in analise:
+                analise["tempo_depois"] = medir(conn, analise["sql"], repeticoes)
+                analise["plano_depois"] = analisar_plano(conn, analise["sql"])["plano"]
+
+    conn.close()
+    return {"tabela": tabela, "analises": analises, "indices": propostos}
+
+
+def imprimir_relatorio(resultado):
+    """
+    Exibe o relatório de análise no terminal.
+
+    Args:
+        resultado (dict): Retorno de aconselhar.
+    """
+    for i, analise in enumerate(resultado["analises"], 1):
+        sql = ' '.join(analise["sql"].split())
+        print(f"\n--- Consulta {i}: {sql[:120]}{'...' if len(sql) > 120 else ''}")
+        if "erro" in analise:
+            print(f"❌ Erro ao analisar: {analise['erro']}")
+            continue
+        for passo in analise["plano"]:
+            print(f"   {passo}")
+        for passo in analise["varreduras"]:
+            print(f"⚠️  Varredura completa: {passo}")
+        for passo in analise["temporarias"]:
+            print(f"⚠️  B-tree temporária: {passo}")
+        if "indice" in analise:
+            print(f"💡 Índice sugerido: {analise['indice']}")
+        tempo = f"Tempo: {analise['tempo_antes'] * 1000:.2f} ms"
+        if "tempo_depois" in analise:
+            ganho = analise['tempo_antes'] / analise['tempo_depois'] if analise['tempo_depois'] else 0
+            tempo += f" -> {analise['tempo_depois'] * 1000:.2f} ms ({ganho:.1f}x)"
+        print(tempo)
+
+    print("\n=== Índices propostos ===")
+    if not resultado["indices"]:
+        print("Nenhum índice novo necessário.")
+    for nome, colunas in resultado["indices"].items():
+        lista = ', '.join(f'"{col}"' for col in colunas)
+        print(f'CREATE INDEX IF NOT EXISTS {nome} ON {resultado["tabela"]} ({lista});')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assistente de índices para o banco cargas.db.")
+    parser.add_argument('--db', default=os.path.join(os.getcwd(), 'cargas.db'),
+                        help='Caminho do banco de dados SQLite.')
+    parser.add_argument('--log', default=None,
+                        help='Arquivo com as consultas registradas (.sql ou .jsonl).')
+    parser.add_argument('--criar', action='store_true',
+                        help='Cria os índices propostos e mede o tempo antes e depois.')
+    parser.add_argument('--repeticoes', type=int, default=3,
+                        help='Execuções por medição de tempo (padrão: 3).')
+    args = parser.parse_args(argv)
+
+    consultas = carregar_consultas(args.log) if args.log else CONSULTAS_EXEMPLO
+    resultado = aconselhar(args.db, consultas, criar=args.criar, repeticoes=args.repeticoes)
+    imprimir_relatorio(resultado)
+
+
+if __name__ == '__main__':
+    main()
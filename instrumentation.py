@@ -0,0 +1,325 @@
+"""
+Instrumentação das consultas por etapas (spans).
+
+Cada pergunta gera um trace com uma árvore de spans:
+    query    - a pergunta inteira (agente, origem do SQL: template, cache ou modelo)
+    context  - montagem do contexto enviado ao modelo (tamanho)
+    llm      - chamada ao modelo (modelo, tokens do prompt e da resposta, retentativas)
+    sql      - execução da consulta (linhas, bytes, custo e plano do EXPLAIN)
+    post     - pós-processamento (cache de consultas e histórico)
+    render   - exibição do resultado no Streamlit
+
+Os spans terminados são gravados em um arquivo local, uma linha por span:
+    jsonl  - padrão: um objeto JSON simples por span
+    otlp   - o JSON do OTLP (ExportTraceServiceRequest), como o exportador de
+             arquivo do OpenTelemetry; pode ser importado por um coletor
+
+A duração das últimas JANELA_PADRAO execuções de cada etapa fica em memória para
+os percentis (p50/p95/p99) exibidos na barra lateral do app.py.
+
+Configuração (variáveis de ambiente):
+    SQL_TRACE          - 0 desativa a gravação do arquivo (padrão 1)
+    SQL_TRACE_FILE     - arquivo dos spans (padrão query_traces.jsonl na pasta atual)
+    SQL_TRACE_FORMAT   - jsonl ou otlp (padrão jsonl)
+    SQL_TRACE_MAX_MB   - tamanho a partir do qual o arquivo é renomeado para .1 (padrão 50)
+"""
+
+import os
+import json
+import time
+import secrets
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from benchmark_serving import percentil
+
+FORMATOS_TRACE = ('jsonl', 'otlp')
+
+# Execuções de cada etapa mantidas em memória para os percentis
+JANELA_PADRAO = 1000
+
+# Tamanho máximo, em MB, do arquivo de spans antes da rotação
+MAX_ARQUIVO_MB = 50
+
+# Atributos numéricos somados por etapa (ex: tokens do modelo)
+ATRIBUTOS_SOMADOS = ('prompt_tokens', 'completion_tokens', 'rows', 'bytes')
+
+_span_atual = contextvars.ContextVar('span_atual', default=None)
+
+
+def _valor_atributo(valor):
+    """Converte um atributo para um tipo gravável em JSON."""
+    if isinstance(valor, (str, bool, int, float)) or valor is None:
+        return valor
+    if isinstance(valor, (list, tuple)):
+        return '; '.join(str(v) for v in valor)
+    return str(valor)
+
+
+def _atributo_otlp(chave, valor):
+    if isinstance(valor, bool):
+        tipado = {'boolValue': valor}
+    elif isinstance(valor, int):
+        tipado = {'intValue': str(valor)}
+    elif isinstance(valor, float):
+        tipado = {'doubleValue': valor}
+    else:
+        tipado = {'stringValue': '' if valor is None else str(valor)}
+    return {'key': chave, 'value': tipado}
+
+
+class Span:
+    """
+    Uma etapa medida de uma consulta.
+    """
+
+    def __init__(self, nome, trace_id, parent_id=None, atributos=None):
+        self.nome = nome
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.atributos = {}
+        self.erro = None
+        self.inicio_ns = time.time_ns()
+        self.fim_ns = None
+        self._inicio = time.perf_counter()
+        self.duracao = None
+        self.definir(**(atributos or {}))
+
+    def definir(self, **atributos):
+        """Define atributos do span (valores None são ignorados)."""
+        for chave, valor in atributos.items():
+            if valor is not None:
+                self.atributos[chave] = _valor_atributo(valor)
+
+    def registrar_erro(self, erro):
+        """Marca o span como falho."""
+        self.erro = str(erro) or type(erro).__name__
+
+    def _terminar(self):
+        self.fim_ns = time.time_ns()
+        self.duracao = time.perf_counter() - self._inicio
+
+    def como_jsonl(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'name': self.nome,
+            'start_time_unix_nano': self.inicio_ns,
+            'end_time_unix_nano': self.fim_ns,
+            'duration_ms': round(self.duracao * 1000, 3),
+            'attributes': self.atributos,
+            'status': 'error' if self.erro else 'ok',
+            'error': self.erro,
+        }
+
+    def como_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.nome,
+            'kind': 1,
+            'startTimeUnixNano': str(self.inicio_ns),
+            'endTimeUnixNano': str(self.fim_ns),
+            'attributes': [_atributo_otlp(chave, valor) for chave, valor in self.atributos.items()],
+            'status': {'code': 2, 'message': self.erro} if self.erro else {'code': 1},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_atributo_otlp('service.name', 'agente-sql')]},
+            'scopeSpans': [{'scope': {'name': 'instrumentation'}, 'spans': [span]}],
+        }]}
+
+
+class _SpanNulo:
+    """Span usado quando não há span ativo: ignora os atributos."""
+
+    def definir(self, **atributos):
+        pass
+
+    def registrar_erro(self, erro):
+        pass
+
+
+class Tracer:
+    """
+    Cria spans, grava os terminados no arquivo e agrega as durações por etapa.
+    """
+
+    def __init__(self, caminho=None, formato=None, max_bytes=None, janela=JANELA_PADRAO, gravar=None):
+        """
+        Args:
+            caminho (str, optional): Arquivo dos spans (padrão: SQL_TRACE_FILE ou
+                                     query_traces.jsonl na pasta atual).
+            formato (str, optional): 'jsonl' ou 'otlp' (padrão: SQL_TRACE_FORMAT ou 'jsonl').
+            max_bytes (int, optional): Tamanho para rotação do arquivo (padrão: SQL_TRACE_MAX_MB ou 50 MB).
+            janela (int): Execuções de cada etapa mantidas para os percentis.
+            gravar (bool, optional): Grava o arquivo (padrão: SQL_TRACE diferente de 0).
+        """
+        self.caminho = caminho or os.getenv("SQL_TRACE_FILE") or os.path.join(os.getcwd(), 'query_traces.jsonl')
+        self.formato = formato or os.getenv("SQL_TRACE_FORMAT") or 'jsonl'
+        if self.formato not in FORMATOS_TRACE:
+            raise ValueError(f"Formato de trace desconhecido: {self.formato}. Use: {', '.join(FORMATOS_TRACE)}")
+        self.max_bytes = max_bytes or int(float(os.getenv("SQL_TRACE_MAX_MB") or MAX_ARQUIVO_MB) * 2**20)
+        self.gravar = gravar if gravar is not None else os.getenv("SQL_TRACE", "1") != "0"
+        self.janela = janela
+        self._duracoes = {}
+        self._erros = {}
+        self._somas = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, nome, **atributos):
+        """
+        Mede um bloco como um span filho do span ativo (ou como a raiz de um novo trace).
+
+        Exceções são registradas no span e propagadas.
+
+        Exemplo:
+            with tracer.span("sql", engine="sqlite") as span:
+                ...
+                span.definir(rows=len(linhas))
+
+        Args:
+            nome (str): Nome da etapa.
+            **atributos: Atributos iniciais do span.
+
+        Yields:
+            Span: O span em andamento.
+        """
+        pai = _span_atual.get()
+        span = Span(nome, pai.trace_id if pai else secrets.token_hex(16), pai.span_id if pai else None, atributos)
+        token = _span_atual.set(span)
+        try:
+            yield span
+        except GeneratorExit:
+            # Gerador interrompido pelo consumidor: não é uma falha da etapa
+            raise
+        except BaseException as e:
+            span.registrar_erro(e)
+            raise
+        finally:
+            try:
+                _span_atual.reset(token)
+            except ValueError:
+                # Gerador com span aberto fechado em outro contexto (ex: coletado pelo GC)
+                pass
+            span._terminar()
+            self._registrar(span)
+
+    def _registrar(self, span):
+        with self._lock:
+            duracoes = self._duracoes.get(span.nome)
+            if duracoes is None:
+                duracoes = self._duracoes[span.nome] = deque(maxlen=self.janela)
+            duracoes.append(span.duracao)
+            if span.erro:
+                self._erros[span.nome] = self._erros.get(span.nome, 0) + 1
+            somas = self._somas.setdefault(span.nome, {})
+            for chave in ATRIBUTOS_SOMADOS:
+                valor = span.atributos.get(chave)
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                    somas[chave] = somas.get(chave, 0) + valor
+            if self.gravar:
+                try:
+                    self._gravar(span)
+                except OSError as e:
+                    print(f"Erro ao gravar span: {e}")
+                    self.gravar = False
+
+    def _gravar(self, span):
+        registro = span.como_otlp() if self.formato == 'otlp' else span.como_jsonl()
+        if os.path.exists(self.caminho) and os.path.getsize(self.caminho) > self.max_bytes:
+            os.replace(self.caminho, self.caminho + '.1')
+        with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+    def estatisticas(self):
+        """
+        Agrega as durações das últimas execuções de cada etapa.
+
+        Returns:
+            dict: Etapa -> n (execuções na janela), erros, p50_ms, p95_ms, p99_ms e
+                as somas dos atributos em ATRIBUTOS_SOMADOS (ex: prompt_tokens).
+        """
+        with self._lock:
+            duracoes = {nome: list(valores) for nome, valores in self._duracoes.items()}
+            erros = dict(self._erros)
+            somas = {nome: dict(valores) for nome, valores in self._somas.items()}
+        return {
+            nome: {
+                'n': len(valores),
+                'erros': erros.get(nome, 0),
+                'p50_ms': percentil(valores, 50) * 1000,
+                'p95_ms': percentil(valores, 95) * 1000,
+                'p99_ms': percentil(valores, 99) * 1000,
+                **somas.get(nome, {}),
+            }
+            for nome, valores in duracoes.items()
+        }
+
+    def limpar(self):
+        """Descarta as durações agregadas (o arquivo é mantido)."""
+        with self._lock:
+            self._duracoes.clear()
+            self._erros.clear()
+            self._somas.clear()
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def obter_tracer():
+    """
+    Retorna o tracer compartilhado do processo.
+
+    Returns:
+        Tracer: Instância única, configurada pelas variáveis de ambiente.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+def tokens_resposta(response):
+    """
+    Lê o uso de tokens de uma resposta do modelo (LangChain ou cliente OpenAI).
+
+    Args:
+        response: Mensagem do LangChain (usage_metadata ou response_metadata)
+                  ou resposta do cliente OpenAI (usage).
+
+    Returns:
+        tuple: (tokens do prompt, tokens da resposta), None quando não informados.
+    """
+    uso = getattr(response, 'usage_metadata', None)
+    if uso:
+        return uso.get('input_tokens'), uso.get('output_tokens')
+    uso = (getattr(response, 'response_metadata', None) or {}).get('token_usage')
+    if uso:
+        return uso.get('prompt_tokens'), uso.get('completion_tokens')
+    uso = getattr(response, 'usage', None)
+    if uso is not None:
+        return getattr(uso, 'prompt_tokens', None), getattr(uso, 'completion_tokens', None)
+    return None, None
+
+
+def span(nome, **atributos):
+    """Atalho para obter_tracer().span(nome, **atributos)."""
+    return obter_tracer().span(nome, **atributos)
+
+
+def span_atual():
+    """
+    Retorna o span ativo, para acrescentar atributos de dentro de uma etapa.
+
+    Returns:
+        Span: Span ativo, ou um span que ignora os atributos se não houver.
+    """
+    return _span_atual.get() or _SpanNulo()
@@ -0,0 +1,203 @@
+"""
+Snapshot compacto e compartilhado dos metadados das tabelas de mapeamento.
+
+As classes de consulta carregavam as oito tabelas de mapeamento em dicionários
+novos a cada instância e descobriam os anos com SELECT DISTINCT Ano FROM Cargas,
+que percorre a tabela de fatos. O snapshot é carregado uma vez por processo e
+por versão dos dados, e compartilhado entre instâncias e sessões do Streamlit:
+
+    - cada tabela de mapeamento vira duas tuplas paralelas (códigos ordenados e
+      descrições), consultadas por busca binária;
+    - códigos e descrições são internados, de modo que descrições repetidas
+      (ex: "Animais Vivos" para vários códigos, países em PaisesOrigem) ocupam
+      uma única string;
+    - os anos vêm da tabela MetadadosAnos, gravada pela ingestão (ver create_database.py).
+
+O snapshot é imutável e se comporta como o dicionário antigo (metadata["portos"],
+metadata["anos_disponiveis"], .get, .items).
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+from bisect import bisect_left
+from collections.abc import Mapping
+from db_connection import connect_database, get_dataset_version
+
+# Categorias do snapshot: (nome, tabela, coluna de descrição)
+CATEGORIAS = [
+    ('sentido', 'Sentido', 'descricao'),
+    ('portos', 'Portos', 'nome'),
+    ('paises_origem', 'PaisesOrigem', 'nome'),
+    ('paises_destino', 'PaisesDestino', 'nome'),
+    ('tipo_navegacao', 'TipoNavegacao', 'descricao'),
+    ('natureza_carga', 'NaturezaCarga', 'descricao'),
+    ('conteiner_estado', 'ConteinerEstado', 'descricao'),
+    ('mercadorias', 'CDMercadoria', 'descricao'),
+]
+
+# Catálogo de anos gravado pela ingestão
+TABELA_ANOS = 'MetadadosAnos'
+
+
+def _internar(valor):
+    return sys.intern(valor) if isinstance(valor, str) else valor
+
+
+class TabelaCodigos(Mapping):
+    """
+    Tabela código -> descrição imutável, guardada em tuplas ordenadas.
+    """
+
+    __slots__ = ('codigos', 'descricoes')
+
+    def __init__(self, pares):
+        """
+        Args:
+            pares (iterable): Pares (código, descrição).
+        """
+        ordenados = sorted(((_internar(c), _internar(d)) for c, d in pares), key=lambda p: str(p[0]))
+        self.codigos = tuple(c for c, _ in ordenados)
+        self.descricoes = tuple(d for _, d in ordenados)
+
+    def _posicao(self, codigo):
+        posicao = bisect_left(self.codigos, codigo)
+        if posicao < len(self.codigos) and self.codigos[posicao] == codigo:
+            return posicao
+        return -1
+
+    def __getitem__(self, codigo):
+        try:
+            posicao = self._posicao(codigo)
+        except TypeError:
+            posicao = -1
+        if posicao < 0:
+            raise KeyError(codigo)
+        return self.descricoes[posicao]
+
+    def __iter__(self):
+        return iter(self.codigos)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def items(self):
+        return zip(self.codigos, self.descricoes)
+
+    def values(self):
+        return self.descricoes
+
+    def __repr__(self):
+        return f"TabelaCodigos({len(self)} códigos)"
+
+
+class MetadataSnapshot(Mapping):
+    """
+    Metadados imutáveis do banco: tabelas de mapeamento e anos disponíveis.
+    """
+
+    def __init__(self, tabelas, anos, versao=None):
+        """
+        Args:
+            tabelas (dict): Categoria -> TabelaCodigos.
+            anos (iterable): Anos disponíveis, em ordem.
+            versao (str, optional): Versão dos dados do snapshot.
+        """
+        self._dados = dict(tabelas)
+        self._dados['anos_disponiveis'] = tuple(anos)
+        self.versao = versao
+
+    @classmethod
+    def vazio(cls):
+        """Snapshot sem dados, usado quando o banco não pode ser lido."""
+        return cls({nome: TabelaCodigos([]) for nome, _, _ in CATEGORIAS}, [])
+
+    def __getitem__(self, chave):
+        return self._dados[chave]
+
+    def __iter__(self):
+        return iter(self._dados)
+
+    def __len__(self):
+        return len(self._dados)
+
+    def __repr__(self):
+        tamanhos = ', '.join(f"{nome}={len(valor)}" for nome, valor in self._dados.items())
+        return f"MetadataSnapshot({tamanhos})"
+
+
+def carregar_anos(conn):
+    """
+    Lê os anos disponíveis do catálogo gravado pela ingestão.
+
+    Em bancos criados antes do catálogo, usa SELECT DISTINCT Ano FROM Cargas.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+
+    Returns:
+        list: Anos disponíveis, em ordem.
+    """
+    try:
+        return [row[0] for row in conn.execute(f"SELECT Ano FROM {TABELA_ANOS} ORDER BY Ano")]
+    except sqlite3.OperationalError:
+        return [row[0] for row in conn.execute("SELECT DISTINCT Ano FROM Cargas ORDER BY Ano")]
+
+
+def carregar_snapshot(db_path):
+    """
+    Lê os metadados do banco em um novo snapshot.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+
+    Returns:
+        MetadataSnapshot: Snapshot dos metadados.
+    """
+    versao = get_dataset_version(db_path)
+    conn = connect_database(db_path)
+    try:
+        tabelas = {}
+        for nome, tabela, coluna in CATEGORIAS:
+            try:
+                tabelas[nome] = TabelaCodigos(conn.execute(f"SELECT codigo, {coluna} FROM {tabela}"))
+            except sqlite3.OperationalError as e:
+                print(f"Erro ao carregar a tabela {tabela}: {e}")
+                tabelas[nome] = TabelaCodigos([])
+        anos = carregar_anos(conn)
+    finally:
+        conn.close()
+    return MetadataSnapshot(tabelas, anos, versao)
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def obter_metadados(db_path):
+    """
+    Retorna o snapshot de metadados do banco, compartilhado no processo.
+
+    O snapshot é carregado na primeira chamada e recarregado apenas quando o
+    arquivo do banco muda e a versão dos dados é outra.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+
+    Returns:
+        MetadataSnapshot: Snapshot dos metadados.
+    """
+    caminho = os.path.abspath(db_path)
+    stat = os.stat(caminho)
+    assinatura = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _snapshots_lock:
+        atual = _snapshots.get(caminho)
+        if atual is not None and atual[0] == assinatura:
+            return atual[1]
+        if atual is not None and atual[1].versao == get_dataset_version(caminho):
+            _snapshots[caminho] = (assinatura, atual[1])
+            return atual[1]
+        snapshot = carregar_snapshot(caminho)
+        _snapshots[caminho] = (assinatura, snapshot)
+        return snapshot
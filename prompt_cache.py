@@ -0,0 +1,104 @@
+"""
+Cache em disco do contexto (prompt de sistema) das classes de consulta.
+
+_create_context chama SQLDatabase.get_table_info, que reflete todas as tabelas
+pelo SQLAlchemy e executa consultas de linhas de exemplo, e depois formata o
+prompt completo. O resultado só muda quando muda o esquema, a versão dos dados
+(linhas de exemplo e anos disponíveis) ou o texto do próprio template, e por
+isso é gravado em disco e lido com uma única leitura nas inicializações seguintes.
+
+A chave é o hash de:
+    - o SQL de todas as tabelas, views e índices (sqlite_master);
+    - a versão dos dados (ver db_connection.get_dataset_version);
+    - o nome da classe e as constantes do código de _create_context, que
+      incluem o texto do template.
+
+Os arquivos ficam em .prompt_cache, ao lado do banco; apenas o mais recente de
+cada classe é mantido.
+"""
+
+import os
+import hashlib
+from db_connection import connect_database, get_dataset_version
+
+# Pasta do cache, relativa à pasta do banco
+PASTA_CACHE = '.prompt_cache'
+
+
+def hash_template(funcao):
+    """
+    Calcula o hash do template de uma função que monta o contexto.
+
+    As partes fixas de uma f-string ficam nas constantes do código da função,
+    portanto qualquer mudança no texto do prompt muda o hash.
+
+    Args:
+        funcao (callable): Função ou método que monta o contexto.
+
+    Returns:
+        str: Hash das constantes do código.
+    """
+    codigo = getattr(funcao, '__func__', funcao).__code__
+    return hashlib.sha256(repr(codigo.co_consts).encode('utf-8')).hexdigest()
+
+
+def chave_contexto(db_path, *partes):
+    """
+    Calcula a chave do contexto a partir do esquema e da versão dos dados.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+        *partes: Valores adicionais da chave (ex: nome da classe, hash do template).
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+    conn = connect_database(db_path)
+    try:
+        esquema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+    finally:
+        conn.close()
+    h = hashlib.sha256()
+    h.update(repr(esquema).encode('utf-8'))
+    h.update(get_dataset_version(db_path).encode('utf-8'))
+    for parte in partes:
+        h.update(b'\0' + str(parte).encode('utf-8'))
+    return h.hexdigest()
+
+
+def carregar_contexto(db_path, nome, construir, pasta=None):
+    """
+    Retorna o contexto gravado em disco, ou o constrói e grava.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+        nome (str): Nome do contexto (ex: nome da classe de consulta).
+        construir (callable): Função sem argumentos que monta o contexto.
+        pasta (str, optional): Pasta do cache (padrão: .prompt_cache ao lado do banco).
+
+    Returns:
+        str: Contexto.
+    """
+    pasta = pasta or os.path.join(os.path.dirname(os.path.abspath(db_path)), PASTA_CACHE)
+    chave = chave_contexto(db_path, nome, hash_template(construir))[:20]
+    arquivo = os.path.join(pasta, f"{nome}-{chave}.txt")
+    try:
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        pass
+
+    contexto = construir()
+    try:
+        os.makedirs(pasta, exist_ok=True)
+        temporario = f"{arquivo}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(contexto)
+        os.replace(temporario, arquivo)
+        # Remove os contextos anteriores desta classe
+        for antigo in os.listdir(pasta):
+            if antigo.startswith(f"{nome}-") and antigo.endswith('.txt') and antigo != os.path.basename(arquivo):
+                os.remove(os.path.join(pasta, antigo))
+    except OSError as e:
+        print(f"Erro ao gravar o contexto em cache: {e}")
+    return contexto
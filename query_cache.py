@@ -0,0 +1,271 @@
+"""
+Cache persistente pergunta -> SQL.
+
+Perguntas já respondidas são atendidas sem chamar o modelo: a pergunta é
+normalizada (maiúsculas, acentos, espaços, pontuação final e números), o SQL
+gerado anteriormente é lido de um arquivo SQLite separado (query_cache.db, ao
+lado de cargas.db) e apenas executado no banco.
+
+A chave combina a pergunta normalizada com um hash do contexto enviado ao modelo
+(esquema, metadados e instruções), de modo que uma mudança no prompt não
+reaproveita SQL antigo. Cada entrada guarda a versão dos dados em que foi gerada,
+gravada pela ingestão (tabela MetadadosCarga, ver create_database.py); uma nova
+carga invalida as entradas antigas, mesmo em um processo já em execução (a versão
+é relida quando o arquivo do banco muda, como em result_cache.py). Entradas também expiram
+pelo TTL e as menos usadas recentemente são removidas acima do limite de tamanho.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from db_connection import get_dataset_version
+
+# Tempo de vida padrão das entradas (7 dias)
+TTL_PADRAO = 7 * 24 * 3600
+
+# Número máximo padrão de entradas
+MAX_ENTRADAS_PADRAO = 5000
+
+# Números por extenso mais comuns nas perguntas ("os cinco principais portos")
+NUMEROS_POR_EXTENSO = {
+    'dois': '2', 'duas': '2', 'tres': '3', 'quatro': '4', 'cinco': '5', 'seis': '6',
+    'sete': '7', 'oito': '8', 'nove': '9', 'dez': '10', 'quinze': '15', 'vinte': '20',
+    'trinta': '30', 'cinquenta': '50', 'cem': '100',
+}
+
+
+def _canonizar_numero(match):
+    """Remove separadores de milhar e usa ponto como separador decimal."""
+    numero = match.group(0)
+    if re.fullmatch(r'\d{1,3}([.\s]\d{3})+', numero):
+        return re.sub(r'[.\s]', '', numero)
+    return numero.replace(',', '.')
+
+
+def normalizar_pergunta(pergunta):
+    """
+    Normaliza uma pergunta para uso como chave do cache.
+
+    Converte para minúsculas, remove acentos e pontuação, colapsa espaços,
+    escreve números por extenso como algarismos e remove separadores de
+    milhar ("1.000" -> "1000", "1,5" -> "1.5"). Zeros à esquerda são mantidos,
+    pois fazem parte de códigos como os de mercadoria.
+
+    Args:
+        pergunta (str): Pergunta em linguagem natural.
+
+    Returns:
+        str: Pergunta normalizada.
+    """
+    texto = unicodedata.normalize('NFKD', pergunta)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+    texto = re.sub(r'\d{1,3}(?:[.\s]\d{3})+(?!\d)|\d+,\d+', _canonizar_numero, texto)
+    texto = re.sub(r'[^\w.%/-]+', ' ', texto)
+    texto = re.sub(r'(?<!\d)[.](?!\d)|(?<=\d)[.](?!\d)', ' ', texto)
+    palavras = [NUMEROS_POR_EXTENSO.get(palavra, palavra) for palavra in texto.split()]
+    return ' '.join(palavras)
+
+
+def hash_contexto(contexto):
+    """
+    Calcula o hash do contexto enviado ao modelo.
+
+    Args:
+        contexto (str): Contexto (prompt de sistema) usado para gerar o SQL.
+
+    Returns:
+        str: Hash curto do contexto.
+    """
+    return hashlib.sha256(contexto.encode('utf-8')).hexdigest()[:16]
+
+
+def caminho_padrao(db_path):
+    """Arquivo padrão do cache: query_cache.db na mesma pasta do banco."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'query_cache.db')
+
+
+class QueryCache:
+    """
+    Cache persistente pergunta -> SQL com TTL, limite de tamanho (LRU) e contadores.
+    """
+
+    def __init__(self, db_path, contexto='', cache_path=None, ttl=TTL_PADRAO,
+                 max_entradas=MAX_ENTRADAS_PADRAO):
+        """
+        Args:
+            db_path (str): Caminho do banco de cargas (origem da versão dos dados).
+            contexto (str): Contexto enviado ao modelo; mudanças invalidam o cache.
+            cache_path (str, optional): Arquivo do cache (padrão: query_cache.db ao lado do banco).
+            ttl (float): Segundos até uma entrada expirar.
+            max_entradas (int): Número máximo de entradas mantidas.
+        """
+        self.db_path = db_path
+        self.cache_path = cache_path or caminho_padrao(db_path)
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.contexto = hash_contexto(contexto)
+        self._assinatura = self._assinatura_arquivo()
+        self.versao = get_dataset_version(db_path)
+
+        self.conn = sqlite3.connect(self.cache_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache_sql (
+            chave TEXT PRIMARY KEY,
+            pergunta TEXT,
+            sql TEXT NOT NULL,
+            versao TEXT NOT NULL,
+            criado REAL NOT NULL,
+            acessado REAL NOT NULL,
+            acessos INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_sql_acessado ON cache_sql (acessado)')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache_contadores (
+            nome TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        )
+        ''')
+
+    def chave(self, pergunta):
+        """
+        Calcula a chave do cache para uma pergunta.
+
+        Args:
+            pergunta (str): Pergunta em linguagem natural.
+
+        Returns:
+            str: Hash do contexto e da pergunta normalizada.
+        """
+        texto = f"{self.contexto}\n{normalizar_pergunta(pergunta)}"
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+    def _assinatura_arquivo(self):
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _verificar_versao(self):
+        """Relê a versão dos dados quando o arquivo do banco muda (ex: após uma nova carga)."""
+        assinatura = self._assinatura_arquivo()
+        if assinatura != self._assinatura:
+            self._assinatura = assinatura
+            self.refresh_version()
+
+    def _contar(self, nome):
+        self.conn.execute('INSERT INTO cache_contadores VALUES (?, 1) '
+                          'ON CONFLICT(nome) DO UPDATE SET valor = valor + 1', (nome,))
+
+    def get(self, pergunta):
+        """
+        Busca o SQL gerado anteriormente para a pergunta.
+
+        Args:
+            pergunta (str): Pergunta em linguagem natural.
+
+        Returns:
+            str: SQL em cache, ou None se não houver entrada válida.
+        """
+        self._verificar_versao()
+        chave = self.chave(pergunta)
+        agora = time.time()
+        with self._lock:
+            row = self.conn.execute('SELECT sql, versao, criado FROM cache_sql WHERE chave = ?',
+                                    (chave,)).fetchone()
+            if row and row[1] == self.versao and agora - row[2] <= self.ttl:
+                self.conn.execute('UPDATE cache_sql SET acessado = ?, acessos = acessos + 1 WHERE chave = ?',
+                                  (agora, chave))
+                self.hits += 1
+                self._contar('hits')
+                return row[0]
+            if row:
+                # Entrada expirada ou de outra versão dos dados
+                self.conn.execute('DELETE FROM cache_sql WHERE chave = ?', (chave,))
+            self.misses += 1
+            self._contar('misses')
+            return None
+
+    def put(self, pergunta, sql):
+        """
+        Armazena o SQL gerado para a pergunta.
+
+        Args:
+            pergunta (str): Pergunta em linguagem natural.
+            sql (str): SQL gerado pelo modelo e executado com sucesso.
+        """
+        self._verificar_versao()
+        agora = time.time()
+        with self._lock:
+            self.conn.execute('INSERT OR REPLACE INTO cache_sql VALUES (?, ?, ?, ?, ?, ?, 0)',
+                              (self.chave(pergunta), pergunta, sql, self.versao, agora, agora))
+            excedente = self.conn.execute('SELECT COUNT(*) FROM cache_sql').fetchone()[0] - self.max_entradas
+            if excedente > 0:
+                self.conn.execute('DELETE FROM cache_sql WHERE chave IN '
+                                  '(SELECT chave FROM cache_sql ORDER BY acessado LIMIT ?)', (excedente,))
+
+    def invalidate(self, pergunta=None):
+        """
+        Remove a entrada de uma pergunta, ou todas as entradas.
+
+        Args:
+            pergunta (str, optional): Pergunta a remover; se omitida, limpa o cache.
+        """
+        with self._lock:
+            if pergunta is None:
+                self.conn.execute('DELETE FROM cache_sql')
+            else:
+                self.conn.execute('DELETE FROM cache_sql WHERE chave = ?', (self.chave(pergunta),))
+
+    def refresh_version(self):
+        """
+        Relê a versão dos dados (ex: após uma carga incremental) e remove as entradas antigas.
+
+        Chamado por get e put quando o arquivo do banco muda.
+
+        Returns:
+            bool: True se a versão mudou.
+        """
+        nova = get_dataset_version(self.db_path)
+        mudou = nova != self.versao
+        self.versao = nova
+        if mudou:
+            with self._lock:
+                self.conn.execute('DELETE FROM cache_sql WHERE versao != ?', (nova,))
+        return mudou
+
+    def stats(self):
+        """
+        Retorna os contadores do cache.
+
+        Returns:
+            dict: hits e misses desta instância, totais persistidos, entradas e taxa de acerto.
+        """
+        with self._lock:
+            totais = dict(self.conn.execute('SELECT nome, valor FROM cache_contadores').fetchall())
+            entradas = self.conn.execute('SELECT COUNT(*) FROM cache_sql').fetchone()[0]
+        consultas = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': self.hits / consultas if consultas else 0.0,
+            'hits_total': totais.get('hits', 0),
+            'misses_total': totais.get('misses', 0),
+            'entradas': entradas,
+        }
+
+    def close(self):
+        """
+        Fecha o arquivo do cache.
+        """
+        self.conn.close()
@@ -0,0 +1,206 @@
+"""
+Cache em memória dos resultados das consultas SQL.
+
+Painéis e perguntas repetidas geram as mesmas agregações várias vezes; o
+resultado de cada SQL é guardado comprimido (pickle + zlib) e reutilizado
+enquanto a versão dos dados não muda. A chave é o SQL canônico (espaços,
+maiúsculas das palavras-chave e ponto e vírgula final normalizados) e o tipo
+de resultado (texto das classes de consulta ou DataFrame de DatabaseTools).
+
+Há uma instância por arquivo de banco no processo (obter_cache_resultados),
+compartilhada por SimpleSQLQuery, OpenAISQLQuery e DatabaseTools. O tamanho
+total é limitado por SQL_RESULT_CACHE_MB (padrão 64 MB; 0 desativa), com
+remoção das entradas usadas há mais tempo.
+"""
+
+import os
+import zlib
+import pickle
+import threading
+from collections import OrderedDict
+from db_connection import get_dataset_version
+from rollups import tokenizar_sql
+
+# Orçamento padrão do cache, em MB (variável SQL_RESULT_CACHE_MB)
+TAMANHO_PADRAO_MB = 64
+
+# Resultados maiores que esta fração do orçamento não são guardados
+FRACAO_MAXIMA_ENTRADA = 0.25
+
+# Palavras-chave escritas em maiúsculas no SQL canônico; identificadores mantêm a
+# grafia original porque ela define os nomes das colunas do resultado
+PALAVRAS_CHAVE = {
+    'select', 'distinct', 'from', 'where', 'and', 'or', 'not', 'in', 'is', 'null',
+    'like', 'glob', 'between', 'group', 'by', 'order', 'asc', 'desc', 'having',
+    'limit', 'offset', 'as', 'join', 'left', 'inner', 'outer', 'cross', 'on',
+    'using', 'union', 'all', 'except', 'intersect', 'case', 'when', 'then', 'else',
+    'end', 'with', 'exists', 'cast', 'collate', 'nulls', 'first', 'last',
+}
+
+
+def canonizar_sql(sql):
+    """
+    Normaliza o texto de uma consulta para uso como chave do cache.
+
+    Args:
+        sql (str): Consulta SQL.
+
+    Returns:
+        str: Consulta com tokens separados por um espaço, palavras-chave em
+            maiúsculas e sem ponto e vírgula final.
+    """
+    tokens = [texto.upper() if tipo == 'ident' and texto.lower() in PALAVRAS_CHAVE else texto
+              for tipo, texto, _, _ in tokenizar_sql(sql)]
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+    return ' '.join(tokens)
+
+
+class ResultCache:
+    """
+    Cache LRU de resultados comprimidos, limitado em bytes e invalidado pela versão dos dados.
+    """
+
+    def __init__(self, db_path, max_bytes=None):
+        """
+        Args:
+            db_path (str): Caminho para o arquivo do banco de dados SQLite.
+            max_bytes (int, optional): Orçamento em bytes dos resultados comprimidos.
+                Padrão: SQL_RESULT_CACHE_MB ou 64 MB.
+        """
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("SQL_RESULT_CACHE_MB") or TAMANHO_PADRAO_MB) * 1024 * 1024)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.remocoes = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._assinatura = None
+        self.versao = None
+
+    def _assinatura_arquivo(self):
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _verificar_versao(self):
+        """Relê a versão dos dados quando o arquivo muda e descarta os resultados antigos."""
+        assinatura = self._assinatura_arquivo()
+        if assinatura == self._assinatura:
+            return
+        versao = get_dataset_version(self.db_path)
+        with self._lock:
+            self._assinatura = assinatura
+            if versao != self.versao:
+                self.versao = versao
+                self._entradas.clear()
+                self.bytes = 0
+
+    def get(self, sql, tipo='texto'):
+        """
+        Busca o resultado de uma consulta.
+
+        Args:
+            sql (str): Consulta SQL.
+            tipo (str): Tipo do resultado ('texto' ou 'dataframe').
+
+        Returns:
+            Resultado armazenado (uma cópia nova a cada chamada), ou None.
+        """
+        if self.max_bytes <= 0:
+            return None
+        self._verificar_versao()
+        chave = (tipo, canonizar_sql(sql))
+        with self._lock:
+            dados = self._entradas.get(chave)
+            if dados is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+        return pickle.loads(zlib.decompress(dados))
+
+    def put(self, sql, resultado, tipo='texto'):
+        """
+        Armazena o resultado de uma consulta.
+
+        Args:
+            sql (str): Consulta SQL.
+            resultado: Resultado da consulta (texto ou DataFrame).
+            tipo (str): Tipo do resultado ('texto' ou 'dataframe').
+
+        Returns:
+            bool: True se o resultado foi armazenado.
+        """
+        if self.max_bytes <= 0:
+            return False
+        self._verificar_versao()
+        dados = zlib.compress(pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        if len(dados) > self.max_bytes * FRACAO_MAXIMA_ENTRADA:
+            return False
+        chave = (tipo, canonizar_sql(sql))
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= len(anterior)
+            self._entradas[chave] = dados
+            self.bytes += len(dados)
+            while self.bytes > self.max_bytes:
+                _, removido = self._entradas.popitem(last=False)
+                self.bytes -= len(removido)
+                self.remocoes += 1
+        return True
+
+    def clear(self):
+        """
+        Remove todos os resultados armazenados.
+        """
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """
+        Retorna os contadores do cache.
+
+        Returns:
+            dict: Acertos, faltas, taxa de acerto, entradas, bytes ocupados e remoções.
+        """
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'taxa_acerto': self.hits / consultas if consultas else 0.0,
+                'entradas': len(self._entradas),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'remocoes': self.remocoes,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def obter_cache_resultados(db_path):
+    """
+    Retorna o cache de resultados compartilhado do banco no processo.
+
+    Args:
+        db_path (str): Caminho para o arquivo do banco de dados SQLite.
+
+    Returns:
+        ResultCache: Instância única para o arquivo.
+    """
+    caminho = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(caminho)
+        if cache is None:
+            cache = _caches[caminho] = ResultCache(caminho)
+        return cache
@@ -0,0 +1,421 @@
+"""
+Tabelas de rollup pré-agregadas e reescrita transparente de consultas.
+
+Durante a ingestão, create_database.py chama criar_rollups para gravar totais de
+VLPesoCargaBruta, TEU, QTCarga e COUNT(*) em vários níveis de granularidade (ano,
+sentido, porto, natureza da carga, mercadoria, país...). Antes de executar o SQL
+gerado pelo modelo, RollupRewriter verifica se a consulta é uma agregação simples
+sobre Cargas que pode ser respondida pelo menor rollup que contém todas as colunas
+usadas; se não puder, a consulta original é executada sem alteração.
+"""
+
+import os
+import re
+import sqlite3
+from db_connection import connect_database
+
+# Rollups criados na ingestão: (nome, dimensões). Rollups cujas dimensões não
+# existem na tabela Cargas (ex: Mes) são ignorados. Todos incluem Ano, que é a
+# unidade de atualização após a carga incremental.
+ROLLUPS = [
+    ('Rollup_Ano_Sentido', ['Ano', 'Sentido']),
+    ('Rollup_Ano_Mes_Sentido', ['Ano', 'Mes', 'Sentido']),
+    ('Rollup_Natureza', ['Ano', 'Sentido', 'Natureza_da_Carga']),
+    ('Rollup_Origem', ['Ano', 'Sentido', 'Origem']),
+    ('Rollup_Destino', ['Ano', 'Sentido', 'Destino']),
+    ('Rollup_Mercadoria', ['Ano', 'Sentido', 'CDMercadoria']),
+    ('Rollup_Pais', ['Ano', 'Sentido', 'Pais_Origem', 'Pais_Destino']),
+    ('Rollup_Porto_Mes', ['Ano', 'Mes', 'Sentido', 'Origem', 'Destino', 'Natureza_da_Carga']),
+    ('Rollup_Porto_Mercadoria', ['Ano', 'Sentido', 'Origem', 'Destino', 'Natureza_da_Carga',
+                                 'CDMercadoria', 'TipoNavegacao_Codigo']),
+]
+
+# Medidas agregadas nos rollups
+MEDIDAS = ['VLPesoCargaBruta', 'TEU', 'QTCarga']
+
+# Tabela de catálogo com os rollups existentes
+CATALOGO = 'Rollups'
+
+# Palavras reservadas aceitas nas consultas reescritas
+PALAVRAS_CHAVE = {
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'BETWEEN', 'LIKE', 'GLOB', 'IS',
+    'NULL', 'AS', 'GROUP', 'BY', 'ORDER', 'ASC', 'DESC', 'LIMIT', 'OFFSET', 'HAVING',
+    'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'ESCAPE', 'COLLATE', 'NOCASE', 'NULLS',
+    'FIRST', 'LAST',
+}
+
+# Construções que impedem a reescrita
+PALAVRAS_BLOQUEADAS = {
+    'JOIN', 'UNION', 'INTERSECT', 'EXCEPT', 'OVER', 'DISTINCT', 'WITH', 'INSERT',
+    'UPDATE', 'DELETE', 'EXISTS',
+}
+
+FUNCOES_AGREGADAS = {'SUM', 'COUNT', 'AVG', 'MIN', 'MAX', 'TOTAL'}
+
+_TOKEN = re.compile(r"""
+    (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<space>\s+)
+  | (?P<op>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+def tokenizar_sql(sql):
+    """Divide o SQL em tokens (tipo, texto, início, fim), descartando espaços."""
+    tokens = []
+    for m in _TOKEN.finditer(sql):
+        if m.lastgroup != 'space':
+            tokens.append((m.lastgroup, m.group(), m.start(), m.end()))
+    return tokens
+
+
+def nome_identificador(token):
+    """Retorna o nome de um identificador, sem aspas."""
+    tipo, texto = token[0], token[1]
+    if tipo == 'quoted':
+        return texto[1:-1].replace('""', '"')
+    return texto
+
+
+def criar_rollups(conn, tabela_origem='Cargas'):
+    """
+    Cria as tabelas de rollup e o catálogo usado pela reescrita.
+
+    Os rollups são criados do mais detalhado para o menos detalhado; cada um é
+    agregado a partir do menor rollup já criado que contém suas dimensões, e
+    apenas o primeiro lê a tabela Cargas.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        tabela_origem (str): Tabela ou view com os dados (padrão: Cargas).
+
+    Returns:
+        dict: Nome do rollup -> número de linhas.
+    """
+    print("Criando tabelas de rollup pré-agregadas...")
+    cursor = conn.cursor()
+    colunas = {row[1] for row in cursor.execute(f'PRAGMA table_info({tabela_origem})')}
+    medidas = [m for m in MEDIDAS if m in colunas]
+    definicoes = [(nome, dims) for nome, dims in ROLLUPS if all(d in colunas for d in dims)]
+
+    cursor.execute(f'DROP TABLE IF EXISTS {CATALOGO}')
+    cursor.execute(f'CREATE TABLE {CATALOGO} (nome TEXT PRIMARY KEY, dimensoes TEXT, linhas INTEGER)')
+
+    criados = {}
+    for nome, dims in sorted(definicoes, key=lambda d: -len(d[1])):
+        base = _escolher_rollup(set(dims), criados)
+        lista_dims = ', '.join(f'"{d}"' for d in dims)
+        if base:
+            agregados = [f'SUM("soma_{m}") AS "soma_{m}", SUM("contagem_{m}") AS "contagem_{m}", '
+                         f'MIN("minimo_{m}") AS "minimo_{m}", MAX("maximo_{m}") AS "maximo_{m}"'
+                         for m in medidas]
+            agregados.append('SUM(registros) AS registros')
+            origem = base
+        else:
+            agregados = [f'SUM("{m}") AS "soma_{m}", COUNT("{m}") AS "contagem_{m}", '
+                         f'MIN("{m}") AS "minimo_{m}", MAX("{m}") AS "maximo_{m}"'
+                         for m in medidas]
+            agregados.append('COUNT(*) AS registros')
+            origem = tabela_origem
+
+        cursor.execute(f'DROP TABLE IF EXISTS {nome}')
+        cursor.execute(f'CREATE TABLE {nome} AS SELECT {lista_dims}, {", ".join(agregados)} '
+                       f'FROM {origem} GROUP BY {lista_dims}')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{nome.lower()} ON {nome} ({lista_dims})')
+        linhas = cursor.execute(f'SELECT COUNT(*) FROM {nome}').fetchone()[0]
+        cursor.execute(f'INSERT INTO {CATALOGO} VALUES (?, ?, ?)', (nome, ','.join(dims), linhas))
+        criados[nome] = (set(dims), linhas)
+        print(f"Rollup {nome}: {linhas} linhas")
+
+    conn.commit()
+    return {nome: linhas for nome, (_, linhas) in criados.items()}
+
+
+def atualizar_rollups(conn, anos, tabela_origem='Cargas'):
+    """
+    Recalcula os rollups existentes apenas para os anos informados.
+
+    Usado após a carga incremental: as linhas dos anos afetados são removidas
+    de cada rollup e agregadas novamente, na mesma ordem de criar_rollups.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+        anos (iterable): Valores da coluna Ano afetados pela carga.
+        tabela_origem (str): Tabela ou view com os dados (padrão: Cargas).
+
+    Returns:
+        dict: Nome do rollup -> número de linhas após a atualização.
+    """
+    catalogo = carregar_catalogo(conn)
+    anos = list(anos)
+    if not catalogo or not anos:
+        return {}
+
+    print(f"Atualizando rollups para os anos: {', '.join(str(ano) for ano in anos)}")
+    cursor = conn.cursor()
+    medidas = [m for m in MEDIDAS if f'soma_{m}' in
+               {row[1] for row in cursor.execute(f'PRAGMA table_info({next(iter(catalogo))})')}]
+    valores = [ano for ano in anos if ano is not None]
+    filtro = ' OR '.join(
+        ([f'Ano IN ({", ".join("?" * len(valores))})'] if valores else [])
+        + (['Ano IS NULL'] if None in anos else []))
+
+    definicoes = [(nome, dimensoes.split(','))
+                  for nome, dimensoes in cursor.execute(f'SELECT nome, dimensoes FROM {CATALOGO}')]
+
+    atualizados = {}
+    for nome, dims in sorted(definicoes, key=lambda d: -len(d[1])):
+        base = _escolher_rollup(set(dims), atualizados)
+        lista_dims = ', '.join(f'"{d}"' for d in dims)
+        if base:
+            agregados = [f'SUM("soma_{m}"), SUM("contagem_{m}"), MIN("minimo_{m}"), MAX("maximo_{m}")'
+                         for m in medidas]
+            agregados.append('SUM(registros)')
+        else:
+            agregados = [f'SUM("{m}"), COUNT("{m}"), MIN("{m}"), MAX("{m}")' for m in medidas]
+            agregados.append('COUNT(*)')
+            base = tabela_origem
+        colunas = [f'"{d}"' for d in dims]
+        for m in medidas:
+            colunas += [f'"soma_{m}"', f'"contagem_{m}"', f'"minimo_{m}"', f'"maximo_{m}"']
+        colunas.append('registros')
+
+        cursor.execute(f'DELETE FROM {nome} WHERE {filtro}', valores)
+        cursor.execute(f'INSERT INTO {nome} ({", ".join(colunas)}) '
+                       f'SELECT {lista_dims}, {", ".join(agregados)} FROM {base} '
+                       f'WHERE {filtro} GROUP BY {lista_dims}', valores)
+        linhas = cursor.execute(f'SELECT COUNT(*) FROM {nome}').fetchone()[0]
+        cursor.execute(f'UPDATE {CATALOGO} SET linhas = ? WHERE nome = ?', (linhas, nome))
+        atualizados[nome] = (set(dims), linhas)
+
+    conn.commit()
+    return {nome: linhas for nome, (_, linhas) in atualizados.items()}
+
+
+def carregar_catalogo(conn):
+    """
+    Lê o catálogo de rollups do banco.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco de dados.
+
+    Returns:
+        dict: Nome do rollup -> (conjunto de dimensões, número de linhas). Vazio se não houver rollups.
+    """
+    existe = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                          (CATALOGO,)).fetchone()
+    if not existe:
+        return {}
+    return {
+        nome: (set(dimensoes.split(',')), linhas)
+        for nome, dimensoes, linhas in conn.execute(f'SELECT nome, dimensoes, linhas FROM {CATALOGO}')
+    }
+
+
+def _escolher_rollup(dimensoes, catalogo):
+    """Retorna o menor rollup do catálogo que contém todas as dimensões, ou None."""
+    candidatos = [(linhas, nome) for nome, (dims, linhas) in catalogo.items() if dimensoes <= dims]
+    return min(candidatos)[1] if candidatos else None
+
+
+def reescrever_consulta(sql, catalogo):
+    """
+    Reescreve uma agregação simples sobre Cargas para usar um rollup.
+
+    A consulta é reescrita apenas quando: lê somente a tabela Cargas, sem
+    junções, subconsultas, DISTINCT ou funções de janela; todas as colunas
+    fora das funções de agregação são dimensões de um mesmo rollup; e as
+    agregações são SUM/TOTAL/AVG/MIN/MAX de uma medida ou COUNT(*). WHERE,
+    GROUP BY, HAVING, ORDER BY e LIMIT são mantidos como estão, pois os
+    rollups usam os mesmos nomes de coluna.
+
+    Args:
+        sql (str): Consulta original.
+        catalogo (dict): Catálogo retornado por carregar_catalogo.
+
+    Returns:
+        str: Consulta reescrita, ou None se a consulta não puder usar um rollup.
+    """
+    if not catalogo:
+        return None
+
+    sql = sql.strip().rstrip(';').strip()
+    tokens = tokenizar_sql(sql)
+    if not tokens or tokens[0][1].upper() != 'SELECT':
+        return None
+
+    palavras = [t[1].upper() for t in tokens if t[0] == 'ident']
+    if palavras.count('SELECT') != 1 or palavras.count('FROM') != 1 or PALAVRAS_BLOQUEADAS & set(palavras):
+        return None
+    if any(t[1] == ';' for t in tokens):
+        return None
+
+    # FROM Cargas, sem alias
+    i_from = next(i for i, t in enumerate(tokens) if t[0] == 'ident' and t[1].upper() == 'FROM')
+    if i_from + 1 >= len(tokens) or nome_identificador(tokens[i_from + 1]) != 'Cargas':
+        return None
+    i_tabela = i_from + 1
+    if i_tabela + 1 < len(tokens):
+        seguinte = tokens[i_tabela + 1]
+        if seguinte[0] != 'ident' or seguinte[1].upper() not in {'WHERE', 'GROUP', 'ORDER', 'LIMIT'}:
+            return None
+
+    edicoes = []
+    dimensoes = set()
+    aliases = set()
+    agregados = []
+    i = 0
+    while i < len(tokens):
+        tipo, texto, inicio, fim = tokens[i]
+        proximo = tokens[i + 1] if i + 1 < len(tokens) else None
+        if i == i_tabela:
+            i += 1
+            continue
+
+        if tipo == 'ident' and texto.upper() in FUNCOES_AGREGADAS and proximo and proximo[1] == '(':
+            # Agregação: FUNC ( * ) ou FUNC ( coluna )
+            if i + 3 >= len(tokens) or tokens[i + 3][1] != ')':
+                return None
+            argumento = tokens[i + 2]
+            funcao = texto.upper()
+            if funcao == 'COUNT' and argumento[1] == '*':
+                substituto = 'COALESCE(SUM(registros), 0)'
+            elif argumento[0] in ('ident', 'quoted') and nome_identificador(argumento) in MEDIDAS:
+                medida = nome_identificador(argumento)
+                substituto = {
+                    'SUM': f'SUM("soma_{medida}")',
+                    'TOTAL': f'TOTAL("soma_{medida}")',
+                    'AVG': f'(SUM("soma_{medida}") * 1.0 / SUM("contagem_{medida}"))',
+                    'MIN': f'MIN("minimo_{medida}")',
+                    'MAX': f'MAX("maximo_{medida}")',
+                }.get(funcao)
+                if substituto is None:
+                    return None
+            else:
+                return None
+            edicoes.append((inicio, tokens[i + 3][3], substituto))
+            agregados.append((inicio, tokens[i + 3][3]))
+            i += 4
+            continue
+
+        if tipo == 'ident' and texto.upper() == 'AS' and proximo and proximo[0] in ('ident', 'quoted'):
+            aliases.add(nome_identificador(proximo))
+            i += 2
+            continue
+
+        if tipo == 'quoted' or (tipo == 'ident' and texto.upper() not in PALAVRAS_CHAVE):
+            anterior = tokens[i - 1]
+            if (i < i_from and proximo and (proximo[1] == ',' or proximo[1].upper() == 'FROM')
+                    and (anterior[1] == ')' or anterior[0] in ('quoted', 'number')
+                         or (anterior[0] == 'ident' and anterior[1].upper() not in PALAVRAS_CHAVE))):
+                # Alias sem AS: SUM(VLPesoCargaBruta) total
+                aliases.add(nome_identificador(tokens[i]))
+                i += 1
+                continue
+            if proximo and proximo[1] == '(' and tipo == 'ident':
+                # Função escalar (ROUND, strftime, COALESCE...): permitida
+                i += 1
+                continue
+            dimensoes.add(nome_identificador(tokens[i]))
+        elif tipo == 'op' and texto == '*':
+            anterior = tokens[i - 1][1] if i > 0 else ''
+            if anterior.upper() == 'SELECT' or anterior == ',':
+                return None
+        i += 1
+
+    if not agregados:
+        return None
+
+    # Aliases podem ser referenciados em ORDER BY/HAVING
+    dimensoes -= aliases
+    if any(d in MEDIDAS for d in dimensoes):
+        return None
+    rollup = _escolher_rollup(dimensoes, catalogo)
+    if not rollup:
+        return None
+    edicoes.append((tokens[i_tabela][2], tokens[i_tabela][3], rollup))
+
+    # Itens do SELECT com agregação e sem alias recebem o texto original como
+    # alias, para que os nomes das colunas do resultado não mudem.
+    item_inicio = tokens[0][3]
+    profundidade = 0
+    limites = []
+    for tipo, texto, inicio, fim in tokens[1:i_from + 1]:
+        if texto == '(':
+            profundidade += 1
+        elif texto == ')':
+            profundidade -= 1
+        elif profundidade == 0 and (texto == ',' or texto.upper() == 'FROM'):
+            limites.append((item_inicio, inicio))
+            item_inicio = fim
+    for inicio_item, fim_item in limites:
+        item = sql[inicio_item:fim_item].strip()
+        tem_agregado = any(inicio_item <= a < fim_item for a, _ in agregados)
+        if tem_agregado and not re.search(r'(\bAS\s+|[)"\w]\s+)("(?:[^"]|"")*"|\w+)\s*$', item, re.I):
+            alias = item.replace('"', '""')
+            fim_texto = inicio_item + len(sql[inicio_item:fim_item].rstrip())
+            edicoes.append((fim_texto, fim_texto, f' AS "{alias}"'))
+
+    for inicio, fim, texto in sorted(edicoes, key=lambda e: (e[0], e[1]), reverse=True):
+        sql = sql[:inicio] + texto + sql[fim:]
+    return sql
+
+
+class RollupRewriter:
+    """
+    Reescreve consultas para os rollups de um banco de dados.
+
+    O catálogo é lido uma vez e relido quando o arquivo do banco muda.
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path (str): Caminho para o arquivo do banco de dados SQLite.
+        """
+        self.db_path = db_path
+        self._catalogo = None
+        self._mtime = None
+
+    def catalogo(self):
+        """
+        Retorna o catálogo de rollups do banco.
+
+        Returns:
+            dict: Catálogo retornado por carregar_catalogo.
+        """
+        try:
+            mtime = os.path.getmtime(self.db_path)
+        except OSError:
+            return {}
+        if self._catalogo is None or mtime != self._mtime:
+            try:
+                conn = connect_database(self.db_path)
+                try:
+                    self._catalogo = carregar_catalogo(conn)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Erro ao carregar catálogo de rollups: {e}")
+                self._catalogo = {}
+            self._mtime = mtime
+        return self._catalogo
+
+    def rewrite(self, sql):
+        """
+        Reescreve a consulta para um rollup, se possível.
+
+        Args:
+            sql (str): Consulta SQL gerada.
+
+        Returns:
+            str: Consulta reescrita, ou a consulta original.
+        """
+        try:
+            reescrita = reescrever_consulta(sql, self.catalogo())
+        except Exception as e:
+            print(f"Erro ao reescrever consulta para rollup: {e}")
+            reescrita = None
+        return reescrita or sql
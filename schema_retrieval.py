@@ -0,0 +1,390 @@
+"""
+Recuperação do esquema e das regras relevantes para cada pergunta.
+
+O contexto completo (esquema de todas as tabelas com linhas de exemplo, todas as
+regras e todos os exemplos) é dividido em blocos indexados com BM25: tabelas,
+seções de regras, exemplos de consultas e entradas das tabelas de mapeamento
+(agrupadas por descrição). Para cada pergunta, o prompt enviado ao modelo leva
+apenas a tabela Cargas, as tabelas de mapeamento, regras e exemplos com maior
+pontuação e os códigos de mapeamento que casam com a pergunta. Com um
+EntityResolver (ver entity_resolver.py), os códigos vêm das entidades resolvidas
+exatamente, em vez da busca BM25 nas descrições.
+
+Uso (relatório de tokens e latência do modelo antes/depois):
+    python schema_retrieval.py                        # tokens das perguntas de teste
+    python schema_retrieval.py --medir-llm            # também mede a latência do modelo
+    python schema_retrieval.py --perguntas perguntas.txt --llm openai --medir-llm
+"""
+
+import re
+import sys
+import math
+import time
+import argparse
+import unicodedata
+from collections import Counter, defaultdict
+
+# Tabela de fatos, sempre incluída no esquema enviado ao modelo
+TABELA_FATOS = 'Cargas'
+
+# Seções de regras incluídas em todos os prompts
+SECOES_FIXAS = ('CONSIDERAÇÕES GERAIS',)
+
+# Quantidade de blocos recuperados por pergunta
+MAX_TABELAS = 2
+MAX_SECOES = 4
+MAX_EXEMPLOS = 2
+MAX_MAPEAMENTOS = 12
+
+# Categorias de metadados (ver _load_metadata) e tabelas de mapeamento correspondentes
+TABELAS_METADADOS = {
+    'sentido': 'Sentido',
+    'portos': 'Portos',
+    'paises_origem': 'PaisesOrigem',
+    'paises_destino': 'PaisesDestino',
+    'tipo_navegacao': 'TipoNavegacao',
+    'natureza_carga': 'NaturezaCarga',
+    'conteiner_estado': 'ConteinerEstado',
+    'mercadorias': 'CDMercadoria',
+}
+
+# Palavras sem valor para a recuperação
+STOPWORDS = set("""
+a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas
+para pra com sem e ou que qual quais quanto quanta quantos quantas foi foram ser sao
+ha houve tem ter como se ao aos mais menos entre sobre ate desde me meu minha seu sua
+""".split())
+
+# Termos do domínio ignorados na busca de mapeamentos ("porto", "carga" aparecem em
+# milhares de nomes e não identificam uma entrada)
+TERMOS_GENERICOS = {'porto', 'carga', 'tipo', 'navegacao', 'terminal', 'tonelada', 'volume', 'total'}
+
+# Perguntas de teste usadas no relatório (as mesmas dos scripts test_*.py)
+PERGUNTAS_TESTE = [
+    "Quantas toneladas foram embarcadas pelo Porto do Itaqui em 2023?",
+    "Qual o total de toneladas desembarcadas em Santos em 2023?",
+    "Quantas cargas foram registradas em 2023?",
+    "Quais são as 5 mercadorias mais frequentes?",
+    "Qual é o peso médio das cargas por tipo de navegação?",
+    "Quantas toneladas de animais vivos foram embarcadas em 2023?",
+    "Qual o volume de carga exportada do Brasil para a China em 2023?",
+    "Quantas cargas de cabotagem passaram pelo Porto de Santos em 2023?",
+    "Qual o volume de granéis líquidos movimentados em 2023?",
+    "Quantos TEUs foram movimentados pelo Porto de Santos em 2023?",
+    "Quais portos movimentaram mais de 500 mil toneladas em 2023?",
+    "Qual a média mensal de cargas embarcadas em 2023?",
+    "Qual o volume de cargas movimentadas pelo Porto do Itaqui em 2024?",
+    "Quantas toneladas foram movimentadas pelos portos de Paranaguá e Antonina em 2023?",
+]
+
+
+def tokenizar(texto):
+    """
+    Divide um texto em termos para o índice.
+
+    Nomes em CamelCase e com sublinhados são separados em palavras, acentos e
+    maiúsculas são removidos, stopwords descartadas e o plural simples reduzido.
+
+    Args:
+        texto (str): Texto a tokenizar.
+
+    Returns:
+        list: Termos do texto.
+    """
+    texto = re.sub(r'([a-z])([A-Z])|([A-Z])([A-Z][a-z])', r'\1\3 \2\4', texto)
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+    termos = []
+    for termo in re.findall(r'[a-z0-9]+', texto):
+        if termo in STOPWORDS or len(termo) < 2:
+            continue
+        if len(termo) > 4 and termo.endswith('s') and not termo.isdigit():
+            termo = termo[:-1]
+        termos.append(termo)
+    return termos
+
+
+def contar_tokens(texto):
+    """
+    Conta os tokens de um texto com o tokenizador do tiktoken, se instalado,
+    ou estima (um token a cada 4 caracteres).
+
+    Args:
+        texto (str): Texto do prompt.
+
+    Returns:
+        int: Número de tokens.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return len(texto) // 4
+    return len(tiktoken.get_encoding('cl100k_base').encode(texto))
+
+
+class IndiceBM25:
+    """
+    Índice invertido com pontuação BM25 sobre uma lista de documentos.
+    """
+
+    def __init__(self, documentos, k1=1.2, b=0.75):
+        """
+        Args:
+            documentos (list): Textos dos documentos.
+            k1 (float): Saturação da frequência dos termos.
+            b (float): Normalização pelo tamanho do documento.
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.tamanhos = []
+        for doc_id, texto in enumerate(documentos):
+            frequencias = Counter(tokenizar(texto))
+            self.tamanhos.append(sum(frequencias.values()))
+            for termo, freq in frequencias.items():
+                self.postings[termo].append((doc_id, freq))
+        total = len(self.tamanhos)
+        self.media = sum(self.tamanhos) / total if total else 0.0
+        self.idf = {termo: math.log(1 + (total - len(lista) + 0.5) / (len(lista) + 0.5))
+                    for termo, lista in self.postings.items()}
+
+    def buscar(self, consulta, k=5, ignorar=()):
+        """
+        Retorna os documentos com maior pontuação para a consulta.
+
+        Args:
+            consulta (str): Texto da consulta.
+            k (int): Número máximo de resultados.
+            ignorar (iterable): Termos desconsiderados nesta busca.
+
+        Returns:
+            list: Tuplas (id do documento, pontuação) com pontuação positiva, em ordem decrescente.
+        """
+        pontuacoes = defaultdict(float)
+        for termo in set(tokenizar(consulta)) - set(ignorar):
+            idf = self.idf.get(termo)
+            if idf is None:
+                continue
+            for doc_id, freq in self.postings[termo]:
+                norma = self.k1 * (1 - self.b + self.b * self.tamanhos[doc_id] / (self.media or 1))
+                pontuacoes[doc_id] += idf * freq * (self.k1 + 1) / (freq + norma)
+        return sorted(pontuacoes.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+def dividir_esquema(esquema):
+    """
+    Divide a saída de SQLDatabase.get_table_info em blocos por tabela.
+
+    Args:
+        esquema (str): Esquema com os CREATE TABLE e as linhas de exemplo.
+
+    Returns:
+        dict: Nome da tabela -> bloco de texto.
+    """
+    blocos = {}
+    for bloco in re.split(r'\n(?=CREATE (?:TABLE|VIEW) )', esquema.strip()):
+        m = re.match(r'CREATE (?:TABLE|VIEW) "?(\w+)"?', bloco)
+        if m:
+            blocos[m.group(1)] = bloco.strip()
+    return blocos
+
+
+def dividir_contexto(contexto):
+    """
+    Divide o contexto completo das classes de consulta em partes.
+
+    Args:
+        contexto (str): Contexto criado por _create_context.
+
+    Returns:
+        dict: cabecalho, tabelas, importante, secoes (título -> texto), exemplos
+            (lista), rodape; ou None se o contexto não tem o formato esperado.
+    """
+    m = re.search(r'ESQUEMA DO BANCO DE DADOS:\n(.*?)\n(IMPORTANTE:[^\n]*)\n(.*?)\n'
+                  r'EXEMPLOS DE CONSULTAS:\n(.*?)\n(Sua tarefa é:.*)', contexto, re.DOTALL)
+    if not m:
+        return None
+    esquema, importante, regras, exemplos, rodape = m.groups()
+    secoes = {}
+    for secao in re.split(r'\n(?=\d{1,2}\. [^\n"]+:\n)', '\n' + regras.strip()):
+        titulo = re.match(r'\s*\d{1,2}\. ([^\n]+):', secao)
+        if titulo:
+            secoes[titulo.group(1).strip()] = secao.strip()
+    return {
+        'cabecalho': contexto[:m.start()].strip(),
+        'tabelas': dividir_esquema(esquema),
+        'importante': importante,
+        'secoes': secoes,
+        'exemplos': [e.strip() for e in re.split(r'\n(?=\d+\. ")', '\n' + exemplos.strip()) if e.strip()],
+        'rodape': rodape.strip(),
+    }
+
+
+class SchemaRetriever:
+    """
+    Monta, para cada pergunta, um prompt com apenas as partes relevantes do contexto completo.
+    """
+
+    def __init__(self, contexto, metadata=None, resolver=None):
+        """
+        Args:
+            contexto (str): Contexto completo criado por _create_context.
+            metadata (dict, optional): Metadados das tabelas de mapeamento (ver _load_metadata).
+            resolver (EntityResolver, optional): Resolvedor de entidades usado para os códigos.
+        """
+        self.contexto = contexto
+        self.resolver = resolver
+        self.partes = dividir_contexto(contexto)
+        if self.partes is None:
+            print("Aviso: formato do contexto não reconhecido; o prompt completo será usado")
+            return
+
+        self.tabelas = [nome for nome in self.partes['tabelas'] if nome != TABELA_FATOS]
+        self.indice_tabelas = IndiceBM25([self.partes['tabelas'][nome] for nome in self.tabelas])
+        self.titulos = [t for t in self.partes['secoes'] if t not in SECOES_FIXAS]
+        self.indice_secoes = IndiceBM25([self.partes['secoes'][t] for t in self.titulos])
+        self.indice_exemplos = IndiceBM25(self.partes['exemplos'])
+
+        # Entradas de mapeamento agrupadas por descrição: (tabela, descrição, códigos)
+        grupos = defaultdict(list)
+        for categoria, tabela in TABELAS_METADADOS.items():
+            for codigo, descricao in (metadata or {}).get(categoria, {}).items():
+                if descricao:
+                    grupos[(tabela, str(descricao))].append(str(codigo))
+        self.mapeamentos = [(tabela, descricao, sorted(codigos))
+                            for (tabela, descricao), codigos in grupos.items()]
+        self.indice_mapeamentos = IndiceBM25([descricao for _, descricao, _ in self.mapeamentos])
+
+    def recuperar(self, pergunta):
+        """
+        Seleciona as partes do contexto relevantes para a pergunta.
+
+        Args:
+            pergunta (str): Pergunta em linguagem natural.
+
+        Returns:
+            dict: Listas de tabelas, seções, exemplos e mapeamentos selecionados.
+        """
+        tabelas = [self.tabelas[i] for i, _ in self.indice_tabelas.buscar(pergunta, MAX_TABELAS)]
+        secoes = [self.titulos[i] for i, _ in self.indice_secoes.buscar(pergunta, MAX_SECOES)]
+        exemplos = [i for i, _ in self.indice_exemplos.buscar(pergunta, MAX_EXEMPLOS)] or [0]
+
+        # Mapeamentos com pontuação próxima à melhor: descrições que casam com a pergunta
+        resultados = self.indice_mapeamentos.buscar(pergunta, MAX_MAPEAMENTOS, TERMOS_GENERICOS)
+        melhor = resultados[0][1] if resultados else 0
+        mapeamentos = [self.mapeamentos[i] for i, pontuacao in resultados if pontuacao >= melhor * 0.5]
+        return {'tabelas': tabelas, 'secoes': secoes, 'exemplos': exemplos, 'mapeamentos': mapeamentos}
+
+    def contexto_para(self, pergunta):
+        """
+        Monta o contexto reduzido para a pergunta.
+
+        Args:
+            pergunta (str): Pergunta em linguagem natural.
+
+        Returns:
+            str: Contexto com o esquema, regras, exemplos e códigos relevantes.
+        """
+        if self.partes is None:
+            return self.contexto
+        partes = self.partes
+        selecao = self.recuperar(pergunta)
+
+        tabelas = [TABELA_FATOS] + [t for t in partes['tabelas'] if t in selecao['tabelas']]
+        esquema = '\n\n'.join(partes['tabelas'][t] for t in tabelas if t in partes['tabelas'])
+        # As seções mantêm a ordem e a numeração do contexto completo
+        secoes = [texto for titulo, texto in partes['secoes'].items()
+                  if titulo in selecao['secoes'] or titulo in SECOES_FIXAS]
+        exemplos = [partes['exemplos'][i] for i in sorted(selecao['exemplos'])]
+
+        blocos = [partes['cabecalho'], f"ESQUEMA DO BANCO DE DADOS:\n{esquema}",
+                  partes['importante'] + '\n\n' + '\n\n'.join(secoes)]
+        if self.resolver is not None:
+            entidades = self.resolver.contexto_prompt(self.resolver.resolver(pergunta))
+            if entidades:
+                blocos.append(entidades)
+        elif selecao['mapeamentos']:
+            linhas = []
+            for tabela, descricao, codigos in selecao['mapeamentos']:
+                lista = ', '.join(f"'{c}'" for c in codigos[:10])
+                if len(codigos) > 10:
+                    lista += f" (+{len(codigos) - 10})"
+                linhas.append(f"   - {tabela}: {descricao} = {lista}")
+            blocos.append("CÓDIGOS DAS TABELAS DE MAPEAMENTO RELACIONADOS À PERGUNTA:\n" + '\n'.join(linhas))
+        blocos.append("EXEMPLOS DE CONSULTAS:\n\n" + '\n\n'.join(exemplos))
+        blocos.append(partes['rodape'])
+        return '\n\n'.join(blocos) + '\n'
+
+
+def relatorio(sql_query, perguntas, medir_llm=False):
+    """
+    Compara os prompts completo e reduzido nas perguntas de teste.
+
+    Args:
+        sql_query: Instância de SimpleSQLQuery ou OpenAISQLQuery.
+        perguntas (list): Perguntas em linguagem natural.
+        medir_llm (bool): Se True, chama o modelo com os dois prompts e mede a latência.
+
+    Returns:
+        dict: Médias de tokens (e de latência em segundos, se medida) antes e depois.
+    """
+    retriever = sql_query.retriever or SchemaRetriever(sql_query.context, sql_query.metadata)
+    tokens_antes, tokens_depois, latencia_antes, latencia_depois = [], [], [], []
+    for pergunta in perguntas:
+        reduzido = retriever.contexto_para(pergunta)
+        tokens_antes.append(contar_tokens(sql_query.context) + contar_tokens(pergunta))
+        tokens_depois.append(contar_tokens(reduzido) + contar_tokens(pergunta))
+        print(f"{tokens_antes[-1]:7d} -> {tokens_depois[-1]:6d} tokens  {pergunta}")
+        if medir_llm:
+            for contexto, latencias in ((sql_query.context, latencia_antes), (reduzido, latencia_depois)):
+                inicio = time.perf_counter()
+                sql_query._generate_sql(pergunta, contexto)
+                latencias.append(time.perf_counter() - inicio)
+
+    def media(valores):
+        return sum(valores) / len(valores) if valores else 0.0
+
+    resultado = {'tokens_antes': media(tokens_antes), 'tokens_depois': media(tokens_depois)}
+    if medir_llm:
+        resultado.update(latencia_antes=media(latencia_antes), latencia_depois=media(latencia_depois))
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório de tokens e latência com o contexto reduzido.")
+    parser.add_argument('--db', default=None, help='Caminho do banco de dados SQLite.')
+    parser.add_argument('--perguntas', default=None,
+                        help='Arquivo com uma pergunta por linha (padrão: perguntas de teste).')
+    parser.add_argument('--llm', choices=['simple', 'openai'], default='simple',
+                        help='Classe de consulta usada para montar o contexto.')
+    parser.add_argument('--medir-llm', action='store_true',
+                        help='Chama o modelo com os dois prompts e compara a latência.')
+    args = parser.parse_args(argv)
+
+    perguntas = PERGUNTAS_TESTE
+    if args.perguntas:
+        with open(args.perguntas, encoding='utf-8') as f:
+            perguntas = [linha.strip() for linha in f if linha.strip()]
+
+    try:
+        if args.llm == 'openai':
+            from openai_sql_query import OpenAISQLQuery
+            sql_query = OpenAISQLQuery(args.db, query_cache=False)
+        else:
+            from simple_sql_query import SimpleSQLQuery
+            sql_query = SimpleSQLQuery(args.db, query_cache=False)
+    except Exception as e:
+        print(f"Erro ao inicializar a classe de consulta: {e}")
+        sys.exit(1)
+
+    resultado = relatorio(sql_query, perguntas, medir_llm=args.medir_llm)
+    reducao = 1 - resultado['tokens_depois'] / resultado['tokens_antes'] if resultado['tokens_antes'] else 0
+    print(f"\nTokens médios por prompt: {resultado['tokens_antes']:.0f} -> "
+          f"{resultado['tokens_depois']:.0f} ({reducao:.0%} a menos)")
+    if args.medir_llm:
+        print(f"Latência média do modelo: {resultado['latencia_antes']:.2f}s -> "
+              f"{resultado['latencia_depois']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
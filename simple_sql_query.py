@@ -4,10 +4,24 @@ sem usar o framework de agentes que requer suporte a ferramentas.
 """
 
 import os
+import asyncio
 import sqlite3
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain_community.utilities.sql_database import SQLDatabase
+from db_connection import create_sql_database, create_query_engine, ConnectionPool, BatchReader, format_result
+from rollups import RollupRewriter
+from sql_guard import SQLGuard, OrcamentoExcedido
+from query_cache import QueryCache
+from result_cache import obter_cache_resultados
+from schema_retrieval import SchemaRetriever
+from entity_resolver import obter_resolver
+from metadata_snapshot import obter_metadados, MetadataSnapshot
+from prompt_cache import carregar_contexto
+from template_engine import TemplateEngine
+from history_store import HistoryStore
+from instrumentation import span, span_atual, tokens_resposta
+from batch_queries import aprocessar_lote, processar_lote
+from sql_stream import processar_em_fluxo, extrair_sql
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import HumanMessage, SystemMessage
 
@@ -15,13 +29,28 @@ from langchain.schema import HumanMessage, SystemMessage
 load_dotenv()
 
 class SimpleSQLQuery:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, backend=None, query_cache=True, schema_pruning=True,
+                 entity_resolution=True, templates=True, max_concurrency=None, timeout=None):
         """
         Inicializa o sistema de consulta SQL simples.
         
         Args:
             db_path (str, optional): Caminho para o arquivo do banco de dados.
                                     Se não fornecido, tenta localizar na pasta de trabalho.
+            backend (str, optional): Motor de execução das consultas ('sqlite', 'duckdb'
+                                    ou 'duckdb-parquet'). Padrão: variável SQL_BACKEND ou 'sqlite'.
+            query_cache (bool): Reutiliza o SQL já gerado para perguntas equivalentes,
+                                    sem chamar o modelo (ver query_cache.py).
+            schema_pruning (bool): Envia ao modelo apenas as tabelas, regras, exemplos e
+                                    códigos relevantes para cada pergunta (ver schema_retrieval.py).
+            entity_resolution (bool): Resolve portos, países e mercadorias citados na pergunta
+                                    em códigos exatos para o prompt (ver entity_resolver.py).
+            templates (bool): Responde as perguntas nos formatos mais comuns com SQL montado
+                                    localmente, sem chamar o modelo (ver template_engine.py).
+            max_concurrency (int, optional): Número máximo de perguntas em andamento em
+                                    aprocess_query. Padrão: variável SQL_MAX_CONCURRENCY ou 16.
+            timeout (float, optional): Tempo limite, em segundos, de cada pergunta em
+                                    aprocess_query. Padrão: variável SQL_QUERY_TIMEOUT ou 60.
         """
         # Obter a chave da API
         self.api_key = os.getenv("OPENROUTER_API_KEY")
@@ -50,7 +79,13 @@ class SimpleSQLQuery:
                 raise FileNotFoundError("❌ Erro: O arquivo do banco de dados não foi encontrado em nenhum dos caminhos predefinidos.")
         
         self.db_path = db_path
-        self.memory = []  # Manter histórico de consultas
+        # Histórico limitado: recentes em memória, demais em query_history.db (ver history_store.py)
+        self.memory = HistoryStore(db_path)
+        
+        # Limites das consultas assíncronas (aprocess_query)
+        self.max_concurrency = max_concurrency or int(os.getenv("SQL_MAX_CONCURRENCY", "16"))
+        self.timeout = timeout or float(os.getenv("SQL_QUERY_TIMEOUT", "60"))
+        self._semaforo = None
         
         # Inicializar o modelo usando OpenRouter
         self.llm = ChatOpenAI(
@@ -60,87 +95,54 @@ class SimpleSQLQuery:
         )
         
         # Inicializar a conexão com o banco de dados SQL
-        db_uri = f"sqlite:///{db_path}"
-        self.db = SQLDatabase.from_uri(db_uri)
+        self.db = create_sql_database(db_path)
+        self.rollups = RollupRewriter(db_path)
+        self.engine = create_query_engine(db_path, backend)
+        self.results = obter_cache_resultados(db_path)
+        # Consultas geradas passam pelo guarda (plano, LIMIT e orçamento de tempo)
+        self.pool = ConnectionPool(db_path)
+        self.guard = SQLGuard()
         
         # Carregar metadados do banco de dados
         self.metadata = self._load_metadata()
+        self.entities = None
+        if entity_resolution:
+            self.entities = obter_resolver(db_path, self.metadata, self.metadata.versao)
+        
+        # Criar o contexto para as consultas SQL (lido do disco enquanto o esquema,
+        # os dados e o template não mudam; ver prompt_cache.py)
+        self.context = carregar_contexto(db_path, type(self).__name__, self._create_context)
+        self.retriever = SchemaRetriever(self.context, self.metadata, self.entities) if schema_pruning else None
+        
+        # Perguntas nos formatos mais comuns: SQL montado localmente, sem o modelo
+        self.templates = None
+        if templates:
+            self.templates = TemplateEngine(
+                self.metadata, self.entities or obter_resolver(db_path, self.metadata, self.metadata.versao))
         
-        # Criar o contexto para as consultas SQL
-        self.context = self._create_context()
+        # Cache persistente pergunta -> SQL, invalidado quando os dados ou o contexto mudam
+        self.cache = None
+        if query_cache:
+            try:
+                self.cache = QueryCache(db_path, contexto=self.context)
+            except sqlite3.Error as e:
+                print(f"Cache de consultas desativado: {e}")
     
     def _load_metadata(self):
         """
         Carrega os metadados das tabelas de mapeamento do banco de dados.
         
-        Returns:
-            dict: Dicionário contendo os metadados das tabelas.
-        """
-        metadata = {
-            "sentido": {},
-            "portos": {},
-            "paises_origem": {},
-            "paises_destino": {},
-            "tipo_navegacao": {},
-            "natureza_carga": {},
-            "conteiner_estado": {},
-            "mercadorias": {},
-            "anos_disponiveis": []
-        }
+        O snapshot é compartilhado por todas as instâncias do processo e lido
+        novamente apenas quando os dados mudam (ver metadata_snapshot.py).
         
+        Returns:
+            MetadataSnapshot: Metadados das tabelas, acessados como um dicionário.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Carregar mapeamentos de Sentido
-            cursor.execute("SELECT codigo, descricao FROM Sentido")
-            for codigo, descricao in cursor.fetchall():
-                metadata["sentido"][codigo] = descricao
-            
-            # Carregar mapeamentos de Portos
-            cursor.execute("SELECT codigo, nome FROM Portos")
-            for codigo, nome in cursor.fetchall():
-                metadata["portos"][codigo] = nome
-            
-            # Carregar mapeamentos de Países de Origem
-            cursor.execute("SELECT codigo, nome FROM PaisesOrigem")
-            for codigo, nome in cursor.fetchall():
-                metadata["paises_origem"][codigo] = nome
-            
-            # Carregar mapeamentos de Países de Destino
-            cursor.execute("SELECT codigo, nome FROM PaisesDestino")
-            for codigo, nome in cursor.fetchall():
-                metadata["paises_destino"][codigo] = nome
-            
-            # Carregar mapeamentos de Tipo de Navegação
-            cursor.execute("SELECT codigo, descricao FROM TipoNavegacao")
-            for codigo, descricao in cursor.fetchall():
-                metadata["tipo_navegacao"][codigo] = descricao
-            
-            # Carregar mapeamentos de Natureza da Carga
-            cursor.execute("SELECT codigo, descricao FROM NaturezaCarga")
-            for codigo, descricao in cursor.fetchall():
-                metadata["natureza_carga"][codigo] = descricao
-            
-            # Carregar mapeamentos de Estado do Contêiner
-            cursor.execute("SELECT codigo, descricao FROM ConteinerEstado")
-            for codigo, descricao in cursor.fetchall():
-                metadata["conteiner_estado"][codigo] = descricao
-            
-            # Carregar mapeamentos de Mercadorias
-            cursor.execute("SELECT codigo, descricao FROM CDMercadoria")
-            for codigo, descricao in cursor.fetchall():
-                metadata["mercadorias"][codigo] = descricao
-            
-            # Obter anos disponíveis
-            cursor.execute("SELECT DISTINCT Ano FROM Cargas ORDER BY Ano")
-            metadata["anos_disponiveis"] = [ano[0] for ano in cursor.fetchall()]
-            
-            conn.close()
+            return obter_metadados(self.db_path)
         except Exception as e:
             print(f"Erro ao carregar metadados: {e}")
-        
-        return metadata
+            return MetadataSnapshot.vazio()
     
     def _create_context(self):
         """
@@ -217,7 +219,7 @@ IMPORTANTE: Ao analisar consultas em linguagem natural, você deve entender o co
     - "Contagem" significa usar a função COUNT()
 
 11. ANOS:
-    - Os dados disponíveis são para os seguintes anos: {', '.join(self.metadata["anos_disponiveis"])}
+    - Os dados disponíveis são para os seguintes anos: {', '.join(str(ano) for ano in self.metadata["anos_disponiveis"])}
     - Se perguntarem sobre anos não disponíveis, informe que não há dados para esse período
     - Ao processar consultas que especificam um ano, sempre considere o período completo do ano (de 01/01 a 31/12)
 
@@ -226,6 +228,7 @@ IMPORTANTE: Ao analisar consultas em linguagem natural, você deve entender o co
     - Ao processar consultas sobre portos específicos, considere TODOS os terminais relacionados àquele porto (públicos e privados)
     - Para consultas sobre Santos, inclua tanto o código "BRSSZ" quanto "BRSP008" (DP World Santos)
     - Para consultas sobre qualquer porto, verifique se o porto está na origem (para exportações) ou no destino (para importações)
+    - Quando o prompt trouxer a seção ENTIDADES IDENTIFICADAS NA PERGUNTA, filtre portos, países e mercadorias com IN (...) usando exatamente os valores listados, sem LIKE
     - SEMPRE amplie as consultas para capturar mais dados relevantes, usando técnicas como LIKE para nomes parciais (ex: '%santos%', '%terminal%', '%porto%')
     - Para consultas sobre períodos, SEMPRE considere o período completo (ex: para um ano, use BETWEEN '2023-01-01' AND '2023-12-31')
     - Para consultas sobre tipos de carga, use LIKE com padrões amplos para capturar todas as variações relevantes
@@ -287,6 +290,118 @@ Responda APENAS com a consulta SQL, sem nenhum texto adicional.
 """
         return context
     
+    def _run_sql(self, sql_query):
+        """
+        Executa a consulta SQL gerada, usando as tabelas de rollup quando possível.
+        
+        Com o backend DuckDB, consultas que não podem ser traduzidas ou que falham
+        no DuckDB são executadas no SQLite. Resultados de consultas repetidas vêm
+        do cache de resultados enquanto os dados não mudam (ver result_cache.py).
+        
+        Antes da execução, a consulta é verificada pelo guarda (ver sql_guard.py):
+        comandos de modificação e planos caros demais são recusados e consultas
+        sem LIMIT recebem um. A execução é interrompida ao passar do orçamento de
+        tempo, no SQLite e no DuckDB; no SQLite o resultado é lido em lotes, até
+        SQL_MAX_ROWS linhas e SQL_MAX_RESULT_MB megabytes.
+        
+        Args:
+            sql_query (str): Consulta SQL gerada pelo modelo.
+            
+        Returns:
+            str: Resultado da consulta.
+            
+        Raises:
+            ConsultaBloqueada: Se a consulta foi recusada pelo guarda.
+            OrcamentoExcedido: Se a execução passou do orçamento.
+        """
+        with span("sql") as etapa:
+            result = self.results.get(sql_query)
+            if result is not None:
+                etapa.definir(cache_hit=True, bytes=len(result))
+                return result
+            
+            with self.pool.connection() as conn:
+                # Uma linha além do orçamento indica que o resultado foi truncado
+                sql_executado = self.guard.preparar(conn, self.rollups.rewrite(sql_query), self.guard.max_linhas + 1)
+                result = None
+                if self.engine is not None:
+                    try:
+                        result = self.engine.run(sql_executado, self.guard.max_segundos)
+                        etapa.definir(engine="duckdb", bytes=len(result))
+                    except OrcamentoExcedido:
+                        # Repetir no SQLite dobraria o tempo gasto
+                        raise
+                    except Exception as e:
+                        print(f"Consulta executada no SQLite (DuckDB: {e})")
+                if result is None:
+                    with self.guard.limitar(conn):
+                        reader = BatchReader(conn.execute(sql_executado), max_rows=self.guard.max_linhas)
+                        result = format_result(reader.fetch())
+                    etapa.definir(engine="sqlite", rows=reader.rows, bytes=reader.bytes, truncated=reader.truncated)
+                    if reader.truncated:
+                        result += f"\n(Resultado truncado: {reader.rows} linhas exibidas)"
+            self.results.put(sql_query, result)
+            return result
+    
+    def _template_sql(self, query):
+        """
+        Monta o SQL das perguntas nos formatos mais comuns, sem chamar o modelo.
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            
+        Returns:
+            str: Consulta SQL, ou None se a pergunta não for reconhecida.
+        """
+        return self.templates.sql_para(query) if self.templates else None
+    
+    def _prompt_context(self, query):
+        """
+        Monta o contexto enviado ao modelo para uma pergunta.
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            
+        Returns:
+            str: Contexto reduzido (ou completo) com as entidades identificadas na pergunta.
+        """
+        with span("context", schema_pruning=self.retriever is not None) as etapa:
+            if self.retriever:
+                context = self.retriever.contexto_para(query)
+            else:
+                entidades = self.entities.contexto_prompt(self.entities.resolver(query)) if self.entities else ""
+                context = f"{self.context}\n{entidades}\n" if entidades else self.context
+            etapa.definir(chars=len(context))
+            return context
+    
+    def _generate_sql(self, query, context=None):
+        """
+        Gera a consulta SQL para uma pergunta com o modelo.
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            context (str, optional): Contexto enviado ao modelo. Padrão: contexto
+                                    reduzido para a pergunta, ou o contexto completo.
+            
+        Returns:
+            str: Consulta SQL gerada.
+        """
+        if context is None:
+            context = self._prompt_context(query)
+        
+        # Criar a mensagem para o modelo
+        messages = [
+            SystemMessage(content=context),
+            HumanMessage(content=query)
+        ]
+        
+        # Obter a resposta do modelo (o cliente refaz as chamadas que falham até max_retries vezes)
+        with span("llm", model=self.llm.model_name, max_retries=self.llm.max_retries) as etapa:
+            response = self.llm.invoke(messages)
+            prompt_tokens, completion_tokens = tokens_resposta(response)
+            etapa.definir(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return extrair_sql(response.content)
+    
     def process_query(self, query):
         """
         Processa uma consulta em linguagem natural e retorna a consulta SQL correspondente.
@@ -297,19 +412,162 @@ Responda APENAS com a consulta SQL, sem nenhum texto adicional.
         Returns:
             dict: Dicionário contendo a consulta original, a consulta SQL gerada e o resultado.
         """
-        try:
-            # Criar a mensagem para o modelo
-            messages = [
-                SystemMessage(content=self.context),
-                HumanMessage(content=query)
-            ]
+        # Tempos e tokens de cada etapa (ver instrumentation.py)
+        with span("query", agent=type(self).__name__) as etapa:
+            try:
+                # Perguntas nos formatos mais comuns não passam pelo modelo
+                sql_query = self._template_sql(query)
+                from_template = sql_query is not None
+                from_cache = False
+                if from_template:
+                    result = self._run_sql(sql_query)
+                else:
+                    # Reutilizar o SQL gerado para uma pergunta equivalente
+                    sql_query = self.cache.get(query) if self.cache else None
+                    from_cache = sql_query is not None
+                if from_cache:
+                    try:
+                        result = self._run_sql(sql_query)
+                    except Exception as e:
+                        print(f"SQL em cache descartado: {e}")
+                        self.cache.invalidate(query)
+                        from_cache = False
+                
+                if not from_cache and not from_template:
+                    sql_query = self._generate_sql(query)
+                    
+                    # Executar a consulta SQL
+                    result = self._run_sql(sql_query)
+                
+                with span("post"):
+                    if self.cache and not from_cache and not from_template:
+                        self.cache.put(query, sql_query)
+                    
+                    # Armazenar no histórico
+                    self.memory.append({
+                        "query": query,
+                        "sql": sql_query,
+                        "result": result
+                    })
+                
+                etapa.definir(from_cache=from_cache, from_template=from_template)
+                return {
+                    "query": query,
+                    "sql": sql_query,
+                    "result": result,
+                    "from_cache": from_cache,
+                    "from_template": from_template
+                }
+            except Exception as e:
+                print(f"Erro ao processar consulta: {e}")
+                etapa.registrar_erro(e)
+                return self._error_response(query, f"Erro: {str(e)}")
+    
+    def _error_response(self, query, error_message):
+        """
+        Registra no histórico e retorna a resposta de uma consulta que falhou.
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            error_message (str): Mensagem de erro.
             
-            # Obter a resposta do modelo
-            response = self.llm.invoke(messages)
-            sql_query = response.content.strip()
+        Returns:
+            dict: Resposta no mesmo formato de process_query.
+        """
+        self.memory.append({
+            "query": query,
+            "sql": "Error generating SQL",
+            "result": error_message
+        })
+        return {
+            "query": query,
+            "sql": "Error generating SQL",
+            "result": error_message,
+            "from_cache": False,
+            "from_template": False
+        }
+    
+    def _semaphore(self):
+        """
+        Retorna o semáforo que limita as consultas assíncronas em andamento.
+        
+        Um semáforo do asyncio pertence a um loop de eventos; um novo é criado
+        quando a instância é usada por outro loop (ex: chamadas a asyncio.run).
+        
+        Returns:
+            asyncio.Semaphore: Semáforo do loop de eventos atual.
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaforo is None or self._semaforo[0] is not loop:
+            self._semaforo = (loop, asyncio.Semaphore(self.max_concurrency))
+        return self._semaforo[1]
+    
+    async def _agenerate_sql(self, query, context=None):
+        """
+        Versão assíncrona de _generate_sql.
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            context (str, optional): Contexto enviado ao modelo.
+            
+        Returns:
+            str: Consulta SQL gerada.
+        """
+        if context is None:
+            context = self._prompt_context(query)
+        
+        messages = [
+            SystemMessage(content=context),
+            HumanMessage(content=query)
+        ]
+        
+        # Obter a resposta do modelo sem bloquear o loop de eventos
+        with span("llm", model=self.llm.model_name, max_retries=self.llm.max_retries) as etapa:
+            response = await self.llm.ainvoke(messages)
+            prompt_tokens, completion_tokens = tokens_resposta(response)
+            etapa.definir(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return extrair_sql(response.content)
+    
+    async def _aprocess(self, query):
+        """
+        Processa uma consulta sem bloquear o loop de eventos.
+        
+        O modelo é chamado pelo cliente assíncrono; o SQLite e o cache de consultas
+        são usados em threads (asyncio.to_thread).
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            
+        Returns:
+            dict: Resposta no mesmo formato de process_query.
+        """
+        # Perguntas nos formatos mais comuns não passam pelo modelo
+        sql_query = self._template_sql(query)
+        from_template = sql_query is not None
+        from_cache = False
+        if from_template:
+            result = await asyncio.to_thread(self._run_sql, sql_query)
+        else:
+            # Reutilizar o SQL gerado para uma pergunta equivalente
+            sql_query = await asyncio.to_thread(self.cache.get, query) if self.cache else None
+            from_cache = sql_query is not None
+        if from_cache:
+            try:
+                result = await asyncio.to_thread(self._run_sql, sql_query)
+            except Exception as e:
+                print(f"SQL em cache descartado: {e}")
+                await asyncio.to_thread(self.cache.invalidate, query)
+                from_cache = False
+        
+        if not from_cache and not from_template:
+            sql_query = await self._agenerate_sql(query)
             
             # Executar a consulta SQL
-            result = self.db.run(sql_query)
+            result = await asyncio.to_thread(self._run_sql, sql_query)
+        
+        with span("post"):
+            if self.cache and not from_cache and not from_template:
+                await asyncio.to_thread(self.cache.put, query, sql_query)
             
             # Armazenar no histórico
             self.memory.append({
@@ -317,34 +575,140 @@ Responda APENAS com a consulta SQL, sem nenhum texto adicional.
                 "sql": sql_query,
                 "result": result
             })
+        
+        span_atual().definir(from_cache=from_cache, from_template=from_template)
+        return {
+            "query": query,
+            "sql": sql_query,
+            "result": result,
+            "from_cache": from_cache,
+            "from_template": from_template
+        }
+    
+    async def aprocess_query(self, query, timeout=None):
+        """
+        Versão assíncrona de process_query.
+        
+        Enquanto uma pergunta aguarda o modelo, o loop de eventos atende as demais,
+        até max_concurrency perguntas em andamento; as excedentes aguardam na fila
+        do semáforo. O tempo limite conta a partir da entrada no semáforo.
+        
+        O cancelamento da tarefa (ex: task.cancel() ou o fim de um asyncio.wait_for
+        externo) é propagado. Uma chamada ao modelo em andamento é interrompida;
+        uma consulta SQL já iniciada termina na sua thread e o resultado é descartado.
+        
+        Exemplo:
+            respostas = await asyncio.gather(*(agente.aprocess_query(p) for p in perguntas))
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            timeout (float, optional): Tempo limite em segundos. Padrão: self.timeout.
             
-            return {
-                "query": query,
-                "sql": sql_query,
-                "result": result
-            }
-        except Exception as e:
-            print(f"Erro ao processar consulta: {e}")
-            error_message = f"Erro: {str(e)}"
-            self.memory.append({
-                "query": query,
-                "sql": "Error generating SQL",
-                "result": error_message
-            })
-            return {
-                "query": query,
-                "sql": "Error generating SQL",
-                "result": error_message
-            }
+        Returns:
+            dict: Dicionário contendo a consulta original, a consulta SQL gerada e o resultado.
+        """
+        timeout = timeout or self.timeout
+        async with self._semaphore():
+            with span("query", agent=type(self).__name__) as etapa:
+                try:
+                    return await asyncio.wait_for(self._aprocess(query), timeout)
+                except asyncio.TimeoutError:
+                    print(f"Tempo limite excedido ({timeout:g} s): {query}")
+                    etapa.registrar_erro(f"tempo limite de {timeout:g} s excedido")
+                    return self._error_response(query, f"Erro: tempo limite de {timeout:g} s excedido")
+                except Exception as e:
+                    print(f"Erro ao processar consulta: {e}")
+                    etapa.registrar_erro(e)
+                    return self._error_response(query, f"Erro: {str(e)}")
+    
+    def _stream_sql(self, query, context=None):
+        """
+        Gera a consulta SQL com a resposta do modelo em fluxo.
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            context (str, optional): Contexto enviado ao modelo.
+            
+        Yields:
+            str: Pedaços da resposta do modelo.
+        """
+        if context is None:
+            context = self._prompt_context(query)
+        
+        messages = [
+            SystemMessage(content=context),
+            HumanMessage(content=query)
+        ]
+        
+        for chunk in self.llm.stream(messages):
+            yield chunk.content
+    
+    def stream_query(self, query):
+        """
+        Processa uma consulta com a resposta do modelo em fluxo (ver sql_stream.py).
+        
+        A consulta SQL começa a ser executada assim que a primeira instrução
+        completa chega, enquanto o modelo ainda emite o restante da resposta.
+        
+        Args:
+            query (str): Consulta em linguagem natural.
+            
+        Yields:
+            dict: Eventos "token", "sql", "result" e, por último, "done" com a
+                resposta no formato de process_query.
+        """
+        return processar_em_fluxo(self, query)
+    
+    def process_queries(self, questions, rpm=None, timeout=None):
+        """
+        Processa um lote de perguntas (ver batch_queries.py).
+        
+        Perguntas equivalentes são processadas uma vez, as chamadas ao modelo são
+        concorrentes e limitadas por minuto, e cada consulta SQL distinta é
+        executada uma vez.
+        
+        Args:
+            questions (list): Consultas em linguagem natural.
+            rpm (float, optional): Limite de chamadas ao modelo por minuto.
+                                  Padrão: variável SQL_LLM_RPM ou 60.
+            timeout (float, optional): Tempo limite, em segundos, de cada pergunta.
+            
+        Returns:
+            list: Respostas no formato de process_query, na ordem da entrada,
+                com os tempos de cada pergunta em "timings".
+        """
+        return processar_lote(self, questions, rpm, timeout)
+    
+    async def aprocess_queries(self, questions, rpm=None, timeout=None):
+        """
+        Versão assíncrona de process_queries.
+        """
+        return await aprocessar_lote(self, questions, rpm, timeout)
     
     def get_memory(self):
         """
-        Retorna o histórico de consultas processadas.
+        Retorna as consultas processadas mais recentes.
+        
+        Os resultados vêm resumidos: "result" traz uma prévia do texto, e
+        "result_size" e "result_hash" o tamanho e o hash do resultado completo.
         
         Returns:
             list: Lista de dicionários contendo as consultas processadas.
         """
-        return self.memory
+        return self.memory.recent()
+    
+    def get_history(self, before=None, limit=20):
+        """
+        Lê uma página do histórico gravado, da consulta mais recente para a mais antiga.
+        
+        Args:
+            before (int, optional): "id" da última consulta da página anterior.
+            limit (int): Consultas por página.
+            
+        Returns:
+            list: Consultas da página, no formato de get_memory.
+        """
+        return self.memory.page(before, limit)
 
 # Exemplo de uso
 if __name__ == "__main__":
@@ -3,7 +3,9 @@ import sqlite3
 import json
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain_community.utilities.sql_database import SQLDatabase
+from db_connection import create_sql_database
+from history_store import HistoryStore
+from instrumentation import span
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain.agents.agent_types import AgentType
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -46,7 +48,10 @@ class SQLAgent:
                 raise FileNotFoundError(f"Banco de dados não encontrado em: {db_path}")
             
             # Inicializar o SQLDatabase do LangChain
-            self.db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
+            self.db = create_sql_database(db_path)
+            
+            # Histórico limitado de consultas (ver history_store.py)
+            self.memory = HistoryStore(db_path)
             
             # Configurar o modelo de linguagem
             self.llm = ChatOpenAI(
@@ -70,27 +75,51 @@ class SQLAgent:
         """
         Process a natural language query and return the results
         """
-        try:
-            # Executar a consulta através do agente
-            result = self.agent_executor.invoke({"input": query})
-            
-            # Extrair SQL da resposta (se disponível)
-            sql = "Query SQL não disponível"
-            if "sql_cmd" in result.get("intermediate_steps", []):
-                sql = result["intermediate_steps"]["sql_cmd"]
-            
-            return {
-                "query": query,
-                "sql": sql,
-                "result": result["output"]
-            }
-            
-        except Exception as e:
-            return {
-                "query": query,
-                "sql": "Error during agent execution",
-                "result": f"Erro: {str(e)}"
-            }
+        # O agente alterna chamadas ao modelo e consultas SQL: as duas etapas são
+        # medidas juntas no span "agent", com os tokens somados pelo callback
+        from langchain_community.callbacks import get_openai_callback
+        
+        with span("query", agent=type(self).__name__) as etapa:
+            try:
+                # Executar a consulta através do agente
+                with span("agent", model=self.llm.model_name) as agente, get_openai_callback() as uso:
+                    result = self.agent_executor.invoke({"input": query})
+                    agente.definir(prompt_tokens=uso.prompt_tokens, completion_tokens=uso.completion_tokens,
+                                   llm_calls=uso.successful_requests)
+                
+                # Extrair SQL da resposta (se disponível)
+                sql = "Query SQL não disponível"
+                if "sql_cmd" in result.get("intermediate_steps", []):
+                    sql = result["intermediate_steps"]["sql_cmd"]
+                
+                response = {
+                    "query": query,
+                    "sql": sql,
+                    "result": result["output"]
+                }
+                
+            except Exception as e:
+                etapa.registrar_erro(e)
+                response = {
+                    "query": query,
+                    "sql": "Error during agent execution",
+                    "result": f"Erro: {str(e)}"
+                }
+            with span("post"):
+                self.memory.append(response)
+        return response
+    
+    def get_memory(self):
+        """
+        Return the most recent processed queries (results as a truncated preview)
+        """
+        return self.memory.recent()
+    
+    def get_history(self, before=None, limit=20):
+        """
+        Return a page of the stored history, newest first (see HistoryStore.page)
+        """
+        return self.memory.page(before, limit)
 
 if __name__ == '__main__':
     try:
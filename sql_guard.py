@@ -0,0 +1,389 @@
+"""
+Proteção contra consultas geradas caras ou perigosas.
+
+Toda consulta gerada passa por três etapas antes e durante a execução:
+
+    1. Somente leitura: uma única instrução SELECT/WITH, sem comandos de
+       modificação, PRAGMA ou ATTACH.
+    2. Plano: o custo é estimado a partir do EXPLAIN QUERY PLAN, multiplicando
+       as linhas visitadas em cada laço aninhado (SCAN percorre a tabela toda;
+       SEARCH usa as estatísticas do índice em sqlite_stat1). Um produto
+       cartesiano de Cargas com Portos, por exemplo, custa linhas(Cargas) x
+       linhas(Portos). Consultas acima do limite são recusadas, exceto as que
+       apenas listam linhas (sem agregação, ordenação ou agrupamento), que param
+       no LIMIT inserido na etapa seguinte.
+    3. LIMIT: consultas sem LIMIT recebem LIMIT max_linhas; um LIMIT maior é reduzido.
+
+Na execução, o progress handler do SQLite interrompe a consulta quando o tempo
+ou o número de instruções da máquina virtual passa do orçamento, ou quando a
+execução é cancelada; a conexão continua utilizável.
+
+Limites (variáveis de ambiente):
+    SQL_MAX_ROWS      - linhas por consulta (padrão 1000)
+    SQL_MAX_COST      - linhas visitadas estimadas pelo plano (padrão 100 milhões)
+    SQL_MAX_SECONDS   - tempo de execução em segundos (padrão 30)
+    SQL_MAX_VM_STEPS  - instruções da máquina virtual (padrão 0, sem limite)
+"""
+
+import os
+import re
+import time
+import sqlite3
+from contextlib import contextmanager
+from rollups import tokenizar_sql, nome_identificador, FUNCOES_AGREGADAS
+from instrumentation import span_atual
+
+MAX_LINHAS_PADRAO = 1000
+MAX_CUSTO_PADRAO = 100_000_000
+MAX_SEGUNDOS_PADRAO = 30.0
+
+# Instruções da máquina virtual entre chamadas do progress handler
+INTERVALO_PROGRESSO = 10_000
+
+# Palavras que não podem aparecer em uma consulta de leitura
+PALAVRAS_PROIBIDAS = {
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'CREATE', 'ATTACH', 'DETACH',
+    'PRAGMA', 'VACUUM', 'REINDEX', 'ANALYZE', 'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT',
+}
+
+# Construções que obrigam a ler todas as linhas antes de devolver a primeira
+PALAVRAS_SEM_FLUXO = {'GROUP', 'ORDER', 'DISTINCT', 'UNION', 'INTERSECT', 'EXCEPT', 'OVER'}
+
+# Palavras que seguem uma tabela e não são apelidos
+PALAVRAS_APOS_TABELA = {
+    'WHERE', 'GROUP', 'ORDER', 'LIMIT', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'NATURAL', 'ON',
+    'USING', 'UNION', 'INTERSECT', 'EXCEPT', 'HAVING', 'WINDOW', 'INDEXED', 'NOT', 'OUTER',
+}
+
+_LACO = re.compile(r'^(SCAN|SEARCH) (\S+)(.*)$')
+_RESTRICOES = re.compile(r'\(([^()]*)\)\s*$')
+
+
+class ConsultaBloqueada(ValueError):
+    """Consulta recusada antes da execução (modificação ou custo acima do limite)."""
+
+
+class OrcamentoExcedido(RuntimeError):
+    """Consulta interrompida durante a execução (tempo, instruções ou cancelamento)."""
+
+
+def _tokens(sql):
+    """Tokens do SQL com a profundidade de parênteses de cada um."""
+    profundidade = 0
+    tokens = []
+    for token in tokenizar_sql(sql):
+        if token[1] == ')':
+            profundidade -= 1
+        tokens.append((token, profundidade))
+        if token[1] == '(':
+            profundidade += 1
+    return tokens
+
+
+def verificar_somente_leitura(sql):
+    """
+    Recusa comandos que não sejam uma única consulta de leitura.
+
+    Args:
+        sql (str): Consulta SQL.
+
+    Raises:
+        ConsultaBloqueada: Se a consulta modifica o banco ou contém mais de uma instrução.
+    """
+    tokens = [token for token, _ in _tokens(sql)]
+    while tokens and tokens[-1][1] == ';':
+        tokens.pop()
+    if not tokens:
+        raise ConsultaBloqueada("Consulta vazia.")
+    if any(token[1] == ';' for token in tokens):
+        raise ConsultaBloqueada("Apenas uma instrução por consulta é permitida.")
+    if tokens[0][0] != 'ident' or tokens[0][1].upper() not in ('SELECT', 'WITH', 'VALUES'):
+        raise ConsultaBloqueada("Consultas de modificação não são permitidas por segurança.")
+    proibidas = {token[1].upper() for token in tokens if token[0] == 'ident'} & PALAVRAS_PROIBIDAS
+    if proibidas:
+        raise ConsultaBloqueada(f"Comando não permitido na consulta: {', '.join(sorted(proibidas))}.")
+
+
+def inserir_limite(sql, max_linhas):
+    """
+    Garante que a consulta retorne no máximo max_linhas linhas.
+
+    Args:
+        sql (str): Consulta SQL.
+        max_linhas (int): Número máximo de linhas.
+
+    Returns:
+        tuple: (SQL com LIMIT, True se o SQL foi alterado)
+    """
+    tokens = _tokens(sql)
+    sql = sql.rstrip().rstrip(';').rstrip()
+    for posicao, (token, profundidade) in enumerate(tokens):
+        if profundidade == 0 and token[0] == 'ident' and token[1].upper() == 'LIMIT':
+            # LIMIT n, LIMIT n OFFSET m ou LIMIT m, n
+            seguintes = [t for t, _ in tokens[posicao + 1:posicao + 4]]
+            quantidade = seguintes[0] if seguintes else None
+            if len(seguintes) == 3 and seguintes[1][1] == ',':
+                quantidade = seguintes[2]
+            if quantidade and quantidade[0] == 'number' and float(quantidade[1]) > max_linhas:
+                return sql[:quantidade[2]] + str(max_linhas) + sql[quantidade[3]:], True
+            return sql, False
+    # Em uma nova linha, para não ficar dentro de um comentário -- no fim da consulta
+    return f"{sql}\nLIMIT {max_linhas}", True
+
+
+def apelidos_tabelas(sql, tabelas):
+    """
+    Mapeia os nomes usados no plano (tabelas e apelidos) para as tabelas do banco.
+
+    Args:
+        sql (str): Consulta SQL.
+        tabelas (iterable): Nomes das tabelas e views do banco.
+
+    Returns:
+        dict: Nome em minúsculas -> tabela.
+    """
+    por_nome = {tabela.lower(): tabela for tabela in tabelas}
+    apelidos = dict(por_nome)
+    tokens = [token for token, _ in _tokens(sql)]
+    for posicao, token in enumerate(tokens):
+        if token[0] not in ('ident', 'quoted'):
+            continue
+        tabela = por_nome.get(nome_identificador(token).lower())
+        if tabela is None:
+            continue
+        seguinte = tokens[posicao + 1] if posicao + 1 < len(tokens) else None
+        if seguinte and seguinte[0] == 'ident' and seguinte[1].upper() == 'AS':
+            seguinte = tokens[posicao + 2] if posicao + 2 < len(tokens) else None
+        if seguinte and seguinte[0] in ('ident', 'quoted') and seguinte[1].upper() not in PALAVRAS_APOS_TABELA:
+            apelidos[nome_identificador(seguinte).lower()] = tabela
+    return apelidos
+
+
+def apenas_lista_linhas(sql):
+    """Indica se a consulta devolve linhas à medida que as encontra (sem agregação nem ordenação)."""
+    for token, _ in _tokens(sql):
+        if token[0] == 'ident' and token[1].upper() in PALAVRAS_SEM_FLUXO | FUNCOES_AGREGADAS | {'GROUP_CONCAT'}:
+            return False
+    return True
+
+
+class SQLGuard:
+    """
+    Verifica, limita e executa consultas geradas com orçamento de tempo e de instruções.
+    """
+
+    def __init__(self, max_linhas=None, max_custo=None, max_segundos=None, max_passos=None):
+        """
+        Args:
+            max_linhas (int, optional): Linhas por consulta (padrão: SQL_MAX_ROWS ou 1000).
+            max_custo (float, optional): Linhas visitadas estimadas pelo plano
+                                         (padrão: SQL_MAX_COST ou 100 milhões).
+            max_segundos (float, optional): Tempo de execução (padrão: SQL_MAX_SECONDS ou 30).
+            max_passos (int, optional): Instruções da máquina virtual
+                                        (padrão: SQL_MAX_VM_STEPS ou 0, sem limite).
+        """
+        self.max_linhas = max_linhas or int(os.getenv("SQL_MAX_ROWS") or MAX_LINHAS_PADRAO)
+        self.max_custo = max_custo or float(os.getenv("SQL_MAX_COST") or MAX_CUSTO_PADRAO)
+        self.max_segundos = max_segundos or float(os.getenv("SQL_MAX_SECONDS") or MAX_SEGUNDOS_PADRAO)
+        self.max_passos = max_passos or int(os.getenv("SQL_MAX_VM_STEPS") or 0)
+        self._linhas = {}
+        self._estatisticas = {}
+        self._tabelas = []
+        self._assinatura = None
+
+    def _carregar_estatisticas(self, conn):
+        """Lê as tabelas do banco e as estatísticas dos índices, uma vez por versão do esquema."""
+        assinatura = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if assinatura == self._assinatura:
+            return
+        self._linhas = {}
+        self._estatisticas = {}
+        tabelas = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")]
+        try:
+            for tabela, indice, stat in conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1"):
+                numeros = [int(n) for n in str(stat).split() if n.isdigit()]
+                if numeros:
+                    self._linhas.setdefault(tabela, numeros[0])
+                    if indice:
+                        self._estatisticas[indice] = numeros
+        except sqlite3.OperationalError:
+            pass
+        for tabela in tabelas:
+            if tabela not in self._linhas:
+                try:
+                    self._linhas[tabela] = conn.execute(f'SELECT MAX(rowid) FROM "{tabela}"').fetchone()[0] or 0
+                except sqlite3.OperationalError:
+                    # Views e tabelas sem rowid: estimadas como a maior tabela
+                    pass
+        self._tabelas = tabelas
+        self._assinatura = assinatura
+
+    def _linhas_tabela(self, nome, apelidos):
+        tabela = apelidos.get(nome.lower())
+        if tabela in self._linhas:
+            return self._linhas[tabela]
+        # Views, CTEs e subconsultas materializadas: estimativa conservadora
+        return max(self._linhas.values(), default=1)
+
+    def _fator(self, detalhe, apelidos):
+        """
+        Estima as linhas visitadas por um laço do plano e o custo fixo de montá-lo.
+
+        Returns:
+            tuple: (linhas por execução do laço, custo fixo)
+        """
+        tipo, nome, resto = _LACO.match(detalhe).groups()
+        linhas = self._linhas_tabela(nome, apelidos)
+        if tipo == 'SCAN':
+            return max(linhas, 1), 0
+        restricoes = _RESTRICOES.search(resto)
+        restricoes = restricoes.group(1) if restricoes else ''
+        if 'INTEGER PRIMARY KEY' in resto and '=' in restricoes and not re.search(r'[<>]', restricoes):
+            return 1, 0
+        iguais = len(re.findall(r'(?<![<>!])=', restricoes))
+        if 'AUTOMATIC' in resto:
+            # Índice temporário: montado uma vez, consultado a cada linha externa
+            return 1, linhas
+        indice = re.search(r'INDEX (\S+)', resto)
+        estatistica = self._estatisticas.get(indice.group(1)) if indice else None
+        if estatistica and iguais < len(estatistica):
+            fator = estatistica[iguais]
+        else:
+            fator = linhas / (10 ** iguais)
+        if re.search(r'[<>]', restricoes):
+            fator /= 4
+        return max(fator, 1), 0
+
+    def _custo(self, filhos, por_pai, apelidos):
+        """Custo de um nível do plano: laços aninhados multiplicam, subconsultas somam."""
+        produto = 1
+        total = 0
+        ha_laco = False
+        for no, detalhe in filhos:
+            subconsulta = self._custo(por_pai.get(no, []), por_pai, apelidos)
+            if _LACO.match(detalhe):
+                fator, fixo = self._fator(detalhe, apelidos)
+                total += fixo + subconsulta
+                produto *= fator
+                ha_laco = True
+            elif 'CORRELATED' in detalhe:
+                total += produto * subconsulta
+            else:
+                total += subconsulta
+        return total + (produto if ha_laco else 0)
+
+    def analisar(self, conn, sql):
+        """
+        Estima o custo de uma consulta pelo EXPLAIN QUERY PLAN.
+
+        Args:
+            conn (sqlite3.Connection): Conexão com o banco de dados.
+            sql (str): Consulta SQL.
+
+        Returns:
+            dict: custo (linhas visitadas estimadas) e plano (detalhes do EXPLAIN).
+        """
+        self._carregar_estatisticas(conn)
+        plano = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        por_pai = {}
+        for no, pai, _, detalhe in plano:
+            por_pai.setdefault(pai, []).append((no, detalhe))
+        apelidos = apelidos_tabelas(sql, self._tabelas)
+        return {
+            'custo': self._custo(por_pai.get(0, []), por_pai, apelidos),
+            'plano': [detalhe for _, _, _, detalhe in plano],
+        }
+
+    def verificar(self, conn, sql):
+        """
+        Verifica a consulta e o custo do plano, sem alterá-la.
+
+        Args:
+            conn (sqlite3.Connection): Conexão com o banco de dados.
+            sql (str): Consulta SQL.
+
+        Raises:
+            ConsultaBloqueada: Se a consulta modifica o banco ou o custo passa do limite.
+        """
+        verificar_somente_leitura(sql)
+        analise = self.analisar(conn, sql)
+        span_atual().definir(plan_cost=analise['custo'], plan=analise['plano'])
+        if analise['custo'] > self.max_custo and not apenas_lista_linhas(sql):
+            raise ConsultaBloqueada(
+                f"Consulta recusada: custo estimado de {analise['custo']:,.0f} linhas visitadas "
+                f"(limite {self.max_custo:,.0f}). Plano: {'; '.join(analise['plano'])}"
+            )
+
+    def preparar(self, conn, sql, max_linhas=None):
+        """
+        Verifica a consulta, estima o custo do plano e insere o LIMIT.
+
+        Args:
+            conn (sqlite3.Connection): Conexão com o banco de dados.
+            sql (str): Consulta SQL.
+            max_linhas (int, optional): LIMIT inserido (padrão: self.max_linhas).
+
+        Returns:
+            str: Consulta pronta para execução.
+
+        Raises:
+            ConsultaBloqueada: Se a consulta modifica o banco ou o custo passa do limite.
+        """
+        self.verificar(conn, sql)
+        sql, _ = inserir_limite(sql, max_linhas or self.max_linhas)
+        return sql
+
+    @contextmanager
+    def limitar(self, conn, cancelar=None, max_segundos=None):
+        """
+        Aplica o orçamento de tempo e de instruções às consultas executadas no bloco.
+
+        Args:
+            conn (sqlite3.Connection): Conexão com o banco de dados.
+            cancelar (threading.Event, optional): Interrompe a consulta quando sinalizado.
+            max_segundos (float, optional): Tempo limite do bloco (padrão: self.max_segundos).
+
+        Raises:
+            OrcamentoExcedido: Se a consulta foi interrompida.
+        """
+        max_segundos = max_segundos or self.max_segundos
+        inicio = time.monotonic()
+        passos = [0]
+        motivo = []
+
+        def progresso():
+            passos[0] += INTERVALO_PROGRESSO
+            if cancelar is not None and cancelar.is_set():
+                motivo.append("consulta cancelada")
+            elif max_segundos and time.monotonic() - inicio > max_segundos:
+                motivo.append(f"tempo limite de {max_segundos:g} s excedido")
+            elif self.max_passos and passos[0] > self.max_passos:
+                motivo.append(f"limite de {self.max_passos:,} instruções excedido")
+            return 1 if motivo else 0
+
+        conn.set_progress_handler(progresso, INTERVALO_PROGRESSO)
+        try:
+            yield
+        except Exception as e:
+            # O pandas envolve o sqlite3.OperationalError "interrupted" em outra exceção
+            if motivo:
+                raise OrcamentoExcedido(f"Consulta interrompida: {motivo[0]}.") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, INTERVALO_PROGRESSO)
+
+    def executar(self, conn, sql, cancelar=None):
+        """
+        Verifica e executa uma consulta dentro do orçamento.
+
+        Args:
+            conn (sqlite3.Connection): Conexão com o banco de dados.
+            sql (str): Consulta SQL.
+            cancelar (threading.Event, optional): Interrompe a consulta quando sinalizado.
+
+        Returns:
+            list: Linhas do resultado (no máximo max_linhas).
+        """
+        sql = self.preparar(conn, sql)
+        with self.limitar(conn, cancelar):
+            return conn.execute(sql).fetchall()
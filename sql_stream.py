@@ -0,0 +1,245 @@
+"""
+Geração de SQL em fluxo, com execução antecipada da consulta.
+
+Sem o fluxo, a execução só começa depois da resposta completa do modelo. Aqui
+os pedaços da resposta são acumulados em um DetectorSQL, que reconhece a
+primeira instrução completa (bloco ```sql fechado ou ponto e vírgula fora de
+strings e comentários). A consulta é enviada para uma thread assim que é
+reconhecida, enquanto o modelo ainda emite o texto final (ex: uma explicação).
+
+processar_em_fluxo produz eventos para a interface:
+    {"event": "token", "text": ...}    texto acumulado da resposta do modelo
+    {"event": "sql", "sql": ..., "early": ...}
+                                        consulta reconhecida e em execução
+    {"event": "result", "sql": ..., "result": ...}
+                                        resultado da consulta
+    {"event": "done", "response": ...} resposta no formato de process_query,
+                                        com os tempos em "timings"
+
+O agente é uma instância de SimpleSQLQuery ou OpenAISQLQuery; são usados os
+atributos cache e memory e os métodos _template_sql, _stream_sql, _run_sql e
+_error_response.
+"""
+
+import os
+import re
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from db_connection import DEFAULT_POOL_SIZE
+from instrumentation import span
+
+# Threads que executam as consultas reconhecidas durante o fluxo
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SQL_POOL_SIZE") or DEFAULT_POOL_SIZE),
+                               thread_name_prefix='sql-stream')
+
+# Início de uma resposta que já é SQL (sem bloco de código)
+_INICIO_SQL = re.compile(r'\s*(SELECT|WITH)\b', re.IGNORECASE)
+_CERCA = '```'
+
+
+def fim_instrucao(texto):
+    """
+    Localiza o ponto e vírgula que termina a primeira instrução SQL.
+
+    Ignora ponto e vírgula dentro de strings, identificadores entre aspas e
+    comentários, inclusive os ainda não fechados.
+
+    Args:
+        texto (str): SQL, possivelmente incompleto.
+
+    Returns:
+        int: Posição do ponto e vírgula, ou -1.
+    """
+    i, n = 0, len(texto)
+    while i < n:
+        c = texto[i]
+        if c in ("'", '"'):
+            fim = texto.find(c, i + 1)
+            # Aspas duplicadas ('') fazem parte da string
+            while fim != -1 and texto[fim + 1:fim + 2] == c:
+                fim = texto.find(c, fim + 2)
+            if fim == -1:
+                return -1
+            i = fim + 1
+        elif texto.startswith('--', i):
+            fim = texto.find('\n', i)
+            if fim == -1:
+                return -1
+            i = fim + 1
+        elif texto.startswith('/*', i):
+            fim = texto.find('*/', i + 2)
+            if fim == -1:
+                return -1
+            i = fim + 2
+        elif c == ';':
+            return i
+        else:
+            i += 1
+    return -1
+
+
+def _limpar(sql):
+    """Remove espaços e o ponto e vírgula final; None se não sobrar texto."""
+    return sql.strip().rstrip(';').strip() or None
+
+
+class DetectorSQL:
+    """
+    Acumula a resposta do modelo e reconhece a primeira instrução SQL completa.
+    """
+
+    def __init__(self):
+        self.texto = ''
+        self.sql = None
+
+    def _instrucao(self, final=False):
+        """Retorna a primeira instrução completa do texto acumulado, ou None."""
+        texto = self.texto
+        inicio = texto.find(_CERCA)
+        if inicio != -1:
+            # Bloco de código: a instrução termina na cerca de fechamento
+            corpo = texto.find('\n', inicio)
+            if corpo == -1:
+                return None
+            texto = texto[corpo:]
+            fim = texto.find(_CERCA)
+            if fim != -1:
+                return _limpar(texto[:fim])
+        elif not _INICIO_SQL.match(texto):
+            # Texto antes do SQL: aguardar um bloco de código ou o fim da resposta
+            return _limpar(texto) if final else None
+        fim = fim_instrucao(texto)
+        if fim != -1:
+            return _limpar(texto[:fim])
+        return _limpar(texto) if final else None
+
+    def adicionar(self, pedaco):
+        """
+        Acrescenta um pedaço da resposta.
+
+        Args:
+            pedaco (str): Texto recebido do modelo.
+
+        Returns:
+            str: A instrução SQL, na primeira vez em que ela fica completa; senão None.
+        """
+        self.texto += pedaco or ''
+        if self.sql is None:
+            self.sql = self._instrucao()
+            return self.sql
+        return None
+
+    def finalizar(self):
+        """
+        Retorna a instrução SQL da resposta completa.
+
+        Returns:
+            str: Instrução reconhecida durante o fluxo ou extraída do texto completo.
+        """
+        if self.sql is None:
+            self.sql = self._instrucao(final=True)
+        return self.sql
+
+
+def extrair_sql(texto):
+    """
+    Extrai a primeira instrução SQL de uma resposta completa do modelo.
+
+    Args:
+        texto (str): Resposta do modelo.
+
+    Returns:
+        str: Instrução SQL, sem bloco de código nem ponto e vírgula final.
+    """
+    detector = DetectorSQL()
+    detector.adicionar(texto)
+    return detector.finalizar() or texto.strip()
+
+
+def processar_em_fluxo(agente, query):
+    """
+    Processa uma consulta com a resposta do modelo em fluxo.
+
+    Args:
+        agente: Instância de SimpleSQLQuery ou OpenAISQLQuery.
+        query (str): Consulta em linguagem natural.
+
+    Yields:
+        dict: Eventos "token", "sql", "result" e "done" (ver o início do módulo).
+    """
+    inicio = time.perf_counter()
+    tempos = {}
+    with span("query", agent=type(agente).__name__, streaming=True) as raiz:
+        # As consultas rodam em outra thread: o contexto leva o span da pergunta
+        contexto = contextvars.copy_context()
+        try:
+            # SQL de um template ou já gerado para uma pergunta equivalente
+            sql_query = agente._template_sql(query)
+            from_template = sql_query is not None
+            if sql_query is None and agente.cache:
+                sql_query = agente.cache.get(query)
+            if sql_query is not None:
+                tempos["first_sql"] = time.perf_counter() - inicio
+                yield {"event": "sql", "sql": sql_query, "early": False}
+                try:
+                    result = agente._run_sql(sql_query)
+                    tempos["first_result"] = tempos["total"] = time.perf_counter() - inicio
+                    yield {"event": "result", "sql": sql_query, "result": result}
+                    with span("post"):
+                        agente.memory.append({"query": query, "sql": sql_query, "result": result})
+                    raiz.definir(from_cache=not from_template, from_template=from_template)
+                    yield {"event": "done", "response": {"query": query, "sql": sql_query, "result": result,
+                                                         "from_cache": not from_template,
+                                                         "from_template": from_template, "timings": tempos}}
+                    return
+                except Exception as e:
+                    if from_template:
+                        raise
+                    print(f"SQL em cache descartado: {e}")
+                    agente.cache.invalidate(query)
+
+            detector = DetectorSQL()
+            execucao = None
+            result = None
+            with span("llm", streaming=True) as etapa:
+                for pedaco in agente._stream_sql(query):
+                    sql_query = detector.adicionar(pedaco)
+                    yield {"event": "token", "text": detector.texto}
+                    if sql_query is not None:
+                        # Instrução completa: executar enquanto o modelo termina a resposta
+                        tempos["first_sql"] = time.perf_counter() - inicio
+                        execucao = _executor.submit(contexto.copy().run, agente._run_sql, sql_query)
+                        yield {"event": "sql", "sql": sql_query, "early": True}
+                    if execucao is not None and result is None and execucao.done():
+                        result = execucao.result()
+                        tempos["first_result"] = time.perf_counter() - inicio
+                        yield {"event": "result", "sql": detector.sql, "result": result}
+                etapa.definir(chars=len(detector.texto))
+
+            sql_query = detector.finalizar()
+            if not sql_query:
+                raise ValueError("o modelo não retornou uma consulta SQL")
+            if execucao is None:
+                tempos["first_sql"] = time.perf_counter() - inicio
+                yield {"event": "sql", "sql": sql_query, "early": False}
+                execucao = _executor.submit(contexto.copy().run, agente._run_sql, sql_query)
+            if result is None:
+                result = execucao.result()
+                tempos["first_result"] = time.perf_counter() - inicio
+                yield {"event": "result", "sql": sql_query, "result": result}
+            with span("post"):
+                if agente.cache:
+                    agente.cache.put(query, sql_query)
+
+                tempos["total"] = time.perf_counter() - inicio
+                agente.memory.append({"query": query, "sql": sql_query, "result": result})
+            raiz.definir(from_cache=False, from_template=False, first_result_ms=tempos["first_result"] * 1000)
+            yield {"event": "done", "response": {"query": query, "sql": sql_query, "result": result,
+                                                 "from_cache": False, "from_template": False, "timings": tempos}}
+        except Exception as e:
+            print(f"Erro ao processar consulta: {e}")
+            raiz.registrar_erro(e)
+            resposta = agente._error_response(query, f"Erro: {str(e)}")
+            resposta["timings"] = tempos
+            yield {"event": "done", "response": resposta}
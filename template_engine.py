@@ -0,0 +1,459 @@
+"""
+Atalho determinístico para os formatos de pergunta mais comuns.
+
+A maior parte das perguntas segue os formatos dos exemplos do prompt:
+    - total de toneladas, TEUs ou cargas por porto, sentido e ano;
+    - os N principais países, mercadorias ou portos;
+    - comparação entre anos.
+
+Essas perguntas são reconhecidas localmente e o SQL é montado a partir de
+templates parametrizados, sem chamar o modelo. O reconhecimento é conservador:
+a pergunta é aceita apenas se todas as palavras forem explicadas pelo
+vocabulário abaixo (sentido, métrica, natureza da carga, tipo de navegação,
+anos disponíveis, "N principais"), pelas entidades resolvidas em códigos (ver
+entity_resolver.py) ou por palavras neutras ("qual", "foram", "total"...).
+Qualquer outra palavra ("média", "mensal", "mais de 500 mil") faz a pergunta
+seguir para o modelo, assim como "porto", "país" ou "mercadoria" sem uma
+entidade do mesmo tipo ("qual porto exportou soja?") e o Brasil como
+contraparte ("importou do Brasil", "exportou para o Brasil"), que inverte o sentido.
+Intervalos de anos ("entre 2021 e 2024") também seguem para o modelo.
+
+Uso:
+    python template_engine.py --db cargas.db                       # perguntas de teste
+    python template_engine.py --db cargas.db --perguntas log.txt --executar
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+from entity_resolver import EntityResolver, normalizar, valores_sql
+from query_cache import NUMEROS_POR_EXTENSO
+
+# Sentido das cargas: valor da coluna Sentido e coluna do porto. Apenas verbos e ações
+# ("importou", "exportações"): "importadores" e "exportadores" são os países da outra
+# ponta e seguem para o modelo
+SENTIDOS = [
+    (re.compile(r'\b(desembarca\w*|desembarque\w*|import(?!ador)\w*)'), 'Desembarcados'),
+    (re.compile(r'\b(embarca\w*|embarque\w*|export(?!ador)\w*)'), 'Embarcados'),
+    (re.compile(r'\b(movimenta\w*|passaram|operad[ao]s?|operou)\b'), None),
+]
+COLUNA_PORTO = {'Embarcados': 'Origem', 'Desembarcados': 'Destino'}
+COLUNA_PAIS = {'Embarcados': 'Pais_Destino', 'Desembarcados': 'Pais_Origem'}
+# Sentido implícito no ranking de destinos ou origens: os destinos de um porto são os
+# dos embarques nele
+SENTIDO_DIMENSAO = {'Pais_Destino': 'Embarcados', 'Pais_Origem': 'Desembarcados'}
+
+# Métricas: (expressão, apelido); None conta os registros
+METRICAS = {
+    'teu': ('SUM(TEU)', 'total_teus'),
+    'toneladas': ('SUM(VLPesoCargaBruta)', 'total_toneladas'),
+    'registros': (None, 'total_registros'),
+}
+PADROES_METRICA = [
+    (re.compile(r'\bteus?\b'), 'teu'),
+    (re.compile(r'\b(toneladas?|peso|volume)\b'), 'toneladas'),
+    (re.compile(r'\b(registros?|frequentes?)\b'), 'registros'),
+]
+
+# Natureza da carga: valores da coluna Natureza_da_Carga
+NATUREZAS = [
+    (re.compile(r'\bgranel solido\b|\bgraneis solidos\b'), ('Granel Sólido',)),
+    (re.compile(r'\bgranel liquido( e gasoso)?\b|\bgraneis liquidos( e gasosos)?\b'),
+     ('Granel Líquido', 'Granel Líquido e Gasoso')),
+    (re.compile(r'\bcargas? gera(l|is)\b'), ('Carga Geral',)),
+    (re.compile(r'\bcargas? conteinerizadas?\b'), ('Carga Conteinerizada',)),
+]
+
+# Tipos de navegação usados quando os metadados não trazem a tabela TipoNavegacao
+TIPOS_NAVEGACAO = {
+    '1': 'Navegação Interior', '2': 'Apoio Portuário', '3': 'Cabotagem',
+    '4': 'Apoio Marítimo', '5': 'Longo Curso',
+}
+
+# "Os N principais/maiores ...": dimensão agrupada
+RANKING = re.compile(r'\b(?:(\d+) )?(?:principais|maiores)\b|\bmais (?:frequentes?|movimentad\w*)\b')
+DIMENSOES = [
+    (re.compile(r'\bpaises de destino\b|\bdestinos\b'), 'Pais_Destino'),
+    (re.compile(r'\bpaises de origem\b|\borigens\b'), 'Pais_Origem'),
+    (re.compile(r'\bpaises\b'), 'pais'),
+    (re.compile(r'\b(mercadorias|produtos)\b'), 'CDMercadoria'),
+    (re.compile(r'\bportos\b'), 'porto'),
+]
+NUMERO_RANKING = re.compile(r'\b(\d{1,3})\b')
+LIMITE_RANKING = 10
+
+# Comparação entre anos
+POR_ANO = re.compile(r'\b(por ano|cada ano|ano a ano|anual|compar\w*|evolucao)\b')
+ANO = re.compile(r'\b(19|20)\d{2}\b')
+
+# O Brasil como contraparte inverte o sentido: "a China importou do Brasil" são
+# embarques e "exportou para o Brasil" são desembarques
+BRASIL_CONTRAPARTE = {
+    'Desembarcados': re.compile(r'\bd[oa] brasil\b'),
+    'Embarcados': re.compile(r'\b(para o|ao) brasil\b'),
+}
+
+# Palavras que não mudam o significado das perguntas reconhecidas. Ficam de fora "mais"
+# (sem um ranking reconhecido, "qual país mais exportou" segue para o modelo), "entre"
+# ("entre 2021 e 2024" é um intervalo, não dois anos) e "contêineres" (um filtro de carga)
+PALAVRAS_NEUTRAS = set("""
+    qual quais quanto quanta quantos quantas o a os as um uma de do da dos das em no na nos nas
+    pelo pela pelos pelas por para e ao aos foi foram sao e eh ser tem teve houve ha durante
+    total totais soma somado quantidade numero carga cargas ano anos registrada registradas
+    registrado registrados brasil brasileiro brasileira brasileiros brasileiras nacional nacionais
+    me informe diga mostre liste
+""".split())
+
+# Substantivos de dimensão aceitos apenas junto de uma entidade do mesmo tipo ("porto de
+# Santos"); sozinhos ("qual porto exportou soja?") pedem um agrupamento
+SUBSTANTIVOS_DIMENSAO = {
+    'porto': 'porto', 'portos': 'porto', 'terminal': 'porto', 'terminais': 'porto',
+    'pais': 'pais', 'mercadoria': 'mercadoria',
+}
+
+
+class TemplateEngine:
+    """
+    Reconhece perguntas nos formatos comuns e monta o SQL sem chamar o modelo.
+    """
+
+    def __init__(self, metadata, resolver=None):
+        """
+        Args:
+            metadata (dict): Metadados com anos_disponiveis e tipo_navegacao (ver _load_metadata).
+            resolver (EntityResolver, optional): Resolvedor de entidades; se não for
+                informado, um é compilado a partir dos metadados.
+        """
+        self.resolver = resolver or EntityResolver(metadata)
+        self.anos = {str(ano) for ano in metadata.get('anos_disponiveis', ())}
+        tipos = dict(metadata.get('tipo_navegacao', {}).items()) or TIPOS_NAVEGACAO
+        self.navegacao = [(re.compile(r'\b' + re.escape(normalizar(descricao)) + r'\b'), str(codigo))
+                          for codigo, descricao in tipos.items()]
+
+    @staticmethod
+    def _remover(texto, padrao):
+        """Remove as ocorrências de um padrão, retornando o texto e os trechos encontrados."""
+        return padrao.sub(' ', texto), list(padrao.finditer(texto))
+
+    def interpretar(self, pergunta):
+        """
+        Reconhece a pergunta e monta o SQL parametrizado.
+
+        Args:
+            pergunta (str): Pergunta em linguagem natural.
+
+        Returns:
+            dict: modelo (total, ranking ou por_ano), sql com parâmetros ?, parametros
+                e sql_literal (parâmetros como literais SQL), ou None se a pergunta
+                não for reconhecida.
+        """
+        texto = ' '.join(NUMEROS_POR_EXTENSO.get(p, p) for p in normalizar(pergunta).split())
+
+        # Ranking e dimensão agrupada
+        ranking = RANKING.search(texto)
+        limite = dimensao = sentido_porto = None
+        if ranking:
+            texto = RANKING.sub(' ', texto, count=1)
+            numero = ranking.group(1)
+            if numero is None:
+                # "as 5 mercadorias mais frequentes": o número vem antes da dimensão
+                outro = NUMERO_RANKING.search(texto)
+                if outro:
+                    numero = outro.group(1)
+                    texto = texto[:outro.start()] + ' ' + texto[outro.end():]
+            limite = int(numero or LIMITE_RANKING)
+            for padrao, coluna in DIMENSOES:
+                if padrao.search(texto):
+                    texto = padrao.sub(' ', texto, count=1)
+                    dimensao = coluna
+                    break
+
+        # Sentido: mais de um sentido na mesma pergunta não é reconhecido
+        sentidos = set()
+        for padrao, sentido in SENTIDOS:
+            texto, encontrados = self._remover(texto, padrao)
+            if encontrados:
+                sentidos.add(sentido)
+        if len(sentidos) > 1:
+            return None
+        sentido = sentidos.pop() if sentidos else None
+        if sentido and BRASIL_CONTRAPARTE[sentido].search(texto):
+            return None
+
+        if ranking:
+            if dimensao in SENTIDO_DIMENSAO:
+                # "Destinos das importações" não tem um porto ou país de referência
+                if sentido not in (None, SENTIDO_DIMENSAO[dimensao]):
+                    return None
+                sentido_porto = SENTIDO_DIMENSAO[dimensao]
+            if dimensao == 'pais':
+                dimensao = COLUNA_PAIS.get(sentido)
+            elif dimensao == 'porto':
+                dimensao = COLUNA_PORTO.get(sentido)
+            if dimensao is None:
+                return None
+
+        # Natureza da carga e tipo de navegação
+        naturezas = []
+        for padrao, valores in NATUREZAS:
+            texto, encontrados = self._remover(texto, padrao)
+            if encontrados:
+                naturezas.extend(valores)
+        navegacoes = []
+        for padrao, codigo in self.navegacao:
+            texto, encontrados = self._remover(texto, padrao)
+            if encontrados:
+                navegacoes.append(codigo)
+
+        # Métrica: TEU, toneladas ou contagem de registros
+        metrica = None
+        for padrao, nome in PADROES_METRICA:
+            texto, encontrados = self._remover(texto, padrao)
+            if encontrados and metrica is None:
+                metrica = nome
+        if metrica is None and ranking and 'frequente' in ranking.group(0):
+            metrica = 'registros'
+        if metrica is None:
+            palavras = set(texto.split())
+            metrica = 'registros' if palavras & {'quantas', 'quantos', 'numero'} else 'toneladas'
+
+        # Anos: um ano fora dos dados disponíveis segue para o modelo, que informa a ausência
+        anos = sorted(set(m.group(0) for m in ANO.finditer(texto)))
+        if any(ano not in self.anos for ano in anos):
+            return None
+        texto = ANO.sub(' ', texto)
+        por_ano = POR_ANO.search(texto)
+        texto = POR_ANO.sub(' ', texto)
+
+        # Portos, países e mercadorias
+        entidades = self.resolver.resolver(texto)
+        codigos = {'porto': set(), 'pais': set(), 'mercadoria': set()}
+        termos = {}
+        for entidade in entidades:
+            termos.setdefault(entidade['termo'], set()).add(entidade['tipo'])
+            if entidade['tipo'] == 'pais' and entidade['codigos'] == ('BRASIL',):
+                continue
+            codigos[entidade['tipo']].update(entidade['codigos'])
+        if any(len(tipos) > 1 for tipos in termos.values()):
+            return None
+        for termo in sorted(termos, key=len, reverse=True):
+            texto = re.sub(r'\b' + re.escape(termo) + r'\b', ' ', texto)
+
+        tipos_resolvidos = set().union(*termos.values())
+        for palavra in texto.split():
+            if palavra in SUBSTANTIVOS_DIMENSAO:
+                if SUBSTANTIVOS_DIMENSAO[palavra] not in tipos_resolvidos:
+                    return None
+            elif palavra not in PALAVRAS_NEUTRAS:
+                return None
+        if dimensao and (dimensao in ('Origem', 'Destino') and codigos['porto']):
+            return None
+
+        # Filtros
+        filtros, parametros = [], []
+
+        def filtrar_in(coluna, valores):
+            valores = sorted(valores)
+            filtros.append(f"{coluna} IN ({', '.join('?' * len(valores))})")
+            parametros.extend(valores)
+
+        def filtrar_colunas(colunas, valores):
+            if len(colunas) == 1:
+                filtrar_in(colunas[0], valores)
+                return
+            valores = sorted(valores)
+            marcadores = ', '.join('?' * len(valores))
+            filtros.append('(' + ' OR '.join(f"{coluna} IN ({marcadores})" for coluna in colunas) + ')')
+            for _ in colunas:
+                parametros.extend(valores)
+
+        if sentido:
+            filtros.append("Sentido = ?")
+            parametros.append(sentido)
+        if codigos['porto']:
+            sentido_porto = sentido or sentido_porto
+            filtrar_colunas([COLUNA_PORTO[sentido_porto]] if sentido_porto else ['Origem', 'Destino'],
+                            codigos['porto'])
+        if codigos['pais']:
+            filtrar_colunas([COLUNA_PAIS[sentido]] if sentido else ['Pais_Origem', 'Pais_Destino'], codigos['pais'])
+        if codigos['mercadoria']:
+            filtrar_in('CDMercadoria', codigos['mercadoria'])
+        if naturezas:
+            filtrar_in('Natureza_da_Carga', naturezas)
+        if navegacoes:
+            filtrar_in('TipoNavegacao_Codigo', navegacoes)
+        if len(anos) == 1:
+            filtros.append("Ano = ?")
+            parametros.append(anos[0])
+        elif anos:
+            filtrar_in('Ano', anos)
+
+        expressao, apelido = METRICAS[metrica]
+        colunas = [f"{expressao} as {apelido}", "COUNT(*) as total_registros"] if expressao else \
+            ["COUNT(*) as total_registros"]
+        where = f"\nWHERE {' AND '.join(filtros)}" if filtros else ''
+
+        if dimensao:
+            modelo = 'ranking'
+            sql = (f"SELECT {dimensao}, {', '.join(colunas)}\nFROM Cargas{where}\n"
+                   f"GROUP BY {dimensao}\nORDER BY {apelido} DESC\nLIMIT {limite}")
+        elif len(anos) > 1 or por_ano:
+            modelo = 'por_ano'
+            sql = f"SELECT Ano, {', '.join(colunas)}\nFROM Cargas{where}\nGROUP BY Ano\nORDER BY Ano"
+        else:
+            modelo = 'total'
+            sql = f"SELECT {', '.join(colunas)}\nFROM Cargas{where}"
+
+        return {
+            'modelo': modelo,
+            'sql': sql,
+            'parametros': tuple(parametros),
+            'sql_literal': sql_literal(sql, parametros),
+        }
+
+    def sql_para(self, pergunta):
+        """
+        Retorna o SQL da pergunta com os parâmetros como literais, ou None.
+
+        O texto literal é o que segue para a execução, para que a reescrita de
+        rollups e o cache de resultados funcionem como para o SQL do modelo.
+        """
+        plano = self.interpretar(pergunta)
+        return plano['sql_literal'] if plano else None
+
+
+def sql_literal(sql, parametros):
+    """
+    Substitui os parâmetros ? de um template pelos valores como literais SQL.
+
+    Args:
+        sql (str): SQL do template; os templates não têm ? dentro de strings.
+        parametros (iterable): Valores, na ordem dos marcadores.
+
+    Returns:
+        str: SQL com os valores.
+    """
+    valores = iter(parametros)
+    return re.sub(r'\?', lambda _: valores_sql([next(valores)]), sql)
+
+
+def percentil(valores, p):
+    """Retorna o percentil p (0 a 100) de uma lista de valores."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def relatorio(engine, perguntas, executar=None):
+    """
+    Mede a cobertura e a latência dos templates em uma lista de perguntas.
+
+    Args:
+        engine (TemplateEngine): Reconhecedor de perguntas.
+        perguntas (list): Perguntas (ex: o histórico de consultas).
+        executar (callable, optional): Função que executa um SQL, para medir a
+                                       latência das consultas reconhecidas.
+
+    Returns:
+        dict: Cobertura, contagem por modelo, latências em milissegundos e
+            perguntas não reconhecidas.
+    """
+    por_modelo = {}
+    nao_reconhecidas = []
+    tempos_reconhecimento = []
+    tempos_execucao = []
+    for pergunta in perguntas:
+        inicio = time.perf_counter()
+        plano = engine.interpretar(pergunta)
+        tempos_reconhecimento.append((time.perf_counter() - inicio) * 1000)
+        if plano is None:
+            nao_reconhecidas.append(pergunta)
+            continue
+        por_modelo[plano['modelo']] = por_modelo.get(plano['modelo'], 0) + 1
+        if executar:
+            inicio = time.perf_counter()
+            executar(plano['sql_literal'])
+            tempos_execucao.append((time.perf_counter() - inicio) * 1000)
+
+    total = len(perguntas)
+    return {
+        'perguntas': total,
+        'reconhecidas': total - len(nao_reconhecidas),
+        'cobertura': (total - len(nao_reconhecidas)) / total if total else 0.0,
+        'por_modelo': por_modelo,
+        'reconhecimento_ms': {'p50': percentil(tempos_reconhecimento, 50), 'p95': percentil(tempos_reconhecimento, 95)},
+        'execucao_ms': {'p50': percentil(tempos_execucao, 50), 'p95': percentil(tempos_execucao, 95)},
+        'nao_reconhecidas': nao_reconhecidas,
+    }
+
+
+def ler_perguntas(caminho):
+    """
+    Lê um log de perguntas: uma por linha, ou JSON Lines com o campo "query".
+
+    Args:
+        caminho (str): Caminho do arquivo.
+
+    Returns:
+        list: Perguntas.
+    """
+    import json
+
+    perguntas = []
+    with open(caminho, encoding='utf-8') as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            if linha.startswith('{'):
+                linha = json.loads(linha).get('query', '')
+            if linha:
+                perguntas.append(linha)
+    return perguntas
+
+
+def main(argv=None):
+    from metadata_snapshot import obter_metadados
+    from schema_retrieval import PERGUNTAS_TESTE
+    from db_connection import connect_database
+
+    parser = argparse.ArgumentParser(description="Cobertura e latência dos templates de perguntas")
+    parser.add_argument('--db', default=os.path.join(os.getcwd(), 'cargas.db'), help="Banco de dados SQLite")
+    parser.add_argument('--perguntas', help="Log de perguntas (uma por linha ou JSON Lines com \"query\")")
+    parser.add_argument('--executar', action='store_true', help="Executa o SQL das perguntas reconhecidas")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Banco de dados não encontrado: {args.db}")
+        sys.exit(1)
+    perguntas = ler_perguntas(args.perguntas) if args.perguntas else PERGUNTAS_TESTE
+
+    inicio = time.perf_counter()
+    engine = TemplateEngine(obter_metadados(args.db))
+    print(f"Templates carregados em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    conn = connect_database(args.db) if args.executar else None
+    executar = (lambda sql: conn.execute(sql).fetchall()) if conn else None
+    resultado = relatorio(engine, perguntas, executar)
+    if conn:
+        conn.close()
+
+    print(f"\nPerguntas: {resultado['perguntas']}")
+    print(f"Reconhecidas: {resultado['reconhecidas']} ({resultado['cobertura']:.0%}), sem chamada ao modelo")
+    for modelo, quantidade in sorted(resultado['por_modelo'].items()):
+        print(f"  {modelo}: {quantidade}")
+    print(f"Reconhecimento: p50 {resultado['reconhecimento_ms']['p50']:.2f} ms, "
+          f"p95 {resultado['reconhecimento_ms']['p95']:.2f} ms")
+    if args.executar:
+        print(f"Execução: p50 {resultado['execucao_ms']['p50']:.1f} ms, p95 {resultado['execucao_ms']['p95']:.1f} ms")
+    if resultado['nao_reconhecidas']:
+        print("\nEncaminhadas ao modelo:")
+        for pergunta in resultado['nao_reconhecidas']:
+            print(f"  - {pergunta}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import os
+import time
+import sqlite3
+import asyncio
+import tempfile
+from batch_queries import processar_lote, agrupar_perguntas, LimitadorTaxa
+from query_cache import QueryCache
+
+# SQL "gerado" para cada pergunta; perguntas diferentes podem gerar o mesmo SQL
+RESPOSTAS = {
+    'santos': "SELECT COUNT(*) FROM Cargas WHERE Origem = 'BRSSZ'",
+    'porto de santos': "select COUNT(*)  from Cargas where Origem = 'BRSSZ';",
+    'itaqui': "SELECT COUNT(*) FROM Cargas WHERE Origem = 'BRIQI'",
+    'invalida': "SELECT * FROM TabelaInexistente",
+}
+
+
+class AgenteTeste:
+    """Agente com a interface usada por batch_queries e um modelo simulado"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.cache = QueryCache(db_path)
+        self.memory = []
+        self.max_concurrency = 8
+        self.timeout = 5
+        self.chamadas_llm = []
+        self.execucoes = []
+
+    async def _agenerate_sql(self, query, context=None):
+        self.chamadas_llm.append(query)
+        await asyncio.sleep(0.2)
+        return RESPOSTAS[query.strip().lower().rstrip('?')]
+
+    def _template_sql(self, query):
+        return "SELECT COUNT(*) FROM Cargas" if query == "Total de cargas" else None
+
+    def _run_sql(self, sql_query):
+        self.execucoes.append(sql_query)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return str(conn.execute(sql_query).fetchall())
+        finally:
+            conn.close()
+
+    def _error_response(self, query, error_message):
+        self.memory.append({"query": query, "sql": "Error generating SQL", "result": error_message})
+        return {"query": query, "sql": "Error generating SQL", "result": error_message, "from_cache": False}
+
+
+def test_agrupar_perguntas():
+    """Verifica o agrupamento de perguntas equivalentes"""
+    assert agrupar_perguntas(["Santos?", "itaqui", "  SANTOS ", "Santos 2023"]) == [[0, 2], [1], [3]]
+    print("✅ Agrupamento de perguntas funcionando")
+
+
+def test_processar_lote():
+    """Verifica deduplicação, SQL executado uma vez, ordem da entrada e cache"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Origem TEXT)')
+        conn.executemany('INSERT INTO Cargas (Origem) VALUES (?)', [('BRSSZ',)] * 3 + [('BRIQI',)] * 2)
+        conn.commit()
+        conn.close()
+
+        agente = AgenteTeste(db_path)
+        perguntas = ["Santos", "Itaqui", "SANTOS?", "Porto de Santos", "Invalida"]
+        inicio = time.perf_counter()
+        respostas = processar_lote(agente, perguntas, rpm=0)
+        duracao = time.perf_counter() - inicio
+
+        assert [r['query'] for r in respostas] == perguntas
+        assert [r['result'] for r in respostas[:4]] == ['[(3,)]', '[(2,)]', '[(3,)]', '[(3,)]']
+        assert respostas[4]['sql'] == "Error generating SQL" and 'TabelaInexistente' in respostas[4]['result']
+        assert respostas[2]['duplicate_of'] == 0 and respostas[3]['duplicate_of'] is None
+
+        # Quatro perguntas distintas, chamadas concorrentes ao modelo
+        assert len(agente.chamadas_llm) == 4 and duracao < 0.6
+        # "Santos" e "Porto de Santos" geram o mesmo SQL, executado uma vez
+        assert len(agente.execucoes) == 3
+        assert all(r['timings']['total'] >= r['timings']['llm'] for r in respostas)
+        assert len(agente.memory) == 5
+
+        # Segundo lote: o SQL vem do cache de consultas, sem chamar o modelo
+        respostas = processar_lote(agente, ["santos", "itaqui"], rpm=0)
+        assert all(r['from_cache'] for r in respostas) and len(agente.chamadas_llm) == 4
+
+        # Perguntas reconhecidas pelos templates também não chamam o modelo
+        resposta = processar_lote(agente, ["Total de cargas"], rpm=0)[0]
+        assert resposta['from_template'] and resposta['result'] == '[(5,)]' and len(agente.chamadas_llm) == 4
+        agente.cache.close()
+        print(f"✅ Lote processado em {duracao:.2f} s")
+
+
+def test_limitador_taxa():
+    """Verifica o espaçamento das chamadas pelo limite por minuto"""
+    async def chamar(limitador):
+        await limitador.aguardar()
+        return time.monotonic()
+
+    async def executar():
+        limitador = LimitadorTaxa(600)  # uma chamada a cada 0,1 s
+        return await asyncio.gather(*(chamar(limitador) for _ in range(4)))
+
+    instantes = sorted(asyncio.run(executar()))
+    assert instantes[-1] - instantes[0] >= 0.29
+    print("✅ Limite de chamadas por minuto funcionando")
+
+
+if __name__ == "__main__":
+    test_agrupar_perguntas()
+    test_processar_lote()
+    test_limitador_taxa()
@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+import random
+import sqlite3
+import tempfile
+import pandas as pd
+from create_database import (layouts, obter_colunas, importar_completo, importar_incremental,
+                             importar_paralelo, detectar_layout)
+from rollups import criar_rollups, atualizar_rollups
+
+
+def gerar_registros(ids, ano, semente):
+    """Gera registros no formato do extrato da ANTAQ (pesos exatos em ponto flutuante)."""
+    random.seed(semente)
+    portos = ['BRITQ', 'BRSSZ', 'BRPNG', 'BRRIG', 'CNSHA']
+    return pd.DataFrame({
+        'IDCarga': ids,
+        'IDAtracacao': [i // 3 for i in ids],
+        'CDMercadoria': [f'{random.randint(1, 30):04d}' for _ in ids],
+        'Origem': [random.choice(portos) for _ in ids],
+        'Destino': [random.choice(portos) for _ in ids],
+        'Pais_Origem': [random.choice(['BRASIL', 'CHINA']) for _ in ids],
+        'Pais_Destino': [random.choice(['BRASIL', 'CHINA']) for _ in ids],
+        'Tipo Navegação': [random.choice(['1', '3', '5']) for _ in ids],
+        'Sentido': [random.choice(['Embarcados', 'Desembarcados']) for _ in ids],
+        'Natureza_da_Carga': [random.choice(['Granel Sólido', 'Carga Conteinerizada']) for _ in ids],
+        'Ano': [ano for _ in ids],
+        'Mes': [random.randint(1, 12) for _ in ids],
+        'VLPesoCargaBruta': [random.randint(0, 4000) / 4 for _ in ids],
+        'QTCarga': [random.randint(0, 10) for _ in ids],
+        'TEU': [random.choice(['', '0', '1', '2']) for _ in ids],
+    })
+
+
+def criar_banco(db_path, csv_path, nome_layout):
+    """Cria um banco completo a partir do CSV, com rollups."""
+    conn = sqlite3.connect(db_path)
+    layout = layouts[nome_layout](*obter_colunas(csv_path))
+    layout.criar(conn)
+    importar_completo(conn, csv_path, layout)
+    criar_rollups(conn)
+    return conn
+
+
+def conteudo(conn, sql):
+    return sorted(conn.execute(sql).fetchall(), key=repr)
+
+
+def verificar_layout(pasta, nome_layout):
+    historico = gerar_registros(list(range(1, 3001)), 2023, 1)
+
+    # Mês novo (2024), registros de 2023 corrigidos (um deles muda de ano) e registros repetidos
+    novos = gerar_registros(list(range(3001, 3501)), 2024, 2)
+    corrigidos = historico.iloc[100:150].copy()
+    corrigidos['VLPesoCargaBruta'] += 1
+    corrigidos.loc[corrigidos.index[0], 'Ano'] = 2024
+    repetidos = historico.iloc[200:300]
+    delta = pd.concat([novos, corrigidos, repetidos])
+    final = pd.concat([historico.drop(corrigidos.index), corrigidos, novos]).sort_values('IDCarga')
+
+    csv_historico = os.path.join(pasta, 'historico.csv')
+    csv_delta = os.path.join(pasta, 'delta.csv')
+    csv_final = os.path.join(pasta, 'final.csv')
+    historico.to_csv(csv_historico, index=False)
+    delta.to_csv(csv_delta, index=False)
+    final.to_csv(csv_final, index=False)
+
+    # Banco existente + carga incremental
+    conn = criar_banco(os.path.join(pasta, f'incremental_{nome_layout}.db'), csv_historico, nome_layout)
+    assert detectar_layout(conn) == nome_layout
+    layout = layouts[nome_layout](*obter_colunas(csv_delta))
+
+    # Primeira carga incremental: registros ainda sem hash são gravados uma vez
+    totais = importar_incremental(conn, csv_historico, layout, chunksize=1000)
+    assert totais['lidos'] == 3000 and totais['novos'] == 0
+
+    totais = importar_incremental(conn, csv_delta, layout, chunksize=200)
+    assert totais['novos'] == 500
+    assert totais['alterados'] == 50
+    assert [str(ano) for ano in totais['anos']] == ['2023', '2024']
+    atualizar_rollups(conn, totais['anos'])
+
+    # Reaplicar o mesmo delta não grava nada
+    totais = importar_incremental(conn, csv_delta, layout)
+    assert totais['novos'] == 0 and totais['alterados'] == 0 and totais['anos'] == []
+
+    # Banco reconstruído do zero com o CSV final
+    referencia = criar_banco(os.path.join(pasta, f'completo_{nome_layout}.db'), csv_final, nome_layout)
+
+    assert conteudo(conn, 'SELECT * FROM Cargas') == conteudo(referencia, 'SELECT * FROM Cargas')
+    for (nome,) in referencia.execute('SELECT nome FROM Rollups'):
+        assert conteudo(conn, f'SELECT * FROM {nome}') == conteudo(referencia, f'SELECT * FROM {nome}'), nome
+    assert conteudo(conn, 'SELECT * FROM Rollups') == conteudo(referencia, 'SELECT * FROM Rollups')
+    conn.close()
+    referencia.close()
+
+
+def test_carga_incremental():
+    """Verifica que a carga incremental produz o mesmo banco que a reconstrução completa"""
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome_layout in ['texto', 'tipado']:
+            print(f"\n=== Layout {nome_layout} ===")
+            verificar_layout(pasta, nome_layout)
+    print("\n✅ Carga incremental equivalente à reconstrução completa")
+
+
+
+def test_importacao_paralela_com_erro():
+    """Verifica que um bloco inválido no trabalhador ou no escritor encerra o pipeline sem gravar nada"""
+    with tempfile.TemporaryDirectory() as pasta:
+        csv_path = os.path.join(pasta, 'cargas.csv')
+        gerar_registros(list(range(1, 20001)), 2023, 3).to_csv(csv_path, index=False)
+        layout = layouts['texto'](*obter_colunas(csv_path))
+
+        def importar(db_path, csv_path):
+            conn = sqlite3.connect(db_path)
+            layout.criar(conn)
+            conn.close()
+            erros = []
+
+            def executar():
+                try:
+                    importar_paralelo(db_path, csv_path, layout, num_trabalhadores=2, chunksize=100, verbose=False)
+                except RuntimeError as e:
+                    erros.append(str(e))
+
+            # Muitos blocos a mais do que a capacidade das filas: sem a drenagem, o pipeline travaria
+            inicio = time.perf_counter()
+            execucao = threading.Thread(target=executar, daemon=True)
+            execucao.start()
+            execucao.join(60)
+            assert not execucao.is_alive(), "a importação travou após o erro"
+            assert time.perf_counter() - inicio < 30
+            assert erros, "a importação deveria falhar"
+            erro = erros[0]
+            conn = sqlite3.connect(db_path)
+            assert conn.execute('SELECT COUNT(*) FROM Cargas').fetchone()[0] == 0
+            conn.close()
+            return erro
+
+        # Linha com campos a mais no meio do arquivo: falha na interpretação (trabalhador)
+        with open(csv_path) as arquivo:
+            linhas = arquivo.readlines()
+        linhas.insert(5000, linhas[5000].rstrip('\n') + ',x,y\n')
+        csv_invalido = os.path.join(pasta, 'invalido.csv')
+        with open(csv_invalido, 'w') as arquivo:
+            arquivo.writelines(linhas)
+        assert 'ParserError' in importar(os.path.join(pasta, 'trabalhador.db'), csv_invalido)
+
+        # Registro recusado pelo banco: falha na gravação (escritor)
+        db_path = os.path.join(pasta, 'escritor.db')
+        conn = sqlite3.connect(db_path)
+        layout.criar(conn)
+        conn.execute("CREATE TRIGGER recusar BEFORE INSERT ON Cargas WHEN NEW.IDCarga = 5000 "
+                     "BEGIN SELECT RAISE(ABORT, 'registro recusado'); END")
+        conn.commit()
+        conn.close()
+        assert 'registro recusado' in importar(db_path, csv_path)
+    print("✅ Importação paralela encerrada sem travar após erros")
+
+
+if __name__ == "__main__":
+    test_carga_incremental()
+    test_importacao_paralela_com_erro()
@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from db_connection import connect_database, get_serving_mode, list_internal_tables, ConnectionPool, BatchReader
+from database_tools import DatabaseTools
+
+
+def criar_banco(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Ano TEXT, VLPesoCargaBruta REAL)')
+    conn.execute('CREATE TABLE Dominio_Porto (id INTEGER PRIMARY KEY, valor TEXT UNIQUE)')
+    conn.executemany('INSERT INTO Cargas VALUES (?, ?, ?)', [(i, '2023', i * 0.5) for i in range(100)])
+    conn.commit()
+    conn.close()
+
+
+def test_modos_de_servico():
+    """Verifica que os modos somente leitura aplicam os PRAGMAs e bloqueiam escritas"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        criar_banco(db_path)
+
+        for modo in ['immutable', 'readonly']:
+            conn = connect_database(db_path, modo)
+            assert conn.execute('SELECT COUNT(*) FROM Cargas').fetchone()[0] == 100
+            assert conn.execute('PRAGMA query_only').fetchone()[0] == 1
+            assert conn.execute('PRAGMA mmap_size').fetchone()[0] > 0
+            try:
+                conn.execute('DELETE FROM Cargas')
+                assert False, f"Escrita permitida no modo {modo}"
+            except sqlite3.OperationalError as e:
+                print(f"{modo}: {e}")
+            conn.close()
+
+        # Padrão somente leitura com travas: uma carga feita com a conexão aberta é vista
+        os.environ.pop('SQL_SERVING_MODE', None)
+        assert get_serving_mode() == 'readonly'
+        leitura = connect_database(db_path)
+        conn = connect_database(db_path, 'readwrite')
+        conn.execute("INSERT INTO Cargas VALUES (100, '2024', 1.0)")
+        conn.commit()
+        conn.close()
+        assert leitura.execute('SELECT COUNT(*) FROM Cargas').fetchone()[0] == 101
+        leitura.close()
+
+        # O modo somente leitura não cria um banco vazio quando o caminho está errado
+        try:
+            connect_database(os.path.join(pasta, 'inexistente.db'), 'immutable')
+            assert False
+        except FileNotFoundError:
+            pass
+        assert not os.path.exists(os.path.join(pasta, 'inexistente.db'))
+
+        assert list_internal_tables(db_path) == ['Dominio_Porto']
+
+        tools = DatabaseTools(db_path)
+        assert tools.list_tables() == ['Cargas']
+        assert tools.execute_query('SELECT COUNT(*) AS n FROM Cargas')['n'][0] == 101
+        print("✅ Modos de serviço funcionando")
+
+
+def test_pool_de_conexoes():
+    """Verifica reutilização, limite de conexões e verificação de saúde do pool"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        criar_banco(db_path)
+
+        pool = ConnectionPool(db_path, size=2, timeout=0.2)
+        with pool.connection() as conn:
+            primeira = conn
+        with pool.connection() as conn:
+            assert conn is primeira
+
+        # Com as duas conexões em uso, a terceira espera e expira
+        a, b = pool.acquire(), pool.acquire()
+        try:
+            pool.acquire()
+            assert False
+        except TimeoutError:
+            pass
+        pool.release(a)
+        pool.release(b)
+
+        # Banco recriado: as conexões antigas são descartadas
+        os.remove(db_path)
+        criar_banco(db_path)
+        with pool.connection() as conn:
+            assert conn is not primeira and conn is not a and conn is not b
+            assert conn.execute('SELECT COUNT(*) FROM Cargas').fetchone()[0] == 100
+        pool.close()
+
+        # Uma instância de DatabaseTools compartilhada por várias threads
+        tools = DatabaseTools(db_path, pool_size=3)
+        erros = []
+
+        def sessao():
+            try:
+                for _ in range(50):
+                    assert tools.execute_query('SELECT COUNT(*) AS n FROM Cargas')['n'][0] == 100
+                    assert tools.list_tables() == ['Cargas']
+            except Exception as e:
+                erros.append(e)
+
+        threads = [threading.Thread(target=sessao) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not erros, erros
+        assert tools.pool._created <= 3
+        tools.close()
+        print("✅ Pool de conexões funcionando")
+
+
+def test_leitura_em_lotes():
+    """Verifica os lotes, os orçamentos de linhas e de bytes e o total de linhas"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        criar_banco(db_path)
+
+        conn = sqlite3.connect(db_path)
+        reader = BatchReader(conn.execute('SELECT * FROM Cargas'), batch_size=30, max_rows=70)
+        assert [len(lote) for lote in reader] == [30, 30, 10]
+        assert reader.rows == 70 and reader.truncated
+        # Cada linha ocupa 3 x 8 bytes de estrutura + 8 (inteiro) + 4 (texto) + 8 (real)
+        reader = BatchReader(conn.execute('SELECT * FROM Cargas'), batch_size=30, max_bytes=44 * 45)
+        assert [len(lote) for lote in reader] == [30, 15] and reader.truncated
+        reader = BatchReader(conn.execute('SELECT * FROM Cargas'), max_rows=100)
+        assert len(reader.fetch()) == 100 and not reader.truncated
+        conn.close()
+
+        tools = DatabaseTools(db_path)
+        stream = tools.iter_query('SELECT IDCarga, Ano FROM Cargas', batch_size=40, max_rows=90)
+        lotes = list(stream)
+        assert [len(lote) for lote in lotes] == [40, 40, 10] and list(lotes[0].columns) == ['IDCarga', 'Ano']
+        assert stream.truncated and (stream.total_rows, stream.total_exact) == (100, True)
+
+        df = tools.execute_query('SELECT * FROM Cargas WHERE IDCarga < 20', max_rows=50)
+        assert len(df) == 20 and not df.attrs['truncated'] and df.attrs['total_rows'] == 20
+        df = tools.execute_query('SELECT * FROM Cargas', max_rows=10)
+        assert len(df) == 10 and df.attrs['truncated'] and df.attrs['total_rows'] == 100
+        # O resultado truncado em cache não é reaproveitado com outros limites
+        df = tools.execute_query('SELECT * FROM Cargas', max_rows=500)
+        assert len(df) == 100 and not df.attrs['truncated']
+        assert len(tools.execute_query('SELECT * FROM Cargas', max_rows=10)) == 10
+        assert tools.results.hits >= 1
+        assert len(tools.sample_table('Cargas', 5)) == 5
+        # A conexão volta ao pool mesmo quando a leitura é abandonada
+        next(iter(tools.iter_query('SELECT * FROM Cargas', batch_size=10)))
+        assert tools.pool._idle.qsize() == tools.pool._created
+        tools.close()
+        print("✅ Leitura em lotes funcionando")
+
+
+def test_paginacao_por_chave():
+    """Verifica que as páginas cobrem o resultado uma única vez, com e sem ordenação"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        criar_banco(db_path)
+        conn = sqlite3.connect(db_path)
+        # Valores repetidos e nulos na coluna de ordenação
+        conn.execute("UPDATE Cargas SET Ano = CASE WHEN IDCarga % 7 = 0 THEN NULL ELSE IDCarga % 3 END")
+        conn.commit()
+        conn.close()
+
+        tools = DatabaseTools(db_path)
+        sql = "SELECT Ano, IDCarga AS id, IDCarga AS id FROM Cargas ORDER BY IDCarga DESC -- recentes"
+        for ordem, decrescente in [(None, False), ('Ano', False), ('Ano', True)]:
+            linhas, after, paginas = [], None, 0
+            while True:
+                page = tools.fetch_page(sql, 15, ordem, decrescente, after)
+                assert len(page['rows']) <= 15 and page['columns'] == ['Ano', 'id', 'id']
+                linhas.extend(page['rows'].itertuples(index=False))
+                paginas += 1
+                after = page['next']
+                if after is None:
+                    break
+            assert paginas == 7 and sorted(linha[1] for linha in linhas) == list(range(100))
+            if ordem is None:
+                assert [linha[1] for linha in linhas] == list(range(99, -1, -1))
+            else:
+                anos = [(linha[0] is not None, linha[0]) for linha in linhas]
+                assert anos == sorted(anos, reverse=decrescente)
+        tools.close()
+        print("✅ Paginação por chave funcionando")
+
+
+if __name__ == "__main__":
+    test_modos_de_servico()
+    test_pool_de_conexoes()
+    test_leitura_em_lotes()
+    test_paginacao_por_chave()
@@ -0,0 +1,91 @@
+import os
+import time
+import sqlite3
+import tempfile
+from duckdb_backend import traduzir_sql, DialetoNaoSuportado, DuckDBEngine, exportar_parquet
+from test_rollups import criar_banco_teste
+from rollups import criar_rollups
+from sql_guard import OrcamentoExcedido
+
+# Consultas no dialeto do SQLite que devem ter o mesmo resultado nos dois motores
+CONSULTAS = [
+    "SELECT SUM(VLPesoCargaBruta) as total_toneladas, COUNT(*) as total_registros FROM Cargas WHERE Sentido = 'Embarcados' AND Origem = 'BRITQ' AND Ano = '2023'",
+    "SELECT Origem, SUM(TEU) AS teus FROM Cargas WHERE Sentido LIKE 'embarc%' GROUP BY Origem ORDER BY Origem",
+    "SELECT Natureza_da_Carga, COUNT(*) FROM Cargas WHERE Destino = \"BRSSZ\" GROUP BY 1 ORDER BY 1",
+    "SELECT Ano, TOTAL(TEU), MAX(COUNT(*), 100), IIF(SUM(VLPesoCargaBruta) > 1000, 'alto', 'baixo') FROM Cargas GROUP BY Ano ORDER BY Ano",
+    "SELECT CAST(Mes AS INTEGER) AS mes, ROUND(AVG(VLPesoCargaBruta), 2) FROM Cargas GROUP BY mes ORDER BY mes",
+    "SELECT Pais_Destino, COUNT(*) FROM Cargas GROUP BY Pais_Destino ORDER BY Pais_Destino LIMIT 5",
+]
+
+
+def test_traducao():
+    """Verifica a tradução das funções do SQLite ensinadas no prompt"""
+    sql, _ = traduzir_sql("SELECT strftime('%Y', DataAtracacao) FROM Cargas")
+    assert sql == "SELECT strftime(TRY_CAST(DataAtracacao AS TIMESTAMP), '%Y') FROM Cargas"
+
+    sql, _ = traduzir_sql("SELECT COUNT(*) FROM Cargas WHERE Sentido LIKE 'emb%';")
+    assert sql == "SELECT COUNT(*) FROM Cargas WHERE Sentido ILIKE 'emb%'"
+
+    sql, _ = traduzir_sql('SELECT "Ano" FROM Cargas WHERE Sentido = "Embarcados"', colunas=['Ano', 'Sentido'])
+    assert sql == "SELECT \"Ano\" FROM Cargas WHERE Sentido = 'Embarcados'"
+
+    sql, _ = traduzir_sql("SELECT CAST(Ano AS INTEGER), date('now') FROM Cargas")
+    assert sql == "SELECT CAST(Ano AS BIGINT), strftime(current_date, '%Y-%m-%d') FROM Cargas"
+
+    _, avisos = traduzir_sql("SELECT COUNT(*) / 2 FROM Cargas")
+    assert avisos
+
+    for sql in ["SELECT julianday('now')", "SELECT strftime('%Y', 'now', '-1 year')", "SELECT date(Ano, '+1 day') FROM Cargas"]:
+        try:
+            traduzir_sql(sql)
+            assert False, sql
+        except DialetoNaoSuportado as e:
+            print(f"Não suportada: {sql} ({e})")
+
+
+def test_duckdb_backend():
+    """Verifica que o DuckDB sobre Parquet retorna os mesmos resultados do SQLite"""
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        print("duckdb não instalado; teste ignorado")
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco_teste(db_path)
+        criar_rollups(conn)
+        exportadas = exportar_parquet(db_path, os.path.join(pasta, 'parquet'))
+        assert exportadas['Cargas'] == 5000 and 'Rollup_Ano_Sentido' in exportadas
+
+        engine = DuckDBEngine(db_path, fonte='parquet', pasta_parquet=os.path.join(pasta, 'parquet'))
+        for sql in CONSULTAS:
+            esperado = conn.execute(sql).fetchall()
+            _, obtido = engine.execute(sql)
+            print(f"\n{sql}\n  SQLite: {esperado[:2]}\n  DuckDB: {obtido[:2]}")
+            assert len(esperado) == len(obtido)
+            for linha_esperada, linha_obtida in zip(esperado, obtido):
+                for a, b in zip(linha_esperada, linha_obtida):
+                    if isinstance(a, float):
+                        assert abs(a - float(b)) < 1e-9 * max(1.0, abs(a))
+                    else:
+                        assert a == b
+
+        assert engine.run("SELECT COUNT(*) FROM Cargas WHERE Origem = 'XXXXX' GROUP BY Ano") == ""
+
+        # O orçamento de tempo do guarda também vale no DuckDB
+        inicio = time.perf_counter()
+        try:
+            engine.execute("SELECT COUNT(*) FROM Cargas a, Cargas b, Cargas c WHERE a.TEU + b.TEU > c.TEU",
+                           max_segundos=0.2)
+            assert False, "a consulta deveria ser interrompida"
+        except OrcamentoExcedido as e:
+            assert 'tempo limite' in str(e)
+        assert time.perf_counter() - inicio < 5
+        conn.close()
+        print("\n✅ DuckDB retorna os mesmos resultados do SQLite")
+
+
+if __name__ == "__main__":
+    test_traducao()
+    test_duckdb_backend()
@@ -0,0 +1,93 @@
+import os
+import json
+import time
+from entity_resolver import AhoCorasick, EntityResolver, predicado_in, normalizar
+from schema_retrieval import SchemaRetriever
+from test_schema_retrieval import CONTEXTO
+
+METADATA = {
+    'portos': {
+        'BRSSZ': 'Santos', 'BRSP008': 'DP World Santos', 'PHGES': 'General Santos/Dadiangas',
+        'BRIQI': 'Itaqui', 'BRRIG': 'Rio Grande', 'BRSAL': 'Salinas (Rio Grande do Norte)',
+        'JPCHI': 'China', 'PTOPO': 'Porto',
+    },
+    'paises_origem': {'CNSHA': 'CHINA', 'BRSSZ': 'BRASIL'},
+    'paises_destino': {'USNYC': 'ESTADOS UNIDOS', 'CNSHA': 'CHINA'},
+    'mercadorias': {'0101': 'Animais Vivos', '0102': 'Animais Vivos', '2201': 'Bebidas, Líquidos Alcoólicos e Vinagres'},
+}
+
+
+def test_aho_corasick():
+    """Verifica a busca simultânea de padrões sobrepostos"""
+    automato = AhoCorasick(['he', 'she', 'his', 'hers'])
+    encontrados = {(inicio, fim, automato.padroes[i]) for inicio, fim, i in automato.buscar('ushers')}
+    assert encontrados == {(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')}
+    print("✅ Aho-Corasick funcionando")
+
+
+def test_resolucao_de_entidades():
+    """Verifica a resolução de portos, países e mercadorias em códigos exatos"""
+    resolver = EntityResolver(METADATA)
+    assert normalizar("Paranaguá, PR") == "paranagua pr"
+
+    entidades = resolver.resolver("Quanto foi EMBARCADO em Santos para a China?")
+    assert [(e['tipo'], e['termo'], e['codigos']) for e in entidades] == [
+        ('porto', 'santos', ('BRSP008', 'BRSSZ')),
+        ('pais', 'china', ('CHINA',)),
+    ]
+    assert predicado_in(entidades[0]) == "Origem IN ('BRSP008', 'BRSSZ')"
+    assert predicado_in(entidades[1], 'Pais_Destino') == "Pais_Destino IN ('CHINA')"
+
+    # Menção mais longa vence; palavras comuns e limites de palavra são respeitados
+    entidades = resolver.resolver("cargas de Salinas (Rio Grande do Norte) e Rio Grande")
+    assert [e['codigos'] for e in entidades] == [('BRSAL',), ('BRRIG',)]
+    assert resolver.resolver("porto santoso") == []
+
+    entidades = resolver.resolver("toneladas de animais vivos e vinagres")
+    assert [e['codigos'] for e in entidades] == [('0101', '0102'), ('2201',)]
+
+    bloco = resolver.contexto_prompt(resolver.resolver("embarques do Itaqui"))
+    assert "Origem ou Destino IN ('BRIQI')" in bloco and 'sem LIKE' in bloco
+    assert resolver.contexto_prompt([]) == ""
+
+    # O contexto reduzido usa as entidades resolvidas no lugar da busca nas descrições
+    contexto = SchemaRetriever(CONTEXTO, METADATA, resolver).contexto_para("cabotagem em Santos")
+    assert "Porto \"santos\": Origem ou Destino IN ('BRSP008', 'BRSSZ')" in contexto
+    assert "CÓDIGOS DAS TABELAS" not in contexto
+    print("✅ Resolução de entidades funcionando")
+
+
+def test_mapeamentos_completos():
+    """Mede a resolução com todas as entradas de mapeamentos.json"""
+    json_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mapeamentos.json')
+    if not os.path.exists(json_path):
+        print("mapeamentos.json não encontrado; teste ignorado")
+        return
+    with open(json_path, 'r') as f:
+        mapeamentos = json.load(f)
+    resolver = EntityResolver({
+        'portos': mapeamentos['Portos'],
+        'paises_origem': mapeamentos['Países Origem'],
+        'paises_destino': mapeamentos['Países Destino'],
+        'mercadorias': mapeamentos['CDMercadoria'],
+    })
+    pergunta = "Quantas toneladas foram movimentadas pelos portos de Paranaguá e Antonina em 2023?"
+    inicio = time.perf_counter()
+    for _ in range(100):
+        entidades = resolver.resolver(pergunta)
+    print(f"Resolução: {(time.perf_counter() - inicio) * 1e4:.0f} µs por pergunta")
+    assert [e['codigos'] for e in entidades] == [('BRPNG',), ('BRANT',)]
+    # Terminais do mesmo porto, sem a bacia de Santos, a balsa no Pará ou o porto espanhol
+    assert resolver.resolver("Porto de Santos")[0]['codigos'] == ('BRSP008', 'BRSSZ')
+    assert resolver.resolver("Porto de Vitória")[0]['codigos'] == ('BRVIX',)
+    assert resolver.resolver("Porto de Manaus")[0]['codigos'] == (
+        'BRAM001', 'BRAM010', 'BRAM011', 'BRAM019', 'BRAM020', 'BRAM021', 'BRAM023', 'BRAM034',
+        'BRAM080', 'BRAM088', 'BRAM155', 'BRMAO')
+    assert resolver.resolver("Porto de Niterói")[0]['codigos'] == ('BRNTR',)
+    print("✅ Resolução com os mapeamentos completos")
+
+
+if __name__ == "__main__":
+    test_aho_corasick()
+    test_resolucao_de_entidades()
+    test_mapeamentos_completos()
@@ -0,0 +1,102 @@
+import os
+import csv
+import gzip
+import sqlite3
+import tempfile
+import tracemalloc
+from exports import exportar_cursor, novo_arquivo_exportacao, limpar_exportacoes
+from database_tools import DatabaseTools
+from sql_guard import ConsultaBloqueada
+
+
+def criar_banco(db_path, linhas):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Origem TEXT, Ano TEXT, VLPesoCargaBruta REAL)')
+    conn.executemany('INSERT INTO Cargas (Origem, Ano, VLPesoCargaBruta) VALUES (?, ?, ?)',
+                     [(None if i % 10 == 0 else f'BR{i % 7}', str(2020 + i % 4), i * 0.5) for i in range(linhas)])
+    conn.commit()
+    return conn
+
+
+def test_exportacao_csv():
+    """Verifica o conteúdo e a memória das exportações em CSV e CSV compactado"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path, 200000)
+
+        destino = os.path.join(pasta, 'resultado.csv')
+        tracemalloc.start()
+        exportacao = exportar_cursor(conn.execute('SELECT * FROM Cargas'), 'csv', destino, tamanho_lote=1000)
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert exportacao['linhas'] == 200000 and exportacao['bytes'] == os.path.getsize(destino)
+        # Apenas um lote em memória: uma fração do arquivo inteiro (~4.8 MB)
+        assert pico < exportacao['bytes'] / 4, (pico, exportacao['bytes'])
+
+        with open(destino, newline='') as arquivo:
+            linhas = list(csv.reader(arquivo))
+        assert linhas[0] == ['IDCarga', 'Origem', 'Ano', 'VLPesoCargaBruta']
+        assert linhas[1] == ['1', '', '2020', '0.0'] and len(linhas) == 200001
+
+        compactado = os.path.join(pasta, 'resultado.csv.gz')
+        exportacao = exportar_cursor(conn.execute('SELECT * FROM Cargas'), 'csv.gz', compactado)
+        with gzip.open(compactado, 'rt', newline='') as arquivo:
+            assert list(csv.reader(arquivo)) == linhas
+        assert exportacao['bytes'] < os.path.getsize(destino) / 3
+        conn.close()
+        print("✅ Exportação em CSV funcionando")
+
+
+def test_exportacao_parquet():
+    """Verifica a exportação em Parquet (requer duckdb)"""
+    try:
+        import duckdb
+    except ImportError:
+        print("duckdb não instalado; teste ignorado")
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path, 5000)
+        destino = os.path.join(pasta, 'resultado.parquet')
+        sql = 'SELECT Origem, Ano, COUNT(*) AS "n registros", SUM(VLPesoCargaBruta) AS peso FROM Cargas GROUP BY 1, 2'
+        exportacao = exportar_cursor(conn.execute(sql), 'parquet', destino, tamanho_lote=7)
+        esperado = conn.execute(sql).fetchall()
+        lido = duckdb.connect().execute(f"SELECT * FROM read_parquet('{destino}')")
+        assert [coluna[0] for coluna in lido.description] == ['Origem', 'Ano', 'n registros', 'peso']
+        assert lido.fetchall() == esperado and exportacao['linhas'] == len(esperado)
+        conn.close()
+        print("✅ Exportação em Parquet funcionando")
+
+
+def test_exportacao_database_tools():
+    """Verifica a exportação pelo DatabaseTools e a limpeza dos arquivos antigos"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        criar_banco(db_path, 3000).close()
+        tools = DatabaseTools(db_path)
+
+        # Sem o LIMIT das consultas interativas
+        destino = os.path.join(pasta, 'resultado.csv')
+        assert tools.export_query("SELECT * FROM Cargas WHERE Ano = '2021'", 'csv', destino)['linhas'] == 750
+        try:
+            tools.export_query("DELETE FROM Cargas", 'csv', destino)
+            assert False
+        except ConsultaBloqueada:
+            pass
+        tools.close()
+
+        exportacoes = os.path.join(pasta, 'exports')
+        antigo, url = novo_arquivo_exportacao('csv.gz', pasta=exportacoes)
+        assert url.startswith('app/static/exports/') and url.endswith('.csv.gz')
+        open(antigo, 'w').close()
+        os.utime(antigo, (0, 0))
+        limpar_exportacoes(exportacoes)
+        assert not os.path.exists(antigo)
+        print("✅ Exportação pelo DatabaseTools funcionando")
+
+
+if __name__ == "__main__":
+    test_exportacao_csv()
+    test_exportacao_parquet()
+    test_exportacao_database_tools()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import tracemalloc
+from history_store import HistoryStore, resumir_resultado
+
+
+def test_historico():
+    """Verifica o buffer circular, a prévia dos resultados e a leitura paginada"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        historico = HistoryStore(db_path, max_recent=5, max_entries=150, preview_chars=20)
+        assert os.path.basename(historico.history_path) == 'query_history.db'
+
+        resultado = str([(i, 'Santos') for i in range(100)])
+        for i in range(300):
+            historico.append({"query": f"Pergunta {i}", "sql": f"SELECT {i}", "result": resultado})
+
+        # Em memória, apenas as mais recentes, com a prévia do resultado
+        recentes = historico.recent()
+        assert [item['query'] for item in recentes] == [f"Pergunta {i}" for i in range(295, 300)]
+        assert len(historico) == 5 and historico[-1]['id'] == 300
+        assert recentes[0]['result'] == resultado[:20] + '...' and recentes[0]['result_size'] == len(resultado)
+        assert recentes[0]['result_hash'] == resumir_resultado(resultado)[2]
+
+        # No arquivo, no máximo max_entries (+ uma rodada de limpeza)
+        assert 150 <= historico.count() < 250
+
+        # Páginas da mais recente para a mais antiga, por id
+        pagina = historico.page(limit=10)
+        assert [item['id'] for item in pagina] == list(range(300, 290, -1))
+        pagina = historico.page(before=pagina[-1]['id'], limit=10)
+        assert [item['id'] for item in pagina] == list(range(290, 280, -1))
+        historico.close()
+
+        # O histórico sobrevive a uma reinicialização
+        historico = HistoryStore(db_path, max_recent=5)
+        assert historico[-1]['query'] == "Pergunta 299"
+        historico.append({"query": "Nova", "sql": "SELECT 1", "result": "[(1,)]"})
+        assert historico.page(limit=1)[0]['id'] == 301
+
+        # Memória constante: novas consultas substituem as antigas no buffer
+        tracemalloc.start()
+        for i in range(2000):
+            historico.append({"query": f"Pergunta {i}", "sql": "SELECT 1", "result": resultado * 10})
+        atual = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        assert atual < 200_000, atual
+        historico.clear()
+        assert historico.count() == 0 and not historico.recent()
+        historico.close()
+        print("✅ Histórico de consultas funcionando")
+
+
+if __name__ == "__main__":
+    test_historico()
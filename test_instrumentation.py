@@ -0,0 +1,131 @@
+import os
+import json
+import sqlite3
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import Tracer, span_atual, tokens_resposta
+from sql_guard import SQLGuard
+
+
+def ler_linhas(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return [json.loads(linha) for linha in arquivo]
+
+
+def test_spans_aninhados():
+    """Verifica a árvore de spans, os atributos, os erros e o arquivo JSONL"""
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'traces.jsonl')
+        tracer = Tracer(caminho=caminho, formato='jsonl', gravar=True)
+
+        with tracer.span("query", agent="Teste") as raiz:
+            with tracer.span("llm", model="modelo") as llm:
+                llm.definir(prompt_tokens=120, completion_tokens=30, ignorado=None)
+            # A etapa executada em outra thread (com o contexto copiado) continua filha da pergunta
+            def executar_sql():
+                with tracer.span("sql") as sql:
+                    sql.definir(rows=3)
+            with ThreadPoolExecutor(1) as executor:
+                executor.submit(contextvars.copy_context().run, executar_sql).result()
+            try:
+                with tracer.span("post"):
+                    raise RuntimeError("falha no histórico")
+            except RuntimeError:
+                pass
+        assert span_atual().definir(x=1) is None  # sem span ativo, atributos são ignorados
+
+        spans = {s['name']: s for s in ler_linhas(caminho)}
+        assert set(spans) == {'query', 'llm', 'sql', 'post'}
+        assert spans['query']['parent_span_id'] is None
+        assert all(spans[nome]['parent_span_id'] == raiz.span_id for nome in ('llm', 'sql', 'post'))
+        assert len({s['trace_id'] for s in spans.values()}) == 1
+        assert spans['llm']['attributes'] == {'model': 'modelo', 'prompt_tokens': 120, 'completion_tokens': 30}
+        assert spans['post']['status'] == 'error' and spans['post']['error'] == 'falha no histórico'
+        assert spans['query']['status'] == 'ok'
+        assert spans['query']['duration_ms'] >= spans['llm']['duration_ms']
+        print("✅ Spans aninhados funcionando")
+
+
+def test_formato_otlp_e_rotacao():
+    """Verifica o JSON do OTLP e a rotação do arquivo"""
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'traces.otlp.jsonl')
+        tracer = Tracer(caminho=caminho, formato='otlp', max_bytes=2000, gravar=True)
+        with tracer.span("query"):
+            with tracer.span("sql", rows=10, truncated=False, plan_cost=12.5, plan=["SCAN Cargas"]):
+                pass
+
+        sql, query = [linha['resourceSpans'][0]['scopeSpans'][0]['spans'][0] for linha in ler_linhas(caminho)]
+        assert sql['parentSpanId'] == query['spanId'] and 'parentSpanId' not in query
+        assert len(sql['traceId']) == 32 and len(sql['spanId']) == 16
+        atributos = {a['key']: a['value'] for a in sql['attributes']}
+        assert atributos == {'rows': {'intValue': '10'}, 'truncated': {'boolValue': False},
+                             'plan_cost': {'doubleValue': 12.5}, 'plan': {'stringValue': 'SCAN Cargas'}}
+        assert int(sql['endTimeUnixNano']) >= int(sql['startTimeUnixNano'])
+
+        for _ in range(20):
+            with tracer.span("query"):
+                pass
+        assert os.path.exists(caminho + '.1') and os.path.getsize(caminho) <= 2000 + 1000
+
+        try:
+            Tracer(caminho=caminho, formato='xml')
+            assert False
+        except ValueError:
+            pass
+        print("✅ Formato OTLP e rotação funcionando")
+
+
+def test_percentis_por_etapa():
+    """Verifica a janela de execuções, os percentis e as somas de tokens"""
+    tracer = Tracer(janela=5, gravar=False)
+    for i in range(8):
+        with tracer.span("llm") as etapa:
+            etapa.definir(prompt_tokens=100, completion_tokens=10)
+    with tracer.span("sql"):
+        pass
+
+    estatisticas = tracer.estatisticas()
+    llm = estatisticas['llm']
+    assert llm['n'] == 5 and llm['erros'] == 0
+    assert 0 <= llm['p50_ms'] <= llm['p95_ms'] <= llm['p99_ms']
+    # As somas contam todas as execuções, não apenas a janela
+    assert llm['prompt_tokens'] == 800 and llm['completion_tokens'] == 80
+    assert estatisticas['sql']['n'] == 1
+    tracer.limpar()
+    assert tracer.estatisticas() == {}
+    print("✅ Percentis por etapa funcionando")
+
+
+def test_plano_e_tokens():
+    """Verifica o plano registrado pelo guarda e a leitura dos tokens das respostas"""
+    with tempfile.TemporaryDirectory() as pasta:
+        conn = sqlite3.connect(os.path.join(pasta, 'cargas.db'))
+        conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Ano TEXT)')
+        tracer = Tracer(gravar=False)
+        with tracer.span("sql") as etapa:
+            SQLGuard().verificar(conn, "SELECT * FROM Cargas WHERE Ano = '2023'")
+        assert 'SCAN' in etapa.atributos['plan'] and etapa.atributos['plan_cost'] >= 0
+        conn.close()
+
+    class MensagemLangChain:
+        usage_metadata = {'input_tokens': 50, 'output_tokens': 7}
+
+    class Uso:
+        prompt_tokens, completion_tokens = 40, 5
+
+    class RespostaOpenAI:
+        usage = Uso()
+
+    assert tokens_resposta(MensagemLangChain()) == (50, 7)
+    assert tokens_resposta(RespostaOpenAI()) == (40, 5)
+    assert tokens_resposta(object()) == (None, None)
+    print("✅ Plano e tokens funcionando")
+
+
+if __name__ == "__main__":
+    test_spans_aninhados()
+    test_formato_otlp_e_rotacao()
+    test_percentis_por_etapa()
+    test_plano_e_tokens()
@@ -0,0 +1,101 @@
+import os
+import time
+import sqlite3
+import tempfile
+import tracemalloc
+from metadata_snapshot import obter_metadados, carregar_snapshot, TabelaCodigos, MetadataSnapshot
+from create_database import criar_tabelas_mapeamento, atualizar_catalogo_anos, registrar_versao
+
+MAPEAMENTOS = {
+    'CDMercadoria': {f'{i:04d}': 'Animais Vivos' if i < 50 else f'Mercadoria {i // 10}' for i in range(1, 1300)},
+    'Portos': {f'BR{i:03d}': f'Porto {i}' for i in range(6000)},
+    'Países Origem': {f'BR{i:03d}': 'BRASIL' if i % 2 else 'CHINA' for i in range(3500)},
+    'Países Destino': {f'BR{i:03d}': 'ESTADOS UNIDOS' for i in range(5000)},
+    'Tipo Navegação': {'1': 'Navegação Interior', '3': 'Cabotagem', '5': 'Longo Curso'},
+    'Sentido': {'1': 'Desembarcados', '2': 'Embarcados'},
+    'Natureza da Carga': {'Granel Sólido': 'Granel Sólido', 'Carga Geral': 'Carga Geral'},
+    'ConteinerEstado': {'C': 'Cheio', 'V': 'Vazio'},
+}
+
+
+def criar_banco(db_path):
+    conn = sqlite3.connect(db_path)
+    criar_tabelas_mapeamento(conn, MAPEAMENTOS)
+    conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Ano TEXT)')
+    conn.executemany('INSERT INTO Cargas VALUES (?, ?)', [(i, '2023' if i % 3 else '2024') for i in range(3000)])
+    conn.commit()
+    return conn
+
+
+def carregar_dicionarios(db_path):
+    """Carregamento antigo: dicionários novos e SELECT DISTINCT em Cargas"""
+    conn = sqlite3.connect(db_path)
+    metadata = {nome: dict(conn.execute(f'SELECT codigo, {coluna} FROM {tabela}'))
+                for nome, tabela, coluna in [('portos', 'Portos', 'nome'), ('paises_origem', 'PaisesOrigem', 'nome'),
+                                             ('paises_destino', 'PaisesDestino', 'nome'),
+                                             ('mercadorias', 'CDMercadoria', 'descricao')]}
+    metadata['anos_disponiveis'] = [row[0] for row in conn.execute('SELECT DISTINCT Ano FROM Cargas ORDER BY Ano')]
+    conn.close()
+    return metadata
+
+
+def test_tabela_codigos():
+    """Verifica as buscas binárias e a interface de dicionário"""
+    tabela = TabelaCodigos([('BRSSZ', 'Santos'), ('BRIQI', 'Itaqui'), ('BRANT', 'Antonina')])
+    assert tabela['BRIQI'] == 'Itaqui' and tabela.get('XXXXX') is None and tabela.get(1) is None
+    assert list(tabela) == ['BRANT', 'BRIQI', 'BRSSZ'] and 'BRSSZ' in tabela
+    assert dict(tabela.items()) == {'BRSSZ': 'Santos', 'BRIQI': 'Itaqui', 'BRANT': 'Antonina'}
+    assert MetadataSnapshot.vazio()['anos_disponiveis'] == ()
+    print("✅ Tabela de códigos funcionando")
+
+
+def test_snapshot_compartilhado():
+    """Verifica o compartilhamento, o catálogo de anos e a recarga após uma nova carga"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path)
+
+        # Banco sem catálogo: os anos vêm de Cargas
+        snapshot = obter_metadados(db_path)
+        assert snapshot['anos_disponiveis'] == ('2023', '2024')
+
+        atualizar_catalogo_anos(conn)
+        conn.execute("DELETE FROM Cargas WHERE Ano = '2024'")
+        registrar_versao(conn, 2000)
+        assert conn.execute('SELECT registros FROM MetadadosAnos WHERE Ano = ?', ('2024',)).fetchone()[0] == 1000
+
+        # Nova versão dos dados: o snapshot é recarregado e os anos vêm do catálogo
+        snapshot = obter_metadados(db_path)
+        assert snapshot['anos_disponiveis'] == ('2023', '2024')
+        assert obter_metadados(db_path) is snapshot
+        assert snapshot['portos']['BR010'] == 'Porto 10'
+        assert snapshot['mercadorias'].get('0001') == 'Animais Vivos'
+        assert len(snapshot['paises_destino']) == 5000
+
+        # Descrições repetidas compartilham a mesma string
+        descricoes = snapshot['paises_origem'].values()
+        assert descricoes[0] is [d for d in descricoes if d == descricoes[0]][-1]
+
+        inicio = time.perf_counter()
+        for _ in range(1000):
+            obter_metadados(db_path)
+        print(f"obter_metadados em cache: {(time.perf_counter() - inicio) * 1000:.0f} µs por chamada")
+
+        tracemalloc.start()
+        antigo = carregar_dicionarios(db_path)
+        memoria_antiga = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        tracemalloc.start()
+        novo = carregar_snapshot(db_path)
+        memoria_nova = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"Memória: dicionários {memoria_antiga / 1024:.0f} KB, snapshot {memoria_nova / 1024:.0f} KB")
+        assert memoria_nova < memoria_antiga
+        assert dict(novo['portos'].items()) == antigo['portos']
+        conn.close()
+        print("✅ Snapshot de metadados compartilhado")
+
+
+if __name__ == "__main__":
+    test_tabela_codigos()
+    test_snapshot_compartilhado()
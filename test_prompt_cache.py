@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import tempfile
+from prompt_cache import carregar_contexto, hash_template, PASTA_CACHE
+from create_database import registrar_versao
+
+
+def test_contexto_em_cache():
+    """Verifica que o contexto é lido do disco e reconstruído quando o esquema ou os dados mudam"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Ano TEXT)')
+        conn.commit()
+        registrar_versao(conn, 0)
+
+        construcoes = []
+
+        def construir():
+            construcoes.append(1)
+            return f"ESQUEMA: Cargas ({len(construcoes)})"
+
+        assert carregar_contexto(db_path, 'Teste', construir) == "ESQUEMA: Cargas (1)"
+        assert carregar_contexto(db_path, 'Teste', construir) == "ESQUEMA: Cargas (1)"
+        assert len(construcoes) == 1
+
+        # Nova versão dos dados
+        registrar_versao(conn, 10)
+        assert carregar_contexto(db_path, 'Teste', construir) == "ESQUEMA: Cargas (2)"
+
+        # Mudança de esquema
+        conn.execute('CREATE INDEX idx_ano ON Cargas (Ano)')
+        conn.commit()
+        assert carregar_contexto(db_path, 'Teste', construir) == "ESQUEMA: Cargas (3)"
+        assert carregar_contexto(db_path, 'Teste', construir) == "ESQUEMA: Cargas (3)"
+        assert len(os.listdir(os.path.join(pasta, PASTA_CACHE))) == 1
+
+        # Outra classe tem seu próprio arquivo
+        assert carregar_contexto(db_path, 'Outra', lambda: "outro") == "outro"
+        assert len(os.listdir(os.path.join(pasta, PASTA_CACHE))) == 2
+        conn.close()
+        print("✅ Contexto em cache funcionando")
+
+
+def test_hash_template():
+    """Verifica que mudanças no texto do template mudam o hash"""
+    def template_a(self):
+        return f"Você é um assistente. Anos: {self}"
+
+    def template_b(self):
+        return f"Você é um assistente SQL. Anos: {self}"
+
+    def template_a_copia(self):
+        return f"Você é um assistente. Anos: {self}"
+
+    assert hash_template(template_a) != hash_template(template_b)
+    assert hash_template(template_a) == hash_template(template_a_copia)
+    print("✅ Hash do template funcionando")
+
+
+if __name__ == "__main__":
+    test_contexto_em_cache()
+    test_hash_template()
@@ -0,0 +1,86 @@
+import os
+import sqlite3
+import tempfile
+from query_cache import QueryCache, normalizar_pergunta
+from db_connection import get_dataset_version
+from create_database import registrar_versao
+
+
+def criar_banco(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Ano TEXT)')
+    conn.commit()
+    return conn
+
+
+def test_normalizacao():
+    """Verifica que perguntas equivalentes têm a mesma forma normalizada"""
+    base = normalizar_pergunta("Quantas cargas foram registradas em 2023?")
+    assert base == "quantas cargas foram registradas em 2023"
+    assert normalizar_pergunta("  QUANTAS cargas foram   registradas em 2023 ") == base
+    assert normalizar_pergunta("Quais os cinco portos com mais de 1.000 toneladas?") == \
+        normalizar_pergunta("quais os 5 portos com mais de 1000 toneladas")
+    assert normalizar_pergunta("Exportações de café") == "exportacoes de cafe"
+    assert normalizar_pergunta("peso médio de 1,5 t") == "peso medio de 1.5 t"
+    assert normalizar_pergunta("mercadoria 0101") == "mercadoria 0101"
+    assert normalizar_pergunta("em 2023") != normalizar_pergunta("em 2024")
+    print("✅ Normalização das perguntas funcionando")
+
+
+def test_cache_de_consultas():
+    """Verifica acertos, TTL, limite de entradas e invalidação por versão dos dados"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path)
+        versao_arquivo = get_dataset_version(db_path)
+        assert versao_arquivo.startswith('arquivo-')
+        registrar_versao(conn, 0)
+        assert get_dataset_version(db_path) != versao_arquivo
+
+        cache = QueryCache(db_path, contexto='prompt v1', max_entradas=2)
+        assert cache.get("Quantas cargas em 2023?") is None
+        cache.put("Quantas cargas em 2023?", "SELECT COUNT(*) FROM Cargas WHERE Ano = '2023'")
+        assert cache.get("quantas  CARGAS em 2023") == "SELECT COUNT(*) FROM Cargas WHERE Ano = '2023'"
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+        # Persistência entre instâncias com o mesmo contexto
+        outro = QueryCache(db_path, contexto='prompt v1')
+        assert outro.get("Quantas cargas em 2023?") is not None
+        assert outro.stats()['hits_total'] == 2
+        outro.close()
+
+        # Contexto diferente não reaproveita o SQL
+        outro = QueryCache(db_path, contexto='prompt v2')
+        assert outro.get("Quantas cargas em 2023?") is None
+        outro.close()
+
+        # Limite de entradas: a menos usada recentemente sai
+        cache.put("pergunta a", "SELECT 1")
+        cache.get("Quantas cargas em 2023?")
+        cache.put("pergunta b", "SELECT 2")
+        assert cache.stats()['entradas'] == 2
+        assert cache.get("pergunta a") is None
+
+        # Nova carga grava outra versão: a próxima consulta ao cache percebe a mudança do arquivo
+        registrar_versao(conn, 10)
+        assert cache.get("Quantas cargas em 2023?") is None
+        assert not cache.refresh_version()
+        cache.put("Quantas cargas em 2023?", "SELECT COUNT(*) FROM Cargas WHERE Ano = '2023'")
+        assert cache.get("Quantas cargas em 2023?") is not None
+
+        # TTL expirado
+        cache.ttl = -1
+        cache.put("pergunta c", "SELECT 3")
+        assert cache.get("pergunta c") is None
+
+        cache.put("pergunta d", "SELECT 4")
+        cache.invalidate("pergunta d")
+        assert cache.get("pergunta d") is None
+        cache.close()
+        conn.close()
+        print("✅ Cache de consultas funcionando")
+
+
+if __name__ == "__main__":
+    test_normalizacao()
+    test_cache_de_consultas()
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import tempfile
+import pandas as pd
+from result_cache import ResultCache, canonizar_sql, obter_cache_resultados
+from create_database import registrar_versao
+from database_tools import DatabaseTools
+
+
+def criar_banco(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Ano TEXT, VLPesoCargaBruta REAL)')
+    conn.executemany('INSERT INTO Cargas VALUES (?, ?, ?)', [(i, '2023', i * 0.5) for i in range(100)])
+    conn.commit()
+    return conn
+
+
+def test_canonizacao():
+    """Verifica que variações de espaço, maiúsculas e ponto e vírgula têm a mesma chave"""
+    base = canonizar_sql("SELECT COUNT(*) FROM Cargas WHERE Ano = '2023'")
+    assert canonizar_sql("select count(*)\n  from Cargas\twhere Ano='2023';") == \
+        "SELECT count ( * ) FROM Cargas WHERE Ano = '2023'"
+    assert canonizar_sql("SELECT COUNT(*) FROM Cargas WHERE Ano = '2023' ;") == base
+    # Literais e nomes de colunas não são alterados
+    assert canonizar_sql("SELECT Ano FROM Cargas WHERE Sentido = 'select'") != \
+        canonizar_sql("SELECT ano FROM Cargas WHERE Sentido = 'SELECT'")
+    print("✅ Canonização do SQL funcionando")
+
+
+def test_cache_de_resultados():
+    """Verifica acertos, orçamento em bytes e invalidação pela versão dos dados"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path)
+        registrar_versao(conn, 100)
+
+        cache = ResultCache(db_path, max_bytes=4000)
+        assert cache.get("SELECT 1") is None
+        assert cache.put("SELECT 1", "[(1,)]")
+        assert cache.get("select 1;") == "[(1,)]"
+        df = pd.DataFrame({'n': [1, 2, 3]})
+        cache.put("SELECT n FROM t", df, tipo='dataframe')
+        assert cache.get("SELECT n FROM t") is None
+        copia = cache.get("SELECT n FROM t", tipo='dataframe')
+        assert copia.equals(df) and copia is not df
+
+        # Resultados grandes demais não são guardados; os antigos saem quando o orçamento acaba
+        assert not cache.put("SELECT grande", os.urandom(2000))
+        for i in range(20):
+            cache.put(f"SELECT {i} FROM Cargas", os.urandom(300))
+        assert cache.bytes <= cache.max_bytes
+        assert cache.stats()['remocoes'] > 0
+        assert cache.get("SELECT 1") is None
+
+        # Nova carga: os resultados da versão anterior são descartados
+        cache.put("SELECT 1", "[(1,)]")
+        registrar_versao(conn, 100)
+        assert cache.get("SELECT 1") is None
+        conn.close()
+        print("✅ Cache de resultados funcionando")
+
+
+def test_cache_compartilhado_database_tools():
+    """Verifica que DatabaseTools usa o cache do processo e vê novas cargas"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path)
+        registrar_versao(conn, 100)
+
+        tools = DatabaseTools(db_path)
+        assert tools.results is obter_cache_resultados(db_path)
+        sql = 'SELECT COUNT(*) AS n FROM Cargas'
+        assert tools.execute_query(sql)['n'][0] == 100
+        assert tools.execute_query('select COUNT(*) as n\nfrom Cargas;')['n'][0] == 100
+        assert tools.results.stats()['hits'] == 1
+
+        conn.execute("INSERT INTO Cargas VALUES (100, '2024', 1.0)")
+        registrar_versao(conn, 101)
+        assert tools.execute_query(sql)['n'][0] == 101
+        tools.close()
+        conn.close()
+        print("✅ Cache compartilhado com DatabaseTools")
+
+
+if __name__ == "__main__":
+    test_canonizacao()
+    test_cache_de_resultados()
+    test_cache_compartilhado_database_tools()
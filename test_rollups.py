@@ -0,0 +1,91 @@
+import os
+import random
+import sqlite3
+import tempfile
+from rollups import criar_rollups, carregar_catalogo, reescrever_consulta, RollupRewriter
+from database_tools import DatabaseTools
+
+# Consultas no formato gerado pelo modelo, com a ordem do resultado determinada
+CONSULTAS = [
+    "SELECT SUM(VLPesoCargaBruta) as total_toneladas FROM Cargas WHERE Origem = 'BRITQ' AND Sentido = 'Embarcados' AND Ano = '2023'",
+    "SELECT Ano, Sentido, SUM(VLPesoCargaBruta), COUNT(*) FROM Cargas GROUP BY Ano, Sentido ORDER BY Ano, Sentido",
+    "SELECT Origem, SUM(TEU) AS teus FROM Cargas WHERE Ano IN ('2023', '2024') GROUP BY Origem ORDER BY Origem",
+    "SELECT Natureza_da_Carga, AVG(VLPesoCargaBruta), MIN(TEU), MAX(TEU) FROM Cargas WHERE Sentido = 'Desembarcados' GROUP BY Natureza_da_Carga ORDER BY Natureza_da_Carga",
+    "SELECT CDMercadoria, COUNT(*) AS n FROM Cargas WHERE Ano = '2024' GROUP BY CDMercadoria HAVING COUNT(*) > 5 ORDER BY CDMercadoria",
+    "SELECT COUNT(*) FROM Cargas WHERE Origem = 'XXXXX'",
+    "SELECT Origem, SUM(VLPesoCargaBruta) total FROM Cargas WHERE Sentido = 'Embarcados' GROUP BY Origem ORDER BY total DESC LIMIT 3",
+    "SELECT Destino, ROUND(SUM(VLPesoCargaBruta) / 1000, 2) AS mil_t FROM Cargas WHERE Mes = '3' GROUP BY Destino ORDER BY Destino;",
+]
+
+# Consultas que devem continuar na tabela Cargas
+CONSULTAS_SEM_ROLLUP = [
+    "SELECT * FROM Cargas LIMIT 5",
+    "SELECT IDCarga, VLPesoCargaBruta FROM Cargas WHERE Ano = '2023'",
+    "SELECT SUM(VLPesoCargaBruta) FROM Cargas WHERE IDAtracacao = 10",
+    "SELECT COUNT(DISTINCT Origem) FROM Cargas",
+    "SELECT SUM(VLPesoCargaBruta) FROM Cargas c JOIN Sentido s ON c.Sentido = s.Sentido",
+    "SELECT SUM(CASE WHEN Sentido = 'Embarcados' THEN VLPesoCargaBruta END) FROM Cargas",
+]
+
+
+def criar_banco_teste(db_path, linhas=5000):
+    """Cria um banco com a tabela Cargas e valores de peso exatos em ponto flutuante."""
+    random.seed(42)
+    conn = sqlite3.connect(db_path)
+    conn.execute('''CREATE TABLE Cargas (
+        IDCarga INTEGER, IDAtracacao INTEGER, CDMercadoria TEXT, Origem TEXT, Destino TEXT,
+        Pais_Origem TEXT, Pais_Destino TEXT, Sentido TEXT, Natureza_da_Carga TEXT,
+        TipoNavegacao_Codigo TEXT, Ano TEXT, Mes TEXT, VLPesoCargaBruta REAL, QTCarga REAL, TEU REAL)''')
+    portos = ['BRITQ', 'BRSSZ', 'BRPNG', 'BRRIG', 'CNSHA']
+    dados = []
+    for i in range(linhas):
+        # Múltiplos de 1/4 com poucos dígitos: as somas são exatas em qualquer ordem
+        peso = random.randint(0, 4000) / 4
+        teu = random.choice([None, 0.0, 1.0, 2.0])
+        dados.append((i, i % 300, f'{random.randint(1, 20):04d}', random.choice(portos), random.choice(portos),
+                      'BR', random.choice(['BR', 'CN']), random.choice(['Embarcados', 'Desembarcados']),
+                      random.choice(['Granel Sólido', 'Granel Líquido', 'Carga Conteinerizada']),
+                      random.choice(['1', '2', '3']), random.choice(['2023', '2024']),
+                      str(random.randint(1, 12)), peso, float(random.randint(1, 10)), teu))
+    conn.executemany('INSERT INTO Cargas VALUES (' + ','.join('?' * 15) + ')', dados)
+    conn.commit()
+    return conn
+
+
+def test_rollups():
+    """Verifica que as consultas reescritas retornam exatamente o mesmo resultado da tabela Cargas"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco_teste(db_path)
+        criados = criar_rollups(conn)
+        assert 'Rollup_Ano_Mes_Sentido' in criados
+        catalogo = carregar_catalogo(conn)
+
+        for sql in CONSULTAS:
+            reescrita = reescrever_consulta(sql, catalogo)
+            print(f"\nOriginal:  {sql}\nReescrita: {reescrita}")
+            assert reescrita is not None and 'Rollup_' in reescrita
+            original = conn.execute(sql.rstrip(';'))
+            resultado = conn.execute(reescrita)
+            assert [d[0] for d in original.description] == [d[0] for d in resultado.description]
+            assert original.fetchall() == resultado.fetchall()
+
+        for sql in CONSULTAS_SEM_ROLLUP:
+            assert reescrever_consulta(sql, catalogo) is None, sql
+
+        # Menor rollup que cobre as colunas
+        assert 'Rollup_Ano_Sentido' in reescrever_consulta(CONSULTAS[1], catalogo)
+        conn.close()
+
+        # DatabaseTools retorna o mesmo DataFrame com e sem rollups
+        tools = DatabaseTools(db_path)
+        df_rollup = tools.execute_query(CONSULTAS[1])
+        tools.rollups = RollupRewriter(os.path.join(pasta, 'inexistente.db'))
+        df_base = tools.execute_query(CONSULTAS[1])
+        assert df_rollup.equals(df_base)
+        assert 'Rollups' not in tools.list_tables()
+        print("\n✅ Rollups retornam os mesmos resultados da tabela Cargas")
+
+
+if __name__ == "__main__":
+    test_rollups()
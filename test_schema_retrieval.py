@@ -0,0 +1,126 @@
+from schema_retrieval import SchemaRetriever, IndiceBM25, dividir_contexto, tokenizar, contar_tokens
+
+# Contexto no mesmo formato de _create_context, com o esquema de get_table_info
+CONTEXTO = """
+Você é um assistente especializado em traduzir consultas em linguagem natural para SQL.
+
+ESQUEMA DO BANCO DE DADOS:
+
+CREATE TABLE "Cargas" (
+\t"IDCarga" INTEGER,
+\t"Ano" TEXT,
+\t"Origem" TEXT,
+\t"Tipo_Navegacao" TEXT,
+\t"VLPesoCargaBruta" REAL
+)
+
+/*
+3 rows from Cargas table:
+IDCarga\tAno\tOrigem\tTipo_Navegacao\tVLPesoCargaBruta
+1\t2023\tBRIQI\tCabotagem\t10.0
+*/
+
+
+CREATE TABLE "Portos" (
+\tcodigo TEXT,
+\tnome TEXT
+)
+
+/*
+3 rows from Portos table:
+codigo\tnome
+BRIQI\tItaqui
+*/
+
+
+CREATE TABLE "TipoNavegacao" (
+\tcodigo TEXT,
+\tdescricao TEXT
+)
+
+/*
+3 rows from TipoNavegacao table:
+codigo\tdescricao
+3\tCabotagem
+*/
+
+IMPORTANTE: Ao analisar consultas em linguagem natural, você deve entender o contexto e os termos específicos:
+
+1. PORTOS:
+   - Quando mencionarem nomes de portos, relacione com o código correspondente
+
+2. TIPOS DE NAVEGAÇÃO:
+   - "Cabotagem" refere-se ao transporte entre portos do mesmo país
+
+3. MÉTRICAS DE QUANTIDADE:
+   - "Toneladas" refere-se à coluna "VLPesoCargaBruta" na tabela Cargas
+
+4. CONSIDERAÇÕES GERAIS:
+   - Sempre inclua contagens (COUNT) além de somas (SUM)
+
+EXEMPLOS DE CONSULTAS:
+
+1. "Quantas toneladas foram embarcadas pelo Porto do Itaqui em 2023?"
+   SQL:
+   ```sql
+   SELECT SUM(VLPesoCargaBruta) FROM Cargas WHERE Origem = 'BRIQI' AND Ano = '2023'
+   ```
+
+2. "Quantos registros de cabotagem existem?"
+   SQL:
+   ```sql
+   SELECT COUNT(*) FROM Cargas WHERE Tipo_Navegacao = 'Cabotagem'
+   ```
+
+Sua tarefa é:
+1. Retornar APENAS a consulta SQL
+
+Responda APENAS com a consulta SQL, sem nenhum texto adicional.
+"""
+
+METADATA = {
+    'portos': {'BRIQI': 'Itaqui', 'BRSSZ': 'Santos', 'BRPNG': 'Paranaguá', 'PTOPO': 'Porto'},
+    'tipo_navegacao': {'3': 'Cabotagem', '5': 'Longo Curso'},
+    'mercadorias': {'0101': 'Animais Vivos', '0102': 'Animais Vivos'},
+}
+
+
+def test_tokenizacao_e_bm25():
+    """Verifica a tokenização e a ordenação do BM25"""
+    assert tokenizar("VLPesoCargaBruta") == ['vl', 'peso', 'carga', 'bruta']
+    assert tokenizar("Navegação de Cabotagem") == ['navegacao', 'cabotagem']
+    indice = IndiceBM25(["porto de santos", "porto do itaqui", "tipo de navegação"])
+    assert indice.buscar("toneladas em Santos")[0][0] == 0
+    assert indice.buscar("inexistente") == []
+    print("✅ BM25 funcionando")
+
+
+def test_contexto_reduzido():
+    """Verifica que o prompt reduzido mantém apenas as partes relevantes"""
+    partes = dividir_contexto(CONTEXTO)
+    assert list(partes['tabelas']) == ['Cargas', 'Portos', 'TipoNavegacao']
+    assert list(partes['secoes']) == ['PORTOS', 'TIPOS DE NAVEGAÇÃO', 'MÉTRICAS DE QUANTIDADE', 'CONSIDERAÇÕES GERAIS']
+    assert len(partes['exemplos']) == 2
+
+    retriever = SchemaRetriever(CONTEXTO, METADATA)
+    contexto = retriever.contexto_para("Quantas cargas de cabotagem saíram de Santos?")
+    print(contexto)
+    assert 'CREATE TABLE "Cargas"' in contexto and 'CREATE TABLE "TipoNavegacao"' in contexto
+    assert "Portos: Santos = 'BRSSZ'" in contexto and "TipoNavegacao: Cabotagem = '3'" in contexto
+    assert 'Itaqui' not in contexto.split('EXEMPLOS DE CONSULTAS')[0].split('CÓDIGOS')[-1]
+    assert '2. TIPOS DE NAVEGAÇÃO' in contexto and 'CONSIDERAÇÕES GERAIS' in contexto
+    assert '"Quantos registros de cabotagem existem?"' in contexto
+    assert contexto.rstrip().endswith("sem nenhum texto adicional.")
+    assert contar_tokens(contexto) < contar_tokens(CONTEXTO)
+
+    contexto = retriever.contexto_para("Quantas toneladas de animais vivos?")
+    assert "CDMercadoria: Animais Vivos = '0101', '0102'" in contexto
+
+    # Contexto em outro formato: o prompt completo é usado
+    assert SchemaRetriever("outro prompt").contexto_para("pergunta") == "outro prompt"
+    print("✅ Contexto reduzido funcionando")
+
+
+if __name__ == "__main__":
+    test_tokenizacao_e_bm25()
+    test_contexto_reduzido()
@@ -0,0 +1,121 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+from sql_guard import SQLGuard, ConsultaBloqueada, OrcamentoExcedido, inserir_limite, verificar_somente_leitura
+from database_tools import DatabaseTools
+
+# Soma de uma sequência longa: só termina se não for interrompida
+CONSULTA_LONGA = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) "
+                  "SELECT SUM(i) FROM n")
+
+
+def criar_banco(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Origem TEXT, Ano TEXT, VLPesoCargaBruta REAL)')
+    conn.execute('CREATE TABLE Portos (Codigo TEXT, Nome TEXT)')
+    conn.executemany('INSERT INTO Cargas (Origem, Ano, VLPesoCargaBruta) VALUES (?, ?, ?)',
+                     [(f'BR{i % 50:03d}', str(2020 + i % 5), float(i)) for i in range(20000)])
+    conn.executemany('INSERT INTO Portos VALUES (?, ?)', [(f'BR{i:03d}', f'Porto {i}') for i in range(5000)])
+    conn.execute('CREATE INDEX idx_ano ON Cargas (Ano)')
+    conn.execute('ANALYZE')
+    conn.commit()
+    return conn
+
+
+def test_verificacoes():
+    """Verifica a recusa de modificações e a inserção do LIMIT"""
+    for sql in ["DELETE FROM Cargas", "SELECT 1; DROP TABLE Cargas", "PRAGMA table_info(Cargas)",
+                "WITH x AS (SELECT 1) INSERT INTO Portos SELECT * FROM x", "ATTACH 'outro.db' AS o"]:
+        try:
+            verificar_somente_leitura(sql)
+            assert False, sql
+        except ConsultaBloqueada:
+            pass
+    verificar_somente_leitura("SELECT REPLACE(Nome, 'a', 'b') FROM Portos;")
+
+    assert inserir_limite("SELECT * FROM Cargas;", 100) == ("SELECT * FROM Cargas\nLIMIT 100", True)
+    assert inserir_limite("SELECT * FROM Cargas LIMIT 5000", 100) == ("SELECT * FROM Cargas LIMIT 100", True)
+    assert inserir_limite("SELECT * FROM Cargas LIMIT 10, 5000", 100) == ("SELECT * FROM Cargas LIMIT 10, 100", True)
+    assert inserir_limite("SELECT * FROM Cargas LIMIT 5", 100) == ("SELECT * FROM Cargas LIMIT 5", False)
+    # LIMIT dentro de subconsulta não limita o resultado
+    assert inserir_limite("SELECT * FROM (SELECT * FROM Cargas LIMIT 5000)", 100)[0].endswith("\nLIMIT 100")
+    print("✅ Verificação de consultas funcionando")
+
+
+def test_custo_do_plano():
+    """Verifica a estimativa de custo e a recusa de produtos cartesianos"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path)
+        guard = SQLGuard(max_linhas=100, max_custo=1_000_000)
+
+        assert guard.analisar(conn, "SELECT * FROM Cargas WHERE IDCarga = 7")['custo'] == 1
+        assert guard.analisar(conn, "SELECT COUNT(*) FROM Cargas")['custo'] == 20000
+        # Busca pelo índice usa as estatísticas do ANALYZE (20000 linhas / 5 anos)
+        assert guard.analisar(conn, "SELECT SUM(VLPesoCargaBruta) FROM Cargas WHERE Ano = '2023'")['custo'] == 4000
+
+        # Produto cartesiano com agregação: 20000 x 5000 linhas
+        cartesiano = "SELECT c.Ano, COUNT(*) FROM Cargas c, Portos p GROUP BY c.Ano"
+        assert guard.analisar(conn, cartesiano)['custo'] == 100_000_000
+        try:
+            guard.preparar(conn, cartesiano)
+            assert False
+        except ConsultaBloqueada as e:
+            assert 'SCAN' in str(e)
+
+        # Listagem sem agregação para no LIMIT inserido
+        listagem = guard.executar(conn, "SELECT * FROM Cargas c, Portos p")
+        assert len(listagem) == 100
+        conn.close()
+        print("✅ Estimativa de custo funcionando")
+
+
+def test_orcamento_de_execucao():
+    """Verifica a interrupção por tempo, por instruções e por cancelamento"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path)
+
+        inicio = time.perf_counter()
+        try:
+            SQLGuard(max_segundos=0.3).executar(conn, CONSULTA_LONGA)
+            assert False
+        except OrcamentoExcedido as e:
+            assert 'tempo limite' in str(e)
+        assert time.perf_counter() - inicio < 2
+
+        try:
+            SQLGuard(max_passos=100_000).executar(conn, CONSULTA_LONGA)
+            assert False
+        except OrcamentoExcedido as e:
+            assert 'instruções' in str(e)
+
+        cancelar = threading.Event()
+        threading.Timer(0.2, cancelar.set).start()
+        try:
+            SQLGuard().executar(conn, CONSULTA_LONGA, cancelar=cancelar)
+            assert False
+        except OrcamentoExcedido as e:
+            assert 'cancelada' in str(e)
+
+        # A conexão continua utilizável e sem o progress handler
+        assert SQLGuard(max_segundos=0.3).executar(conn, "SELECT COUNT(*) FROM Cargas") == [(20000,)]
+        assert conn.execute(CONSULTA_LONGA.replace('1000000000', '100000')).fetchone() == (5000050000,)
+        conn.close()
+
+        # DatabaseTools devolve os erros do guarda no DataFrame
+        tools = DatabaseTools(db_path)
+        tools.guard = SQLGuard(max_segundos=0.3)
+        assert 'error' in tools.execute_query("DELETE FROM Cargas")
+        assert 'tempo limite' in tools.execute_query(CONSULTA_LONGA)['error'][0]
+        assert len(tools.execute_query("SELECT * FROM Cargas")) == 1000
+        tools.close()
+        print("✅ Orçamento de execução funcionando")
+
+
+if __name__ == "__main__":
+    test_verificacoes()
+    test_custo_do_plano()
+    test_orcamento_de_execucao()
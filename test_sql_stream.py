@@ -0,0 +1,98 @@
+import os
+import time
+import sqlite3
+import tempfile
+from sql_stream import DetectorSQL, extrair_sql, fim_instrucao, processar_em_fluxo
+
+
+def detectar(pedacos):
+    """Retorna o índice do pedaço em que a instrução ficou completa e a instrução"""
+    detector = DetectorSQL()
+    for indice, pedaco in enumerate(pedacos):
+        sql = detector.adicionar(pedaco)
+        if sql:
+            return indice, sql
+    return None, detector.finalizar()
+
+
+def test_detector_sql():
+    """Verifica o reconhecimento da primeira instrução completa"""
+    sql = "SELECT ';' FROM t -- ;\n WHERE a = \"x;\" /* ; */;"
+    assert fim_instrucao(sql) == len(sql) - 1
+    assert fim_instrucao("SELECT 'aberta;") == -1
+
+    # Ponto e vírgula fora de strings e comentários termina a instrução
+    assert detectar(["SEL", "ECT a FROM t WHERE x = 'a;b'", " AND y = 1", ";\nExplicação..."]) == \
+        (3, "SELECT a FROM t WHERE x = 'a;b' AND y = 1")
+
+    # Bloco de código após um texto: a cerca de fechamento termina a instrução
+    assert detectar(["Aqui está:\n```s", "ql\nSELECT 1\n", "FROM t\n``", "`\nExplicação"]) == (3, "SELECT 1\nFROM t")
+    assert detectar(["```sql\nSELECT 1 FROM t;", "\n```"]) == (0, "SELECT 1 FROM t")
+
+    # Sem terminador, a instrução só é conhecida no fim da resposta
+    assert detectar(["SELECT 1 ", "FROM t"]) == (None, "SELECT 1 FROM t")
+    assert extrair_sql("```sql\nSELECT 'it''s;' FROM t;\n```") == "SELECT 'it''s;' FROM t"
+    print("✅ Detecção de SQL em fluxo funcionando")
+
+
+class AgenteTeste:
+    """Agente com a interface usada por sql_stream e um modelo simulado"""
+
+    def __init__(self, db_path, pedacos):
+        self.db_path = db_path
+        self.pedacos = pedacos
+        self.cache = None
+        self.memory = []
+
+    def _stream_sql(self, query, context=None):
+        for pedaco in self.pedacos:
+            time.sleep(0.1)
+            yield pedaco
+
+    def _template_sql(self, query):
+        return None
+
+    def _run_sql(self, sql_query):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return str(conn.execute(sql_query).fetchall())
+        finally:
+            conn.close()
+
+    def _error_response(self, query, error_message):
+        self.memory.append({"query": query, "sql": "Error generating SQL", "result": error_message})
+        return {"query": query, "sql": "Error generating SQL", "result": error_message, "from_cache": False}
+
+
+def test_execucao_antecipada():
+    """Verifica que o resultado chega antes do fim da resposta do modelo"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Ano TEXT)')
+        conn.executemany('INSERT INTO Cargas (Ano) VALUES (?)', [('2023',)] * 3)
+        conn.commit()
+        conn.close()
+
+        pedacos = ["```sql\nSELECT COUNT(*) ", "FROM Cargas;\n```", "\nEsta consulta ", "conta ", "as cargas", "."]
+        agente = AgenteTeste(db_path, pedacos)
+        eventos = list(processar_em_fluxo(agente, "Quantas cargas?"))
+        tipos = [evento['event'] for evento in eventos]
+
+        assert tipos.index('sql') < tipos.index('result') < len(tipos) - 2
+        assert tipos[-1] == 'done'
+        resposta = eventos[-1]['response']
+        assert resposta['sql'] == "SELECT COUNT(*) FROM Cargas" and resposta['result'] == '[(3,)]'
+        assert resposta['timings']['first_result'] < resposta['timings']['total'] - 0.2
+        assert agente.memory[-1]['result'] == '[(3,)]'
+
+        # Erros na consulta voltam na resposta final
+        agente = AgenteTeste(db_path, ["SELECT * FROM TabelaInexistente"])
+        resposta = list(processar_em_fluxo(agente, "?"))[-1]['response']
+        assert resposta['sql'] == "Error generating SQL" and 'TabelaInexistente' in resposta['result']
+        print("✅ Execução antecipada funcionando")
+
+
+if __name__ == "__main__":
+    test_detector_sql()
+    test_execucao_antecipada()
@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import tempfile
+from template_engine import TemplateEngine, relatorio, sql_literal
+from metadata_snapshot import obter_metadados
+from create_database import criar_tabelas_mapeamento
+
+MAPEAMENTOS = {
+    'CDMercadoria': {'0101': 'Animais Vivos', '2601': 'Minérios de Ferro'},
+    'Portos': {'BRSSZ': 'Santos', 'BRSP008': 'DP World Santos', 'BRIQI': 'Itaqui', 'BRPNG': 'Paranaguá'},
+    'Países Origem': {'CN': 'CHINA', 'BR': 'BRASIL'},
+    'Países Destino': {'CN': 'CHINA', 'US': 'ESTADOS UNIDOS'},
+    'Tipo Navegação': {'1': 'Navegação Interior', '3': 'Cabotagem', '5': 'Longo Curso'},
+    'Sentido': {'1': 'Desembarque', '2': 'Embarque'},
+    'Natureza da Carga': {'Granel Sólido': 'Granel Sólido', 'Carga Geral': 'Carga Geral'},
+    'ConteinerEstado': {'C': 'Cheio', 'V': 'Vazio'},
+}
+
+# (Origem, Destino, Pais_Destino, CDMercadoria, TipoNavegacao_Codigo, Sentido, Natureza, Ano, peso, TEU)
+REGISTROS = [
+    ('BRSSZ', 'CNSHA', 'CHINA', '2601', '5', 'Embarcados', 'Granel Sólido', '2023', 100.0, 0),
+    ('BRSP008', 'USNYC', 'ESTADOS UNIDOS', '0101', '5', 'Embarcados', 'Carga Geral', '2023', 50.0, 2),
+    ('BRIQI', 'CNSHA', 'CHINA', '2601', '5', 'Embarcados', 'Granel Sólido', '2023', 300.0, 0),
+    ('CNSHA', 'BRSSZ', 'BRASIL', '0101', '5', 'Desembarcados', 'Carga Geral', '2023', 20.0, 1),
+    ('BRPNG', 'BRSSZ', 'BRASIL', '2601', '3', 'Embarcados', 'Granel Sólido', '2024', 70.0, 0),
+    ('BRSSZ', 'CNSHA', 'CHINA', '2601', '5', 'Embarcados', 'Granel Sólido', '2024', 130.0, 0),
+]
+
+
+def criar_banco(db_path):
+    conn = sqlite3.connect(db_path)
+    criar_tabelas_mapeamento(conn, MAPEAMENTOS)
+    conn.execute('CREATE TABLE Cargas (IDCarga INTEGER PRIMARY KEY, Origem TEXT, Destino TEXT, Pais_Origem TEXT, '
+                 'Pais_Destino TEXT, CDMercadoria TEXT, TipoNavegacao_Codigo TEXT, Sentido TEXT, '
+                 'Natureza_da_Carga TEXT, Ano TEXT, VLPesoCargaBruta REAL, TEU REAL)')
+    conn.executemany('INSERT INTO Cargas (Origem, Destino, Pais_Destino, CDMercadoria, TipoNavegacao_Codigo, '
+                     'Sentido, Natureza_da_Carga, Ano, VLPesoCargaBruta, TEU) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     REGISTROS)
+    conn.commit()
+    return conn
+
+
+def test_templates():
+    """Verifica o SQL montado para os formatos comuns e o encaminhamento das demais perguntas"""
+    with tempfile.TemporaryDirectory() as pasta:
+        db_path = os.path.join(pasta, 'cargas.db')
+        conn = criar_banco(db_path)
+        engine = TemplateEngine(obter_metadados(db_path))
+
+        def executar(pergunta):
+            plano = engine.interpretar(pergunta)
+            assert plano is not None, pergunta
+            # O SQL parametrizado e o literal retornam o mesmo resultado
+            resultado = conn.execute(plano['sql'], plano['parametros']).fetchall()
+            assert conn.execute(plano['sql_literal']).fetchall() == resultado
+            return plano['modelo'], resultado
+
+        # Santos inclui o terminal DP World Santos; embarque filtra a origem
+        assert executar("Quantas toneladas foram embarcadas pelo Porto de Santos em 2023?") == \
+            ('total', [(150.0, 2)])
+        assert executar("Qual o total de carga desembarcada em Santos em 2023?") == ('total', [(20.0, 1)])
+        assert executar("Quantos TEUs foram movimentados pelo porto de Santos em 2023?") == ('total', [(3.0, 3)])
+        assert executar("Quantas cargas de cabotagem foram registradas em 2024?") == ('total', [(1,)])
+        assert executar("Toneladas de granéis sólidos exportados para a China em 2023") == ('total', [(400.0, 2)])
+        assert executar("Quantas toneladas de minérios de ferro foram embarcadas?") == ('total', [(600.0, 4)])
+        assert executar("Quais os dois principais países de destino das exportações em 2023?") == \
+            ('ranking', [('CHINA', 400.0, 2), ('ESTADOS UNIDOS', 50.0, 1)])
+        assert executar("Quais as 5 mercadorias mais frequentes?") == ('ranking', [('2601', 4), ('0101', 2)])
+        assert executar("Compare as toneladas embarcadas em Santos em 2023 e 2024") == \
+            ('por_ano', [('2023', 150.0, 2), ('2024', 130.0, 1)])
+        # Os destinos de um porto são os dos embarques nele, sem as cargas que chegam a Santos
+        plano = engine.interpretar("Quais os 5 principais destinos de Santos em 2023?")
+        assert "Origem IN ('BRSP008', 'BRSSZ')" in plano['sql_literal'] and 'Destino IN' not in plano['sql_literal']
+        assert executar("Quais os 5 principais destinos de Santos em 2023?") == \
+            ('ranking', [('CHINA', 100.0, 1), ('ESTADOS UNIDOS', 50.0, 1)])
+
+        # Palavras fora do vocabulário, anos sem dados e sentidos conflitantes seguem para o modelo
+        for pergunta in ["Qual é o peso médio das cargas por tipo de navegação?",
+                         "Quais portos movimentaram mais de 500 mil toneladas em 2023?",
+                         "Qual a média mensal de cargas embarcadas em 2023?",
+                         "Quantas toneladas foram embarcadas em 2019?",
+                         "Quanto foi embarcado e desembarcado em Santos?",
+                         "Quais os principais portos?",
+                         # Perguntas de ranking sem um ranking reconhecido não viram totais
+                         "Qual país mais exportou em 2023?",
+                         "Qual porto mais exportou em 2023?",
+                         "Qual mercadoria mais exportada em 2023?",
+                         "Qual porto exportou minérios de ferro em 2023?",
+                         # "Do/para o Brasil" pode inverter o sentido
+                         "Qual país mais importou minérios de ferro do Brasil em 2023?",
+                         "Quanto a China exportou para o Brasil em 2023?",
+                         # Intervalo de anos, filtro de contêineres e países importadores
+                         "Quantas toneladas foram embarcadas em Santos entre 2023 e 2024?",
+                         "Quantas toneladas de contêineres foram embarcadas em 2023?",
+                         "Quais os 5 maiores países importadores em 2023?",
+                         "Quais os maiores exportadores de minérios de ferro em 2023?",
+                         "Quais os principais destinos das importações em 2023?"]:
+            assert engine.interpretar(pergunta) is None, pergunta
+
+        assert sql_literal("SELECT * FROM Cargas WHERE Origem IN (?, ?)", ["BRSSZ", "D'x"]) == \
+            "SELECT * FROM Cargas WHERE Origem IN ('BRSSZ', 'D''x')"
+
+        resultado = relatorio(engine, ["Quantas cargas em 2023?", "Qual a média mensal?"],
+                              lambda sql: conn.execute(sql).fetchall())
+        assert resultado['cobertura'] == 0.5 and resultado['nao_reconhecidas'] == ["Qual a média mensal?"]
+        print(f"Reconhecimento: p50 {resultado['reconhecimento_ms']['p50']:.2f} ms")
+        conn.close()
+        print("✅ Templates de perguntas funcionando")
+
+
+if __name__ == "__main__":
+    test_templates()
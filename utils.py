@@ -1,5 +1,5 @@
 import streamlit as st
-import base64
+from exports import novo_arquivo_exportacao
 
 def add_logo():
     """Add a logo to the sidebar"""
@@ -25,8 +25,14 @@ def inject_custom_css():
         st.write("CSS file not found. Using default styles.")
 
 def get_table_download_link(df, filename="data.csv", text="Download data as CSV"):
-    """Generate a link to download the dataframe as a CSV file"""
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">{text}</a>'
+    """Generate a link to download the dataframe as a CSV file served from static/exports"""
+    path, url = novo_arquivo_exportacao('csv')
+    df.to_csv(path, index=False, chunksize=10000)
+    href = f'<a href="{url}" download="{filename}">{text}</a>'
     return href
+
+def get_query_download_link(db_tools, sql, formato="csv", text=None):
+    """Export a query result in batches (see exports.py) and return a link to the file"""
+    exportacao = db_tools.export_query(sql, formato)
+    text = text or f"Baixar {formato.upper()} ({exportacao['linhas']:,} linhas)"
+    return f'<a href="{exportacao["url"]}" download>{text}</a>'